@@ -21,17 +21,30 @@ else:
 
 from fastapi import FastAPI, HTTPException, Path, Body, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from data_stores.api import router as router_1
-from document_loaders.api import router as router_2
-from document_stores.api import router as router_3
-from document_transformers.api import router as router_4
-from embedding_models.api import router as router_5
-from vector_stores.api import router as router_6
-from llms.api import router as router_7
-from prompts.api import router as router_8
-from tools.api import router as router_9
-from chains.api import router as router_10
-#from gcs_data_storage.api import router as router_11
+from utilities.lazy_imports import timed_import, import_report
+from utilities.executors import event_loop_lag_monitor, get_executor_stats, run_blocking
+from utilities.mongo import close_mongo_clients
+from utilities.jobs import job_worker, job_worker_process, process_job_worker, JOB_WORKERS_EMBEDDED
+from utilities.lifecycle import lifecycle_manager
+from utilities.object_registry import object_registry
+
+# (prefix, router) di ciascun sottosistema; i moduli vengono importati (e cronometrati) solo se abilitati.
+# ENABLED_ROUTERS="vector_stores,embedding_models" avvia solo i router indicati (default: tutti).
+ROUTERS = [
+    ("data_stores", "data_stores.api:router"),
+    #("gcs_data_stores", "gcs_data_storage.api:router"),
+    ("document_loaders", "document_loaders.api:router"),
+    ("document_stores", "document_stores.api:router"),
+    ("document_transformers", "document_transformers.api:router"),
+    ("embedding_models", "embedding_models.api:router"),
+    ("vector_stores", "vector_stores.api:router"),
+    ("llms", "llms.api:router"),
+    ("prompts", "prompts.api:router"),
+    ("tools", "tools.api:router"),
+    ("chains", "chains.api:router"),
+    ("jobs", "jobs.api:router"),
+]
+ENABLED_ROUTERS = [name.strip() for name in os.getenv("ENABLED_ROUTERS", "").split(",") if name.strip()]
 
 app = FastAPI(
     root_path="/llm-core"
@@ -45,17 +58,79 @@ app.add_middleware(
     allow_headers=["*"],  # Permetti tutti gli headers
 )
 
-app.include_router(router_1, prefix="/data_stores", tags=["data_stores"])
-#app.include_router(router_11, prefix="/gcs_data_stores", tags=["gcs_data_stores"])
-app.include_router(router_2, prefix="/document_loaders", tags=["document_loaders"])
-app.include_router(router_3, prefix="/document_stores", tags=["document_stores"])
-app.include_router(router_4, prefix="/document_transformers", tags=["document_transformers"])
-app.include_router(router_5, prefix="/embedding_models", tags=["embedding_models"])
-app.include_router(router_6, prefix="/vector_stores", tags=["vector_stores"])
-app.include_router(router_7, prefix="/llms", tags=["llms"])
-app.include_router(router_8, prefix="/prompts", tags=["prompts"])
-app.include_router(router_9, prefix="/tools", tags=["tools"])
-app.include_router(router_10, prefix="/chains", tags=["chains"])
+for name, target in ROUTERS:
+    if ENABLED_ROUTERS and name not in ENABLED_ROUTERS:
+        continue
+    app.include_router(timed_import(name, target), prefix=f"/{name}", tags=[name])
+
+
+@app.on_event("startup")
+async def on_startup():
+    event_loop_lag_monitor.start()
+    # worker della coda di job: un processo figlio per nodo o thread in questo worker (vedi utilities/jobs.py)
+    if JOB_WORKERS_EMBEDDED == "process":
+        job_worker_process.start()
+    elif JOB_WORKERS_EMBEDDED == "thread":
+        await run_blocking("mongo", job_worker.start)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    event_loop_lag_monitor.stop()
+    await run_blocking("mongo", job_worker.stop)
+    await run_blocking("mongo", process_job_worker.stop)
+    await run_blocking("mongo", job_worker_process.stop)
+    await close_mongo_clients()
+
+
+@app.get("/runtime/stats", tags=["runtime"])
+async def runtime_stats():
+    """
+    Event loop lag (ms) of this worker and in-flight/queued jobs of each blocking executor pool.
+    """
+    return {
+        "pid": os.getpid(),
+        "event_loop_lag": event_loop_lag_monitor.get_stats(),
+        "executors": get_executor_stats(),
+    }
+
+
+@app.get("/runtime/imports", tags=["runtime"])
+async def runtime_imports():
+    """
+    Import times of the routers loaded at startup and of the modules imported lazily on first use.
+    """
+    return import_report.get_report()
+
+
+@app.get("/runtime/memory", tags=["runtime"])
+async def runtime_memory():
+    """
+    Memory budget of this worker: estimated footprint, idle time and pinning of every loaded vector store,
+    LLM and chain, and the evictions performed so far (least recently used first).
+    """
+    return await run_blocking("vector_stores", lifecycle_manager.get_stats)
+
 
+@app.post("/runtime/pin/{kind}/{object_id}", tags=["runtime"])
+async def pin_object(
+    kind: str = Path(..., description="The kind of object: vector_store, llm or chain.", example="vector_store"),
+    object_id: str = Path(..., description="The store, model or chain ID.", example="faq_store")
+):
+    """
+    Pin an object on this node: no worker evicts it to stay within the memory budget.
+    """
+    await run_blocking("vector_stores", object_registry.pin, kind, object_id)
+    return {"detail": f"{kind} {object_id} pinned"}
 
 
+@app.delete("/runtime/pin/{kind}/{object_id}", tags=["runtime"])
+async def unpin_object(
+    kind: str = Path(..., description="The kind of object: vector_store, llm or chain.", example="vector_store"),
+    object_id: str = Path(..., description="The store, model or chain ID.", example="faq_store")
+):
+    """
+    Unpin an object on this node: the workers can evict it again when their memory budget is exceeded.
+    """
+    await run_blocking("vector_stores", object_registry.unpin, kind, object_id)
+    return {"detail": f"{kind} {object_id} unpinned"}
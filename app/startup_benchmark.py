@@ -0,0 +1,97 @@
+"""
+startup_benchmark.py
+
+Misura il cold start dell'API: avvia più volte un interprete pulito che
+importa `app.main` (router inclusi) e riporta il tempo totale e i moduli più
+lenti secondo `python -X importtime`.
+
+Uso (dalla root del repository, dove si trova config.json):
+
+    python -m app.startup_benchmark --runs 5
+    python -m app.startup_benchmark --runs 5 --max-seconds 8 --output startup.json
+
+Con `--max-seconds` lo script termina con codice 1 se la mediana supera la
+soglia, così il tempo di avvio resta sotto controllo anche in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+IMPORT_STATEMENT = "import app.main"
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, float, int]]:
+    """Estrae (modulo, tempo cumulativo in secondi, profondità) dall'output di `-X importtime`."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(cumulative) / 1e6, depth))
+    return modules
+
+
+def run_once(env: Dict[str, str]) -> Tuple[float, List[Tuple[str, float, int]]]:
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_STATEMENT],
+                               capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{completed.stderr[-2000:]}")
+    return elapsed, _parse_importtime(completed.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of app.main")
+    parser.add_argument("--runs", type=int, default=3, help="Number of fresh interpreters to start.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to report.")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail if the median startup exceeds this.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    timings = []
+    modules: List[Tuple[str, float, int]] = []
+    for run in range(args.runs):
+        elapsed, modules = run_once(env)
+        timings.append(elapsed)
+        print(f"run {run + 1}/{args.runs}: {elapsed:.3f}s")
+
+    # moduli di primo livello (senza indentazione) ordinati per tempo cumulativo dell'ultima esecuzione
+    top_level = sorted(((name, seconds) for name, seconds, depth in modules if depth == 0),
+                       key=lambda item: item[1], reverse=True)[:args.top]
+    result = {
+        "runs": args.runs,
+        "min_s": round(min(timings), 3),
+        "median_s": round(statistics.median(timings), 3),
+        "max_s": round(max(timings), 3),
+        "slowest_imports": [{"module": name, "cumulative_s": round(seconds, 3)} for name, seconds in top_level],
+    }
+
+    print(f"\nstartup median {result['median_s']}s (min {result['min_s']}s, max {result['max_s']}s)")
+    for item in result["slowest_imports"]:
+        print(f"  {item['cumulative_s']:8.3f}s  {item['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+
+    if args.max_seconds is not None and result["median_s"] > args.max_seconds:
+        print(f"\nmedian startup {result['median_s']}s exceeds --max-seconds {args.max_seconds}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
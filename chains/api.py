@@ -4,23 +4,23 @@
 import json
 import os
 
-from fastapi import FastAPI, HTTPException, Path, Body, APIRouter
+from fastapi import FastAPI, HTTPException, Path, Body, Query, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_core.messages import HumanMessage, BaseMessage
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
-from pymongo import MongoClient
 from chains.utilities.chain_manager import ChainManager
+from utilities.executors import run_blocking, run_native_or_blocking
 from fastapi.responses import StreamingResponse
 
 #from langchain_community.callbacks.manager import get_openai_callback
 from langchain_community.callbacks import get_openai_callback
 
 from chains.utilities.multimodal import to_message, build_parts, build_parts_legacy
+from utilities.mongo import get_mongo_client
 
 router = APIRouter()
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 db = client['chain_db']
 collection = db['chain_configs']
 chain_manager = ChainManager(collection)
@@ -148,7 +148,7 @@ async def configure_chain(request: ChainConfigRequest):
     - **config_id**: The ID of the newly created configuration.
     """
     try:
-        result = chain_manager.configure_chain(request.dict())
+        result = await run_blocking("mongo", chain_manager.configure_chain, request.dict())
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -167,7 +167,7 @@ async def update_chain_config(config_id: str, request: ChainConfigRequest):
     - **config_id**: The ID of the updated configuration.
     """
     try:
-        result = chain_manager.update_chain_config(config_id, request.dict())
+        result = await run_blocking("mongo", chain_manager.update_chain_config, config_id, request.dict())
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -185,7 +185,7 @@ async def delete_chain_config(config_id: str = Path(..., description="The unique
     - A confirmation message upon successful deletion.
     """
     try:
-        result = chain_manager.delete_chain_config(config_id)
+        result = await run_blocking("mongo", chain_manager.delete_chain_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -203,7 +203,7 @@ async def load_chain(config_id: str = Path(..., description="The unique ID of th
     - A confirmation message upon successful loading.
     """
     try:
-        result = chain_manager.load_chain(config_id)
+        result = await run_blocking("chains", chain_manager.load_chain, config_id)
         return result
     except ValueError as e:
         print(e)
@@ -222,22 +222,24 @@ async def unload_chain(chain_id: str = Path(..., description="The unique ID of t
     - A confirmation message upon successful unloading.
     """
     try:
-        result = chain_manager.unload_chain(chain_id)
+        result = await run_blocking("chains", chain_manager.unload_chain, chain_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/list_loaded_chains/", response_model=List[str])
-async def list_loaded_chains():
+async def list_loaded_chains(scope: str = Query("worker", description="'worker' for the answering worker only, 'node' for every worker on this node.")):
     """
     List all currently loaded chains.
 
     This endpoint retrieves and returns a list of all currently loaded chains.
 
+    - **scope**: `worker` (default) or `node`.
+
     Returns:
     - A list of chain IDs for the currently loaded chains.
     """
-    return chain_manager.list_loaded_chains()
+    return await run_blocking("chains", chain_manager.list_loaded_chains, scope=scope)
 
 @router.get("/list_chain_configs/", response_model=List[Dict[str, Any]])
 async def list_chain_configs():
@@ -250,7 +252,7 @@ async def list_chain_configs():
     - A list of chain configurations.
     """
     try:
-        configs = chain_manager.list_chain_configs()
+        configs = await run_blocking("mongo", chain_manager.list_chain_configs)
         return configs
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -268,7 +270,7 @@ async def get_chain_config(config_id: str = Path(..., description="The unique ID
     - The configuration details of the specified chain.
     """
     try:
-        config = chain_manager.get_chain_config(config_id)
+        config = await run_blocking("mongo", chain_manager.get_chain_config, config_id)
         return config
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -293,9 +295,11 @@ async def execute_chain(request: ExecuteChainRequest):
     #  - integra caricamento automatico dell oggetto se non presente in memoria (default true, da settare mediante input)
 
     try:
-        chain = chain_manager.get_chain(request.chain_id)
+        # get_chain può fare lazy-load di chain, LLM e vector store: fuori dall'event loop
+        chain = await run_blocking("chains", chain_manager.get_chain, request.chain_id)
         with get_openai_callback() as cb:
-            result = chain.invoke(request.query, **request.inference_kwargs)
+            result = await run_native_or_blocking("chains", chain, "ainvoke", "invoke",
+                                                  request.query, **request.inference_kwargs)
             print(result)
             print("\n\nToken usage:\n")
             print(cb)
@@ -340,7 +344,7 @@ async def stream_chain(request: ExecuteChainRequest):
         #query = body.query
         #inference_kwargs = body.inference_kwargs
         # ✅ lazy‑load automatico: pensa a tutto ChainManager.get_chain
-        chain = chain_manager.get_chain(request.chain_id)
+        chain = await run_blocking("chains", chain_manager.get_chain, request.chain_id)
         query = request.query
         inference_kwargs = request.inference_kwargs
 
@@ -501,7 +505,7 @@ async def stream_events_chain(request: ExecuteChainRequest):
         #query = body.query
         #inference_kwargs = body.inference_kwargs
 
-        chain = chain_manager.get_chain(request.chain_id)
+        chain = await run_blocking("chains", chain_manager.get_chain, request.chain_id)
         query = request.query
         inference_kwargs = request.inference_kwargs
 
@@ -578,7 +582,7 @@ async def stream_events_chain(request: ExecuteChainRequest):
             #yield cb
 
     try:
-        chain = chain_manager.get_chain(request.chain_id)
+        chain = await run_blocking("chains", chain_manager.get_chain, request.chain_id)
         inference_kwargs = request.inference_kwargs
 
         # —————— fallback legacy vs multimodale ——————
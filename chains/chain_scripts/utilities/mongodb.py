@@ -1,6 +1,7 @@
 import json
 import os
 from pymongo import MongoClient
+from utilities.mongo import MONGO_CONNECTION_STRING, get_mongo_client, mongo_client_options
 from pydantic import BaseModel, Field
 from typing import Optional, Any
 from langchain_core.tools import StructuredTool
@@ -34,7 +35,11 @@ class UpdateDataModel(BaseModel):
 class MongoDBToolKitManager:
     def __init__(self, connection_string: str, default_database: str = "default_db", default_collection: str = "default_collection"):
         """Inizializza MongoDBToolKit con una connection string e opzionalmente un database e collection di default."""
-        self.client = MongoClient(connection_string)
+        # riusa il client condiviso quando la connection string è quella dell'applicazione
+        if connection_string == MONGO_CONNECTION_STRING:
+            self.client = get_mongo_client()
+        else:
+            self.client = MongoClient(connection_string, **mongo_client_options())
         self.default_database = default_database
         self.default_collection = default_collection
 
@@ -38,7 +38,10 @@ from pydantic import BaseModel, Field, ValidationError
 from langchain_core.tools import StructuredTool
 
 # Registry helpers (assumed to wrap a Chroma vector store)
-from vector_stores.api import vector_stores, load_vector_store
+from vector_stores.api import get_vector_store
+from vector_stores.utilities.hybrid import hybrid_search
+from vector_stores.utilities.search_cache import cached_search
+from vector_stores.utilities.store_locks import read_locked
 
 ###############################################################################
 # Helper to obtain (and lazily load) the vector store                        #
@@ -47,10 +50,8 @@ from vector_stores.api import vector_stores, load_vector_store
 
 def get_vectorstore_component(store_id: str):
     """Return a Chroma-based vector store instance from the global registry, loading it on-demand."""
-    if store_id not in vector_stores:
-        # The config id convention is <store_id>_config (change if different)
-        load_vector_store(config_id=f"{store_id}_config")
-    return vector_stores[store_id]
+    # concurrent tool calls for an unloaded store wait for the same load
+    return get_vector_store(store_id)
 
 
 ###############################################################################
@@ -191,12 +192,15 @@ class VectorStoreToolKitManager:
             Identificativo logico del vector store Chroma, usato per recuperare
             l'istanza dal registry globale.
         search_type:
-            Tipo di ricerca del retriever (es. 'similarity', 'mmr', ...).
+            Tipo di ricerca del retriever (es. 'similarity', 'mmr', ...) oppure
+            'hybrid' (BM25 + ricerca densa fuse con RRF, adatta a codici
+            articolo, part number e nomi di file).
         default_k:
             Valore di fallback per `k` se non specificato a livello di tool call.
         search_kwargs:
             Argomenti base passati al retriever; possono essere sovrascritti
-            per singola chiamata (es. con filtri e k diversi).
+            per singola chiamata (es. con filtri e k diversi). Per 'hybrid'
+            accetta anche `fetch_k`, `lexical_weight`, `vector_weight`, `rrf_k`.
         """
         self.store_id = store_id
         self.vectorstore = get_vectorstore_component(store_id=store_id)
@@ -313,9 +317,17 @@ class VectorStoreToolKitManager:
             filter_dict = self._parse_metadata_filter(metadata_filter)
             k_int = self._parse_k(k)
 
-            # Execute search on Chroma
-            retriever = self._get_retriever(metadata_filter=filter_dict, k=k_int)
-            docs = retriever.invoke(query)
+            # Execute search on Chroma (le chiamate ripetute dall'agente sono servite dalla cache dello store)
+            search_kwargs = self._build_search_kwargs(filter_dict, k_int)
+            if self.search_type == "hybrid":
+                docs = [doc for doc, _ in cached_search(self.vectorstore, query, self.search_type, search_kwargs,
+                                                        lambda: read_locked(self.vectorstore, hybrid_search,
+                                                                            self.vectorstore, query, search_kwargs))]
+            else:
+                # il retriever restituisce solo documenti anche dove /vector_store/search dà anche gli score
+                retriever = self._get_retriever(metadata_filter=filter_dict, k=k_int)
+                docs = cached_search(self.vectorstore, query, f"retriever:{self.search_type}", search_kwargs,
+                                     lambda: read_locked(self.vectorstore, retriever.invoke, query))
 
             results: List[Dict[str, Any]] = []
 
@@ -1,8 +1,5 @@
 from typing import Dict, Any
 
-from langchain_openai import ChatOpenAI
-from pymongo import MongoClient
-from langchain.chains import RetrievalQA
 
 # TODO:
 #  - [ ] to implement 'get_object' methods
@@ -14,14 +11,14 @@ from langchain.chains import RetrievalQA
 
 # TODO:
 #  - [ ] to implement VectorStoreManager class
-from chains.chain_scripts import qa_chain, agent_with_tools
-from chains.chain_scripts import mongodb_chain
-from chains.chain_scripts import dataloader_chain
 # from chains.chain_scripts import tmp as qa_chain
 from llms.api import model_manager, load_model
 from prompts.api import prompt_manager
 from tools.api import tool_manager
-from vector_stores.api import vector_stores, load_vector_store
+from vector_stores.api import get_vector_store
+from utilities.object_registry import object_registry, config_version
+from utilities.lifecycle import lifecycle_manager
+from utilities.lazy_imports import LazyClassMap
 
 
 # Functions for getting components by ID
@@ -55,30 +52,28 @@ def get_llm_component(model_id: str):
 
 
 def get_vectorstore_component(store_id: str):
-    # Function to get a vectorstore component by ID
+    # Function to get a vectorstore component by ID (lazy-load condiviso con le richieste concorrenti)
 
-    if not vector_stores.get(store_id):
-        try:
-            load_vector_store(config_id=f"{store_id}_config")
-        except Exception as e:
-            print(e)
-
-    vector_store = vector_stores[store_id]
+    vector_store = get_vector_store(store_id)
 
     return vector_store
 
 
 class ChainManager:
-    available_chains: Dict[str, Any] = {
-        "qa_chain": qa_chain,
-        "mongodb_chain": mongodb_chain,
-        "dataloader_chain": dataloader_chain,
-        "agent_with_tools": agent_with_tools,
-    }
+    # gli script delle chain (pymupdf4llm, matplotlib, ...) vengono importati al primo utilizzo
+    available_chains: Dict[str, Any] = LazyClassMap({
+        "qa_chain": "chains.chain_scripts.qa_chain",
+        "mongodb_chain": "chains.chain_scripts.mongodb_chain",
+        "dataloader_chain": "chains.chain_scripts.dataloader_chain",
+        "agent_with_tools": "chains.chain_scripts.agent_with_tools",
+    })
 
     def __init__(self, db_collection):
         self.chains = {}
         self.collection = db_collection
+        # le chain meno usate di recente vengono scaricate quando il budget di memoria del worker è superato
+        # (e ricaricate da get_chain al successivo utilizzo)
+        lifecycle_manager.register_kind("chain", self.chains, self._evict_chain)
 
     def configure_chain(self, chain_config: dict):
         config_id = chain_config['config_id']
@@ -87,6 +82,8 @@ class ChainManager:
 
         chain_config["_id"] = config_id
         self.collection.insert_one(chain_config)
+        if chain_config.get("chain_id"):
+            object_registry.forget_missing("chain", chain_config["chain_id"])
         return {"config_id": config_id}
 
     def update_chain_config(self, config_id: str, chain_config: dict):
@@ -94,6 +91,10 @@ class ChainManager:
             raise ValueError("Configuration not found")
 
         self.collection.update_one({"_id": config_id}, {"$set": chain_config})
+        if chain_config.get("chain_id"):
+            updated = self.collection.find_one({"_id": config_id})
+            object_registry.mark_updated("chain", chain_config["chain_id"], config_version(updated))
+            object_registry.forget_missing("chain", chain_config["chain_id"])
         return {"config_id": config_id}
 
     def delete_chain_config(self, config_id: str):
@@ -112,41 +113,50 @@ class ChainManager:
         if chain_id in self.chains:
             raise ValueError("Chain already loaded")
 
+        if chain_type in ("qa_chain", "agent_with_tools"):
+            object_registry.load_once("chain", chain_id, self.chains,
+                                      build=lambda: self._build_chain(config),
+                                      version=config_version(config))
+
+        return {"message": "Chain loaded successfully", "chain_id": chain_id}
+
+    def _build_chain(self, config: dict):
+        chain_type = config["chain_type"]
+
         if chain_type == "qa_chain":
             # prompt = get_prompt_component(config["prompt_id"])
             llm = get_llm_component(config["llm_id"])
             vectorstore = get_vectorstore_component(config["vectorstore_id"])
             retriever = vectorstore.as_retriever(**{"search_type": "similarity", "search_kwargs": {"k": 10}})
 
-            chain = self.available_chains[chain_type].get_chain(llm=llm,
-                                                                retriever=retriever)
+            return self.available_chains[chain_type].get_chain(llm=llm,
+                                                               retriever=retriever)
 
-            self.chains[chain_id] = chain
-
-        elif chain_type == "agent_with_tools":
-
-            llm = get_llm_component(config["llm_id"])
-            system_message = config["system_message"]
-            tools = config["tools"]
+        llm = get_llm_component(config["llm_id"])
+        system_message = config["system_message"]
+        tools = config["tools"]
 
-            chain = self.available_chains[chain_type].get_chain(
-                llm=llm,
-                system_message=system_message,
-                tools=tools
-            )
-
-            self.chains[chain_id] = chain
-
-        return {"message": "Chain loaded successfully", "chain_id": chain_id}
+        return self.available_chains[chain_type].get_chain(
+            llm=llm,
+            system_message=system_message,
+            tools=tools
+        )
 
     def unload_chain(self, chain_id: str):
         if chain_id not in self.chains:
             raise ValueError("Chain not found")
 
         del self.chains[chain_id]
+        object_registry.unregister("chain", chain_id)
         return {"message": "Chain unloaded successfully"}
 
-    def list_loaded_chains(self):
+    def _evict_chain(self, chain_id: str) -> None:
+        if chain_id in self.chains:
+            self.unload_chain(chain_id)
+
+    def list_loaded_chains(self, scope: str = "worker"):
+        if scope == "node":
+            return object_registry.list_ids("chain")
         return list(self.chains.keys())
 
     def list_chain_configs(self):
@@ -171,15 +181,16 @@ class ChainManager:
         configurazione ‹chain_id› → ‹config_id› in Mongo.
         """
 
-        if chain_id not in self.chains:
+        def load():
             cfg = self.collection.find_one({"chain_id": chain_id})
-
-            if cfg:
-                self.load_chain(cfg["_id"])
-
-
-        if chain_id not in self.chains:
-
+            if not cfg:
+                return None
+            self.load_chain(cfg["_id"])
+            return self.chains.get(chain_id)
+
+        # le richieste concorrenti per una chain non caricata attendono lo stesso caricamento
+        chain = object_registry.get_or_load("chain", chain_id, self.chains, load)
+        if chain is None:
             raise ValueError("Chain not found and no config found in DB")
 
-        return self.chains[chain_id]
+        return chain
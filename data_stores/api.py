@@ -4,6 +4,7 @@ from fastapi.responses import FileResponse, HTMLResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from data_stores.utilities.storage import FileStorage
+from utilities.executors import run_blocking
 import json
 import os
 import mimetypes
@@ -83,7 +84,7 @@ async def create_directory(
     custom_metadata = {"description": description} if description else {}
     if extra_metadata:
         custom_metadata.update(json.loads(extra_metadata))
-    file_storage.save_directory_metadata(directory, custom_metadata)
+    await run_blocking("data_stores", file_storage.save_directory_metadata, directory, custom_metadata)
     return DirectoryMetadata(path=directory, custom_metadata=custom_metadata)
 
 
@@ -107,7 +108,7 @@ async def delete_directory(directory_id: str):
             item.rmdir()
 
     dir_path.rmdir()
-    file_storage.delete_directory_metadata(directory_id)
+    await run_blocking("data_stores", file_storage.delete_directory_metadata, directory_id)
     return {"detail": "Directory deleted successfully"}
 
 
@@ -136,8 +137,8 @@ async def upload_file(
     custom_metadata = {"file_description": file_description} if file_description else {}
     if extra_metadata:
         custom_metadata.update(json.loads(extra_metadata))
-    file_storage.save_file(file_path, content, custom_metadata)
-    metadata = file_storage.get_file_metadata(file_path)
+    await run_blocking("data_stores", file_storage.save_file, file_path, content, custom_metadata)
+    metadata = await run_blocking("data_stores", file_storage.get_file_metadata, file_path)
     return metadata
 
 
@@ -168,7 +169,7 @@ async def upload_multiple_files(
         custom_metadata = {"file_description": file_description} if file_description else {}
         if extra_metadata:
             custom_metadata.update(json.loads(extra_metadata))
-        file_storage.save_file(file_path, content, custom_metadata)
+        await run_blocking("data_stores", file_storage.save_file, file_path, content, custom_metadata)
         ids.append(file_path)
     return {"file_ids": ids}
 
@@ -187,13 +188,13 @@ async def update_file(
     with new content and updates the associated metadata. If the file does not exist, a 404 error is returned.
     """
     content = await file.read()
-    if not file_storage.get_file(file_id):
+    if not await run_blocking("data_stores", file_storage.get_file, file_id):
         raise HTTPException(status_code=404, detail="File not found")
     custom_metadata = {"file_description": file_description} if file_description else {}
     if extra_metadata:
         custom_metadata.update(json.loads(extra_metadata))
-    file_storage.update_file(file_id, content, custom_metadata)
-    metadata = file_storage.get_file_metadata(file_id)
+    await run_blocking("data_stores", file_storage.update_file, file_id, content, custom_metadata)
+    metadata = await run_blocking("data_stores", file_storage.get_file_metadata, file_id)
     return metadata
 
 
@@ -213,14 +214,14 @@ async def save_file_metadata(
     Save metadata for a file. This endpoint attaches custom metadata to a specified file
     and saves it on the server. The metadata of the file is then returned.
     """
-    if not file_storage.get_file(file_id):
+    if not await run_blocking("data_stores", file_storage.get_file, file_id):
         raise HTTPException(status_code=404, detail="File not found")
 
     custom_metadata = {"file_description": file_description} if file_description else {}
     if extra_metadata:
         custom_metadata.update(json.loads(extra_metadata))
-    file_storage.save_file_metadata(file_id, custom_metadata)
-    metadata = file_storage.get_file_metadata(file_id)
+    await run_blocking("data_stores", file_storage.save_file_metadata, file_id, custom_metadata)
+    metadata = await run_blocking("data_stores", file_storage.get_file_metadata, file_id)
     return metadata
 
 @router.put(
@@ -241,7 +242,7 @@ async def update_file_metadata(
     Aggiorna (merge) i metadati personalizzati di un file.
     Se non esiste ancora un record di metadati, viene creato automaticamente.
     """
-    if not file_storage.get_file(file_id):
+    if not await run_blocking("data_stores", file_storage.get_file, file_id):
         raise HTTPException(status_code=404, detail="File not found")
 
     custom_metadata: Dict[str, Any] = {}
@@ -254,9 +255,9 @@ async def update_file_metadata(
             raise HTTPException(status_code=400, detail="extra_metadata non è JSON valido")
 
     # *** richiama il nuovo metodo ***
-    file_storage.update_file_metadata(file_id, custom_metadata)
+    await run_blocking("data_stores", file_storage.update_file_metadata, file_id, custom_metadata)
 
-    metadata = file_storage.get_file_metadata(file_id)
+    metadata = await run_blocking("data_stores", file_storage.get_file_metadata, file_id)
     return FileMetadata(**metadata)
 
 @router.delete("/delete/{file_id:path}",
@@ -267,9 +268,9 @@ async def delete_file(file_id: str):
     Delete a file and its metadata. This endpoint removes a specified file from the server along with
     any associated metadata. If the file does not exist, a 404 error is returned.
     """
-    if not file_storage.get_file(file_id):
+    if not await run_blocking("data_stores", file_storage.get_file, file_id):
         raise HTTPException(status_code=404, detail="File not found")
-    file_storage.delete_file(file_id)
+    await run_blocking("data_stores", file_storage.delete_file, file_id)
     return {"detail": "File deleted successfully"}
 
 
@@ -281,7 +282,7 @@ async def get_file(file_id: str):
     Retrieve a file from the server. This endpoint returns the content of a specified file.
     If the file does not exist, a 404 error is returned.
     """
-    content = file_storage.get_file(file_id)
+    content = await run_blocking("data_stores", file_storage.get_file, file_id)
     if not content:
         raise HTTPException(status_code=404, detail="File not found")
     return FileResponse(path=os.path.join(file_storage.store.root_path, file_id), filename=file_id)
@@ -296,8 +297,8 @@ async def list_files(
     List all files on the server. This endpoint returns metadata for all files stored on the server.
     Optionally, it can list files from a specific subdirectory.
     """
-    files = file_storage.list_files(subdir)
-    metadata_list = [file_storage.get_file_metadata(file) for file in files]
+    files = await run_blocking("data_stores", file_storage.list_files, subdir)
+    metadata_list = await run_blocking("data_stores", lambda: [file_storage.get_file_metadata(file) for file in files])
     return metadata_list
 
 
@@ -309,7 +310,7 @@ async def get_file_metadata(file_id: str):
     Retrieve metadata for a specific file. This endpoint returns the metadata of a specified file.
     If the file does not exist, a 404 error is returned.
     """
-    metadata = file_storage.get_file_metadata(file_id)
+    metadata = await run_blocking("data_stores", file_storage.get_file_metadata, file_id)
     if not metadata:
         raise HTTPException(status_code=404, detail="File not found")
     return metadata
@@ -345,7 +346,7 @@ async def list_directories(
 
     - **prefix** (opzionale): stringa usata per filtrare i path delle directory.
     """
-    directories = file_storage.list_directories()
+    directories = await run_blocking("data_stores", file_storage.list_directories)
 
     # Applica il filtro, se richiesto
     if prefix:
@@ -354,7 +355,7 @@ async def list_directories(
         directories = [d for d in directories if d.startswith(norm_prefix)]
 
     # lettura _una sola volta_ di metadata.json
-    meta_map = file_storage.get_directory_metadata_bulk(directories)
+    meta_map = await run_blocking("data_stores", file_storage.get_directory_metadata_bulk, directories)
     metadata_list = [
         DirectoryMetadata(path=d, custom_metadata=meta_map.get(d, {}))
         for d in directories
@@ -387,7 +388,7 @@ async def save_directory_metadata(
     custom_metadata = {"description": description} if description else {}
     if extra_metadata:
         custom_metadata.update(json.loads(extra_metadata))
-    file_storage.save_directory_metadata(directory, custom_metadata)
+    await run_blocking("data_stores", file_storage.save_directory_metadata, directory, custom_metadata)
     return DirectoryMetadata(path=directory, custom_metadata=custom_metadata)
 
 @router.put(
@@ -423,7 +424,7 @@ async def update_directory_metadata(
             raise HTTPException(status_code=400, detail="extra_metadata non è JSON valido")
 
     # *** richiama il nuovo metodo ***
-    file_storage.update_directory_metadata(directory_id, custom_metadata)
+    await run_blocking("data_stores", file_storage.update_directory_metadata, directory_id, custom_metadata)
 
     return DirectoryMetadata(path=directory_id, custom_metadata=custom_metadata)
 
@@ -446,8 +447,8 @@ async def search_files(
     Search for files based on a query. This endpoint returns metadata for files that match the search query.
     Optionally, it can search within a specific subdirectory.
     """
-    files = file_storage.search_files(query, subdir)
-    metadata_list = [file_storage.get_file_metadata(file) for file in files]
+    files = await run_blocking("data_stores", file_storage.search_files, query, subdir)
+    metadata_list = await run_blocking("data_stores", lambda: [file_storage.get_file_metadata(file) for file in files])
     return metadata_list
 
 
@@ -471,11 +472,30 @@ async def filter_files(
     """
     Filter files based on MIME type and size. This endpoint returns metadata for files that match the specified filters.
     """
-    files = file_storage.filter_files(mime_type, min_size, max_size)
-    metadata_list = [file_storage.get_file_metadata(file) for file in files]
+    files = await run_blocking("data_stores", file_storage.filter_files, mime_type, min_size, max_size)
+    metadata_list = await run_blocking("data_stores", lambda: [file_storage.get_file_metadata(file) for file in files])
     return metadata_list
 
 
+def _render_file_html(file_path: str, mime_type: str) -> str:
+    """Legge il file e ne restituisce una rappresentazione HTML leggibile."""
+    with open(file_path, "rb") as file:
+        content = file.read()
+    if mime_type == "application/pdf":
+        pdf_reader = PdfFileReader(BytesIO(content))
+        text_content = ""
+        for page_num in range(pdf_reader.getNumPages()):
+            text_content += pdf_reader.getPage(page_num).extract_text()
+
+        return f"<html><body><pre>{text_content}</pre></body></html>"
+    elif mime_type in ["application/msword",
+                       "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
+        doc = DocxDocument(BytesIO(content))
+        text_content = "\n".join([para.text for para in doc.paragraphs])
+        return f"<html><body><pre>{text_content}</pre></body></html>"
+    return f"<html><body><pre>{content.decode('utf-8')}</pre></body></html>"
+
+
 @router.get("/view/{file_id:path}", response_class=HTMLResponse,
          responses={404: {"description": "File Not Found"}, 400: {"description": "Bad Request"},
                     500: {"description": "Internal Server Error"}})
@@ -494,23 +514,8 @@ async def view_file(file_id: str):
 
     if mime_type in ["text/plain", "application/pdf", "application/msword",
                      "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-        with open(file_path, "rb") as file:
-            content = file.read()
-        if mime_type == "application/pdf":
-            pdf_reader = PdfFileReader(BytesIO(content))
-            text_content = ""
-            for page_num in range(pdf_reader.getNumPages()):
-                text_content += pdf_reader.getPage(page_num).extract_text()
-
-            html_content = f"<html><body><pre>{text_content}</pre></body></html>"
-        elif mime_type in ["application/msword",
-                           "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-            doc = DocxDocument(BytesIO(content))
-            text_content = "\n".join([para.text for para in doc.paragraphs])
-            html_content = f"<html><body><pre>{text_content}</pre></body></html>"
-        else:
-            html_content = f"<html><body><pre>{content.decode('utf-8')}</pre></body></html>"
-
+        # lettura e parsing (PDF/DOCX) fuori dall'event loop
+        html_content = await run_blocking("data_stores", _render_file_html, file_path, mime_type)
         return HTMLResponse(content=html_content)
     else:
         raise HTTPException(status_code=400, detail="File type not supported for viewing")
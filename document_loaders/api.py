@@ -1,176 +1,140 @@
 import base64
 import os
-from fastapi import FastAPI, HTTPException, Form, Query, Path, Body, APIRouter, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Form, Query, Path, Body, APIRouter
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import json
 import uuid
-from pymongo import MongoClient
 from langchain_core.documents import Document
-from langchain_unstructured import UnstructuredLoader
-from document_loaders.utilities.image2text_llm_loader import ImageDescriptionLoader
-#from langchain_community.document_loaders import PyMuPDFLoader
-from document_loaders.utilities.pymupdf4llm_loader import PyMuPDFLoader
-from langchain_community.document_loaders.csv_loader import CSVLoader
-from langchain_community.document_loaders.html_bs import BSHTMLLoader
-from langchain_community.document_loaders.text import TextLoader
 from document_loaders.utilities.custom_directory_loader import CustomDirectoryLoader
-from document_loaders.utilities.video2text_llm_loader import VideoDescriptionLoader
-from datetime import datetime
+from utilities.lazy_imports import LazyClassMap
+from utilities.jobs import (JobContext, register_job_handler, aenqueue_job, aget_job, acancel_job,
+                            aget_job_outputs, acount_job_outputs, new_job_files_dir, remove_job_files)
+from pymongo.errors import DuplicateKeyError
+from utilities.executors import run_blocking
+from utilities.mongo import get_mongo_client, get_async_mongo_client
 
 router = APIRouter()
 
 ########################################################################################################################
 # MongoDB connection configuration
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-mongo_client = MongoClient(MONGO_CONNECTION_STRING)
+mongo_client = get_mongo_client()
+async_mongo_client = get_async_mongo_client()
 loaders_db_name = "loader_configs"
 document_store_db_name = "document_store"
 ########################################################################################################################
 
 # Mappatura dei loader disponibili
-available_loaders = {
-    "TextLoader": TextLoader,
-    "BSHTMLLoader": BSHTMLLoader,
-    "CSVLoader": CSVLoader,
-    "PyMuPDFLoader": PyMuPDFLoader,
-    "ImageDescriptionLoader": ImageDescriptionLoader,
-    "UnstructuredLoader": UnstructuredLoader,
-    "VideoDescriptionLoader": VideoDescriptionLoader
-}
+# i loader (cv2, unstructured, pymupdf4llm...) vengono importati solo al primo utilizzo
+available_loaders = LazyClassMap({
+    "TextLoader": "langchain_community.document_loaders.text:TextLoader",
+    "BSHTMLLoader": "langchain_community.document_loaders.html_bs:BSHTMLLoader",
+    "CSVLoader": "langchain_community.document_loaders.csv_loader:CSVLoader",
+    "PyMuPDFLoader": "document_loaders.utilities.pymupdf4llm_loader:PyMuPDFLoader",
+    "ImageDescriptionLoader": "document_loaders.utilities.image2text_llm_loader:ImageDescriptionLoader",
+    "UnstructuredLoader": "langchain_unstructured:UnstructuredLoader",
+    "VideoDescriptionLoader": "document_loaders.utilities.video2text_llm_loader:VideoDescriptionLoader"
+})
 
 
 ########################################################################################################################
-# ---------- TASK STATE HELPERS ----------
-
-def _create_task_record(task_id: str,
-                        endpoint: str,
-                        payload: dict) -> None:
-    """Registra un job: id (nostro), endpoint e input JSON."""
-    res = mongo_client[loaders_db_name]["tasks"].insert_one({
-        "id": task_id,
-        "endpoint": endpoint,
-        "payload": payload,
-        "status": "PENDING",
-        "created_at": datetime.utcnow(),
-        "finished_at": None,
-        "result": None,
-        "error": None
-    })
-
-
-def _update_task_status(task_id: str,
-                        status: str,
-                        *,
-                        result: Optional[List[dict]] = None,
-                        error: Optional[str] = None) -> None:
-    res = mongo_client[loaders_db_name].tasks.update_one(
-        {"id": task_id},                 # <-- ora filtra su `id`
-        {"$set": {
-            "status": status,
-            "finished_at": (
-                datetime.utcnow() if status in ("DONE", "ERROR") else None
-            ),
-            "result": result,
-            "error": error
-        }}
-    )
+# ---------------- JOB HANDLERS (utilities/jobs.py) ------------
 
+# documenti salvati per blocco (output del job + checkpoint di progresso/cancellazione)
+LOADER_JOB_BATCH_SIZE = int(os.getenv("LOADER_JOB_BATCH_SIZE", "100"))
+# oltre questa soglia gli id scritti non vengono più elencati nel riepilogo (restano i conteggi)
+LOADER_JOB_MAX_SUMMARY_IDS = int(os.getenv("LOADER_JOB_MAX_SUMMARY_IDS", "10000"))
 
-########################################################################################################################
-# ---------------- BACKGROUND WORKERS ------------
 
-def _process_loader_job(config_id: str, task_id: str) -> None:
-    """
-    Esegue in background tutta la logica di load_documents.
-    Aggiorna lo stato del job in Mongo.
-    """
-    try:
-        _update_task_status(task_id, "RUNNING")
-
-        config_doc = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
-        if not config_doc:
-            raise RuntimeError("Configuration not found")
-
-        cfg = config_doc["config"]
-        # risolvi le classi dei loader
-        cfg["loader_map"] = {g: available_loaders[l] for g, l in cfg["loader_map"].items()}
-        cfg.pop("config_id", None)
-
-        loader = CustomDirectoryLoader(**cfg)
-        documents = loader.load()
-        doc_models = [DocumentModel.from_langchain_document(d) for d in documents]
-
-        # persistenza documenti (identico a prima)
-        for dm in doc_models:
-            matched = False
-            if loader.output_store_map:
-                for glob, store_cfg in loader.output_store_map.items():
-                    if glob in dm.metadata.get("source", ""):
-                        save_document_to_store(store_cfg["collection_name"], dm)
-                        matched = True
-                        break
-            if not matched and loader.default_output_store:
-                save_document_to_store(loader.default_output_store["collection_name"], dm)
+def _output_collection_name(loader: CustomDirectoryLoader, dm: "DocumentModel") -> Optional[str]:
+    """Collezione del document store in cui salvare `dm` secondo la configurazione del loader."""
+    if loader.output_store_map:
+        for glob, store_cfg in loader.output_store_map.items():
+            if glob in dm.metadata.get("source", ""):
+                return store_cfg["collection_name"]
+    if loader.default_output_store:
+        return loader.default_output_store["collection_name"]
+    return None
 
-        _update_task_status(
-            task_id, "DONE",
-            result=[dm.model_dump() for dm in doc_models]
-        )
 
-    except Exception as exc:        # pragma: no cover
-        _update_task_status(task_id, "ERROR", error=str(exc))
+def _run_loader_job(job: JobContext, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Esegue il loader descritto da `cfg` e salva i documenti a blocchi.
 
-def _process_loader_job_b64(config_id: str, task_id: str, b64_docs: List[str]) -> None:
+    I documenti prodotti finiscono negli output del job (`/task_documents`);
+    il risultato del job è solo un riepilogo: conteggi, collezioni di
+    destinazione, esito per file e id dei documenti scritti.
     """
-    Variante che crea una dir temporanea, salva i file b64 e poi
-    richiama lo stesso flusso del loader.
+    # risolvi le classi dei loader
+    cfg["loader_map"] = {g: available_loaders[l] for g, l in cfg["loader_map"].items()}
+    cfg.pop("config_id", None)
+
+    job.set_progress(current=0, message="loading")
+    loader = CustomDirectoryLoader(**cfg)
+
+    total = 0
+    collections: Dict[str, int] = {}
+    document_ids: Dict[str, List[str]] = {}
+    ids_listed = 0
+    batch: List[dict] = []
+
+    def flush() -> None:
+        job.add_outputs(batch)
+        batch.clear()
+        job.set_progress(current=total, message="loading")
+
+    for document in loader.lazy_load():
+        dm = DocumentModel.from_langchain_document(document)
+        collection_name = _output_collection_name(loader, dm)
+        if collection_name:
+            key = save_document_to_store(collection_name, dm)
+            collections[collection_name] = collections.get(collection_name, 0) + 1
+            if ids_listed < LOADER_JOB_MAX_SUMMARY_IDS:
+                document_ids.setdefault(collection_name, []).append(key)
+                ids_listed += 1
+        batch.append(dm.model_dump())
+        total += 1
+        if len(batch) >= LOADER_JOB_BATCH_SIZE:
+            flush()
+    flush()
+
+    job.set_progress(current=total, total=total, message="done")
+    return {
+        "documents": total,
+        "collections": collections,
+        "files": loader.file_status,
+        "document_ids": document_ids,
+        "document_ids_truncated": ids_listed < sum(collections.values()),
+    }
+
+
+def _process_loader_job(job: JobContext, config_id: str) -> Dict[str, Any]:
     """
-    try:
-        _update_task_status(task_id, "RUNNING")
-
-        # 1. crea dir temporanea
-        temp_dir = f"/tmp/{uuid.uuid4()}"
-        os.makedirs(temp_dir, exist_ok=True)
+    Esegue nel worker dei job tutta la logica di load_documents.
+    """
+    config_doc = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
+    if not config_doc:
+        raise RuntimeError("Configuration not found")
+    return _run_loader_job(job, config_doc["config"])
 
-        # 2. scrive i file
-        for doc_b64 in b64_docs:
-            tmp_name = f"{uuid.uuid4()}.pdf"   # o deduci estensione dal client
-            with open(os.path.join(temp_dir, tmp_name), "wb") as fh:
-                fh.write(base64.b64decode(doc_b64))
 
-        # 3. carica config da Mongo
-        cfg_doc = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
-        if not cfg_doc:
-            raise RuntimeError("Configuration not found")
-        cfg = cfg_doc["config"]
-        cfg["path"] = temp_dir
-        cfg["loader_map"] = {g: available_loaders[l] for g, l in cfg["loader_map"].items()}
-        cfg.pop("config_id", None)
-
-        loader = CustomDirectoryLoader(**cfg)
-        documents = loader.load()
-        doc_models = [DocumentModel.from_langchain_document(d) for d in documents]
-
-        # stessa persistenza
-        for dm in doc_models:
-            matched = False
-            if loader.output_store_map:
-                for glob, store_cfg in loader.output_store_map.items():
-                    if glob in dm.metadata.get("source", ""):
-                        save_document_to_store(store_cfg["collection_name"], dm)
-                        matched = True
-                        break
-            if not matched and loader.default_output_store:
-                save_document_to_store(loader.default_output_store["collection_name"], dm)
+def _process_loader_job_b64(job: JobContext, config_id: str, files_dir: str) -> Dict[str, Any]:
+    """
+    Variante per i file base64: l'endpoint li ha già scritti in `files_dir`
+    (sotto JOB_FILES_DIR), qui si esegue il loader su quella directory.
+    La directory viene rimossa dalla coda quando il job termina (utilities/jobs.py).
+    """
+    cfg_doc = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
+    if not cfg_doc:
+        raise RuntimeError("Configuration not found")
+    cfg = cfg_doc["config"]
+    cfg["path"] = files_dir
+    return _run_loader_job(job, cfg)
 
-        _update_task_status(
-            task_id, "DONE",
-            result=[dm.model_dump() for dm in doc_models]
-        )
 
-    except Exception as exc:
-        _update_task_status(task_id, "ERROR", error=str(exc))
+# parsing pesante (PDF, video, immagini): al massimo 2 job per tipo (JOB_CONCURRENCY_<TIPO> per cambiarlo)
+register_job_handler("document_loader", _process_loader_job, max_concurrency=2)
+register_job_handler("document_loader_b64", _process_loader_job_b64, max_concurrency=2)
 
 ########################################################################################################################
 
@@ -182,6 +146,8 @@ class TaskInfo(BaseModel):
     payload: Optional[dict] = None
     result: Optional[Any] = None
     error: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    attempts: Optional[int] = None
 
 
 class LoaderConfig(BaseModel):
@@ -260,6 +226,15 @@ class DocumentModel(BaseModel):
         )
 
 
+class TaskDocumentsPage(BaseModel):
+    id: str
+    status: str
+    total: int
+    skip: int
+    limit: int
+    documents: List[DocumentModel]
+
+
 class SearchConfig(BaseModel):
     """
     Pydantic model for searching configurations.
@@ -302,6 +277,24 @@ def save_document_to_store(collection_name: str, document: DocumentModel):
     return key
 
 
+def _save_loaded_documents(loader: CustomDirectoryLoader, document_models: List[DocumentModel]) -> None:
+    """Salva i documenti caricati nelle collezioni indicate da `output_store_map` / `default_output_store`."""
+    for doc_model in document_models:
+        matched = False
+        if loader.output_store_map:
+            for glob, store_config in loader.output_store_map.items():
+                if glob in doc_model.metadata.get("source", ""):
+                    collection_name = store_config.get("collection_name")
+                    if collection_name:
+                        save_document_to_store(collection_name, doc_model)
+                        matched = True
+                        break
+        if not matched and loader.default_output_store:
+            collection_name = loader.default_output_store.get("collection_name")
+            if collection_name:
+                save_document_to_store(collection_name, doc_model)
+
+
 @router.post("/configure_loader", response_model=str)
 async def configure_loader(
         config_id: Optional[str] = Body(None,
@@ -394,7 +387,7 @@ async def configure_loader(
     The configurations are stored in MongoDB and can be retrieved using their unique IDs.
     """
     try:
-        if config_id and mongo_client[loaders_db_name].configs.find_one({"_id": config_id}):
+        if config_id and await async_mongo_client[loaders_db_name].configs.find_one({"_id": config_id}):
             raise HTTPException(status_code=400, detail=f"Configuration with ID {config_id} already exists.")
 
         # Generate a new config_id if not provided
@@ -426,7 +419,7 @@ async def configure_loader(
         )
 
         # Save configuration to MongoDB
-        mongo_client[loaders_db_name].configs.insert_one({
+        await async_mongo_client[loaders_db_name].configs.insert_one({
             "_id": config_id,
             "config": {
                 "config_id": config_id,
@@ -479,7 +472,7 @@ async def load_documents(
     #if config_id not in loader_configs:
     #    raise HTTPException(status_code=404, detail="Configuration not found")
 
-    config = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
+    config = await async_mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
     config = config["config"] if "config" in config else None
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
@@ -493,24 +486,12 @@ async def load_documents(
     loader_configs[config_id] = CustomDirectoryLoader(**config)
 
     loader = loader_configs[config_id]
-    documents = loader.load()
+    # parsing dei file (PDF, video, immagini...) nel pool dei loader, non nell'event loop
+    documents = await run_blocking("document_loaders", loader.load)
     document_models = [DocumentModel.from_langchain_document(doc) for doc in documents]
 
     # Save documents to the document store if configured
-    for doc_model in document_models:
-        matched = False
-        if loader.output_store_map:
-            for glob, store_config in loader.output_store_map.items():
-                if glob in doc_model.metadata.get("source", ""):
-                    collection_name = store_config.get("collection_name")
-                    if collection_name:
-                        save_document_to_store(collection_name, doc_model)
-                        matched = True
-                        break
-        if not matched and loader.default_output_store:
-            collection_name = loader.default_output_store.get("collection_name")
-            if collection_name:
-                save_document_to_store(collection_name, doc_model)
+    await run_blocking("mongo", _save_loaded_documents, loader, document_models)
 
     return document_models
 
@@ -550,19 +531,22 @@ async def load_b64_documents(
     # List to store the document metadata to be returned
     #documents_metadata = []
 
-    for doc_b64 in documents:
-        # Generate a unique filename for each document
-        filename = f"{str(uuid.uuid4())}.pdf"  # Assuming PDF files, adjust as needed
+    def _write_documents():
+        for doc_b64 in documents:
+            # Generate a unique filename for each document
+            filename = f"{str(uuid.uuid4())}.pdf"  # Assuming PDF files, adjust as needed
 
-        # Save the file to the temporary directory
-        doc_path = os.path.join(temp_dir, filename)
+            # Save the file to the temporary directory
+            doc_path = os.path.join(temp_dir, filename)
 
-        # Decode the base64 string and save it to the file
-        try:
-            with open(doc_path, "wb") as file:
-                file.write(base64.b64decode(doc_b64))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to save document: {str(e)}")
+            # Decode the base64 string and save it to the file
+            try:
+                with open(doc_path, "wb") as file:
+                    file.write(base64.b64decode(doc_b64))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to save document: {str(e)}")
+
+    await run_blocking("document_loaders", _write_documents)
 
         # Store metadata for the document
         #documents_metadata.append(DocumentModel(filename=filename, path=doc_path))
@@ -570,7 +554,7 @@ async def load_b64_documents(
 
     ####
 
-    config = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
+    config = await async_mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
     config = config["config"] if "config" in config else None
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
@@ -588,24 +572,11 @@ async def load_b64_documents(
     loader_configs[config_id] = CustomDirectoryLoader(**config)
 
     loader = loader_configs[config_id]
-    documents = loader.load()
+    documents = await run_blocking("document_loaders", loader.load)
     document_models = [DocumentModel.from_langchain_document(doc) for doc in documents]
 
     # Save documents to the document store if configured
-    for doc_model in document_models:
-        matched = False
-        if loader.output_store_map:
-            for glob, store_config in loader.output_store_map.items():
-                if glob in doc_model.metadata.get("source", ""):
-                    collection_name = store_config.get("collection_name")
-                    if collection_name:
-                        save_document_to_store(collection_name, doc_model)
-                        matched = True
-                        break
-        if not matched and loader.default_output_store:
-            collection_name = loader.default_output_store.get("collection_name")
-            if collection_name:
-                save_document_to_store(collection_name, doc_model)
+    await run_blocking("mongo", _save_loaded_documents, loader, document_models)
 
     return document_models
 
@@ -622,7 +593,7 @@ async def get_config_by_id(
     This endpoint retrieves a loader configuration stored in MongoDB by its unique ID.
     It is useful for accessing specific configurations without listing all configurations.
     """
-    config = mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
+    config = await async_mongo_client[loaders_db_name].configs.find_one({"_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
 
@@ -637,7 +608,7 @@ async def list_configs():
     This endpoint retrieves and returns all existing loader configurations stored in the MongoDB.
     It is useful for viewing all available configurations.
     """
-    configs = mongo_client[loaders_db_name].configs.find()
+    configs = await async_mongo_client[loaders_db_name].configs.find().to_list()
     return [LoaderConfig(**config["config"]) for config in configs]
 
 
@@ -659,7 +630,7 @@ async def search_configs(search_params: SearchConfig = Body(...)):
     if search_params.max_depth is not None:
         query["config.max_depth"] = search_params.max_depth
 
-    configs = mongo_client[loaders_db_name].configs.find(query)
+    configs = await async_mongo_client[loaders_db_name].configs.find(query).to_list()
     return [LoaderConfig(**config["config"]) for config in configs]
 
 
@@ -675,7 +646,7 @@ async def delete_config(
 
     This endpoint deletes a specified loader configuration from the MongoDB.
     """
-    result = mongo_client[loaders_db_name].configs.delete_one({"_id": config_id})
+    result = await async_mongo_client[loaders_db_name].configs.delete_one({"_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
@@ -684,58 +655,69 @@ async def delete_config(
 
 @router.post("/load_documents_async/{config_id}", response_model=dict)
 async def load_documents_async(
-    background_tasks: BackgroundTasks,
     config_id: str = Path(..., description="Loader configuration ID"),
     task_id: Optional[str] = Form(None, description="Task ID")
 ):
 
     """
-    Avvia il caricamento dei documenti in background e
+    Accoda il caricamento dei documenti nella coda di job e
     restituisce subito task_id e stato iniziale.
     """
+    try:
+        job = await aenqueue_job(
+            "document_loader",
+            {"config_id": config_id},
+            job_id=task_id,
+            endpoint="load_documents_async",
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
 
-    task_id = str(uuid.uuid4()) if not task_id else task_id
-
-    _create_task_record(
-        task_id=task_id,
-        endpoint="load_documents_async",
-        payload={"config_id": config_id}
-    )
-
-    background_tasks.add_task(
-        _process_loader_job,
-        config_id=config_id,
-        task_id=task_id
-    )
-
-    return {"task_id": task_id, "status": "PENDING"}
+    return {"task_id": job["id"], "status": job["status"]}
 
 
 @router.post("/load_b64_documents_async/{config_id}", response_model=dict)
 async def load_b64_documents_async(
-    background_tasks: BackgroundTasks,
     config_id: str = Path(..., description="Loader configuration ID"),
     documents: List[str] = Form(..., description="Lista di file in base64"),
     task_id: Optional[str] = Form(None, description="Task ID")
 ):
     """
-    Variante che accetta file base-64: avvia il job in background
-    mantenendo identica la firma di input.
+    Variante che accetta file base-64: i file vengono scritti in una directory
+    nuova sotto JOB_FILES_DIR e il job riceve solo il percorso, mantenendo
+    identica la firma di input.
     """
     task_id = str(uuid.uuid4()) if not task_id else task_id
+    if await aget_job(task_id, include_result=False):
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
 
-    _create_task_record(
-        task_id=task_id,
-        endpoint="load_b64_documents_async",
-        payload={"config_id": config_id, "documents_count": len(documents)}
-    )
-    background_tasks.add_task(
-        _process_loader_job_b64,
-        config_id=config_id,
-        task_id=task_id,
-        b64_docs=documents
-    )
-    return {"task_id": task_id, "status": "PENDING"}
+    def _write_documents() -> str:
+        # directory propria della richiesta: un task_id ripetuto non tocca i file di un job esistente
+        files_dir = new_job_files_dir()
+        for doc_b64 in documents:
+            tmp_name = f"{uuid.uuid4()}.pdf"   # o deduci estensione dal client
+            with open(os.path.join(files_dir, tmp_name), "wb") as fh:
+                fh.write(base64.b64decode(doc_b64))
+        return files_dir
+
+    files_dir = await run_blocking("document_loaders", _write_documents)
+
+    try:
+        job = await aenqueue_job(
+            "document_loader_b64",
+            {"config_id": config_id, "files_dir": files_dir},
+            job_id=task_id,
+            endpoint="load_b64_documents_async",
+            files_dir=files_dir,
+        )
+    except DuplicateKeyError:
+        # task_id creato nel frattempo da un'altra richiesta
+        await run_blocking("document_loaders", remove_job_files, files_dir)
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
+    except Exception:
+        await run_blocking("document_loaders", remove_job_files, files_dir)
+        raise
+    return {"task_id": job["id"], "status": job["status"]}
 
 
 @router.get("/task_status/{task_id}", response_model=TaskInfo)
@@ -743,21 +725,62 @@ async def get_task_status(
     task_id: str = Path(..., description="ID del job restituito alla creazione")
 ):
 
-    record = mongo_client[loaders_db_name]["tasks"].find_one({"id": task_id})
+    """
+    Stato del job. Per i job completati `result` contiene solo il riepilogo
+    (conteggi, collezioni, esito per file, id scritti); i documenti prodotti si
+    leggono a pagine da `/task_documents/{task_id}`.
+    """
+    record = await aget_job(task_id)
     if not record:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    docs = None
-    if record["status"] == "DONE" and record["result"]:
-        docs = [DocumentModel(**d) for d in record["result"]]
-
     return TaskInfo(
         id=task_id,
         status=record["status"],
-        result=docs,
-        error=record.get("error")
+        result=record.get("result"),
+        error=record.get("error"),
+        progress=record.get("progress"),
+        attempts=record.get("attempts")
+    )
+
+
+@router.get("/task_documents/{task_id}", response_model=TaskDocumentsPage)
+async def get_task_documents(
+    task_id: str = Path(..., description="ID del job restituito alla creazione"),
+    skip: int = Query(0, ge=0, description="Number of documents to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of documents to return")
+):
+    """
+    Return a page of the documents produced by an async loading job, in load order.
+    """
+    record = await aget_job(task_id, include_result=False)
+    if not record:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    items = await aget_job_outputs(task_id, skip=skip, limit=limit)
+    return TaskDocumentsPage(
+        id=task_id,
+        status=record["status"],
+        total=await acount_job_outputs(task_id),
+        skip=skip,
+        limit=limit,
+        documents=[DocumentModel(**d) for d in items]
     )
 
+
+@router.post("/task_cancel/{task_id}", response_model=TaskInfo)
+async def cancel_task(
+    task_id: str = Path(..., description="ID del job restituito alla creazione")
+):
+    """
+    Cancella il job: se è in coda non verrà eseguito, se è in esecuzione si ferma al prossimo checkpoint.
+    """
+    record = await acancel_job(task_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return TaskInfo(id=task_id, status=record["status"], error=record.get("error"),
+                    progress=record.get("progress"), attempts=record.get("attempts"))
+
 ########################################################################################################################
 
 
@@ -6,20 +6,14 @@ from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Type
 
 from langchain_core.documents import Document
 from langchain_community.document_loaders.base import BaseLoader
-from langchain_community.document_loaders.csv_loader import CSVLoader
-from langchain_community.document_loaders.html_bs import BSHTMLLoader
-from langchain_community.document_loaders.text import TextLoader
 #from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
-from langchain_unstructured import UnstructuredLoader
 
-from document_loaders.utilities.pymupdf4llm_loader import PyMuPDFLoader
-from document_loaders.utilities.video2text_llm_loader import VideoDescriptionLoader
-from document_loaders.utilities.image2text_llm_loader import ImageDescriptionLoader
 
 #from langchain_community.document_loaders.pdf import PyPDFLoader, PyMuPDFLoader
 
-FILE_LOADER_TYPE = Union[
-   Type[UnstructuredLoader], Type[TextLoader], Type[BSHTMLLoader], Type[CSVLoader], Type[PyMuPDFLoader], Type[ImageDescriptionLoader], Type[VideoDescriptionLoader]]
+# qualsiasi loader di file (TextLoader, PyMuPDFLoader, UnstructuredLoader, ...): le classi concrete
+# vengono importate in modo lazy da document_loaders/api.py
+FILE_LOADER_TYPE = Type[BaseLoader]
 logger = logging.getLogger(__name__)
 
 
@@ -112,6 +106,8 @@ class CustomDirectoryLoader(BaseLoader):
         self.sample_seed = sample_seed
         self.output_store_map = output_store_map or {}
         self.default_output_store = default_output_store or {}
+        # esito dell'ultimo caricamento per file: {"status": "loaded" | "error", "documents": n, "error": ...}
+        self.file_status: Dict[str, Dict[str, Any]] = {}
 
     def load(self) -> List[Document]:
         """
@@ -149,6 +145,8 @@ class CustomDirectoryLoader(BaseLoader):
                 randomizer.shuffle(items)
             items = items[:min(len(items), self.sample_size)]
 
+        self.file_status = {}
+
         pbar = None
         if self.show_progress:
             try:
@@ -203,6 +201,8 @@ class CustomDirectoryLoader(BaseLoader):
         if item.is_file():
             for pattern, loader_cls in self.loader_map.items():
                 if item.match(pattern):
+                    status = {"status": "loaded", "documents": 0, "error": None}
+                    self.file_status[str(item)] = status
                     try:
                         loader_kwargs = self.loader_kwargs_map.get(pattern, {})
                         loader = loader_cls(str(item), **loader_kwargs)
@@ -211,8 +211,10 @@ class CustomDirectoryLoader(BaseLoader):
                             specific_metadata = self.metadata_map.get(pattern, {})
                             subdoc.metadata.update(self.default_metadata)
                             subdoc.metadata.update(specific_metadata)
+                            status["documents"] += 1
                             yield subdoc
                     except Exception as e:
+                        status.update({"status": "error", "error": str(e)})
                         if self.silent_errors:
                             logger.warning(f"Error loading file {str(item)}: {e}")
                         else:
@@ -274,6 +276,11 @@ class CustomDirectoryLoader(BaseLoader):
         print("\n---\n")'''
 
 if __name__ == "__main__":
+    from langchain_community.document_loaders.csv_loader import CSVLoader
+    from langchain_community.document_loaders.html_bs import BSHTMLLoader
+    from langchain_community.document_loaders.text import TextLoader
+    from langchain_unstructured import UnstructuredLoader
+
     # === CONFIG API SELF-HOSTED ===
     API_URL = "http://localhost:8000/"  # endpoint completo
     API_KEY = "metti-una-chiave-robusta"                  # deve combaciare col container
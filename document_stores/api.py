@@ -4,14 +4,15 @@ from fastapi import FastAPI, HTTPException, Query, Path, Body, APIRouter
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 from langchain_core.documents import Document
-from pymongo import MongoClient, UpdateOne
+from pymongo import UpdateOne
 import uuid
+from utilities.mongo import get_mongo_client, get_async_mongo_client
 
 router = APIRouter()
 
-# MongoDB connection configuration
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+# MongoDB connection configuration (client condivisi, vedi utilities/mongo.py)
+client = get_mongo_client()
+async_client = get_async_mongo_client()
 db_name = "document_store"
 metadata_collection_name = "collections_metadata"
 
@@ -81,18 +82,18 @@ def get_collection(collection_name: str):
         collection_name (str): The name of the collection.
 
     Returns:
-        Collection: The MongoDB collection.
+        AsyncCollection: The MongoDB collection.
     """
-    return client[db_name][collection_name]
+    return async_client[db_name][collection_name]
 
 
 def get_metadata_collection():
     """Get the MongoDB collection for storing collections metadata.
 
     Returns:
-        Collection: The MongoDB collection for metadata.
+        AsyncCollection: The MongoDB collection for metadata.
     """
-    return client[db_name][metadata_collection_name]
+    return async_client[db_name][metadata_collection_name]
 
 
 @router.post("/documents/{collection_name}/", response_model=DocumentModel)
@@ -118,7 +119,7 @@ async def create_document(
     doc.metadata.update({"doc_store_id": key})
     document.metadata.update({"doc_store_id": key, "doc_store_collection": collection_name})
 
-    collection.update_one(
+    await collection.update_one(
         {"_id": key}, {"$set": {
             "value": {"page_content": document.page_content, "metadata": document.metadata, "type": document.type}}},
         upsert=True
@@ -140,7 +141,7 @@ async def get_document(
     If the document is found, it is returned with its content and metadata. Otherwise, a 404 error is raised.
     """
     collection = get_collection(collection_name)
-    result = collection.find_one({"_id": doc_id})
+    result = await collection.find_one({"_id": doc_id})
     if not result:
         raise HTTPException(status_code=404, detail="Document not found")
     doc = Document(**result["value"])
@@ -160,7 +161,7 @@ async def delete_document(
     Returns a confirmation message upon successful deletion.
     """
     collection = get_collection(collection_name)
-    collection.delete_one({"_id": doc_id})
+    await collection.delete_one({"_id": doc_id})
     return {"detail": "Document deleted successfully"}
 
 
@@ -181,12 +182,12 @@ async def update_document(
     If the document is found and updated, the new document data is returned. Otherwise, a 404 error is raised.
     """
     collection = get_collection(collection_name)
-    existing_doc = collection.find_one({"_id": doc_id})
+    existing_doc = await collection.find_one({"_id": doc_id})
     if not existing_doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
     updated_document = doc.to_langchain_document()
-    collection.update_one(
+    await collection.update_one(
         {"_id": doc_id}, {"$set": {
             "value": {"page_content": updated_document.page_content, "metadata": updated_document.metadata,
                       "type": updated_document.type}}}
@@ -209,7 +210,7 @@ async def list_documents(
     """
     collection = get_collection(collection_name)
     query = {"_id": {"$regex": f"^{prefix}"}} if prefix else {}
-    result = collection.find(query).skip(skip).limit(limit)
+    result = await collection.find(query).skip(skip).limit(limit).to_list()
     documents = [Document(**doc["value"]) for doc in result]
     return [DocumentModel.from_langchain_document(doc) for doc in documents]
 
@@ -236,7 +237,7 @@ async def search_documents(
             {"metadata.id": regex}
         ]
     }
-    result = collection.find(search_query).skip(skip).limit(limit)
+    result = await collection.find(search_query).skip(skip).limit(limit).to_list()
     documents = [Document(**doc["value"]) for doc in result]
     return [DocumentModel.from_langchain_document(doc) for doc in documents]
 
@@ -255,7 +256,7 @@ async def create_collection_metadata(
     metadata_collection = get_metadata_collection()
     metadata_data = metadata.dict()
     metadata_data["collection_name"] = collection_name
-    metadata_collection.update_one(
+    await metadata_collection.update_one(
         {"collection_name": collection_name}, {"$set": metadata_data}, upsert=True
     )
     return metadata
@@ -273,7 +274,7 @@ async def update_collection_metadata(
     The metadata includes a description, creation date, and custom metadata.
     """
     metadata_collection = get_metadata_collection()
-    existing_metadata = metadata_collection.find_one({"collection_name": collection_name})
+    existing_metadata = await metadata_collection.find_one({"collection_name": collection_name})
     if not existing_metadata:
         raise HTTPException(status_code=404, detail="Collection metadata not found")
 
@@ -286,11 +287,11 @@ async def update_collection_metadata(
     if metadata.custom_metadata:
         update_data["custom_metadata"] = metadata.custom_metadata
 
-    metadata_collection.update_one(
+    await metadata_collection.update_one(
         {"collection_name": collection_name}, {"$set": update_data}
     )
 
-    updated_metadata = metadata_collection.find_one({"collection_name": collection_name})
+    updated_metadata = await metadata_collection.find_one({"collection_name": collection_name})
     return CollectionMetadataModel.from_dict(updated_metadata)
 
 
@@ -302,7 +303,7 @@ async def list_collections_metadata():
     This endpoint retrieves and returns a list of all collections in the MongoDB database along with their metadata.
     """
     metadata_collection = get_metadata_collection()
-    metadata_list = list(metadata_collection.find({}, {"_id": 0}))
+    metadata_list = await metadata_collection.find({}, {"_id": 0}).to_list()
     return metadata_list
 
 
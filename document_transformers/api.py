@@ -4,19 +4,20 @@ from fastapi import FastAPI, HTTPException, Path, Body, Query, APIRouter
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional, Union
 import uuid
-from pymongo import MongoClient
 from langchain_core.documents import Document
 from langchain_core.documents.transformers import BaseDocumentTransformer
 
 from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter, TokenTextSplitter
 
 from document_transformers.utilities.document_transformer_map import DocumentTransformerMap
+from utilities.executors import run_blocking
+from utilities.mongo import get_mongo_client, get_async_mongo_client
 
 router = APIRouter()
 
 # MongoDB connection configuration
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-mongo_client = MongoClient(MONGO_CONNECTION_STRING)
+mongo_client = get_mongo_client()
+async_mongo_client = get_async_mongo_client()
 mongo_db_name = "transformers"
 transformer_collection_name = "transformer_configs"
 transformer_map_collection_name = "transformer_map_configs"
@@ -160,7 +161,7 @@ async def configure_transformer(
     If it does, an error will be returned.
     """
     try:
-        if config_id and mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config_id}):
+        if config_id and await async_mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config_id}):
             raise HTTPException(status_code=400, detail=f"Configuration with ID {config_id} already exists.")
 
         if not config_id:
@@ -180,7 +181,7 @@ async def configure_transformer(
         )
 
         # Save configuration to MongoDB
-        mongo_client[mongo_db_name][transformer_collection_name].insert_one(transformer_config.dict())
+        await async_mongo_client[mongo_db_name][transformer_collection_name].insert_one(transformer_config.dict())
 
         return config_id
     except KeyError:
@@ -196,7 +197,7 @@ async def list_transformer_configs(skip: int = Query(0, description="Number of r
     This endpoint retrieves and returns all existing transformer configurations stored in the MongoDB.
     It is useful for viewing all available configurations.
     """
-    configs = mongo_client[mongo_db_name][transformer_collection_name].find().skip(skip).limit(limit)
+    configs = await async_mongo_client[mongo_db_name][transformer_collection_name].find().skip(skip).limit(limit).to_list()
     return [TransformerConfig(**config) for config in configs]
 
 @router.get("/get_transformer_config/{config_id}", response_model=TransformerConfig)
@@ -208,7 +209,7 @@ async def get_transformer_config(
 
     This endpoint retrieves a specific transformer configuration from the MongoDB using its unique ID.
     """
-    config = mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config_id})
+    config = await async_mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return TransformerConfig(**config)
@@ -234,7 +235,7 @@ async def search_transformer_configs(search_params: SearchConfig = Body(...)):
         for key, value in search_params.metadata.items():
             query[f"metadata.{key}"] = value
 
-    configs = mongo_client[mongo_db_name][transformer_collection_name].find(query).skip(search_params.skip).limit(search_params.limit)
+    configs = await async_mongo_client[mongo_db_name][transformer_collection_name].find(query).skip(search_params.skip).limit(search_params.limit).to_list()
     return [TransformerConfig(**config) for config in configs]
 
 @router.delete("/delete_transformer_config/{config_id}", response_model=dict)
@@ -246,7 +247,7 @@ async def delete_transformer_config(
 
     This endpoint deletes a specified transformer configuration from the MongoDB.
     """
-    result = mongo_client[mongo_db_name][transformer_collection_name].delete_one({"config_id": config_id})
+    result = await async_mongo_client[mongo_db_name][transformer_collection_name].delete_one({"config_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
@@ -277,7 +278,7 @@ async def configure_transformer_map(
     If it does, an error will be returned.
     """
     try:
-        if config_id and mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id}):
+        if config_id and await async_mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id}):
             raise HTTPException(status_code=400, detail=f"Configuration with ID {config_id} already exists.")
 
         if not config_id:
@@ -286,7 +287,7 @@ async def configure_transformer_map(
         resolved_transformer_map = {}
         for query, config in transformer_map.items():
             if isinstance(config, str):
-                transformer_config = mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config})
+                transformer_config = await async_mongo_client[mongo_db_name][transformer_collection_name].find_one({"config_id": config})
                 if not transformer_config:
                     raise HTTPException(status_code=404, detail=f"Transformer configuration with ID {config} not found.")
                 resolved_transformer_map[query] = TransformerConfig(**transformer_config)
@@ -317,7 +318,7 @@ async def configure_transformer_map(
             metadata=metadata
         )
 
-        mongo_client[mongo_db_name][transformer_map_collection_name].insert_one(transformer_map_config.dict())
+        await async_mongo_client[mongo_db_name][transformer_map_collection_name].insert_one(transformer_map_config.dict())
 
         return config_id
     except KeyError:
@@ -334,7 +335,7 @@ async def get_transformer_map_config(
 
     This endpoint retrieves a specific transformer map configuration from the MongoDB using its unique ID.
     """
-    config = mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
+    config = await async_mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return TransformerMapConfig(**config)
@@ -351,7 +352,7 @@ async def transform_documents(
     The documents are transformed and returned along with their metadata. If configured, documents are also stored
     in the MongoDB document store.
     """
-    config = mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
+    config = await async_mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
 
@@ -380,18 +381,18 @@ async def transform_documents(
         if transformer_config.output_store:
             collection_name = transformer_config.output_store.get("collection_name")
             if collection_name:
-                store_docs = load_documents_from_store(collection_name)
+                store_docs = await run_blocking("mongo", load_documents_from_store, collection_name)
                 langchain_docs.extend(store_docs)
 
-    transformed_docs = transformer.transform_documents(langchain_docs)
+    transformed_docs = await run_blocking("document_transformers", transformer.transform_documents, langchain_docs)
     document_models = [DocumentModel.from_langchain_document(doc) for doc in transformed_docs]
 
     for transformer_config in transformer_map_config.transformer_map.values():
         if transformer_config.output_store:
             collection_name = transformer_config.output_store.get("collection_name")
             if collection_name:
-                for doc_model in document_models:
-                    save_document_to_store(collection_name, doc_model)
+                await run_blocking("mongo", lambda: [save_document_to_store(collection_name, doc_model)
+                                                     for doc_model in document_models])
 
     return document_models
 
@@ -407,7 +408,7 @@ async def transform_documents_from_store(
     transformer map, identified by a unique configuration ID. The documents are transformed and returned along with
     their metadata. If configured, documents are also stored in the MongoDB document store.
     """
-    config = mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
+    config = await async_mongo_client[mongo_db_name][transformer_map_collection_name].find_one({"config_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
 
@@ -434,17 +435,17 @@ async def transform_documents_from_store(
     if not collection_name:
         raise HTTPException(status_code=400, detail="Invalid input store configuration")
 
-    langchain_docs = load_documents_from_store(collection_name)
+    langchain_docs = await run_blocking("mongo", load_documents_from_store, collection_name)
 
-    transformed_docs = transformer.transform_documents(langchain_docs)
+    transformed_docs = await run_blocking("document_transformers", transformer.transform_documents, langchain_docs)
     document_models = [DocumentModel.from_langchain_document(doc) for doc in transformed_docs]
 
     for transformer_config in transformer_map_config.transformer_map.values():
         if transformer_config.output_store:
             collection_name = transformer_config.output_store.get("collection_name")
             if collection_name:
-                for doc_model in document_models:
-                    save_document_to_store(collection_name, doc_model)
+                await run_blocking("mongo", lambda: [save_document_to_store(collection_name, doc_model)
+                                                     for doc_model in document_models])
 
     return document_models
 
@@ -456,7 +457,7 @@ async def list_transformer_map_configs(skip: int = Query(0, description="Number
     This endpoint retrieves and returns all existing transformer map configurations stored in the MongoDB.
     It is useful for viewing all available configurations.
     """
-    configs = mongo_client[mongo_db_name][transformer_map_collection_name].find().skip(skip).limit(limit)
+    configs = await async_mongo_client[mongo_db_name][transformer_map_collection_name].find().skip(skip).limit(limit).to_list()
     return [TransformerMapConfig(**config) for config in configs]
 
 @router.post("/search_transformer_map_configs", response_model=List[TransformerMapConfig])
@@ -480,7 +481,7 @@ async def search_transformer_map_configs(search_params: SearchConfig = Body(...)
         for key, value in search_params.metadata.items():
             query[f"metadata.{key}"] = value
 
-    configs = mongo_client[mongo_db_name][transformer_map_collection_name].find(query).skip(search_params.skip).limit(search_params.limit)
+    configs = await async_mongo_client[mongo_db_name][transformer_map_collection_name].find(query).skip(search_params.skip).limit(search_params.limit).to_list()
     return [TransformerMapConfig(**config) for config in configs]
 
 @router.delete("/delete_transformer_map_config/{config_id}", response_model=dict)
@@ -492,7 +493,7 @@ async def delete_transformer_map_config(
 
     This endpoint deletes a specified transformer map configuration from the MongoDB.
     """
-    result = mongo_client[mongo_db_name][transformer_map_collection_name].delete_one({"config_id": config_id})
+    result = await async_mongo_client[mongo_db_name][transformer_map_collection_name].delete_one({"config_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
@@ -9,12 +9,11 @@ from langchain_text_splitters import (CharacterTextSplitter,
                                       TokenTextSplitter)
 
 from bson import ObjectId
-from pymongo import MongoClient
 import uuid
+from utilities.mongo import get_mongo_client
 
 # MongoDB connection configuration
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 document_store_db_name = "document_store"
 
 
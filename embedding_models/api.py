@@ -2,19 +2,22 @@ import os
 
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
-from fastapi import FastAPI, HTTPException, Path, Body, APIRouter
-from pymongo import MongoClient
+from fastapi import FastAPI, HTTPException, Path, Body, Query, APIRouter
 import uuid
 from embedding_models.utilities.model_manager import EmbeddingModelManager
+from embedding_models.utilities.remote_embeddings import RemoteEmbeddings
+from utilities.executors import run_blocking
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
+from utilities.mongo import get_mongo_client, get_async_mongo_client
 
 router = APIRouter()
 
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
+async_client = get_async_mongo_client()
 db = client['embedding_model_db']
 collection = db['embedding_model_configs']
+async_collection = async_client['embedding_model_db']['embedding_model_configs']
 embedding_manager = EmbeddingModelManager(collection)
 
 
@@ -68,12 +71,12 @@ async def configure_embedding_model(request: EmbeddingConfigRequest):
     - **config_id**: The ID of the newly created configuration.
     """
     config_id = request.config_id
-    if collection.find_one({"_id": config_id}):
+    if await async_collection.find_one({"_id": config_id}):
         raise HTTPException(status_code=400, detail="Configuration ID already exists")
 
     config = request.dict()
     config["_id"] = config_id
-    collection.insert_one(config)
+    await async_collection.insert_one(config)
     return {"config_id": config_id}
 
 
@@ -91,7 +94,7 @@ async def load_embedding_model(
     - A confirmation message upon successful loading.
     """
     try:
-        embedding_manager.load_model(config_id)
+        await run_blocking("embeddings", embedding_manager.load_model, config_id)
         return {"message": "Model loaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -111,7 +114,7 @@ async def unload_embedding_model(
     - A confirmation message upon successful unloading.
     """
     try:
-        embedding_manager.unload_model(model_id)
+        await run_blocking("embeddings", embedding_manager.unload_model, model_id)
         return {"message": "Model unloaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -131,23 +134,30 @@ async def embedding_inference(request: InferenceRequest):
     """
     try:
         model = embedding_manager.get_model(request.model_id)
-        embeddings = model.embed(request.texts, **request.inference_kwargs)
+        if isinstance(model, RemoteEmbeddings) and not request.inference_kwargs:
+            # il servizio accorpa questa richiesta con quelle degli altri worker
+            embeddings = await model.aembed_documents(request.texts)
+        else:
+            embeddings = await run_blocking("embeddings", model.embed_documents, request.texts, **request.inference_kwargs)
         return {"embeddings": embeddings}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/list_loaded_embedding_models/", response_model=List[str])
-async def list_loaded_embedding_models():
+async def list_loaded_embedding_models(
+        scope: str = Query("worker", description="'worker' for the answering worker only, 'node' for every worker on this node.")):
     """
     Lists all currently loaded embedding models.
 
     This endpoint retrieves and returns a list of all currently loaded embedding models.
 
+    - **scope**: `worker` (default) or `node`.
+
     Returns:
     - A list of model IDs for the currently loaded embedding models.
     """
-    return embedding_manager.list_loaded_models()
+    return await run_blocking("embeddings", embedding_manager.list_loaded_models, scope=scope)
 
 
 @router.get("/embedding_model_config/{config_id}", response_model=Dict[str, Any])
@@ -163,7 +173,7 @@ async def get_embedding_model_config(
     Returns:
     - The configuration details of the specified embedding model.
     """
-    config = collection.find_one({"_id": config_id})
+    config = await async_collection.find_one({"_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return config
@@ -182,7 +192,7 @@ async def delete_embedding_model_config(
     Returns:
     - A confirmation message upon successful deletion.
     """
-    result = collection.delete_one({"_id": config_id})
+    result = await async_collection.delete_one({"_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
@@ -207,7 +217,7 @@ async def execute_embedding_method(request: ExecuteMethodRequest):
 
         method = getattr(embedding_instance, request.method_name)
         if callable(method):
-            result = method(*request.args, **request.kwargs)
+            result = await run_blocking("embeddings", method, *request.args, **request.kwargs)
             return {"result": result}
         else:
             raise ValueError(f"'{request.method_name}' is not a callable method")
@@ -0,0 +1,126 @@
+"""
+Servizio di embedding standalone.
+
+Va avviato come processo separato, con UN solo worker, in modo che ogni
+modello di embedding esista in un'unica copia per nodo:
+
+    uvicorn embedding_models.service:app --host 0.0.0.0 --port 8110 --workers 1
+
+I worker dell'API principale (e tutti i vector store) vi si collegano tramite
+`RemoteEmbeddings` impostando `EMBEDDING_SERVICE_URL`. Le richieste
+concorrenti verso lo stesso modello vengono accorpate da un `MicroBatcher`
+(dimensione massima e attesa massima configurabili via env). Anche le query
+vengono embeddate con una sola chiamata a `embed_documents` per batch, se il
+modello non le tratta diversamente dai documenti (`QUERY_AS_DOCUMENTS_CLASSES`);
+per gli altri modelli (es. con un'istruzione per le query) ogni query passa
+da `embed_query`.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Tuple
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+from embedding_models.utilities.micro_batcher import MicroBatcher
+from utilities.object_registry import config_version
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "10"))
+
+available_models = {
+    "HuggingFaceEmbeddings": HuggingFaceEmbeddings,
+    "OpenAIEmbeddings": OpenAIEmbeddings,
+}
+
+# classi il cui `embed_query(text)` è `embed_documents([text])[0]`
+QUERY_AS_DOCUMENTS_CLASSES = {"HuggingFaceEmbeddings", "OpenAIEmbeddings"}
+
+app = FastAPI(title="embedding-service")
+
+# model_key -> istanza del modello; (model_key, kind) -> batcher
+models: Dict[str, Any] = {}
+batchers: Dict[Tuple[str, str], MicroBatcher] = {}
+_models_lock = asyncio.Lock()
+
+
+class EmbedRequest(BaseModel):
+    model_class: str = Field(..., example="HuggingFaceEmbeddings",
+                             description="The class of the embedding model.")
+    model_kwargs: Dict[str, Any] = Field(default_factory=dict, example={"model_name": "sentence-transformers/all-MiniLM-L6-v2"},
+                                         description="Keyword arguments used to build the model.")
+    texts: List[str] = Field(..., example=["Hello world"], description="The texts to embed.")
+    kind: str = Field("documents", example="documents",
+                      description="'documents' uses embed_documents, 'query' uses embed_query.")
+
+
+def _model_key(model_class: str, model_kwargs: Dict[str, Any]) -> str:
+    return config_version({"model_class": model_class, "model_kwargs": model_kwargs})
+
+
+async def _get_batcher(request: EmbedRequest) -> MicroBatcher:
+    if request.model_class not in available_models:
+        raise HTTPException(status_code=400, detail=f"Model class {request.model_class} not supported")
+    if request.kind not in ("documents", "query"):
+        raise HTTPException(status_code=400, detail="kind must be 'documents' or 'query'")
+
+    key = _model_key(request.model_class, request.model_kwargs)
+    batcher = batchers.get((key, request.kind))
+    if batcher is not None:
+        return batcher
+
+    async with _models_lock:
+        if key not in models:
+            # la costruzione (download pesi, ecc.) non deve bloccare l'event loop
+            models[key] = await asyncio.to_thread(available_models[request.model_class], **request.model_kwargs)
+        model = models[key]
+
+        if request.kind == "documents" or (request.model_class in QUERY_AS_DOCUMENTS_CLASSES
+                                           and not getattr(model, "query_instruction", None)):
+            embed_fn = model.embed_documents
+        else:
+            embed_fn = lambda texts: [model.embed_query(text) for text in texts]
+
+        batcher = batchers.setdefault((key, request.kind), MicroBatcher(embed_fn,
+                                                                        max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+                                                                        max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS))
+    return batcher
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    """
+    Generate embeddings for `texts`, merging concurrent requests for the same model into one batch.
+    """
+    batcher = await _get_batcher(request)
+    try:
+        embeddings = await batcher.submit(request.texts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"embeddings": embeddings}
+
+
+@app.get("/stats")
+async def stats():
+    """Loaded models and micro-batching statistics per (model, kind)."""
+    return {
+        "loaded_models": len(models),
+        "batchers": [
+            {"model_key": key, "kind": kind, **batcher.get_stats()}
+            for (key, kind), batcher in batchers.items()
+        ],
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=8110, workers=1)
@@ -0,0 +1,158 @@
+"""
+embedding_cache.py
+
+Cache persistente (MongoDB) degli embedding dei documenti.
+
+Ogni import da document store in un vector store ricalcolava l'embedding di
+tutti i documenti, anche di quelli già indicizzati in un'esecuzione precedente
+o in un altro store con lo stesso modello. `CachedDocumentEmbeddings` avvolge
+il modello di embedding di uno store: `embed_documents` cerca i vettori per
+(configurazione del modello, sha256 del testo) e chiama il modello solo per i
+testi nuovi. Ricostruire un indice FAISS/Chroma con gli stessi documenti non
+richiede quindi chiamate al modello.
+
+I vettori sono salvati come float32 binari nella collezione
+`embedding_cache.document_embeddings` (`_id` = "<model_key>:<sha256>").
+
+Configurazione via env:
+
+    DOCUMENT_EMBEDDING_CACHE_ENABLED       (default "true")
+    DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS   (default 0 = nessuna scadenza)
+"""
+
+import datetime
+import hashlib
+import os
+from array import array
+from typing import Any, Dict, List
+
+from bson.binary import Binary
+from langchain_core.embeddings import Embeddings
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from utilities.mongo import get_mongo_client
+
+DOCUMENT_EMBEDDING_CACHE_ENABLED = os.getenv("DOCUMENT_EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS", "0"))
+EMBEDDING_CACHE_DB_NAME = "embedding_cache"
+EMBEDDING_CACHE_COLLECTION_NAME = "document_embeddings"
+
+# lookup su Mongo a blocchi per non superare la dimensione massima della query
+_LOOKUP_BATCH_SIZE = 1000
+
+_indexes_ready = False
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode(vector: List[float]) -> Binary:
+    return Binary(array("f", vector).tobytes())
+
+
+def _decode(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+def _collection():
+    return get_mongo_client()[EMBEDDING_CACHE_DB_NAME][EMBEDDING_CACHE_COLLECTION_NAME]
+
+
+def ensure_embedding_cache_indexes() -> None:
+    """Indice per modello (statistiche/pulizia) e, se configurato, TTL sugli embedding."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection = _collection()
+    collection.create_index([("model_key", ASCENDING)])
+    if DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS > 0:
+        collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS)
+    _indexes_ready = True
+
+
+class DocumentEmbeddingCache:
+    """Embedding dei documenti di un modello (`model_key`), indicizzati per hash del contenuto."""
+
+    def __init__(self, model_key: str):
+        self.model_key = model_key
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def _id(self, digest: str) -> str:
+        return f"{self.model_key}:{digest}"
+
+    def get_many(self, digests: List[str]) -> Dict[str, List[float]]:
+        """Vettori in cache per gli hash richiesti (gli hash assenti non compaiono nel risultato)."""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(digests))
+        prefix_length = len(self.model_key) + 1
+        for start in range(0, len(unique), _LOOKUP_BATCH_SIZE):
+            ids = [self._id(digest) for digest in unique[start:start + _LOOKUP_BATCH_SIZE]]
+            for doc in _collection().find({"_id": {"$in": ids}}, {"vector": 1}):
+                found[doc["_id"][prefix_length:]] = _decode(doc["vector"])
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(unique) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]) -> None:
+        if not vectors:
+            return
+        ensure_embedding_cache_indexes()
+        now = datetime.datetime.utcnow()
+        docs = [{"_id": self._id(digest), "model_key": self.model_key, "vector": _encode(vector),
+                 "dimensions": len(vector), "created_at": now}
+                for digest, vector in vectors.items()]
+        try:
+            _collection().insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            # un altro worker ha inserito gli stessi embedding nel frattempo
+            if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+                raise
+
+
+class CachedDocumentEmbeddings(Embeddings):
+    """
+    Embeddings LangChain che serve `embed_documents` dalla cache persistente e delega tutto il resto al modello avvolto.
+    """
+
+    def __init__(self, wrapped: Embeddings, cache: DocumentEmbeddingCache):
+        self.wrapped = wrapped
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("wrapped", "cache"):
+            raise AttributeError(name)
+        return getattr(self.wrapped, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        digests = [content_hash(text) for text in texts]
+        vectors = self.cache.get_many(digests)
+
+        missing = {digest: text for digest, text in zip(digests, texts) if digest not in vectors}
+        if missing:
+            computed = dict(zip(missing.keys(), self.wrapped.embed_documents(list(missing.values()))))
+            self.cache.put_many(computed)
+            vectors.update(computed)
+        return [vectors[digest] for digest in digests]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.wrapped.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.wrapped.aembed_query(text)
+
+
+def with_document_cache(embeddings: Embeddings, model_key: str) -> Embeddings:
+    """Avvolge `embeddings` con la cache persistente dei documenti di `model_key` (se abilitata)."""
+    if not DOCUMENT_EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    return CachedDocumentEmbeddings(embeddings, DocumentEmbeddingCache(model_key))
+
+
+def get_document_embedding_cache_stats() -> List[Dict[str, Any]]:
+    """Numero di embedding salvati per modello."""
+    pipeline = [{"$group": {"_id": "$model_key", "count": {"$sum": 1}}}]
+    return [{"model_key": row["_id"], "count": row["count"]} for row in _collection().aggregate(pipeline)]
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Accorpa richieste di embedding concorrenti in un'unica chiamata al modello.
+
+    Ogni chiamata a `submit(texts)` viene accodata; un task in background
+    raccoglie le richieste finché il numero di testi raggiunge `max_batch_size`
+    oppure finché non scade `max_wait_ms` dalla prima richiesta in coda, quindi
+    invoca `embed_fn` una sola volta (in un thread dedicato, per non bloccare
+    l'event loop) e restituisce a ciascun chiamante la propria porzione.
+
+    I testi duplicati all'interno dello stesso batch vengono embeddati una sola volta.
+    """
+
+    def __init__(self,
+                 embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 10.0):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # un solo thread per modello: il parallelismo è dentro il batch (BLAS / tokenizer)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batch")
+        self.stats: Dict[str, float] = {"requests": 0, "texts": 0, "batches": 0, "model_calls_texts": 0}
+
+    def _ensure_started(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, texts: List[str]) -> List[List[float]]:
+        """Accoda `texts` e attende i relativi embedding."""
+        if not texts:
+            return []
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        self.stats["requests"] += 1
+        self.stats["texts"] += len(texts)
+        return await future
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        first = await self._queue.get()
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _embed_unique(self, texts: List[str]) -> List[List[float]]:
+        unique = list(dict.fromkeys(texts))
+        vectors: List[List[float]] = []
+        for start in range(0, len(unique), self.max_batch_size):
+            vectors.extend(self.embed_fn(unique[start:start + self.max_batch_size]))
+        by_text = dict(zip(unique, vectors))
+        self.stats["model_calls_texts"] += len(unique)
+        return [by_text[text] for text in texts]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._embed_unique, texts)
+            except Exception as exc:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.stats["batches"] += 1
+            offset = 0
+            for item_texts, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"] or 1
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "avg_texts_per_batch": self.stats["texts"] / batches,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
@@ -2,6 +2,8 @@ from typing import Dict, Any
 from pymongo import MongoClient
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
+from utilities.object_registry import object_registry, config_version
+from embedding_models.utilities.remote_embeddings import build_embeddings
 
 
 class EmbeddingModelManager:
@@ -29,13 +31,14 @@ class EmbeddingModelManager:
         if model_class not in self.available_models:
             raise ValueError(f"Model class {model_class} not supported")
 
-        model_class_instance = self.available_models[model_class]
-        model_instance = model_class_instance(**model_kwargs)
-        self.models[model_id] = model_instance
+        object_registry.load_once("embedding_model", model_id, self.models,
+                                  build=lambda: build_embeddings(model_class, model_kwargs, self.available_models),
+                                  version=config_version(config))
 
     def unload_model(self, model_id: str):
         if model_id in self.models:
             del self.models[model_id]
+            object_registry.unregister("embedding_model", model_id)
         else:
             raise ValueError("Model with this model_id is not loaded")
 
@@ -45,5 +48,7 @@ class EmbeddingModelManager:
         else:
             raise ValueError("Model with this model_id is not loaded")
 
-    def list_loaded_models(self):
+    def list_loaded_models(self, scope: str = "worker"):
+        if scope == "node":
+            return object_registry.list_ids("embedding_model")
         return list(self.models.keys())
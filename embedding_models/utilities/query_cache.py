@@ -0,0 +1,169 @@
+"""
+query_cache.py
+
+Cache in memoria degli embedding delle query di ricerca.
+
+Gli agenti ripetono spesso la stessa query nella stessa conversazione e ogni
+ricerca (`/vector_store/search`, `/vector_store/retrieve`, tool dei vector
+store) ricalcola l'embedding del testo. `CachedQueryEmbeddings` avvolge il
+modello di embedding di uno store e memorizza gli embedding delle query in una
+cache LRU con TTL, condivisa da tutti gli store che usano la stessa
+configurazione del modello. Gli embedding dei documenti non passano dalla cache.
+
+Configurazione via env:
+
+    QUERY_EMBEDDING_CACHE_SIZE     (default 1024 query per modello, 0 disabilita)
+    QUERY_EMBEDDING_CACHE_TTL      (default 3600 secondi, 0 = nessuna scadenza)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Chiave di cache della query: spazi iniziali/finali rimossi e spazi interni compattati."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class QueryEmbeddingCache:
+    """Cache LRU thread-safe testo normalizzato -> embedding, con scadenza per TTL."""
+
+    def __init__(self, max_size: int = QUERY_EMBEDDING_CACHE_SIZE, ttl: float = QUERY_EMBEDDING_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = normalize_query(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, vector = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return list(vector)
+
+    def put(self, text: str, vector: List[float]) -> None:
+        if self.max_size <= 0:
+            return
+        key = normalize_query(text)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+# model_key (versione della configurazione del modello) -> cache
+_caches: Dict[str, QueryEmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_embedding_cache(model_key: str) -> QueryEmbeddingCache:
+    """Restituisce (creandola alla prima richiesta) la cache del modello `model_key`."""
+    with _caches_lock:
+        cache = _caches.get(model_key)
+        if cache is None:
+            cache = _caches[model_key] = QueryEmbeddingCache()
+        return cache
+
+
+def get_query_embedding_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistiche (hit/miss, dimensione...) di ciascuna cache, per modello."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {model_key: cache.get_stats() for model_key, cache in caches.items()}
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings LangChain che serve `embed_query` dalla cache e delega tutto il resto al modello avvolto.
+    """
+
+    def __init__(self, wrapped: Embeddings, cache: QueryEmbeddingCache):
+        self.wrapped = wrapped
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        # attributi specifici del modello (es. model_name) restano accessibili
+        if name in ("wrapped", "cache"):
+            raise AttributeError(name)
+        return getattr(self.wrapped, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.wrapped.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.wrapped.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.wrapped.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = await self.wrapped.aembed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embedding di più query: solo quelle non in cache vengono calcolate, in un'unica chiamata."""
+        vectors: List[Optional[List[float]]] = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            if hasattr(self.wrapped, "embed_queries"):
+                computed = self.wrapped.embed_queries(missing)
+            else:
+                computed = self.wrapped.embed_documents(missing)
+            by_text = dict(zip(missing, computed))
+            for text, vector in by_text.items():
+                self.cache.put(text, vector)
+            vectors = [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+
+def with_query_cache(embeddings: Embeddings, model_key: str) -> Embeddings:
+    """Avvolge `embeddings` con la cache delle query di `model_key` (se la cache è abilitata)."""
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return embeddings
+    return CachedQueryEmbeddings(embeddings, get_query_embedding_cache(model_key))
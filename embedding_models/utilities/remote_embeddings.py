@@ -0,0 +1,73 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+from langchain_core.embeddings import Embeddings
+
+# URL del servizio di embedding condiviso (vedi embedding_models/service.py); se assente si usano modelli locali
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL")
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "120"))
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings LangChain che delega il calcolo al servizio di embedding standalone.
+
+    Il servizio mantiene una sola copia del modello `model_class(**model_kwargs)` e
+    accorpa in micro-batch le richieste di tutti i worker e di tutti i vector store.
+    """
+
+    def __init__(self,
+                 model_class: str,
+                 model_kwargs: Optional[Dict[str, Any]] = None,
+                 service_url: Optional[str] = None,
+                 timeout: float = EMBEDDING_SERVICE_TIMEOUT):
+        self.model_class = model_class
+        self.model_kwargs = model_kwargs or {}
+        self.service_url = (service_url or EMBEDDING_SERVICE_URL or "").rstrip("/")
+        self.timeout = timeout
+        if not self.service_url:
+            raise ValueError("RemoteEmbeddings requires service_url or EMBEDDING_SERVICE_URL")
+        self._session = requests.Session()
+
+    def _payload(self, texts: List[str], kind: str) -> Dict[str, Any]:
+        return {"model_class": self.model_class, "model_kwargs": self.model_kwargs, "texts": texts, "kind": kind}
+
+    def _post(self, texts: List[str], kind: str) -> List[List[float]]:
+        response = self._session.post(f"{self.service_url}/embed", json=self._payload(texts, kind), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    async def _apost(self, texts: List[str], kind: str) -> List[List[float]]:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(f"{self.service_url}/embed", json=self._payload(texts, kind))
+            response.raise_for_status()
+            return response.json()["embeddings"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._post(list(texts), "documents")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._post([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embedding di più query in un'unica richiesta al servizio."""
+        return self._post(list(texts), "query")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._apost(list(texts), "documents")
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._apost([text], "query"))[0]
+
+
+def build_embeddings(model_class: str, model_kwargs: Optional[Dict[str, Any]], available_models: Dict[str, Any]) -> Embeddings:
+    """
+    Costruisce il modello di embedding: remoto se `EMBEDDING_SERVICE_URL` è impostato,
+    altrimenti locale tramite la mappa `available_models`.
+    """
+    model_kwargs = model_kwargs or {}
+    if EMBEDDING_SERVICE_URL:
+        return RemoteEmbeddings(model_class=model_class, model_kwargs=model_kwargs)
+    return available_models[model_class](**model_kwargs)
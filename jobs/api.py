@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Path, Query
+from pydantic import BaseModel
+
+from utilities.jobs import (acancel_job, aget_job, ajob_stats, alist_jobs, job_worker, job_worker_process,
+                            process_job_worker)
+
+router = APIRouter()
+
+
+class JobInfo(BaseModel):
+    id: str
+    type: str
+    status: str
+    endpoint: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = 1
+    progress: Optional[Dict[str, Any]] = None
+    cancel_requested: bool = False
+    error: Optional[str] = None
+    created_at: Optional[Any] = None
+    started_at: Optional[Any] = None
+    finished_at: Optional[Any] = None
+
+
+@router.get("/jobs", response_model=List[JobInfo])
+async def list_jobs(
+    job_type: Optional[str] = Query(None, description="Filter by job type."),
+    status: Optional[str] = Query(None, description="Filter by status (PENDING, RUNNING, DONE, ERROR, CANCELLED)."),
+    skip: int = Query(0, description="Number of jobs to skip."),
+    limit: int = Query(50, description="Maximum number of jobs to return."),
+):
+    """
+    List jobs (newest first) without payload and result.
+    """
+    return [JobInfo(**job) for job in await alist_jobs(job_type, status, skip, limit)]
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str = Path(..., description="The job ID.")):
+    """
+    Status, attempts and progress of a job.
+    """
+    job = await aget_job(job_id, include_result=False)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobInfo(**job)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobInfo)
+async def cancel_job(job_id: str = Path(..., description="The job ID.")):
+    """
+    Cancel a job: pending jobs are cancelled immediately, running jobs stop at their next progress checkpoint.
+    """
+    job = await acancel_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobInfo(**job)
+
+
+@router.get("/stats")
+async def get_jobs_stats():
+    """
+    Job counts per type and status, statistics of the job worker threads of this process (including the ones that
+    run jobs pinned to this process) and of the job worker process started by this process, if any.
+    """
+    return {"jobs": await ajob_stats(), "worker": job_worker.get_stats(), "worker_process": job_worker_process.get_stats(),
+            "process_worker": process_job_worker.get_stats()}
@@ -0,0 +1,70 @@
+"""
+Worker standalone della coda di job (vedi utilities/jobs.py).
+
+    python -m jobs.worker
+
+Importa i moduli che registrano gli handler (`JOB_HANDLER_MODULES`) ed esegue i
+job in questo processo. Con `JOB_WORKERS_EMBEDDED=process` (default) l'API ne
+avvia uno per nodo come processo figlio; con `JOB_WORKERS_EMBEDDED=false` va
+avviato a parte.
+
+I job dei vector store caricano lo store dalla configurazione su Mongo (come
+il lazy-load dell'API) e, per gli store in memoria, scrivono uno snapshot al
+termine: i worker dell'API ricaricano la loro copia al successivo accesso.
+Solo gli store che esistono unicamente nella memoria di un processo (es.
+NumpyVectorStore) hanno job legati al processo dell'API che li ha creati:
+questo worker non li preleva, li esegue `process_job_worker` in quel processo.
+
+Con `JOB_WORKER_PARENT_PID` (impostato dall'API) il worker termina quando
+termina il processo che lo ha avviato, così un altro processo dell'API può
+prenderne il posto.
+"""
+
+import importlib
+import json
+import os
+import platform
+import signal
+import threading
+
+if "MONGO_CONNECTION_STRING" not in os.environ and os.path.exists("config.json"):
+    with open("config.json", "rb") as config_file:
+        os.environ["MONGO_CONNECTION_STRING"] = json.load(config_file)["mongodb_connection_string"]
+
+# stessa sostituzione di sqlite3 dell'API (Chroma richiede una versione recente)
+if platform.system() == 'Linux':
+    try:
+        import pysqlite3
+        import sqlite3
+
+        sqlite3.connect = pysqlite3.connect
+    except ImportError:
+        pass
+
+JOB_HANDLER_MODULES = os.getenv("JOB_HANDLER_MODULES", "document_loaders.api,vector_stores.api")
+JOB_WORKER_PARENT_PID = int(os.getenv("JOB_WORKER_PARENT_PID", "0"))
+
+
+def main() -> None:
+    from utilities.jobs import job_worker, _handlers
+
+    for module_name in filter(None, (name.strip() for name in JOB_HANDLER_MODULES.split(","))):
+        importlib.import_module(module_name)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    job_worker.start()
+    print(f"Job worker started (pid {os.getpid()}, handlers: {sorted(_handlers)})")
+    try:
+        while not stop.wait(5):
+            if JOB_WORKER_PARENT_PID and os.getppid() != JOB_WORKER_PARENT_PID:
+                print("Job worker parent process exited, stopping")
+                break
+    except KeyboardInterrupt:
+        pass
+    job_worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import json
 import os
 from typing import Dict, Any, Optional
 
-from fastapi import FastAPI, APIRouter, HTTPException, Path, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Path, Body, Query
 from langchain_core.callbacks import StreamingStdOutCallbackHandler
 from pydantic import BaseModel, Field
 import uuid
@@ -11,13 +11,16 @@ from starlette.responses import StreamingResponse
 from starlette.websockets import WebSocket
 
 from llms.utilities.model_manager import ModelManager
-from pymongo import MongoClient
+from utilities.executors import run_blocking, run_native_or_blocking
+from utilities.mongo import get_mongo_client, get_async_mongo_client
+from utilities.object_registry import object_registry
 
 # MongoDB connection setup
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
+async_client = get_async_mongo_client()
 db = client['model_config_db']
 collection = db['model_configs']
+async_collection = async_client['model_config_db']['model_configs']
 
 model_manager = ModelManager()
 
@@ -91,14 +94,15 @@ async def configure_model(request: ModelConfigRequest):
     if model_id is None:
         model_id = str(uuid.uuid4())
 
-    if collection.find_one({"_id": config_id}):
+    if await async_collection.find_one({"_id": config_id}):
         raise HTTPException(status_code=400, detail="Configuration ID already exists")
 
     #config_id = str(uuid.uuid4())
     #config = request.dict()
     config["_id"] = config_id
     config["model_id"] = model_id
-    collection.insert_one(config)
+    await async_collection.insert_one(config)
+    object_registry.forget_missing("llm", model_id)
     return {"config_id": config_id}
 
 
@@ -125,7 +129,7 @@ async def unload_model(
     """
     Unloads a model from memory.
     """
-    model_manager.unload_model(model_id)
+    await run_blocking("llms", model_manager.unload_model, model_id)
     return {"message": "Model unloaded successfully"}
 
 
@@ -134,10 +138,11 @@ async def inference(request: InferenceRequest):
     """
     Performs inference using a loaded model.
     """
-    model = model_manager.get_model(request.model_id)
+    # get_model può fare lazy-load (Mongo + costruzione del modello): fuori dall'event loop
+    model = await run_blocking("llms", model_manager.get_model, request.model_id)
     if model is None:
         raise HTTPException(status_code=404, detail="Model not found")
-    response = model.invoke(request.prompt, **request.inference_kwargs)
+    response = await run_native_or_blocking("llms", model, "ainvoke", "invoke", request.prompt, **request.inference_kwargs)
     return {"response": response}
 
 
@@ -163,7 +168,7 @@ async def streaming_inference(request: StreamingInferenceRequest):
                 chunk = chunk.to_json()
                 yield json.dumps(chunk)
 
-    model = model_manager.get_model(request.model_id)
+    model = await run_blocking("llms", model_manager.get_model, request.model_id)
 
     if model is None:
         raise HTTPException(status_code=404, detail="Model not found")
@@ -186,7 +191,7 @@ async def execute_model_method(
     """
     Executes a specific method on a loaded model.
     """
-    model = model_manager.get_model(model_id)
+    model = await run_blocking("llms", model_manager.get_model, model_id)
     if model is None:
         raise HTTPException(status_code=404, detail="Model not found")
 
@@ -194,7 +199,7 @@ async def execute_model_method(
         raise HTTPException(status_code=400, detail=f"Method {request.method_name} not found on model {model_id}")
 
     method = getattr(model, request.method_name)
-    result = method(**request.kwargs)
+    result = await run_blocking("llms", method, **request.kwargs)
 
     return {"detail": f"Method {request.method_name} executed successfully on model {model_id}", "result": result}
 
@@ -211,7 +216,7 @@ async def get_model_attribute(request: GetAttributeRequest):
     attribute_name = request.attribute_name
 
     try:
-        model_instance = model_manager.get_model(model_id)
+        model_instance = await run_blocking("llms", model_manager.get_model, model_id)
         if model_instance is None:
             raise ValueError("Model instance ID does not exist")
 
@@ -229,7 +234,7 @@ async def list_configurations():
     """
     Lists all stored model configurations.
     """
-    configs = collection.find({})
+    configs = await async_collection.find({}).to_list()
     return [
         {
             "config_id": config["_id"],
@@ -249,7 +254,7 @@ async def get_configuration(
     """
     Retrieves a specific model configuration.
     """
-    config = collection.find_one({"_id": config_id})
+    config = await async_collection.find_one({"_id": config_id})
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return config
@@ -263,18 +268,21 @@ async def delete_configuration(
     """
     Deletes a specific model configuration.
     """
-    result = collection.delete_one({"_id": config_id})
+    result = await async_collection.delete_one({"_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
 
 
 @router.get("/loaded_models/")
-async def list_loaded_models():
+async def list_loaded_models(
+        scope: str = Query("worker", example="node", title="Scope",
+                           description="'worker' for the answering worker only, 'node' for every worker on this node.")
+):
     """
     Lists all currently loaded models.
     """
-    return model_manager.list_loaded_models()
+    return await run_blocking("llms", model_manager.list_loaded_models, scope=scope)
 
 
 if __name__ == "__main__":
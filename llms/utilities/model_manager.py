@@ -1,14 +1,15 @@
 
 import os
-from pymongo import MongoClient
 from langchain_community.llms import VLLM, VLLMOpenAI
 from langchain_core.caches import InMemoryCache
 from langchain_openai import OpenAI, ChatOpenAI
 from typing import Dict
+from utilities.object_registry import object_registry, config_version
+from utilities.lifecycle import lifecycle_manager
+from utilities.mongo import get_mongo_client
 
 # MongoDB connection setup
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 db = client['model_config_db']
 collection = db['model_configs']
 
@@ -31,6 +32,9 @@ class ModelManager:
 
     def __init__(self):
         self.models: Dict[str, object] = {}
+        # i modelli meno usati di recente vengono scaricati quando il budget di memoria del worker è superato
+        # (e ricaricati da get_model al successivo utilizzo)
+        lifecycle_manager.register_kind("llm", self.models, self.unload_model)
 
     def load_model(self, config_id: str):
         """
@@ -44,7 +48,11 @@ class ModelManager:
         model_type = config['model_type']
         model_kwargs = config.get('model_kwargs', {})
 
-        self.models[model_id] = available_models[model_type](**model_kwargs)
+        # costruzione serializzata sul nodo e registrata nel registro condiviso
+        self.models.pop(model_id, None)
+        object_registry.load_once("llm", model_id, self.models,
+                                  build=lambda: available_models[model_type](**model_kwargs),
+                                  version=config_version(config))
 
     def unload_model(self, model_id: str):
         """
@@ -52,6 +60,7 @@ class ModelManager:
         """
         if model_id in self.models:
             del self.models[model_id]
+            object_registry.unregister("llm", model_id)
 
     #def get_model(self, model_id: str):
     #    """
@@ -66,23 +75,22 @@ class ModelManager:
         `model_id` uguale; se la trova lo carica e poi lo restituisce.
         """
 
-        mdl = self.models.get(model_id)
-
-        if mdl is not None:
-            return mdl
-
-        # ‑‑ lazy‑load --------------------------------------------------
-        cfg = collection.find_one({"model_id": model_id})
-
-        if cfg:
+        # ‑‑ lazy‑load (le richieste concorrenti attendono lo stesso caricamento) --
+        def load():
+            cfg = collection.find_one({"model_id": model_id})
+            if not cfg:
+                return None  # niente da caricare ⇒ restiamo su None
             self.load_model(cfg["_id"])  # usa già la factory esistente
-
             return self.models.get(model_id)
 
-        return None  # niente da caricare ⇒ restiamo su None
+        return object_registry.get_or_load("llm", model_id, self.models, load)
 
-    def list_loaded_models(self):
+    def list_loaded_models(self, scope: str = "worker"):
         """
         Lists all currently loaded model IDs.
+
+        Con `scope="node"` restituisce i modelli caricati da qualsiasi worker del nodo.
         """
-        return list(self.models.keys())
\ No newline at end of file
+        if scope == "node":
+            return object_registry.list_ids("llm")
+        return list(self.models.keys())
@@ -2,14 +2,14 @@ import os
 from fastapi import FastAPI, HTTPException, Path, Body, APIRouter
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
-from pymongo import MongoClient
 from prompts.utilities.prompt_manager import PromptManager, PromptConfig, ChatPromptConfig
+from utilities.executors import run_blocking
+from utilities.mongo import get_mongo_client
 
 router = APIRouter()
 
 # Configurazione della connessione a MongoDB
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 db = client['prompt_db']
 collection = db['prompt_configs']
 
@@ -67,7 +67,7 @@ async def add_prompt_config(prompt_config: PromptConfig = Body(..., example={
     - **prompt_config**: The prompt configuration to add.
     """
     try:
-        result = prompt_manager.add_prompt_config(prompt_config)
+        result = await run_blocking("mongo", prompt_manager.add_prompt_config, prompt_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -90,7 +90,7 @@ async def add_chat_prompt_config(chat_prompt_config: ChatPromptConfig = Body(...
     - **chat_prompt_config**: The chat prompt configuration to add.
     """
     try:
-        result = prompt_manager.add_chat_prompt_config(chat_prompt_config)
+        result = await run_blocking("mongo", prompt_manager.add_chat_prompt_config, chat_prompt_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -111,7 +111,7 @@ async def update_prompt_config(config_id: str = Path(..., example="example_promp
     - **prompt_config**: The updated prompt configuration.
     """
     try:
-        result = prompt_manager.update_prompt_config(config_id, prompt_config)
+        result = await run_blocking("mongo", prompt_manager.update_prompt_config, config_id, prompt_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -136,7 +136,7 @@ async def update_chat_prompt_config(config_id: str = Path(..., example="example_
     - **chat_prompt_config**: The updated chat prompt configuration.
     """
     try:
-        result = prompt_manager.update_chat_prompt_config(config_id, chat_prompt_config)
+        result = await run_blocking("mongo", prompt_manager.update_chat_prompt_config, config_id, chat_prompt_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -150,7 +150,7 @@ async def delete_prompt_config(config_id: str = Path(..., example="example_promp
     - **config_id**: The ID of the prompt configuration to delete.
     """
     try:
-        result = prompt_manager.delete_prompt_config(config_id)
+        result = await run_blocking("mongo", prompt_manager.delete_prompt_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -164,7 +164,7 @@ async def delete_chat_prompt_config(config_id: str = Path(..., example="example_
     - **config_id**: The ID of the chat prompt configuration to delete.
     """
     try:
-        result = prompt_manager.delete_chat_prompt_config(config_id)
+        result = await run_blocking("mongo", prompt_manager.delete_chat_prompt_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -178,7 +178,7 @@ async def get_prompt_config(config_id: str = Path(..., example="example_prompt_c
     - **config_id**: The ID of the prompt configuration to retrieve.
     """
     try:
-        result = prompt_manager.get_prompt_config(config_id)
+        result = await run_blocking("mongo", prompt_manager.get_prompt_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -192,7 +192,7 @@ async def get_chat_prompt_config(config_id: str = Path(..., example="example_cha
     - **config_id**: The ID of the chat prompt configuration to retrieve.
     """
     try:
-        result = prompt_manager.get_chat_prompt_config(config_id)
+        result = await run_blocking("mongo", prompt_manager.get_chat_prompt_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -206,7 +206,7 @@ async def get_prompt(request: PromptRequest):
     - **request**: Contains the prompt configuration ID, variables to format the prompt, whether to perform partial formatting, and whether to perform full formatting.
     """
     try:
-        result = prompt_manager.get_prompt(request.config_id, request.variables, request.is_partial, request.is_format)
+        result = await run_blocking("prompts", prompt_manager.get_prompt, request.config_id, request.variables, request.is_partial, request.is_format)
         return {"prompt": result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -220,7 +220,7 @@ async def get_chat_prompt(request: ChatPromptRequest):
     - **request**: Contains the chat prompt configuration ID, variables to format the chat prompt, whether to perform partial formatting, and whether to perform full formatting.
     """
     try:
-        result = prompt_manager.get_chat_prompt(request.config_id, request.variables, request.is_partial, request.is_format)
+        result = await run_blocking("prompts", prompt_manager.get_chat_prompt, request.config_id, request.variables, request.is_partial, request.is_format)
         return {"chat_prompt": result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -232,7 +232,7 @@ async def list_prompt_configs():
     List all prompt configurations from the database.
     """
     try:
-        result = prompt_manager.list_prompt_configs()
+        result = await run_blocking("mongo", prompt_manager.list_prompt_configs)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -244,7 +244,7 @@ async def list_chat_prompt_configs():
     List all chat prompt configurations from the database.
     """
     try:
-        result = prompt_manager.list_chat_prompt_configs()
+        result = await run_blocking("mongo", prompt_manager.list_chat_prompt_configs)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -261,13 +261,13 @@ async def execute_prompt_method(request: ExecutePromptMethodRequest):
     - **kwargs**: The keyword arguments for the method (if any).
     """
     try:
-        prompt_instance = prompt_manager.get_prompt(request.config_id, {}, is_partial=False, is_format=False)
+        prompt_instance = await run_blocking("prompts", prompt_manager.get_prompt, request.config_id, {}, is_partial=False, is_format=False)
         if not hasattr(prompt_instance, request.method_name):
             raise ValueError(f"Method '{request.method_name}' does not exist on prompt instance")
 
         method = getattr(prompt_instance, request.method_name)
         if callable(method):
-            result = method(*request.args, **request.kwargs)
+            result = await run_blocking("prompts", method, *request.args, **request.kwargs)
             return {"result": result}
         else:
             raise ValueError(f"'{request.method_name}' is not a callable method")
@@ -284,7 +284,7 @@ async def get_prompt_attribute(request: GetPromptAttributeRequest):
     - **attribute_name**: The name of the attribute to get.
     """
     try:
-        prompt_instance = prompt_manager.get_prompt(request.config_id, {}, False)
+        prompt_instance = await run_blocking("prompts", prompt_manager.get_prompt, request.config_id, {}, False)
         if not hasattr(prompt_instance, request.attribute_name):
             raise ValueError(f"Attribute '{request.attribute_name}' does not exist on prompt instance")
 
@@ -305,13 +305,13 @@ async def execute_chat_prompt_method(request: ExecuteChatPromptMethodRequest):
     - **kwargs**: The keyword arguments for the method (if any).
     """
     try:
-        chat_prompt_instance = prompt_manager.get_chat_prompt(request.config_id, {}, is_partial=False, is_format=False)
+        chat_prompt_instance = await run_blocking("prompts", prompt_manager.get_chat_prompt, request.config_id, {}, is_partial=False, is_format=False)
         if not hasattr(chat_prompt_instance, request.method_name):
             raise ValueError(f"Method '{request.method_name}' does not exist on chat prompt instance")
 
         method = getattr(chat_prompt_instance, request.method_name)
         if callable(method):
-            result = method(*request.args, **request.kwargs)
+            result = await run_blocking("prompts", method, *request.args, **request.kwargs)
             return {"result": result}
         else:
             raise ValueError(f"'{request.method_name}' is not a callable method")
@@ -328,7 +328,7 @@ async def get_chat_prompt_attribute(request: GetChatPromptAttributeRequest):
     - **attribute_name**: The name of the attribute to get.
     """
     try:
-        chat_prompt_instance = prompt_manager.get_chat_prompt(request.config_id, {}, False)
+        chat_prompt_instance = await run_blocking("prompts", prompt_manager.get_chat_prompt, request.config_id, {}, False)
         if not hasattr(chat_prompt_instance, request.attribute_name):
             raise ValueError(f"Attribute '{request.attribute_name}' does not exist on chat prompt instance")
 
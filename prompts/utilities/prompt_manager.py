@@ -1,12 +1,11 @@
 import os
-from pymongo import MongoClient
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, ChatMessagePromptTemplate
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List
+from utilities.mongo import get_mongo_client
 
 # Configurazione della connessione a MongoDB
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 db = client['prompt_db']
 collection = db['prompt_configs']
 
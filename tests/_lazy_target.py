@@ -0,0 +1,5 @@
+"""Modulo importato da `test_lazy_class_map_imports_on_first_access`."""
+
+
+class Target:
+    pass
@@ -0,0 +1,37 @@
+"""
+Configurazione comune dei test.
+
+I moduli leggono le directory di lavoro (registro degli oggetti, file dei
+job) da env all'import: vengono impostate qui, in una directory temporanea,
+prima che i test importino qualsiasi modulo del repository.
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_WORK_DIR = tempfile.mkdtemp(prefix="nlp_core_tests_")
+os.environ.setdefault("OBJECT_REGISTRY_DIR", os.path.join(_WORK_DIR, "object_registry"))
+os.environ.setdefault("JOB_FILES_DIR", os.path.join(_WORK_DIR, "jobs"))
+os.environ.setdefault("FAISS_SNAPSHOT_DIR", os.path.join(_WORK_DIR, "faiss_snapshots"))
+
+
+@pytest.fixture
+def mongo_client():
+    """Client mongomock installato come client condiviso (utilities/mongo.py)."""
+    mongomock = pytest.importorskip("mongomock")
+    from utilities import mongo
+
+    client = mongomock.MongoClient()
+    previous = (mongo._sync_client, mongo._async_client, mongo._owner_pid)
+    mongo.set_mongo_clients(client)
+    yield client
+    mongo._sync_client, mongo._async_client, mongo._owner_pid = previous
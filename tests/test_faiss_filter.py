@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from vector_stores.utilities.faiss_store import FaissVectorStore, supports_selector
+
+DIMENSION = 16
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(1200, DIMENSION)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    # filtro selettivo: un documento su 20
+    metadatas = [{"group": i % 20, "page": i} for i in range(len(vectors))]
+    return vectors, ids, metadatas
+
+
+@pytest.mark.parametrize("ann, quantization", [
+    (None, None),
+    ({"type": "ivf", "nlist": 16, "nprobe": 16}, None),
+    ({"type": "hnsw", "efSearch": 128}, None),
+    (None, {"type": "sq8"}),
+    (None, {"type": "pq", "m": 4, "nbits": 6}),
+    (None, {"type": "pq", "m": 4, "nbits": 6, "rerank": "flat"}),
+    (None, {"type": "pq", "m": 4, "nbits": 6, "rerank": None}),
+    ({"type": "ivf", "nlist": 16, "nprobe": 16}, {"type": "pq", "m": 4, "nbits": 6}),
+    ({"type": "hnsw", "efSearch": 128}, {"type": "sq8"}),
+])
+def test_filtered_search(dataset, ann, quantization):
+    vectors, ids, metadatas = dataset
+    store = FaissVectorStore(None, dimension=DIMENSION, ann=ann, quantization=quantization)
+    store.add_embeddings(list(zip(ids, vectors.tolist())), metadatas=metadatas, ids=ids)
+    if ann or quantization:
+        store.rebuild()
+
+    query = vectors[7].tolist()
+    results = store.similarity_search_with_score_by_vector(query, k=5, filter={"group": 7})
+    mmr = store.max_marginal_relevance_search_by_vector(query, k=5, fetch_k=10, filter={"group": 7})
+    ranged = store.similarity_search_with_score_by_vector(query, k=5, filter={"page": {"$lt": 3}})
+
+    assert len(results) == 5 and all(doc.metadata["group"] == 7 for doc, _ in results)
+    # il documento stesso è il più vicino tra quelli ammessi
+    assert results[0][0].id == "doc-7"
+    assert len(mmr) == 5 and all(doc.metadata["group"] == 7 for doc in mmr)
+    # meno documenti ammessi di `k`: vengono restituiti tutti
+    assert sorted(doc.metadata["page"] for doc, _ in ranged) == [0, 1, 2]
+
+
+def test_pq_uses_post_filter(dataset):
+    vectors, ids, metadatas = dataset
+    store = FaissVectorStore(None, dimension=DIMENSION, quantization={"type": "pq", "m": 4, "nbits": 6})
+    store.add_embeddings(list(zip(ids, vectors.tolist())), metadatas=metadatas, ids=ids)
+
+    assert supports_selector(store.index)
+    store.rebuild()
+    assert not supports_selector(store.index)
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from utilities import jobs
+
+
+@pytest.fixture
+def queue(mongo_client, monkeypatch):
+    """Coda dei job su mongomock con handler di prova; i job vengono eseguiti a mano con `_claim`/`_run`."""
+    monkeypatch.setattr(jobs, "_indexes_ready", False)
+    monkeypatch.setattr(jobs, "JOB_RETRY_BACKOFF_SECONDS", 0)
+    handlers = dict(jobs._handlers)
+    calls = []
+
+    def echo(context, value, fail_times=0):
+        calls.append(context.attempt)
+        context.add_outputs([f"{value}-{context.attempt}"])
+        context.set_progress(current=1, total=1, message="done")
+        if context.attempt <= fail_times:
+            raise ValueError("failing attempt")
+        return {"value": value}
+
+    jobs.register_job_handler("test_echo", echo, max_attempts=3)
+    jobs.ensure_job_indexes()
+    yield calls
+    jobs.process_job_worker.stop()
+    jobs._handlers.clear()
+    jobs._handlers.update(handlers)
+
+
+def _run_next(worker):
+    job = worker._claim()
+    if job is not None:
+        worker._run(job)
+    return job
+
+
+def _get(job_id):
+    return asyncio.run(jobs.aget_job(job_id))
+
+
+def test_job_runs_to_completion(queue):
+    files_dir = jobs.new_job_files_dir()
+    job = jobs.enqueue_job("test_echo", {"value": "a"}, files_dir=files_dir)
+
+    assert _get(job["id"])["status"] == jobs.PENDING
+    assert _run_next(jobs.JobWorker())["id"] == job["id"]
+
+    stored = _get(job["id"])
+    assert stored["status"] == jobs.DONE
+    assert stored["result"] == {"value": "a"}
+    assert stored["progress"]["message"] == "done"
+    assert stored["expire_at"] is not None
+    assert asyncio.run(jobs.aget_job_outputs(job["id"])) == ["a-1"]
+    # i file di input vengono rimossi a fine job
+    assert not os.path.exists(files_dir)
+
+
+def test_failed_attempts_are_retried(queue):
+    worker = jobs.JobWorker()
+    job = jobs.enqueue_job("test_echo", {"value": "b", "fail_times": 1})
+
+    _run_next(worker)
+    retried = _get(job["id"])
+    assert retried["status"] == jobs.PENDING
+    assert retried["error"] == "ValueError: failing attempt"
+
+    _run_next(worker)
+    stored = _get(job["id"])
+    assert stored["status"] == jobs.DONE
+    assert stored["attempts"] == 2
+    assert queue == [1, 2]
+    # gli output del tentativo fallito vengono scartati
+    assert asyncio.run(jobs.aget_job_outputs(job["id"])) == ["b-2"]
+
+
+def test_job_fails_after_max_attempts(queue):
+    worker = jobs.JobWorker()
+    job = jobs.enqueue_job("test_echo", {"value": "c", "fail_times": 5}, max_attempts=2)
+
+    _run_next(worker)
+    _run_next(worker)
+
+    stored = _get(job["id"])
+    assert stored["status"] == jobs.ERROR
+    assert stored["attempts"] == 2
+    assert _run_next(worker) is None
+
+
+def test_affinity(queue, mongo_client, monkeypatch):
+    # il job legato a un altro processo non deve essere prelevato dal worker di questo
+    monkeypatch.setattr(jobs, "start_process_job_worker", lambda: None)
+    worker = jobs.JobWorker()
+    other_process = jobs.enqueue_job("test_echo", {"value": "d"}, pin_to_process=True)
+    mongo_client[jobs.JOBS_DB_NAME][jobs.JOBS_COLLECTION_NAME].update_one(
+        {"id": other_process["id"]}, {"$set": {"affinity.pid": os.getpid() + 100000}})
+    node = jobs.enqueue_job("test_echo", {"value": "e"}, pin_to_node=True)
+
+    assert _run_next(worker)["id"] == node["id"]
+    assert _run_next(worker) is None
+    assert _get(other_process["id"])["status"] == jobs.PENDING
+
+
+def test_per_type_concurrency(queue, mongo_client):
+    jobs.register_job_handler("test_single", lambda context: None, max_concurrency=1)
+    running = jobs.enqueue_job("test_single", {})
+    mongo_client[jobs.JOBS_DB_NAME][jobs.JOBS_COLLECTION_NAME].update_one(
+        {"id": running["id"]}, {"$set": {"status": jobs.RUNNING}})
+    jobs.enqueue_job("test_single", {})
+
+    # un altro job dello stesso tipo è già in esecuzione (anche in un altro processo)
+    assert jobs.JobWorker()._claim() is None
+
+
+def test_cancel_pending_job(queue):
+    job = jobs.enqueue_job("test_echo", {"value": "f"})
+
+    cancelled = asyncio.run(jobs.acancel_job(job["id"]))
+
+    assert cancelled["status"] == jobs.CANCELLED
+    assert _run_next(jobs.JobWorker()) is None
+
+
+def test_expired_lease_is_requeued(queue, mongo_client):
+    job = jobs.enqueue_job("test_echo", {"value": "g"})
+    mongo_client[jobs.JOBS_DB_NAME][jobs.JOBS_COLLECTION_NAME].update_one(
+        {"id": job["id"]},
+        {"$set": {"status": jobs.RUNNING, "attempts": 1, "lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+    worker = jobs.JobWorker()
+    worker.recover_stale_jobs()
+
+    assert _get(job["id"])["status"] == jobs.PENDING
+    _run_next(worker)
+    assert _get(job["id"])["status"] == jobs.DONE
+
+
+def test_process_pinned_job_runs_in_owning_process(queue, monkeypatch):
+    """Con il worker di nodo in un processo figlio (default) i job legati al processo girano nel processo che li crea."""
+    monkeypatch.setattr(jobs, "JOB_WORKERS_EMBEDDED", "process")
+    unpinned = jobs.enqueue_job("test_echo", {"value": "h"})
+    job = jobs.enqueue_job("test_echo", {"value": "i"}, pin_to_process=True)
+    assert jobs.process_job_worker.get_stats()["running"] == 1
+
+    deadline = time.monotonic() + 10
+    while _get(job["id"])["status"] != jobs.DONE and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert _get(job["id"])["status"] == jobs.DONE
+    # i job non legati al processo restano al worker di nodo
+    assert _get(unpinned["id"])["status"] == jobs.PENDING
@@ -0,0 +1,54 @@
+import asyncio
+
+from utilities import mongo
+
+
+def test_client_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.delenv("MONGO_SOCKET_TIMEOUT_MS", raising=False)
+
+    options = mongo.mongo_client_options()
+
+    assert options["maxPoolSize"] == 7
+    assert options["readPreference"] == "secondaryPreferred"
+    # le opzioni senza default non vengono passate a pymongo
+    assert "socketTimeoutMS" not in options
+
+
+def test_shared_clients(mongo_client):
+    assert mongo.get_mongo_client() is mongo_client
+    assert mongo.get_async_mongo_client() is mongo.get_async_mongo_client()
+    assert isinstance(mongo.get_async_mongo_client(), mongo.AsyncClientAdapter)
+
+
+def test_async_adapter_crud(mongo_client):
+    async def scenario():
+        collection = mongo.get_async_mongo_client()["db"]["configs"]
+        await collection.insert_many([{"id": str(i), "group": i % 2} for i in range(5)])
+        found = await collection.find_one({"id": "3"}, {"_id": 0})
+        page = await collection.find({"group": 0}, {"_id": 0}).sort("id", -1).skip(1).limit(1).to_list()
+        count = await collection.count_documents({"group": 1})
+        updated = await collection.update_one({"id": "1"}, {"$set": {"group": 0}})
+        cursor = await collection.aggregate([{"$group": {"_id": "$group", "n": {"$sum": 1}}}])
+        groups = {row["_id"]: row["n"] async for row in cursor}
+        return found, page, count, updated.modified_count, groups
+
+    found, page, count, modified, groups = asyncio.run(scenario())
+
+    assert found == {"id": "3", "group": 1}
+    assert page == [{"id": "2", "group": 0}]
+    assert count == 2
+    assert modified == 1
+    assert groups == {0: 4, 1: 1}
+    # stessi dati visti dal client sincrono
+    assert mongo_client["db"]["configs"].count_documents({}) == 5
+
+
+def test_async_adapter_collection_attribute(mongo_client):
+    mongo_client["db"]["configs"].insert_one({"id": "a"})
+
+    async def scenario():
+        return await mongo.get_async_mongo_client()["db"].configs.find_one({"id": "a"}, {"_id": 0})
+
+    assert asyncio.run(scenario()) == {"id": "a"}
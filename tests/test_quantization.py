@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+pytest.importorskip("faiss")
+
+from embedding_models.utilities.embedding_cache import with_document_cache
+from vector_stores.utilities.faiss_store import FaissVectorStore
+from vector_stores.utilities.numpy_store import NumpyVectorStore
+
+DIMENSION = 32
+K = 10
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    """Vettori raggruppati in cluster (come gli embedding reali), query estratte dagli stessi cluster."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, DIMENSION)) * 4
+    vectors = (centers[rng.integers(0, 40, 3000)] + rng.normal(size=(3000, DIMENSION))).astype(np.float32)
+    queries = (centers[rng.integers(0, 40, 50)] + rng.normal(size=(50, DIMENSION))).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    return vectors, queries, ids
+
+
+def _recall(store, dataset) -> float:
+    """Recall@K dello store rispetto alla ricerca esatta (distanza euclidea) calcolata con numpy."""
+    vectors, queries, ids = dataset
+    hits = 0
+    for query in queries:
+        exact = {ids[i] for i in np.argsort(((vectors - query) ** 2).sum(axis=1))[:K]}
+        found = {doc.id for doc, _ in store.similarity_search_with_score_by_vector(query.tolist(), k=K)}
+        hits += len(exact & found)
+    return hits / (K * len(queries))
+
+
+def _fill(store, dataset):
+    vectors, _, ids = dataset
+    store.add_embeddings(list(zip(ids, vectors.tolist())), ids=ids)
+    return store
+
+
+@pytest.mark.parametrize("ann, quantization, min_recall, min_reduction", [
+    ({"type": "ivf"}, None, 0.95, None),
+    ({"type": "hnsw"}, None, 0.95, None),
+    (None, {"type": "sq8"}, 0.9, 3.5),
+    (None, {"type": "pq", "m": 8}, 0.85, 3.0),
+    ({"type": "ivf"}, {"type": "pq", "m": 8}, 0.85, 3.0),
+])
+def test_faiss_index_recall(dataset, ann, quantization, min_recall, min_reduction):
+    store = _fill(FaissVectorStore(None, dimension=DIMENSION, ann=ann, quantization=quantization), dataset)
+
+    report = store.rebuild(k=K)
+
+    assert report["index"] != "IndexFlatL2"
+    assert _recall(store, dataset) >= min_recall
+    assert report["recall_at_k"] >= min_recall
+    if min_reduction is not None:
+        before, after = report["memory_before"]["resident_bytes"], report["memory_after"]["resident_bytes"]
+        assert before / after >= min_reduction
+
+
+class _TableEmbeddings(Embeddings):
+    """Embedding deterministici: il testo è l'indice della riga del dataset."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+        self.query_calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self.vectors[int(text) if text.isdigit() else 0].tolist() for text in texts]
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self.vectors[int(text)].tolist()
+
+
+def test_faiss_rebuild_uses_original_vectors(dataset):
+    """Le ricostruzioni successive di un indice quantizzato non perdono recall: si parte dai vettori originali."""
+    vectors, _, ids = dataset
+    store = FaissVectorStore(_TableEmbeddings(vectors), dimension=DIMENSION, quantization={"type": "sq8"})
+    store.add_texts([str(i) for i in range(len(vectors))], ids=ids)
+
+    first = store.rebuild(k=K)
+    recall = _recall(store, dataset)
+    second = store.rebuild(k=K)
+
+    assert first["vectors_from"] == "index" and second["vectors_from"] == "embeddings"
+    assert second["recall_at_k"] == first["recall_at_k"]
+    assert _recall(store, dataset) == recall
+
+
+def test_faiss_dimension_from_document_cache(dataset, mongo_client, tmp_path):
+    """La dimensione dello store arriva dalla cache dei documenti (una sola chiamata al modello) o dall'indice salvato."""
+    model = _TableEmbeddings(dataset[0])
+    embeddings = with_document_cache(model, "table")
+
+    stores = [FaissVectorStore(embeddings) for _ in range(2)]
+    probe_calls = model.calls
+    stores[0].add_texts(["1", "2"])
+    stores[0].save_snapshot(str(tmp_path))
+    model.calls = 0
+    loaded = FaissVectorStore.load_snapshot(str(tmp_path), embeddings)
+
+    assert all(store.index.d == DIMENSION for store in stores + [loaded])
+    assert probe_calls == 1 and model.calls == 0 and model.query_calls == 0
+
+
+@pytest.mark.parametrize("quantization, min_recall, min_reduction", [
+    ({"type": "sq8"}, 0.95, 4.0),
+    ({"type": "pq", "m": 8}, 0.9, 16.0),
+])
+def test_numpy_quantized_recall(dataset, tmp_path, quantization, min_recall, min_reduction):
+    store = _fill(NumpyVectorStore(None, persist_directory=str(tmp_path), distance="euclidean",
+                                   quantization={**quantization, "train_size": 0}), dataset)
+
+    report = store.quantize(k=K)
+
+    assert _recall(store, dataset) >= min_recall
+    assert report["memory_after"]["reduction"] >= min_reduction
+
+
+def test_quantized_search_survives_reload(dataset, tmp_path):
+    quantization = {"type": "pq", "m": 8, "train_size": 0}
+    store = _fill(NumpyVectorStore(None, persist_directory=str(tmp_path), distance="euclidean",
+                                   quantization=quantization), dataset)
+    store.quantize(k=K)
+    recall = _recall(store, dataset)
+
+    reloaded = NumpyVectorStore(None, persist_directory=str(tmp_path), distance="euclidean", quantization=quantization)
+
+    assert reloaded.memory_usage()["quantization"] == "pq"
+    assert _recall(reloaded, dataset) == recall
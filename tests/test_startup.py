@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+from app.startup_benchmark import _parse_importtime, run_once
+from utilities.lazy_imports import LazyClassMap, import_report
+
+# tempo massimo di avvio a freddo di `import app.main`
+STARTUP_MAX_SECONDS = float(os.getenv("STARTUP_MAX_SECONDS", "15"))
+# dipendenze che devono essere importate solo al primo utilizzo del loader/tool che le richiede
+HEAVY_MODULES = ("cv2", "unstructured", "langchain_unstructured", "pymupdf4llm", "langchain_experimental",
+                 "matplotlib")
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:      2000 |     350000 | app.main",
+        "some other output",
+    ])
+
+    assert _parse_importtime(stderr) == [("_io", 0.00012, 1), ("app.main", 0.35, 0)]
+
+
+def test_lazy_class_map_imports_on_first_access():
+    module = "tests._lazy_target"
+    sys.modules.pop(module, None)
+    classes = LazyClassMap({"Target": f"{module}:Target"})
+
+    assert "Target" in classes and list(classes) == ["Target"] and len(classes) == 1
+    assert module not in sys.modules and not classes.is_loaded("Target")
+
+    assert classes["Target"].__name__ == "Target"
+    assert classes.is_loaded("Target")
+    assert any(entry["target"] == f"{module}:Target" and entry["phase"] == "lazy"
+               for entry in import_report.get_report()["entries"])
+
+
+def test_cold_start():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))}
+    try:
+        elapsed, modules = run_once(env)
+    except RuntimeError as exc:
+        if "ModuleNotFoundError" in str(exc):
+            pytest.skip(f"app dependencies not installed: {str(exc).splitlines()[-1]}")
+        raise
+
+    imported = {name.split(".")[0] for name, _, _ in modules}
+    assert not imported.intersection(HEAVY_MODULES)
+    assert elapsed < STARTUP_MAX_SECONDS
@@ -4,14 +4,14 @@ from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, HTTPException, Path, Body, APIRouter
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
-from pymongo import MongoClient
 from tools.utilities.tool_manager import ToolManager, ToolConfig
+from utilities.executors import run_blocking
+from utilities.mongo import get_mongo_client
 
 router = APIRouter()
 
 # Configurazione della connessione a MongoDB
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+client = get_mongo_client()
 db = client['tool_db']
 collection = db['tool_configs']
 tool_manager = ToolManager(collection)
@@ -47,7 +47,7 @@ async def add_tool_config(tool_config: ToolConfig = Body(..., example={
     - **tool_config**: The tool configuration to add.
     """
     try:
-        result = tool_manager.add_tool_config(tool_config)
+        result = await run_blocking("mongo", tool_manager.add_tool_config, tool_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -68,7 +68,7 @@ async def update_tool_config(config_id: str = Path(..., example="example_tool_co
     - **tool_config**: The updated tool configuration.
     """
     try:
-        result = tool_manager.update_tool_config(config_id, tool_config)
+        result = await run_blocking("mongo", tool_manager.update_tool_config, config_id, tool_config)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -82,7 +82,7 @@ async def delete_tool_config(config_id: str = Path(..., example="example_tool_co
     - **config_id**: The ID of the tool configuration to delete.
     """
     try:
-        result = tool_manager.delete_tool_config(config_id)
+        result = await run_blocking("mongo", tool_manager.delete_tool_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -96,7 +96,7 @@ async def get_tool_config(config_id: str = Path(..., example="example_tool_confi
     - **config_id**: The ID of the tool configuration to retrieve.
     """
     try:
-        result = tool_manager.get_tool_config(config_id)
+        result = await run_blocking("mongo", tool_manager.get_tool_config, config_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -108,7 +108,7 @@ async def list_tool_configs():
     List all tool configurations from the database.
     """
     try:
-        result = tool_manager.list_tool_configs()
+        result = await run_blocking("mongo", tool_manager.list_tool_configs)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,7 +122,7 @@ async def instantiate_tool(request: ToolRequest):
     - **request**: Contains the tool configuration ID.
     """
     try:
-        tool = tool_manager.instantiate_tool(request.config_id)
+        tool = await run_blocking("tools", tool_manager.instantiate_tool, request.config_id)
 
         return tool
     except ValueError as e:
@@ -137,7 +137,7 @@ async def remove_tool_instance(request: ToolRequest):
     - **request**: Contains the tool instance ID.
     """
     try:
-        result = tool_manager.remove_tool_instance(request.tool_id)
+        result = await run_blocking("tools", tool_manager.remove_tool_instance, request.tool_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -197,7 +197,7 @@ async def execute_tool_method(request: ExecuteMethodRequest):
         method = getattr(tool_instance, method_name)
 
         if callable(method):
-            result = method(*args, **kwargs)
+            result = await run_blocking("tools", method, *args, **kwargs)
             return {"result": result}
         else:
             raise ValueError(f"'{method_name}' is not a callable method")
@@ -1,16 +1,7 @@
 import json
 import uuid
 from typing import List, Dict, Any
-from langchain_community.tools.sql_database.tool import (
-    InfoSQLDatabaseTool,
-    BaseSQLDatabaseTool,
-    ListSQLDatabaseTool,
-    QuerySQLCheckerTool,
-    InfoSQLDatabaseTool,
-    QuerySQLDataBaseTool
-)
-from langchain_experimental.tools import (PythonREPLTool, PythonAstREPLTool)
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from utilities.lazy_imports import LazyClassMap
 from pydantic import BaseModel, Field
 import os
 from pymongo import MongoClient
@@ -28,10 +19,11 @@ class ToolConfig(BaseModel):
 class ToolManager:
     def __init__(self, db_collection):
         self.collection = db_collection
-        self.available_tools = {
-            "PythonREPLTool": PythonREPLTool,
-            "PythonAstREPLTool": PythonAstREPLTool,
-        }
+        # langchain_experimental viene importato solo alla prima istanza di un tool
+        self.available_tools = LazyClassMap({
+            "PythonREPLTool": "langchain_experimental.tools:PythonREPLTool",
+            "PythonAstREPLTool": "langchain_experimental.tools:PythonAstREPLTool",
+        })
         self.instantiated_tools = {}
 
     def add_tool_config(self, tool_config: ToolConfig):
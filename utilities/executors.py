@@ -0,0 +1,178 @@
+"""
+executors.py
+
+Livello di esecuzione comune per il lavoro bloccante negli endpoint async.
+
+Quasi tutti gli handler FastAPI sono `async def` ma chiamano codice sincrono
+(LangChain, pymongo, loader, splitter...). Eseguito inline, quel codice blocca
+l'event loop del worker e ogni richiesta lenta (es. una chiamata OpenAI)
+ferma tutte le altre.
+
+Questo modulo fornisce:
+
+- un ThreadPoolExecutor limitato per ciascun sottosistema (dimensione
+  configurabile con `EXECUTOR_POOL_SIZE_<SUBSYSTEM>`), così un sottosistema
+  saturo non affama gli altri;
+- `run_blocking(subsystem, fn, ...)` per eseguire una funzione sincrona
+  nel pool del sottosistema;
+- `run_native_or_blocking(...)` che usa il metodo async nativo dell'oggetto
+  (es. `ainvoke`, `asimilarity_search`) quando è realmente implementato e
+  ricade sul pool altrimenti; i metodi async delle classi in
+  `EXECUTOR_WRAPPED_CLASSES` (es. FAISS, che esegue il metodo sincrono con
+  `run_in_executor(None, ...)`) non sono considerati nativi;
+- `EventLoopLagMonitor`, che misura il ritardo dell'event loop sotto carico.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+# dimensione di default dei pool per sottosistema (sovrascrivibile via env)
+DEFAULT_POOL_SIZES: Dict[str, int] = {
+    "mongo": 16,
+    "vector_stores": 8,
+    "embeddings": 4,
+    "llms": 16,
+    "chains": 16,
+    "document_loaders": 4,
+    "document_transformers": 4,
+    "data_stores": 8,
+    "prompts": 4,
+    "tools": 4,
+}
+
+# classi (e sottoclassi) i cui metodi async eseguono solo il metodo sincrono nel default executor
+EXECUTOR_WRAPPED_CLASSES = frozenset({
+    "langchain_community.vectorstores.faiss.FAISS",
+})
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_in_flight: Dict[str, int] = {}
+
+
+def _pool_size(subsystem: str) -> int:
+    env_value = os.getenv(f"EXECUTOR_POOL_SIZE_{subsystem.upper()}")
+    if env_value:
+        return int(env_value)
+    return DEFAULT_POOL_SIZES.get(subsystem, 4)
+
+
+def get_executor(subsystem: str) -> ThreadPoolExecutor:
+    """Restituisce (creandolo alla prima richiesta) il pool del sottosistema."""
+    executor = _executors.get(subsystem)
+    if executor is None:
+        executor = _executors.setdefault(
+            subsystem,
+            ThreadPoolExecutor(max_workers=_pool_size(subsystem), thread_name_prefix=f"{subsystem}-pool"),
+        )
+    return executor
+
+
+async def run_blocking(subsystem: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Esegue `fn(*args, **kwargs)` nel pool limitato di `subsystem` senza bloccare l'event loop."""
+    loop = asyncio.get_running_loop()
+    # come asyncio.to_thread: propaga i contextvars (es. get_openai_callback) nel thread
+    context = contextvars.copy_context()
+    _in_flight[subsystem] = _in_flight.get(subsystem, 0) + 1
+    try:
+        return await loop.run_in_executor(get_executor(subsystem),
+                                          functools.partial(context.run, fn, *args, **kwargs))
+    finally:
+        _in_flight[subsystem] -= 1
+
+
+def has_native_async(obj: Any, async_method: str) -> bool:
+    """
+    True se `async_method` è implementato dalla classe concreta e non è il
+    fallback delle classi base LangChain (che esegue il metodo sincrono nel
+    default executor, senza limiti per sottosistema) né un metodo di una
+    classe in `EXECUTOR_WRAPPED_CLASSES`.
+    """
+    if any(f"{cls.__module__}.{cls.__qualname__}" in EXECUTOR_WRAPPED_CLASSES for cls in type(obj).__mro__):
+        return False
+    from langchain_core.vectorstores import VectorStore
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.runnables import Runnable
+
+    method = getattr(type(obj), async_method, None)
+    if method is None:
+        return False
+    for base in (VectorStore, Embeddings, Runnable):
+        if isinstance(obj, base) and getattr(base, async_method, None) is method:
+            return False
+    return True
+
+
+async def run_native_or_blocking(subsystem: str,
+                                 obj: Any,
+                                 async_method: str,
+                                 sync_method: str,
+                                 *args: Any,
+                                 **kwargs: Any) -> Any:
+    """Usa `obj.<async_method>` se nativo, altrimenti `obj.<sync_method>` nel pool del sottosistema."""
+    if has_native_async(obj, async_method):
+        return await getattr(obj, async_method)(*args, **kwargs)
+    return await run_blocking(subsystem, getattr(obj, sync_method), *args, **kwargs)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, int]]:
+    """Dimensione, richieste in corso e coda di ciascun pool."""
+    return {
+        name: {
+            "max_workers": executor._max_workers,
+            "in_flight": _in_flight.get(name, 0),
+            "queued": executor._work_queue.qsize(),
+        }
+        for name, executor in _executors.items()
+    }
+
+
+class EventLoopLagMonitor:
+    """
+    Misura il ritardo dell'event loop: ogni `interval` secondi un task dorme e
+    registra di quanto si è svegliato in ritardo. Un ritardo alto indica
+    lavoro bloccante eseguito direttamente nell'event loop.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 600):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - started - self.interval) * 1000.0)
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def get_stats(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"samples": 0, "last_ms": 0.0, "avg_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "last_ms": self.samples[-1],
+            "avg_ms": sum(ordered) / len(ordered),
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "max_ms": self.max_lag_ms,
+        }
+
+
+event_loop_lag_monitor = EventLoopLagMonitor()
@@ -0,0 +1,639 @@
+"""
+jobs.py
+
+Coda di job persistente (MongoDB) condivisa dai router, al posto di
+`BackgroundTasks` e delle copie di `_create_task_record` /
+`_update_task_status` in ciascun router.
+
+- Ogni job è un documento nella collezione `JOBS_DB_NAME.jobs` con tipo,
+  payload, stato (PENDING, RUNNING, DONE, ERROR, CANCELLED), tentativi,
+  progresso, risultato ed errore.
+- I job vengono eseguiti da un pool di thread dedicato (`JobWorker`),
+  separato dall'event loop e dai pool delle richieste, con un limite di
+  concorrenza per tipo di job.
+- Se un handler solleva un'eccezione il job viene ripianificato con backoff
+  finché non esaurisce `max_attempts`.
+- La cancellazione è immediata per i job in coda; per quelli in esecuzione
+  viene richiesta e l'handler la osserva tramite `JobContext`.
+- Un job in esecuzione rinnova periodicamente il proprio lease: se il
+  worker muore, il job torna in coda alla scadenza del lease.
+- I job possono essere legati al nodo che li ha creati (`pin_to_node`),
+  quando lavorano su file locali (directory Chroma, snapshot FAISS), o al
+  processo (`pin_to_process`) solo se i loro dati esistono unicamente nella
+  memoria di quel processo. Questi ultimi possono girare solo nel processo
+  che li ha creati: al primo job legato al processo viene avviato in quel
+  processo `process_job_worker`, che preleva solo i job legati a esso (con
+  `JOB_WORKERS_EMBEDDED=thread` li preleva già `job_worker`).
+- Il polling dello stato è una `find_one` sull'indice univoco `id`; i job
+  terminati vengono rimossi da un indice TTL dopo `JOB_TTL_SECONDS`.
+- I file di input di un job (es. upload base64) vanno scritti in una
+  directory nuova sotto `JOB_FILES_DIR` (`new_job_files_dir`) indicata
+  come `files_dir` alla creazione: viene rimossa quando il job termina
+  (DONE, ERROR, CANCELLED, anche se cancellato prima di partire), non tra
+  un tentativo e l'altro.
+- Il `result` del job deve restare un riepilogo compatto: gli output
+  voluminosi (es. i documenti prodotti da un loader) vanno salvati con
+  `JobContext.add_outputs` nella collezione `job_outputs` e letti a pagine
+  con `aget_job_outputs`, così il record resta lontano dal limite di 16 MB.
+
+Gli handler si registrano con `register_job_handler(tipo, fn, ...)`; `fn`
+riceve un `JobContext` e il payload come keyword argument.
+
+Dove girano i job (`JOB_WORKERS_EMBEDDED`):
+
+- `process` (default): il processo dell'API che ottiene il lock di nodo
+  (`JOB_FILES_DIR/worker.lock`) avvia `python -m jobs.worker` come processo
+  figlio e lo riavvia se termina; gli altri processi dell'API subentrano
+  se quel processo termina. Su ogni nodo c'è un solo worker e nessun job
+  gira nei worker uvicorn;
+- `thread`: ogni processo dell'API avvia il proprio `JobWorker` in thread
+  (sviluppo, test);
+- `false`: l'API non esegue job, `python -m jobs.worker` va avviato a parte.
+"""
+
+import fcntl
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from utilities.executors import run_blocking
+from utilities.mongo import get_async_mongo_client, get_mongo_client
+from utilities.object_registry import _pid_alive
+
+JOBS_DB_NAME = os.getenv("JOBS_DB_NAME", "jobs")
+JOBS_COLLECTION_NAME = "jobs"
+JOB_OUTPUTS_COLLECTION_NAME = "job_outputs"
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
+# thread del worker dei job legati al processo (vedi `process_job_worker`)
+JOB_PROCESS_WORKER_CONCURRENCY = int(os.getenv("JOB_PROCESS_WORKER_CONCURRENCY", "1"))
+# "process", "thread" o "false" (vedi sopra)
+JOB_WORKERS_EMBEDDED = os.getenv("JOB_WORKERS_EMBEDDED", "process").lower()
+if JOB_WORKERS_EMBEDDED in ("1", "true", "yes"):
+    # valore booleano delle versioni precedenti: worker in thread
+    JOB_WORKERS_EMBEDDED = "thread"
+# directory condivisa per i file allegati ai job (es. upload base64), in modo che il payload resti piccolo
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", "/tmp/nlp_core_jobs")
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+ERROR = "ERROR"
+CANCELLED = "CANCELLED"
+TERMINAL_STATUSES = (DONE, ERROR, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Sollevata dentro un handler quando è stata richiesta la cancellazione del job."""
+
+
+class JobHandler:
+    def __init__(self, job_type: str, fn: Callable[..., Any], max_concurrency: int, max_attempts: int):
+        self.job_type = job_type
+        self.fn = fn
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+
+
+_handlers: Dict[str, JobHandler] = {}
+_indexes_ready = False
+
+
+def register_job_handler(job_type: str,
+                         fn: Callable[..., Any],
+                         max_concurrency: Optional[int] = None,
+                         max_attempts: int = 1) -> None:
+    """
+    Registra l'handler di un tipo di job. `max_concurrency` (sovrascrivibile con
+    `JOB_CONCURRENCY_<TIPO>`) limita i job di quel tipo in esecuzione contemporanea.
+    """
+    env_value = os.getenv(f"JOB_CONCURRENCY_{job_type.upper()}")
+    if env_value:
+        max_concurrency = int(env_value)
+    _handlers[job_type] = JobHandler(job_type, fn, max_concurrency or 1, max_attempts)
+
+
+def _collection():
+    return get_mongo_client()[JOBS_DB_NAME][JOBS_COLLECTION_NAME]
+
+
+def _async_collection():
+    return get_async_mongo_client()[JOBS_DB_NAME][JOBS_COLLECTION_NAME]
+
+
+def _outputs_collection():
+    return get_mongo_client()[JOBS_DB_NAME][JOB_OUTPUTS_COLLECTION_NAME]
+
+
+def _async_outputs_collection():
+    return get_async_mongo_client()[JOBS_DB_NAME][JOB_OUTPUTS_COLLECTION_NAME]
+
+
+def ensure_job_indexes() -> None:
+    """Indice univoco su `id`, indice per il claim e TTL sui job terminati e sui loro output."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection = _collection()
+    collection.create_index([("id", ASCENDING)], unique=True)
+    collection.create_index([("status", ASCENDING), ("type", ASCENDING), ("priority", DESCENDING), ("created_at", ASCENDING)])
+    collection.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+    outputs = _outputs_collection()
+    outputs.create_index([("job_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+    outputs.create_index([("created_at", ASCENDING)], expireAfterSeconds=JOB_TTL_SECONDS)
+    _indexes_ready = True
+
+
+def new_job_files_dir() -> str:
+    """Crea una directory nuova (mai condivisa con altri job) per i file di input di un job."""
+    path = os.path.join(JOB_FILES_DIR, "files", uuid.uuid4().hex)
+    os.makedirs(path)
+    return path
+
+
+def remove_job_files(files_dir: Optional[str]) -> None:
+    """Rimuove i file di input di un job (solo directory create da `new_job_files_dir`)."""
+    if not files_dir:
+        return
+    root = os.path.join(os.path.abspath(JOB_FILES_DIR), "files")
+    if os.path.dirname(os.path.abspath(files_dir)) == root:
+        shutil.rmtree(files_dir, ignore_errors=True)
+
+
+def _this_node() -> Dict[str, Any]:
+    return {"host": socket.gethostname()}
+
+
+def _this_process() -> Dict[str, Any]:
+    return {"host": socket.gethostname(), "pid": os.getpid()}
+
+
+def new_job_document(job_type: str,
+                     payload: Dict[str, Any],
+                     job_id: Optional[str] = None,
+                     endpoint: Optional[str] = None,
+                     max_attempts: Optional[int] = None,
+                     priority: int = 0,
+                     pin_to_node: bool = False,
+                     pin_to_process: bool = False,
+                     files_dir: Optional[str] = None) -> Dict[str, Any]:
+    if job_type not in _handlers:
+        raise ValueError(f"No handler registered for job type '{job_type}'")
+    now = datetime.utcnow()
+    return {
+        "id": job_id or str(uuid.uuid4()),
+        "type": job_type,
+        "endpoint": endpoint,
+        "payload": payload,
+        "status": PENDING,
+        "priority": priority,
+        "attempts": 0,
+        "max_attempts": max_attempts or _handlers[job_type].max_attempts,
+        "progress": None,
+        "cancel_requested": False,
+        "affinity": _this_process() if pin_to_process else _this_node() if pin_to_node else None,
+        "files_dir": files_dir,
+        "worker": None,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "not_before": None,
+        "lease_until": None,
+        "expire_at": None,
+        "result": None,
+        "error": None,
+    }
+
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+    """Accoda un job (versione sincrona) e restituisce il documento creato."""
+    ensure_job_indexes()
+    job = new_job_document(job_type, payload, **kwargs)
+    _collection().insert_one(dict(job))
+    if kwargs.get("pin_to_process"):
+        start_process_job_worker()
+    return job
+
+
+async def aenqueue_job(job_type: str, payload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+    """Accoda un job dall'event loop."""
+    job = new_job_document(job_type, payload, **kwargs)
+    await _async_collection().insert_one(dict(job))
+    if kwargs.get("pin_to_process"):
+        await run_blocking("mongo", start_process_job_worker)
+    return job
+
+
+async def aget_job(job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+    """Stato di un job (lookup sull'indice `id`); `include_result=False` esclude il risultato."""
+    projection = {"_id": 0} if include_result else {"_id": 0, "result": 0}
+    return await _async_collection().find_one({"id": job_id}, projection)
+
+
+async def aget_job_outputs(job_id: str, skip: int = 0, limit: int = 100) -> List[Any]:
+    """Pagina degli output salvati dal job con `JobContext.add_outputs`, nell'ordine di inserimento."""
+    rows = await _async_outputs_collection().find({"job_id": job_id}, {"_id": 0, "item": 1}) \
+        .sort("seq", ASCENDING).skip(skip).limit(limit).to_list()
+    return [row["item"] for row in rows]
+
+
+async def acount_job_outputs(job_id: str) -> int:
+    return await _async_outputs_collection().count_documents({"job_id": job_id})
+
+
+async def alist_jobs(job_type: Optional[str] = None,
+                     status: Optional[str] = None,
+                     skip: int = 0,
+                     limit: int = 50) -> List[Dict[str, Any]]:
+    query: Dict[str, Any] = {}
+    if job_type:
+        query["type"] = job_type
+    if status:
+        query["status"] = status
+    return await _async_collection().find(query, {"_id": 0, "result": 0, "payload": 0}) \
+        .sort("created_at", DESCENDING).skip(skip).limit(limit).to_list()
+
+
+async def acancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cancella un job: se è ancora in coda passa subito a CANCELLED, se è in
+    esecuzione viene richiesta la cancellazione all'handler.
+    """
+    now = datetime.utcnow()
+    collection = _async_collection()
+    job = await collection.find_one_and_update(
+        {"id": job_id, "status": PENDING},
+        {"$set": {"status": CANCELLED, "cancel_requested": True, "finished_at": now, "updated_at": now,
+                  "expire_at": now + timedelta(seconds=JOB_TTL_SECONDS)}},
+        projection={"_id": 0, "result": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        # il job non partirà più: i suoi file di input non servono
+        await run_blocking("mongo", remove_job_files, job.get("files_dir"))
+        return job
+    return await collection.find_one_and_update(
+        {"id": job_id, "status": RUNNING},
+        {"$set": {"cancel_requested": True, "updated_at": now}},
+        projection={"_id": 0, "result": 0},
+        return_document=ReturnDocument.AFTER,
+    ) or await aget_job(job_id, include_result=False)
+
+
+async def ajob_stats() -> Dict[str, Any]:
+    """Numero di job per tipo e stato."""
+    cursor = await _async_collection().aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+    ])
+    stats: Dict[str, Dict[str, int]] = {}
+    async for row in cursor:
+        stats.setdefault(row["_id"]["type"], {})[row["_id"]["status"]] = row["count"]
+    return stats
+
+
+class JobContext:
+    """Passato all'handler: id del job, aggiornamento del progresso e controllo della cancellazione."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.id = job["id"]
+        self.type = job["type"]
+        self.attempt = job["attempts"]
+        self._cancelled = False
+        self._output_seq = 0
+
+    def set_progress(self, current: Optional[int] = None, total: Optional[int] = None,
+                     message: Optional[str] = None, **extra: Any) -> None:
+        """Aggiorna il progresso del job; solleva `JobCancelled` se ne è stata richiesta la cancellazione."""
+        progress = {"current": current, "total": total, "message": message, **extra}
+        job = _collection().find_one_and_update(
+            {"id": self.id},
+            {"$set": {"progress": progress, "updated_at": datetime.utcnow()}},
+            projection={"cancel_requested": 1},
+        )
+        if job and job.get("cancel_requested"):
+            self._cancelled = True
+        self.check_cancelled()
+
+    def add_outputs(self, items: List[Any]) -> None:
+        """Salva un blocco di output del job in `job_outputs` (uno per documento, ordinati per `seq`)."""
+        if not items:
+            return
+        now = datetime.utcnow()
+        _outputs_collection().insert_many([
+            {"job_id": self.id, "seq": self._output_seq + i, "item": item, "created_at": now}
+            for i, item in enumerate(items)
+        ])
+        self._output_seq += len(items)
+
+    def clear_outputs(self) -> None:
+        """Rimuove gli output di un tentativo precedente (il job riparte da zero)."""
+        _outputs_collection().delete_many({"job_id": self.id})
+        self._output_seq = 0
+
+    def is_cancelled(self) -> bool:
+        if not self._cancelled:
+            job = _collection().find_one({"id": self.id}, {"cancel_requested": 1})
+            self._cancelled = bool(job and job.get("cancel_requested"))
+        return self._cancelled
+
+    def check_cancelled(self) -> None:
+        if self._cancelled or self.is_cancelled():
+            raise JobCancelled(self.id)
+
+
+class JobWorker:
+    """
+    Pool di thread che preleva i job dalla coda Mongo e li esegue.
+
+    Il limite per tipo è esatto all'interno del processo (semafori) e, tra
+    processi diversi, viene rispettato controllando i job RUNNING prima del claim.
+    Con `process_only` preleva solo i job legati al processo corrente.
+    """
+
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL,
+                 process_only: bool = False):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.process_only = process_only
+        self._start_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+        self._last_recovery = 0.0
+        self.stats = {"claimed": 0, "done": 0, "failed": 0, "retried": 0, "cancelled": 0}
+
+    # ------------------------------------------------------------------ #
+    # Lifecycle                                                          #
+    # ------------------------------------------------------------------ #
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._threads:
+                return
+            ensure_job_indexes()
+            self._stop.clear()
+            prefix = "process-job-worker" if self.process_only else "job-worker"
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._loop, name=f"{prefix}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._start_lock:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join(timeout=timeout)
+            self._threads = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "process_only": self.process_only,
+            "running": len(self._threads),
+            "handlers": {name: {"max_concurrency": h.max_concurrency, "max_attempts": h.max_attempts}
+                         for name, h in _handlers.items()},
+            **self.stats,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Claim / execution                                                  #
+    # ------------------------------------------------------------------ #
+
+    def _slot(self, job_type: str) -> threading.BoundedSemaphore:
+        with self._slots_lock:
+            if job_type not in self._slots:
+                self._slots[job_type] = threading.BoundedSemaphore(_handlers[job_type].max_concurrency)
+            return self._slots[job_type]
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        collection = _collection()
+        for job_type, handler in list(_handlers.items()):
+            slot = self._slot(job_type)
+            if not slot.acquire(blocking=False):
+                continue
+            claimed = None
+            try:
+                if collection.count_documents({"type": job_type, "status": RUNNING}) >= handler.max_concurrency:
+                    continue
+                now = datetime.utcnow()
+                me = _this_process()
+                affinities = [{"affinity": me}] if self.process_only else \
+                    [{"affinity": None}, {"affinity": me}, {"affinity": _this_node()}]
+                claimed = collection.find_one_and_update(
+                    {"type": job_type,
+                     "status": PENDING,
+                     "$and": [{"$or": [{"not_before": None}, {"not_before": {"$lte": now}}]},
+                              {"$or": affinities}]},
+                    {"$set": {"status": RUNNING, "worker": me, "started_at": now, "updated_at": now,
+                              "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                     "$inc": {"attempts": 1}},
+                    sort=[("priority", DESCENDING), ("created_at", ASCENDING)],
+                    return_document=ReturnDocument.AFTER,
+                )
+                if claimed:
+                    self.stats["claimed"] += 1
+                    return claimed
+            finally:
+                if claimed is None:
+                    slot.release()
+        return None
+
+    def _renew_lease(self, job_id: str, done: threading.Event) -> None:
+        while not done.wait(JOB_LEASE_SECONDS / 3):
+            _collection().update_one(
+                {"id": job_id, "status": RUNNING},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}},
+            )
+
+    def _finish(self, job: Dict[str, Any], status: str, result: Any = None, error: Optional[str] = None) -> None:
+        now = datetime.utcnow()
+        _collection().update_one(
+            {"id": job["id"]},
+            {"$set": {"status": status, "result": result, "error": error, "finished_at": now, "updated_at": now,
+                      "lease_until": None, "expire_at": now + timedelta(seconds=JOB_TTL_SECONDS)}},
+        )
+        remove_job_files(job.get("files_dir"))
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        handler = _handlers[job["type"]]
+        done = threading.Event()
+        lease_thread = threading.Thread(target=self._renew_lease, args=(job["id"], done), daemon=True)
+        lease_thread.start()
+        try:
+            context = JobContext(job)
+            context.check_cancelled()
+            if job["attempts"] > 1:
+                context.clear_outputs()
+            result = handler.fn(context, **(job.get("payload") or {}))
+            self._finish(job, DONE, result=result)
+            self.stats["done"] += 1
+        except JobCancelled:
+            self._finish(job, CANCELLED, error="Cancelled")
+            self.stats["cancelled"] += 1
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if job["attempts"] < job.get("max_attempts", 1):
+                backoff = JOB_RETRY_BACKOFF_SECONDS * (2 ** (job["attempts"] - 1))
+                _collection().update_one(
+                    {"id": job["id"]},
+                    {"$set": {"status": PENDING, "error": error, "worker": None, "lease_until": None,
+                              "updated_at": datetime.utcnow(),
+                              "not_before": datetime.utcnow() + timedelta(seconds=backoff)}},
+                )
+                self.stats["retried"] += 1
+            else:
+                traceback.print_exc()
+                self._finish(job, ERROR, error=error)
+                self.stats["failed"] += 1
+        finally:
+            done.set()
+            self._slot(job["type"]).release()
+
+    def recover_stale_jobs(self) -> None:
+        """
+        Rimette in coda i job il cui lease è scaduto (worker terminato) e
+        libera l'affinità dei job legati a processi non più attivi su questo host.
+        """
+        collection = _collection()
+        now = datetime.utcnow()
+        for job in collection.find({"status": RUNNING, "lease_until": {"$lt": now}},
+                                   {"id": 1, "attempts": 1, "max_attempts": 1, "files_dir": 1}):
+            if job.get("attempts", 0) < job.get("max_attempts", 1):
+                collection.update_one({"id": job["id"], "status": RUNNING, "lease_until": {"$lt": now}},
+                                      {"$set": {"status": PENDING, "worker": None, "lease_until": None,
+                                                "updated_at": now}})
+            else:
+                lost = collection.update_one({"id": job["id"], "status": RUNNING, "lease_until": {"$lt": now}},
+                                             {"$set": {"status": ERROR, "error": "Worker lost", "finished_at": now,
+                                                       "updated_at": now, "lease_until": None,
+                                                       "expire_at": now + timedelta(seconds=JOB_TTL_SECONDS)}})
+                if lost.modified_count:
+                    remove_job_files(job.get("files_dir"))
+        hostname = socket.gethostname()
+        for job in collection.find({"status": PENDING, "affinity.host": hostname, "affinity.pid": {"$exists": True}},
+                                   {"id": 1, "affinity": 1}):
+            if not _pid_alive(int(job["affinity"]["pid"])):
+                collection.update_one({"id": job["id"], "status": PENDING}, {"$set": {"affinity": None}})
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_recovery > JOB_LEASE_SECONDS:
+                    self._last_recovery = time.monotonic()
+                    self.recover_stale_jobs()
+                job = self._claim()
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+
+class JobWorkerProcess:
+    """
+    Worker dei job in un processo figlio (`python -m jobs.worker`), uno per nodo: lo avvia il processo dell'API
+    che ottiene il lock `JOB_FILES_DIR/worker.lock`; gli altri processi riprovano ogni `check_interval` secondi
+    e subentrano se quel processo termina (il figlio termina con il processo che lo ha avviato, vedi jobs/worker.py).
+    """
+
+    def __init__(self, lock_path: str = os.path.join(JOB_FILES_DIR, "worker.lock"),
+                 check_interval: float = JOB_POLL_INTERVAL * 5):
+        self.lock_path = lock_path
+        self.check_interval = check_interval
+        self._process: Optional[subprocess.Popen] = None
+        self._lock_fh = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.restarts = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, name="job-worker-process", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 40.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        running = self._process is not None and self._process.poll() is None
+        return {"owner": self._lock_fh is not None,
+                "pid": self._process.pid if running else None,
+                "restarts": self.restarts}
+
+    def _acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_fh = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_fh.close()
+            return False
+        self._lock_fh = lock_fh
+        return True
+
+    def _supervise(self) -> None:
+        try:
+            while not self._stop.is_set():
+                if self._lock_fh is None and not self._acquire():
+                    self._stop.wait(self.check_interval)
+                    continue
+                if self._process is None or self._process.poll() is not None:
+                    if self._process is not None:
+                        print(f"job worker process exited with code {self._process.returncode}, restarting")
+                        self.restarts += 1
+                    self._process = subprocess.Popen([sys.executable, "-m", "jobs.worker"],
+                                                     env={**os.environ, "JOB_WORKER_PARENT_PID": str(os.getpid())})
+                self._stop.wait(self.check_interval)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._terminate()
+
+    def _terminate(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            # SIGTERM: il worker smette di prelevare job; quelli non terminati tornano in coda alla scadenza del lease
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+        if self._lock_fh is not None:
+            fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+            self._lock_fh.close()
+            self._lock_fh = None
+
+
+job_worker = JobWorker()
+job_worker_process = JobWorkerProcess()
+# job legati a questo processo (es. store solo in memoria), che il worker di nodo non può eseguire
+process_job_worker = JobWorker(concurrency=JOB_PROCESS_WORKER_CONCURRENCY, process_only=True)
+
+
+def start_process_job_worker() -> None:
+    """Avvia (una volta) `process_job_worker`, salvo che `job_worker` giri già in questo processo."""
+    if JOB_WORKERS_EMBEDDED != "thread":
+        process_job_worker.start()
+
@@ -0,0 +1,113 @@
+"""
+lazy_imports.py
+
+Import differiti per le dipendenze pesanti (cv2, unstructured, pymupdf4llm,
+langchain_experimental, matplotlib...).
+
+`LazyClassMap` sostituisce le mappe nome -> classe dei router (loader, tool,
+chain): contiene solo i percorsi `"modulo:attributo"` e importa il modulo la
+prima volta che la voce viene richiesta. `in`, `keys()` e `len()` non
+importano nulla.
+
+Ogni import (router all'avvio, voce lazy al primo uso) viene misurato e
+registrato in `import_report`, esposto da `/runtime/imports`.
+"""
+
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ImportReport:
+    """Tempi di import registrati dal processo (avvio e import lazy)."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, target: str, seconds: float, phase: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.entries.append({
+                "name": name,
+                "target": target,
+                "seconds": round(seconds, 4),
+                "phase": phase,
+                "since_start_s": round(time.perf_counter() - self.started_at, 4),
+                "error": error,
+            })
+
+    def get_report(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self.entries)
+        startup = [e for e in entries if e["phase"] == "startup"]
+        return {
+            "startup_import_s": round(sum(e["seconds"] for e in startup), 4),
+            "lazy_import_s": round(sum(e["seconds"] for e in entries if e["phase"] == "lazy"), 4),
+            "entries": sorted(entries, key=lambda e: e["seconds"], reverse=True),
+        }
+
+
+import_report = ImportReport()
+
+
+def import_target(target: str) -> Any:
+    """Importa `"pkg.modulo:Attributo"` (o solo `"pkg.modulo"`) e restituisce l'oggetto."""
+    module_name, _, attribute = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+def timed_import(name: str, target: str, phase: str = "startup") -> Any:
+    """Come `import_target`, ma registra la durata in `import_report`."""
+    started = time.perf_counter()
+    try:
+        obj = import_target(target)
+    except Exception as e:
+        import_report.record(name, target, time.perf_counter() - started, phase, error=f"{type(e).__name__}: {e}")
+        raise
+    import_report.record(name, target, time.perf_counter() - started, phase)
+    return obj
+
+
+class LazyClassMap(Mapping):
+    """
+    Mappa nome -> oggetto che importa il modulo solo al primo accesso alla voce.
+
+        available_loaders = LazyClassMap({
+            "TextLoader": "langchain_community.document_loaders.text:TextLoader",
+            ...
+        })
+        available_loaders["TextLoader"]   # import qui, poi in cache
+    """
+
+    def __init__(self, targets: Dict[str, str]):
+        self._targets = dict(targets)
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self._loaded:
+            return self._loaded[name]
+        target = self._targets[name]
+        with self._lock:
+            if name not in self._loaded:
+                self._loaded[name] = timed_import(name, target, phase="lazy")
+        return self._loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._targets)
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._targets
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def target(self, name: str) -> str:
+        return self._targets[name]
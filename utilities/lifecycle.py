@@ -0,0 +1,248 @@
+"""
+lifecycle.py
+
+Budget di memoria per gli oggetti caricati nel worker (vector store, LLM,
+chain), con espulsione dei meno usati di recente (LRU).
+
+Il lazy-load (`object_registry.get_or_load`) aggiunge oggetti ai dizionari
+in memoria (`vector_stores`, `ModelManager.models`, `ChainManager.chains`)
+senza mai toglierli: un worker che serve centinaia di store per contesto
+cresce fino all'OOM. Ogni tipo di oggetto si registra con `register_kind`
+indicando il proprio dizionario, come scaricare un oggetto (per i vector
+store: snapshot se modificato, poi offload) e come stimarne l'occupazione.
+
+Il registro segna ogni accesso (`touch`), ogni caricamento (`loaded`) e
+ogni scrittura che può far crescere un oggetto (`written`, es. le aggiunte
+a un vector store); dopo un caricamento o una scrittura, se la somma delle
+occupazioni stimate supera il budget, vengono scaricati gli oggetti usati
+meno di recente finché si rientra. Dopo le scritture il controllo avviene
+al più ogni `OBJECT_BUDGET_WRITE_CHECK_SECONDS`, così un flusso di piccole
+aggiunte non ricalcola le stime a ogni richiesta. Non vengono mai scaricati:
+
+- gli oggetti fissati sul nodo (`/runtime/pin`, salvati nel registro di
+  nodo e letti con `set_pin_source`), nel worker (`pin`) o con `OBJECT_PINNED`;
+- gli oggetti in uso da operazioni lunghe (`hold`, es. i job di import);
+- l'oggetto appena caricato.
+
+Le stime vengono ricalcolate a ogni controllo del budget (per i vector store
+da `memory_usage()` o dal numero di documenti). Un oggetto scaricato viene
+ricaricato dalla configurazione al successivo accesso; un oggetto ancora
+referenziato altrove (es. lo store usato da una chain caricata) resta in
+memoria finché quel riferimento esiste.
+
+Configurazione via env:
+
+    OBJECT_MEMORY_BUDGET_MB       (default 0 = nessun limite)
+    OBJECT_DEFAULT_FOOTPRINT_MB   (default 16; stima per gli oggetti senza stima propria)
+    OBJECT_PINNED                 (es. "vector_store:faq_store,llm:gpt-4o"; mai scaricati)
+    OBJECT_BUDGET_WRITE_CHECK_SECONDS (default 1; intervallo minimo dei controlli dopo le scritture)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+OBJECT_MEMORY_BUDGET_MB = float(os.getenv("OBJECT_MEMORY_BUDGET_MB", "0"))
+OBJECT_DEFAULT_FOOTPRINT_MB = float(os.getenv("OBJECT_DEFAULT_FOOTPRINT_MB", "16"))
+OBJECT_PINNED = [item.strip() for item in os.getenv("OBJECT_PINNED", "").split(",") if item.strip()]
+OBJECT_BUDGET_WRITE_CHECK_SECONDS = float(os.getenv("OBJECT_BUDGET_WRITE_CHECK_SECONDS", "1"))
+
+_MB = 1024 * 1024
+
+
+class _Kind:
+    def __init__(self,
+                 local: Dict[str, Any],
+                 evict: Callable[[str], None],
+                 estimate: Optional[Callable[[Any], Optional[int]]]):
+        self.local = local
+        self.evict = evict
+        self.estimate = estimate
+
+
+class LifecycleManager:
+    """Uso recente, occupazione stimata ed espulsione LRU degli oggetti caricati nel worker."""
+
+    def __init__(self,
+                 budget_bytes: int = int(OBJECT_MEMORY_BUDGET_MB * _MB),
+                 default_footprint: int = int(OBJECT_DEFAULT_FOOTPRINT_MB * _MB),
+                 pinned: Optional[List[str]] = None,
+                 write_check_interval: float = OBJECT_BUDGET_WRITE_CHECK_SECONDS):
+        self.budget_bytes = budget_bytes
+        self.write_check_interval = write_check_interval
+        self.default_footprint = default_footprint
+        self._kinds: Dict[str, _Kind] = {}
+        # "<kind>:<object_id>" -> ultimo accesso, dal meno recente
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._pinned = set(pinned if pinned is not None else OBJECT_PINNED)
+        self._held: Dict[str, int] = {}
+        # oggetti fissati sul nodo (`set_pin_source`)
+        self._pin_source: Optional[Callable[[], List[str]]] = None
+        self._last_write_check = 0.0
+        self._lock = threading.Lock()
+        # un solo controllo del budget alla volta (le espulsioni possono scrivere snapshot)
+        self._enforcing = threading.Lock()
+        self.stats: Dict[str, Any] = {"evictions": 0, "evicted_bytes": 0, "eviction_errors": 0, "by_kind": {}}
+
+    @staticmethod
+    def _key(kind: str, object_id: str) -> str:
+        return f"{kind}:{object_id}"
+
+    def register_kind(self,
+                      kind: str,
+                      local: Dict[str, Any],
+                      evict: Callable[[str], None],
+                      estimate: Optional[Callable[[Any], Optional[int]]] = None) -> None:
+        """
+        Registra un tipo di oggetto: `local` è il dizionario id -> istanza del worker, `evict(object_id)`
+        scarica l'oggetto, `estimate(instance)` ne stima i byte (None = stima di default).
+        """
+        self._kinds[kind] = _Kind(local, evict, estimate)
+
+    def touch(self, kind: str, object_id: str) -> None:
+        """Segna l'accesso all'oggetto."""
+        key = self._key(kind, object_id)
+        with self._lock:
+            self._last_used[key] = time.monotonic()
+            self._last_used.move_to_end(key)
+
+    def loaded(self, kind: str, object_id: str) -> None:
+        """Segna il caricamento dell'oggetto e, se il budget è superato, scarica i meno usati di recente."""
+        self.touch(kind, object_id)
+        self.enforce(protect=self._key(kind, object_id))
+
+    def written(self, kind: str, object_id: str) -> None:
+        """Segna una scrittura che può aver fatto crescere l'oggetto e ricontrolla il budget (vedi sopra)."""
+        self.touch(kind, object_id)
+        if self.budget_bytes <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_write_check < self.write_check_interval:
+                return
+            self._last_write_check = now
+        self.enforce(protect=self._key(kind, object_id))
+
+    def set_pin_source(self, source: Callable[[], List[str]]) -> None:
+        """`source()` restituisce le chiavi "<kind>:<object_id>" fissate sul nodo, lette a ogni controllo del budget."""
+        self._pin_source = source
+
+    def _pinned_keys(self) -> set:
+        with self._lock:
+            pinned = set(self._pinned)
+        if self._pin_source is not None:
+            try:
+                pinned.update(self._pin_source())
+            except Exception as exc:
+                print(f"pinned objects read error: {exc}")
+        return pinned
+
+    def pin(self, kind: str, object_id: str) -> None:
+        with self._lock:
+            self._pinned.add(self._key(kind, object_id))
+
+    def unpin(self, kind: str, object_id: str) -> None:
+        with self._lock:
+            self._pinned.discard(self._key(kind, object_id))
+
+    @contextmanager
+    def hold(self, kind: str, object_id: str) -> Iterator[None]:
+        """L'oggetto non viene scaricato durante il blocco (operazioni lunghe che ne tengono l'istanza)."""
+        key = self._key(kind, object_id)
+        with self._lock:
+            self._held[key] = self._held.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held[key] -= 1
+                if not self._held[key]:
+                    del self._held[key]
+            self.touch(kind, object_id)
+
+    def _estimate(self, kind: str, instance: Any) -> int:
+        estimate = self._kinds[kind].estimate
+        footprint = None
+        if estimate is not None:
+            try:
+                footprint = estimate(instance)
+            except Exception as exc:
+                print(f"memory estimate error for {kind}: {exc}")
+        return int(footprint) if footprint is not None else self.default_footprint
+
+    def _loaded_objects(self) -> List[Tuple[str, str, Any]]:
+        """(kind, object_id, istanza) degli oggetti in memoria, dal meno usato di recente."""
+        with self._lock:
+            keys = list(self._last_used)
+        objects = []
+        for key in keys:
+            kind, object_id = key.split(":", 1)
+            instance = self._kinds[kind].local.get(object_id) if kind in self._kinds else None
+            if instance is None:
+                # scaricato da un altro percorso (endpoint di offload/unload)
+                with self._lock:
+                    self._last_used.pop(key, None)
+                continue
+            objects.append((kind, object_id, instance))
+        return objects
+
+    def enforce(self, protect: Optional[str] = None) -> None:
+        """Scarica gli oggetti meno usati di recente finché l'occupazione stimata rientra nel budget."""
+        if self.budget_bytes <= 0:
+            return
+        with self._enforcing:
+            objects = self._loaded_objects()
+            footprints = {self._key(kind, object_id): self._estimate(kind, instance)
+                          for kind, object_id, instance in objects}
+            pinned = self._pinned_keys()
+            with self._lock:
+                held = set(self._held)
+            used = sum(footprints.values())
+            for kind, object_id, _ in objects:
+                if used <= self.budget_bytes:
+                    break
+                key = self._key(kind, object_id)
+                if key == protect or key in pinned or key in held:
+                    continue
+                try:
+                    self._kinds[kind].evict(object_id)
+                except Exception as exc:
+                    self.stats["eviction_errors"] += 1
+                    print(f"eviction error for {key}: {exc}")
+                    continue
+                used -= footprints[key]
+                with self._lock:
+                    self._last_used.pop(key, None)
+                    self.stats["evictions"] += 1
+                    self.stats["evicted_bytes"] += footprints[key]
+                    self.stats["by_kind"][kind] = self.stats["by_kind"].get(kind, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        objects = self._loaded_objects()
+        footprints = {self._key(kind, object_id): self._estimate(kind, instance)
+                      for kind, object_id, instance in objects}
+        pinned = self._pinned_keys()
+        with self._lock:
+            entries = [{
+                "kind": kind,
+                "object_id": object_id,
+                "footprint_bytes": footprints[self._key(kind, object_id)],
+                "idle_seconds": now - self._last_used.get(self._key(kind, object_id), now),
+                "pinned": self._key(kind, object_id) in pinned,
+                "held": self._key(kind, object_id) in self._held,
+            } for kind, object_id, _ in objects]
+            return {
+                "budget_bytes": self.budget_bytes,
+                "estimated_bytes": sum(footprints.values()),
+                "objects": entries,
+                "pinned": sorted(pinned),
+                **self.stats,
+                "by_kind": dict(self.stats["by_kind"]),
+            }
+
+
+lifecycle_manager = LifecycleManager()
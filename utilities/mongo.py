@@ -0,0 +1,236 @@
+"""
+mongo.py
+
+Livello di accesso a MongoDB condiviso da tutti i router e i manager.
+
+Prima ogni modulo creava il proprio `MongoClient` all'import, con più di dieci
+connection pool per worker. Ora esistono un solo client sincrono e un solo
+client async (pymongo `AsyncMongoClient`) per processo, configurati via env:
+
+    MONGO_CONNECTION_STRING              (default "localhost")
+    MONGO_MAX_POOL_SIZE                  (default 50)
+    MONGO_MIN_POOL_SIZE                  (default 0)
+    MONGO_MAX_IDLE_TIME_MS               (default 60000)
+    MONGO_CONNECT_TIMEOUT_MS             (default 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS    (default 10000)
+    MONGO_SOCKET_TIMEOUT_MS              (default nessuno)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          (default nessuno)
+    MONGO_READ_PREFERENCE                (default "primary", es. "secondaryPreferred")
+    MONGO_CLIENT_BACKEND                 ("pymongo" | "mongomock", default "pymongo")
+
+- Gli endpoint async usano `get_async_mongo_client()` e fanno `await` delle
+  operazioni senza passare dai thread pool.
+- I manager e il codice sincrono (eseguito nei pool di `utilities.executors`)
+  usano `get_mongo_client()`.
+
+Per i test: `MONGO_CLIENT_BACKEND=mongomock` (oppure `set_mongo_clients(...)`
+prima di importare i router) usa mongomock; il client async è allora un
+adattatore che esegue le chiamate sincrone nel pool "mongo".
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from pymongo import AsyncMongoClient, MongoClient
+
+MONGO_CONNECTION_STRING = os.getenv("MONGO_CONNECTION_STRING", "localhost")
+MONGO_CLIENT_BACKEND = os.getenv("MONGO_CLIENT_BACKEND", "pymongo")
+
+_sync_client: Optional[Any] = None
+_async_client: Optional[Any] = None
+_owner_pid: Optional[int] = None
+
+
+def _int_env(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Opzioni comuni (pool, timeout, read preference) per i client pymongo."""
+    options = {
+        "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS", 60000),
+        "connectTimeoutMS": _int_env("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _int_env("MONGO_SOCKET_TIMEOUT_MS", None),
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+        "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _reset_after_fork() -> None:
+    # i client pymongo non sono fork-safe: un processo figlio ricrea i propri
+    global _sync_client, _async_client, _owner_pid
+    if _owner_pid is not None and _owner_pid != os.getpid():
+        _sync_client = None
+        _async_client = None
+    _owner_pid = os.getpid()
+
+
+def get_mongo_client() -> Any:
+    """Client sincrono condiviso dal processo (manager, job, codice nei thread pool)."""
+    global _sync_client
+    _reset_after_fork()
+    if _sync_client is None:
+        if MONGO_CLIENT_BACKEND == "mongomock":
+            import mongomock
+            _sync_client = mongomock.MongoClient()
+        else:
+            _sync_client = MongoClient(MONGO_CONNECTION_STRING, **mongo_client_options())
+    return _sync_client
+
+
+def get_async_mongo_client() -> Any:
+    """Client async condiviso dal processo, da usare negli endpoint `async def`."""
+    global _async_client
+    _reset_after_fork()
+    if _async_client is None:
+        if MONGO_CLIENT_BACKEND == "mongomock":
+            _async_client = AsyncClientAdapter(get_mongo_client())
+        else:
+            _async_client = AsyncMongoClient(MONGO_CONNECTION_STRING, connect=False, **mongo_client_options())
+    return _async_client
+
+
+def set_mongo_clients(sync_client: Any, async_client: Optional[Any] = None) -> None:
+    """
+    Sostituisce i client condivisi (test, mongod locale...). Se `async_client`
+    non è indicato viene usato un adattatore sopra `sync_client`.
+    """
+    global _sync_client, _async_client, _owner_pid
+    _sync_client = sync_client
+    _async_client = async_client if async_client is not None else AsyncClientAdapter(sync_client)
+    _owner_pid = os.getpid()
+
+
+async def close_mongo_clients() -> None:
+    """Chiude i client condivisi (shutdown dell'app)."""
+    global _sync_client, _async_client
+    if isinstance(_async_client, AsyncMongoClient):
+        await _async_client.close()
+    if _sync_client is not None and hasattr(_sync_client, "close"):
+        _sync_client.close()
+    _sync_client = None
+    _async_client = None
+
+
+########################################################################################################################
+# Adattatore async per client sincroni (mongomock)
+########################################################################################################################
+
+# metodi che in pymongo async restituiscono un cursore in modo sincrono / tramite await
+_CURSOR_METHODS = {"find", "find_raw_batches"}
+_AWAITABLE_CURSOR_METHODS = {"aggregate", "aggregate_raw_batches", "list_indexes", "list_search_indexes"}
+
+
+async def _run_mongo(fn, *args, **kwargs):
+    from utilities.executors import run_blocking
+    return await run_blocking("mongo", fn, *args, **kwargs)
+
+
+class AsyncCursorAdapter:
+    """Espone l'interfaccia di `AsyncCursor` sopra un cursore sincrono."""
+
+    def __init__(self, cursor: Any):
+        self._cursor = cursor
+        self._buffer: Optional[list] = None
+
+    def __getattr__(self, name: str) -> Any:
+        # skip/limit/sort/... non fanno I/O: vengono applicati al cursore sincrono
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._cursor else result
+        return chained
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        if length:
+            return await _run_mongo(lambda: [doc for _, doc in zip(range(length), self._cursor)])
+        return await _run_mongo(list, self._cursor)
+
+    async def next(self) -> Any:
+        if self._buffer is None:
+            self._buffer = await self.to_list()
+        if not self._buffer:
+            raise StopAsyncIteration
+        return self._buffer.pop(0)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.next()
+
+
+class AsyncCollectionAdapter:
+    def __init__(self, collection: Any):
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+        if name in _CURSOR_METHODS:
+            return lambda *args, **kwargs: AsyncCursorAdapter(attr(*args, **kwargs))
+        if name in _AWAITABLE_CURSOR_METHODS:
+            async def cursor_method(*args, **kwargs):
+                return AsyncCursorAdapter(await _run_mongo(attr, *args, **kwargs))
+            return cursor_method
+
+        async def method(*args, **kwargs):
+            return await _run_mongo(attr, *args, **kwargs)
+        return method
+
+    def __getitem__(self, name: str) -> "AsyncCollectionAdapter":
+        return AsyncCollectionAdapter(self._collection[name])
+
+
+class AsyncDatabaseAdapter:
+    def __init__(self, database: Any):
+        self._database = database
+
+    def __getitem__(self, name: str) -> AsyncCollectionAdapter:
+        return AsyncCollectionAdapter(self._database[name])
+
+    def get_collection(self, name: str, **kwargs: Any) -> AsyncCollectionAdapter:
+        return AsyncCollectionAdapter(self._database.get_collection(name, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._database, name)
+        if hasattr(attr, "find_one"):
+            # accesso alla collezione come attributo (`db.configs`)
+            return AsyncCollectionAdapter(attr)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await _run_mongo(attr, *args, **kwargs)
+        return method
+
+
+class AsyncClientAdapter:
+    """
+    Client "async" sopra un client sincrono (es. `mongomock.MongoClient`): le
+    operazioni vengono eseguite nel pool "mongo" con la stessa interfaccia
+    di `AsyncMongoClient` usata dai router.
+    """
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def __getitem__(self, name: str) -> AsyncDatabaseAdapter:
+        return AsyncDatabaseAdapter(self._client[name])
+
+    def get_database(self, name: str, **kwargs: Any) -> AsyncDatabaseAdapter:
+        return AsyncDatabaseAdapter(self._client.get_database(name, **kwargs))
+
+    async def close(self) -> None:
+        self._client.close()
@@ -0,0 +1,424 @@
+"""
+object_registry.py
+
+Registro condiviso, a livello di nodo, degli oggetti pesanti caricati in
+memoria dai worker uvicorn (vector store, LLM, modelli di embedding, chain).
+
+Con `--workers N` ogni processo ha i propri dizionari in memoria
+(`vector_stores`, `ModelManager.models`, ...). Il registro è un file JSON
+condiviso (protetto da `fcntl.flock`) in cui ogni worker scrive quali oggetti
+ha caricato, con quale versione di configurazione e con quale PID; in questo
+modo:
+
+- `/loaded_store_ids?scope=node` (e simili) risponde in modo coerente
+  indipendentemente dal worker che serve la richiesta;
+- la costruzione di uno stesso oggetto è serializzata sul nodo tramite
+  `build_lock`, quindi N worker non scaricano/istanziano contemporaneamente
+  lo stesso modello;
+- quando una configurazione viene aggiornata da un worker, gli altri vedono
+  la loro copia come "stale" e la ricaricano al successivo lazy-load.
+
+Le voci dei processi terminati vengono rimosse automaticamente.
+
+Per i dati condivisi su disco dai worker (es. una collezione Chroma
+persistita) il registro tiene anche una generazione di scrittura per
+oggetto (`bump_generation` / `get_generation`, un piccolo file per oggetto
+fuori dal file JSON): chi scrive la incrementa, chi tiene in memoria stato
+derivato da quei dati (cache dei risultati, indici BM25 e dei metadati) la
+confronta con l'ultima vista e lo scarta se è cambiata.
+
+All'interno del worker il lazy-load passa da `get_or_load`: le richieste
+concorrenti per lo stesso oggetto non caricato attendono un unico
+caricamento in corso (single-flight) invece di leggere ciascuna la
+configurazione e costruire l'oggetto. Gli id senza configurazione vengono
+ricordati per `OBJECT_NOT_FOUND_TTL_SECONDS` (default 5, 0 disabilita),
+così le richieste per id inesistenti non interrogano Mongo ogni volta;
+`forget_missing` li dimentica quando la configurazione viene creata.
+
+Le risorse contate sul nodo (es. i processi degli shard, sharded_store.py)
+passano da `reserve`: la riserva viene rifiutata se il totale dei processi
+vivi supererebbe il limite, e sparisce con il processo che la ha fatta.
+
+Il controllo di obsolescenza fatto a ogni accesso (`is_stale`) non prende
+il lock del registro e non rilegge il file: usa la copia già letta finché
+il file non cambia (inode, dimensione e mtime, una `stat` per accesso) e al
+più per `OBJECT_REGISTRY_CACHE_SECONDS` (default 1).
+
+Accessi e caricamenti vengono segnalati a `lifecycle_manager`
+(utilities/lifecycle.py), che scarica gli oggetti meno usati di recente
+quando il budget di memoria del worker è superato.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utilities.lifecycle import lifecycle_manager
+
+OBJECT_REGISTRY_DIR = os.getenv("OBJECT_REGISTRY_DIR", "/tmp/nlp_core_object_registry")
+OBJECT_NOT_FOUND_TTL_SECONDS = float(os.getenv("OBJECT_NOT_FOUND_TTL_SECONDS", "5"))
+# età massima della copia in memoria del registro usata dalle letture (vedi `_current_state`)
+OBJECT_REGISTRY_CACHE_SECONDS = float(os.getenv("OBJECT_REGISTRY_CACHE_SECONDS", "1"))
+
+
+def config_version(config: Any) -> str:
+    """Calcola una versione stabile (hash) di una configurazione JSON-like."""
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """Caricamento in corso nel worker, atteso dalle richieste concorrenti per lo stesso oggetto."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ObjectRegistry:
+    """
+    Registro degli oggetti caricati dai worker di questo nodo.
+
+    Struttura del file JSON:
+
+        {
+          "<kind>:<object_id>": {
+              "kind": "...",
+              "object_id": "...",
+              "version": "<versione corrente della configurazione>",
+              "holders": {
+                  "<pid>": {"host": "...", "version": "...", "loaded_at": 0.0}
+              }
+          }
+        }
+    """
+
+    def __init__(self, registry_dir: str = OBJECT_REGISTRY_DIR):
+        self.registry_dir = registry_dir
+        self.registry_path = os.path.join(registry_dir, "registry.json")
+        self.lock_path = os.path.join(registry_dir, "registry.lock")
+        self.build_locks_dir = os.path.join(registry_dir, "build_locks")
+        self.generations_dir = os.path.join(registry_dir, "generations")
+        self.hostname = socket.gethostname()
+        os.makedirs(self.build_locks_dir, exist_ok=True)
+        os.makedirs(self.generations_dir, exist_ok=True)
+        # stato locale al worker: caricamenti in corso e id senza configurazione (con scadenza)
+        self._flights: Dict[str, _Flight] = {}
+        self._missing: Dict[str, float] = {}
+        self._flights_lock = threading.Lock()
+        # ultima copia letta del registro: (chiave del file, istante della lettura, stato)
+        self._cached: Optional[Tuple[Any, float, Dict[str, Any]]] = None
+        self._cached_lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Internal helpers                                                   #
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _key(kind: str, object_id: str) -> str:
+        return f"{kind}:{object_id}"
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.registry_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, state: Dict[str, Any]) -> None:
+        tmp_path = f"{self.registry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, self.registry_path)
+
+    @staticmethod
+    def _prune(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Rimuove i holder associati a processi non più attivi."""
+        for key in list(state.keys()):
+            holders = state[key].get("holders", {})
+            for pid in list(holders.keys()):
+                if not _pid_alive(int(pid)):
+                    del holders[pid]
+            if not holders and state[key].get("version") is None and not state[key].get("pinned"):
+                del state[key]
+        return state
+
+    def _file_key(self) -> Any:
+        try:
+            st = os.stat(self.registry_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _current_state(self) -> Dict[str, Any]:
+        """
+        Stato del registro per le letture frequenti, da non modificare: la copia in memoria finché il file non
+        cambia (il file viene sempre sostituito con `os.replace`, quindi cambia inode) e non è più vecchia di
+        `OBJECT_REGISTRY_CACHE_SECONDS`; altrimenti viene riletto con il lock condiviso.
+        """
+        key = self._file_key()
+        now = time.monotonic()
+        cached = self._cached
+        if cached is not None and cached[0] == key and now - cached[1] < OBJECT_REGISTRY_CACHE_SECONDS:
+            return cached[2]
+        with self._cached_lock:
+            with self._locked_state(write=False) as state:
+                # chiave letta sotto il lock: il file non cambia fino al suo rilascio
+                self._cached = (self._file_key(), now, state)
+            return state
+
+    @contextmanager
+    def _locked_state(self, write: bool = True):
+        with open(self.lock_path, "a+") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                state = self._read()
+                yield state
+                if write:
+                    self._write(self._prune(state))
+            finally:
+                fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------ #
+    # Public API                                                         #
+    # ------------------------------------------------------------------ #
+
+    def register(self, kind: str, object_id: str, version: Optional[str] = None, **info: Any) -> None:
+        """Registra che il worker corrente ha caricato l'oggetto."""
+        with self._locked_state() as state:
+            entry = state.setdefault(self._key(kind, object_id),
+                                     {"kind": kind, "object_id": object_id, "version": version, "holders": {}})
+            if version is not None:
+                entry["version"] = version
+            entry["holders"][str(os.getpid())] = {
+                "host": self.hostname,
+                "version": version,
+                "loaded_at": time.time(),
+                **info,
+            }
+
+    def unregister(self, kind: str, object_id: str) -> None:
+        """Rimuove il worker corrente dai holder dell'oggetto."""
+        with self._locked_state() as state:
+            entry = state.get(self._key(kind, object_id))
+            if entry:
+                entry["holders"].pop(str(os.getpid()), None)
+                if not entry["holders"]:
+                    del state[self._key(kind, object_id)]
+
+    def mark_updated(self, kind: str, object_id: str, version: str) -> None:
+        """
+        Segnala che la configurazione dell'oggetto è cambiata: le copie già
+        caricate dagli altri worker diventano "stale".
+        """
+        with self._locked_state() as state:
+            entry = state.setdefault(self._key(kind, object_id),
+                                     {"kind": kind, "object_id": object_id, "holders": {}})
+            entry["version"] = version
+
+    def is_stale(self, kind: str, object_id: str) -> bool:
+        """True se la copia del worker corrente non corrisponde alla versione corrente."""
+        entry = self._current_state().get(self._key(kind, object_id))
+        if not entry:
+            return False
+        holder = entry["holders"].get(str(os.getpid()))
+        if holder is None or entry.get("version") is None:
+            return False
+        return holder.get("version") != entry["version"]
+
+    def pin(self, kind: str, object_id: str) -> None:
+        """Fissa l'oggetto sul nodo: nessun worker lo scarica per il budget di memoria (utilities/lifecycle.py)."""
+        with self._locked_state() as state:
+            state.setdefault(self._key(kind, object_id),
+                             {"kind": kind, "object_id": object_id, "holders": {}})["pinned"] = True
+
+    def unpin(self, kind: str, object_id: str) -> None:
+        with self._locked_state() as state:
+            entry = state.get(self._key(kind, object_id))
+            if entry:
+                entry.pop("pinned", None)
+
+    def list_pinned(self) -> List[str]:
+        """Chiavi "<kind>:<object_id>" degli oggetti fissati sul nodo."""
+        return [key for key, entry in self._current_state().items() if entry.get("pinned")]
+
+    def reserve(self, kind: str, object_id: str, amount: int, limit: int) -> int:
+        """
+        Riserva per il worker corrente `amount` unità della risorsa `kind` (es. processi) sotto la voce
+        `object_id`, da rilasciare con `unregister`. Solleva RuntimeError se il totale riservato sul nodo
+        supererebbe `limit` (0 = nessun limite); restituisce il totale dopo la riserva.
+        """
+        with self._locked_state() as state:
+            used = sum(holder.get("amount", 0)
+                       for entry in self._prune(state).values() if entry["kind"] == kind
+                       for holder in entry["holders"].values())
+            if limit > 0 and used + amount > limit:
+                raise RuntimeError(f"Cannot reserve {amount} {kind} on this node: {used} of {limit} already in use")
+            state[self._key(kind, object_id)] = {
+                "kind": kind, "object_id": object_id, "version": None,
+                "holders": {str(os.getpid()): {"host": self.hostname, "amount": amount, "loaded_at": time.time()}},
+            }
+        return used + amount
+
+    def get(self, kind: str, object_id: str) -> Optional[Dict[str, Any]]:
+        with self._locked_state(write=False) as state:
+            return self._prune(state).get(self._key(kind, object_id))
+
+    def list_objects(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Elenca gli oggetti caricati sul nodo (da almeno un worker vivo)."""
+        with self._locked_state(write=False) as state:
+            state = self._prune(state)
+        return [entry for entry in state.values()
+                if entry.get("holders") and (kind is None or entry["kind"] == kind)]
+
+    def list_ids(self, kind: str) -> List[str]:
+        return [entry["object_id"] for entry in self.list_objects(kind)]
+
+    @contextmanager
+    def build_lock(self, kind: str, object_id: str):
+        """
+        Lock esclusivo di nodo per la costruzione di un oggetto: evita che più
+        worker istanzino contemporaneamente lo stesso store/modello.
+        """
+        digest = hashlib.sha1(self._key(kind, object_id).encode("utf-8")).hexdigest()
+        path = os.path.join(self.build_locks_dir, f"{kind}__{digest}.lock")
+        with open(path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _generation_path(self, kind: str, object_id: str) -> str:
+        digest = hashlib.sha1(self._key(kind, object_id).encode("utf-8")).hexdigest()
+        return os.path.join(self.generations_dir, f"{kind}__{digest}")
+
+    def bump_generation(self, kind: str, object_id: str) -> Tuple[int, int]:
+        """Incrementa la generazione di scrittura dell'oggetto sul nodo; restituisce (precedente, nuova)."""
+        with open(self._generation_path(kind, object_id), "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                fh.seek(0)
+                previous = int(fh.read() or 0)
+                fh.seek(0)
+                fh.truncate()
+                fh.write(str(previous + 1))
+                fh.flush()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+        return previous, previous + 1
+
+    def get_generation(self, kind: str, object_id: str) -> int:
+        """Generazione di scrittura corrente dell'oggetto (0 se mai scritto)."""
+        try:
+            with open(self._generation_path(kind, object_id), "r") as fh:
+                fcntl.flock(fh, fcntl.LOCK_SH)
+                try:
+                    return int(fh.read() or 0)
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+        except FileNotFoundError:
+            return 0
+
+    def load_once(self,
+                  kind: str,
+                  object_id: str,
+                  local: Dict[str, Any],
+                  build: Callable[[], Any],
+                  version: Optional[str] = None) -> Any:
+        """
+        Costruisce l'oggetto sotto `build_lock`, lo salva in `local[object_id]`
+        e lo registra. Se nel frattempo un altro thread del worker lo ha già
+        caricato, restituisce l'istanza esistente.
+        """
+        with self.build_lock(kind, object_id):
+            if object_id in local:
+                lifecycle_manager.touch(kind, object_id)
+                return local[object_id]
+            instance = build()
+            local[object_id] = instance
+            self.register(kind, object_id, version=version)
+        # fuori dal lock di costruzione: l'eventuale espulsione di altri oggetti può scrivere snapshot
+        lifecycle_manager.loaded(kind, object_id)
+        return instance
+
+
+    def get_or_load(self,
+                    kind: str,
+                    object_id: str,
+                    local: Dict[str, Any],
+                    load: Callable[[], Any]) -> Any:
+        """
+        Restituisce `local[object_id]` se presente e non obsoleto, altrimenti lo carica con `load()`
+        (che legge la configurazione e chiama `load_once`, restituendo l'istanza o None se la
+        configurazione non esiste). Un solo caricamento per oggetto è in corso nel worker: le richieste
+        concorrenti ne attendono l'esito, errori compresi. None = oggetto inesistente.
+        """
+        instance = local.get(object_id)
+        if instance is not None and not self.is_stale(kind, object_id):
+            lifecycle_manager.touch(kind, object_id)
+            return instance
+
+        key = self._key(kind, object_id)
+        with self._flights_lock:
+            expires_at = self._missing.get(key)
+            if expires_at is not None:
+                if time.monotonic() < expires_at:
+                    return None
+                del self._missing[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            # un caricamento appena terminato può aver già sostituito la copia obsoleta
+            instance = local.get(object_id)
+            if instance is not None and not self.is_stale(kind, object_id):
+                flight.result = instance
+            else:
+                local.pop(object_id, None)
+                flight.result = load()
+                if flight.result is None and OBJECT_NOT_FOUND_TTL_SECONDS > 0:
+                    with self._flights_lock:
+                        self._missing[key] = time.monotonic() + OBJECT_NOT_FOUND_TTL_SECONDS
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def forget_missing(self, kind: str, object_id: str) -> None:
+        """Da chiamare quando viene creata la configurazione dell'oggetto."""
+        with self._flights_lock:
+            self._missing.pop(self._key(kind, object_id), None)
+
+
+object_registry = ObjectRegistry()
+lifecycle_manager.set_pin_source(object_registry.list_pinned)
@@ -1,28 +1,56 @@
 import os
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Path, Body, Query, APIRouter,BackgroundTasks, Form
+import asyncio
+import time
+from fastapi import FastAPI, HTTPException, Path, Body, Query, APIRouter, Form
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional, Tuple
-from pymongo import MongoClient
 import uuid
 from langchain_core.documents import Document
 from langchain_community.vectorstores import (Chroma,
                                               ElasticsearchStore,
-                                              ElasticVectorSearch,
-                                              FAISS)
+                                              ElasticVectorSearch)
 
 from langchain_community.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
-from langchain_community.vectorstores.utils import filter_complex_metadata
+from utilities.object_registry import object_registry, config_version
+from utilities.lifecycle import lifecycle_manager
+from embedding_models.utilities.remote_embeddings import build_embeddings
+from embedding_models.utilities.query_cache import with_query_cache, get_query_embedding_cache_stats
+from embedding_models.utilities.embedding_cache import with_document_cache, get_document_embedding_cache_stats
+from utilities.executors import run_blocking, has_native_async
+from vector_stores.utilities.search import (SEARCH_TYPES, TEXT_SEARCH_METHODS, get_store_embeddings,
+                                            embed_queries, supports_search_by_vector, search_by_vector)
+from vector_stores.utilities.ingestion import ingest_collection
+from vector_stores.utilities.hybrid import hybrid_search
+from vector_stores.utilities.store_index import record_added, record_deleted, invalidate
+from vector_stores.utilities.metadata_index import filter_store_documents
+from vector_stores.utilities.store_locks import get_store_lock, read_locked, write_locked
+from vector_stores.utilities.write_queue import get_write_queue, peek_write_queue
+from vector_stores.utilities.search_cache import (configure_search_cache, get_search_cache, search_cache_key,
+                                                  acached_search)
+from vector_stores.utilities.sync import sync_collection, get_sync_status, clear_sync_state, move_sync_state
+from vector_stores.utilities.rebuild import (ShadowRebuild, shadow_params, REBUILD_VALIDATION_QUERIES,
+                                             REBUILD_MIN_SELF_RECALL)
+from vector_stores.utilities.numpy_store import NumpyVectorStore
+from vector_stores.utilities.faiss_store import FaissVectorStore
+from vector_stores.utilities.sharded_store import ShardedVectorStore
+from vector_stores.utilities.chroma_pool import build_chroma_store, release_chroma_store, get_chroma_pool_stats
+from vector_stores.utilities.snapshots import (FAISS_SNAPSHOT_INTERVAL_SECONDS, FAISS_SNAPSHOT_MMAP,
+                                               supports_snapshots, write_snapshot)
+from utilities.mongo import get_mongo_client, get_async_mongo_client
+from utilities.jobs import JobContext, register_job_handler, aenqueue_job, aget_job, acancel_job
+from pymongo.errors import DuplicateKeyError
 #from vector_stores.utilities import mongodb_atlas_vector_search
 
 router = APIRouter()
 
-# MongoDB connection configuration
-MONGO_CONNECTION_STRING = os.getenv('MONGO_CONNECTION_STRING', 'localhost')
-client = MongoClient(MONGO_CONNECTION_STRING)
+# MongoDB connection configuration (client condivisi, vedi utilities/mongo.py)
+client = get_mongo_client()
+async_client = get_async_mongo_client()
 db_name = "vector_store"
 collection_name = "vector_store_configs"
+# sync: percorsi di caricamento eseguiti nei thread pool; async: endpoint
 vector_store_collection = client[db_name][collection_name]
+async_vector_store_collection = async_client[db_name][collection_name]
 
 document_db_name = "document_store"  # Database name for documents
 document_collection_name = "documents"  # Default collection name for documents
@@ -36,10 +64,24 @@ VECTOR_STORE_CLASSES = {
     "Chroma": Chroma,
     "ElasticsearchStore": ElasticsearchStore,
     "ElasticVectorSearch": ElasticVectorSearch,
-    "FAISS": FAISS,
+    # FAISS istanziabile dalla configurazione, con quantizzazione opzionale (vector_stores/utilities/faiss_store.py)
+    "FAISS": FaissVectorStore,
+    # store NumPy in-process (vector_stores/utilities/numpy_store.py)
+    "NumpyVectorStore": NumpyVectorStore,
+    # store partizionato su processi worker, FAISS o NumPy per shard (vector_stores/utilities/sharded_store.py)
+    "ShardedVectorStore": ShardedVectorStore,
     #"MongoDBAtlasVectorSearch": mongodb_atlas_vector_search.create_vectorstore
 }
 
+# numero massimo di query accettate da /vector_store/batch_search
+BATCH_SEARCH_MAX_QUERIES = int(os.getenv("BATCH_SEARCH_MAX_QUERIES", "64"))
+
+# stima dell'occupazione degli store per il budget di memoria del worker (utilities/lifecycle.py):
+# testo e metadati per documento degli store che riportano la memoria dei vettori (FAISS, NumPy, shard),
+# occupazione complessiva per documento degli altri (Chroma: vettore, testo, metadati e indice HNSW)
+VECTOR_STORE_TEXT_BYTES_PER_DOCUMENT = int(os.getenv("VECTOR_STORE_TEXT_BYTES_PER_DOCUMENT", "2048"))
+VECTOR_STORE_BYTES_PER_DOCUMENT = int(os.getenv("VECTOR_STORE_BYTES_PER_DOCUMENT", "8192"))
+
 # Mapping of available embeddings models
 EMBEDDINGS_MODELS = {
     "OpenAIEmbeddings": OpenAIEmbeddings,
@@ -47,76 +89,193 @@ EMBEDDINGS_MODELS = {
 }
 
 ########################################################################################################################
-# ----------------- TASK HELPERS ----------------
-def _create_task_record(task_id: str,
-                        endpoint: str,
-                        payload: Dict[str, Any]) -> None:
-    """
-    Inserisce un task con stato PENDING nella collezione `tasks`.
-    """
-    client[db_name]["tasks"].insert_one({
-        "id": task_id,         # chiave pubblica leggibile
-        "endpoint": endpoint,
-        "payload": payload,
-        "status": "PENDING",
-        "created_at": datetime.utcnow(),
-        "finished_at": None,
-        "result": None,
-        "error": None
-    })
-
-def _update_task_status(task_id: str,
-                        status: str,
-                        *,
-                        result: Optional[Any] = None,
-                        error: Optional[str] = None) -> None:
-    client[db_name]["tasks"].update_one(
-        {"id": task_id},
-        {"$set": {
-            "status": status,
-            "finished_at": (
-                datetime.utcnow() if status in ("DONE", "ERROR") else None
-            ),
-            "result": result,
-            "error": error
-        }}
-    )
-########################################################################################################################
-
-########################################################################################################################
-# ---------------- BACKGROUND WORKER ------------
-def _process_add_docs_from_store_job(store_id: str,
-                                     task_id: str,
-                                     document_collection: str) -> None:
-    """
-    Implementa la logica originale di add_documents_from_document_store
-    ma aggiorna lo stato del task in Mongo.
-    """
-    try:
-        _update_task_status(task_id, "RUNNING")
-
-        # ---- validazioni ----
-        if store_id not in vector_stores:
-            raise RuntimeError("Vector store not loaded in memory")
+# ---------------- JOB HANDLERS (utilities/jobs.py) ------------
+# documenti per blocco nell'import da document store (sotto il limite di batch di Chroma)
+ADD_DOCS_JOB_BATCH_SIZE = int(os.getenv("ADD_DOCS_JOB_BATCH_SIZE", "500"))
+# tentativi dei job ripetibili senza effetti duplicati (import per id, sincronizzazione)
+VECTOR_STORE_JOB_MAX_ATTEMPTS = int(os.getenv("VECTOR_STORE_JOB_MAX_ATTEMPTS", "3"))
 
-        vector_store_instance = vector_stores[store_id]
-        doc_coll = get_document_collection(document_collection)
 
-        docs_cursor = doc_coll.find()
-        docs = [DocumentModel(
-                    page_content=d["value"]["page_content"],
-                    metadata=d["value"]["metadata"]
-                ).to_langchain_document()
-                for d in docs_cursor]
-
-        filtered_docs = filter_complex_metadata(docs)
-        vector_store_instance.add_documents(filtered_docs)
+def _process_add_docs_from_store_job(job: JobContext,
+                                     store_id: str,
+                                     document_collection: str,
+                                     batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Implementa la logica di add_documents_from_document_store nel worker dei job:
+    il cursore viene letto a blocchi e il progresso è aggiornato dopo ogni blocco.
 
-        # memorizza breve riepilogo risultato
-        _update_task_status(task_id, "DONE",
-                            result={"added": len(filtered_docs)})
-    except Exception as exc:            # pragma: no cover
-        _update_task_status(task_id, "ERROR", error=str(exc))
+    I documenti hanno come id l'`_id` del document store e quelli già presenti vengono saltati:
+    un nuovo tentativo dopo un errore riprende da dove si era fermato.
+    """
+    # lo store viene caricato dalla configurazione se il job gira in un processo che non lo ha in memoria
+    doc_coll = get_document_collection(document_collection)
+    batch_size = batch_size or ADD_DOCS_JOB_BATCH_SIZE
+
+    # lo store non viene scaricato per il budget di memoria mentre il job lo sta scrivendo
+    with lifecycle_manager.hold("vector_store", store_id):
+        vector_store_instance = get_vector_store(store_id)
+        added = ingest_collection(
+            vector_store_instance,
+            doc_coll.find(batch_size=batch_size),
+            batch_size,
+            total=doc_coll.estimated_document_count(),
+            # set_progress solleva JobCancelled se il job è stato cancellato
+            on_progress=lambda current, total: job.set_progress(current=current, total=total, message="adding"),
+            use_document_ids=True,
+        )
+    # lo store è cresciuto: il budget di memoria del processo viene ricontrollato
+    lifecycle_manager.written("vector_store", store_id)
+    # le copie degli altri processi (API, altri worker) vengono ricaricate dallo snapshot
+    _snapshot_vector_store(store_id)
+    job.set_progress(current=added, total=added, message="done")
+
+    # memorizza breve riepilogo risultato
+    return {"added": added}
+
+
+register_job_handler("vector_store_add_documents", _process_add_docs_from_store_job, max_concurrency=2,
+                     max_attempts=VECTOR_STORE_JOB_MAX_ATTEMPTS)
+
+
+def _process_sync_from_store_job(job: JobContext,
+                                 store_id: str,
+                                 document_collection: str,
+                                 batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Sincronizzazione incrementale collezione -> vector store (vedi vector_stores/utilities/sync.py)."""
+    with lifecycle_manager.hold("vector_store", store_id):
+        vector_store_instance = get_vector_store(store_id)
+        counts = sync_collection(vector_store_instance, store_id,
+                                 get_document_collection(document_collection),
+                                 batch_size or ADD_DOCS_JOB_BATCH_SIZE,
+                                 on_progress=job.set_progress)
+    lifecycle_manager.written("vector_store", store_id)
+    _snapshot_vector_store(store_id)
+    return counts
+
+
+# una sola sincronizzazione alla volta: due sync della stessa coppia si contenderebbero lo stato
+register_job_handler("vector_store_sync", _process_sync_from_store_job, max_concurrency=1,
+                     max_attempts=VECTOR_STORE_JOB_MAX_ATTEMPTS)
+
+
+def _process_rebuild_index_job(job: JobContext,
+                               store_id: str,
+                               ann: Optional[Dict[str, Any]] = None,
+                               quantization: Optional[Dict[str, Any]] = None,
+                               sample_size: int = 50000,
+                               recall_queries: int = 100,
+                               k: int = 10) -> Dict[str, Any]:
+    """Costruzione dell'indice ANN/quantizzato e sostituzione atomica (vedi vector_stores/utilities/faiss_store.py)."""
+    with lifecycle_manager.hold("vector_store", store_id):
+        vector_store_instance = get_vector_store(store_id)
+        report = vector_store_instance.rebuild(ann=ann, quantization=quantization, sample_size=sample_size,
+                                               recall_queries=recall_queries, k=k, on_progress=job.set_progress)
+    # gli altri processi caricano il nuovo indice dallo snapshot
+    _snapshot_vector_store(store_id, force=True)
+    return report
+
+
+# la costruzione di un indice satura già i core (FAISS usa OpenMP)
+register_job_handler("vector_store_rebuild_index", _process_rebuild_index_job, max_concurrency=1)
+
+
+def _process_rebuild_store_job(job: JobContext,
+                               store_id: str,
+                               document_collection: Optional[str] = None,
+                               vector_store_class: Optional[str] = None,
+                               params: Optional[Dict[str, Any]] = None,
+                               embeddings_model_class: Optional[str] = None,
+                               embeddings_params: Optional[Dict[str, Any]] = None,
+                               batch_size: Optional[int] = None,
+                               validation_queries: int = REBUILD_VALIDATION_QUERIES,
+                               min_self_recall: float = REBUILD_MIN_SELF_RECALL,
+                               k: int = 10) -> Dict[str, Any]:
+    """
+    Ricostruzione dello store con una nuova configurazione mentre quello in uso continua a servire, poi
+    sostituzione atomica (vedi vector_stores/utilities/rebuild.py).
+    """
+    cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    if not cfg:
+        raise ValueError(f"Vector store {store_id} not found")
+    live_config = cfg["config"]
+    tag = uuid.uuid4().hex[:8]
+
+    def without_snapshot(config: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in config.items() if key != "snapshot"}
+
+    new_config = without_snapshot(live_config)
+    if vector_store_class is not None:
+        new_config["vector_store_class"] = vector_store_class
+    if embeddings_model_class is not None:
+        new_config["embeddings_model_class"] = embeddings_model_class
+    if embeddings_params is not None:
+        new_config["embeddings_params"] = embeddings_params
+    new_config["params"] = shadow_params(new_config["vector_store_class"],
+                                         params if params is not None else live_config["params"],
+                                         live_config["params"], tag)
+    if new_config["vector_store_class"] not in VECTOR_STORE_CLASSES:
+        raise ValueError(f"Vector store class {new_config['vector_store_class']} not supported")
+    same_embeddings = (new_config.get("embeddings_model_class"), new_config.get("embeddings_params")) == \
+        (live_config.get("embeddings_model_class"), live_config.get("embeddings_params"))
+    # stato di sincronizzazione dell'ombra, spostato sullo store alla sostituzione
+    sync_store_id = f"{store_id}.rebuild-{tag}"
+    batch_size = batch_size or ADD_DOCS_JOB_BATCH_SIZE
+    started = time.monotonic()
+
+    with lifecycle_manager.hold("vector_store", store_id):
+        live = get_vector_store(store_id)
+        shadow = _build_vector_store(new_config)
+        rebuild = ShadowRebuild(live, shadow, reuse_vectors=same_embeddings)
+        try:
+            if document_collection:
+                rebuild.build_from_collection(get_document_collection(document_collection), sync_store_id,
+                                              batch_size, on_progress=job.set_progress)
+            else:
+                rebuild.build_from_store(batch_size, on_progress=job.set_progress)
+            job.set_progress(current=rebuild.documents, total=rebuild.documents, message="catching up")
+            rebuild.catch_up()
+            job.set_progress(current=rebuild.documents, total=rebuild.documents, message="validating")
+            validation = rebuild.validate(validation_queries, k, min_self_recall)
+            if supports_snapshots(shadow):
+                # gli altri worker ricaricano lo store dallo snapshot registrato nella nuova configurazione
+                new_config["snapshot"] = write_snapshot(shadow, store_id)
+
+            def commit() -> None:
+                current = vector_store_collection.find_one({"_id": cfg["_id"]})
+                # uno snapshot nel frattempo è ammesso, un aggiornamento della configurazione annulla la ricostruzione
+                if not current or without_snapshot(current["config"]) != without_snapshot(live_config):
+                    raise RuntimeError(f"The configuration of vector store {store_id} changed during the rebuild")
+                vector_store_collection.update_one({"_id": cfg["_id"]}, {"$set": {"config": new_config}})
+                if document_collection:
+                    move_sync_state(sync_store_id, store_id, document_collection)
+                version = config_version(new_config)
+                object_registry.mark_updated("vector_store", store_id, version)
+                object_registry.register("vector_store", store_id, version=version)
+                vector_stores[store_id] = shadow
+
+            rebuild.swap(commit)
+        except BaseException:
+            rebuild.discard(new_config["params"])
+            if document_collection:
+                clear_sync_state(sync_store_id)
+            raise
+    # scritture riportate durante la sostituzione, successive allo snapshot
+    _snapshot_vector_store(store_id)
+
+    job.set_progress(current=rebuild.documents, total=rebuild.documents, message="done")
+    return {"documents": rebuild.documents,
+            "caught_up_writes": rebuild.caught_up,
+            "source": document_collection or "store",
+            "reused_vectors": rebuild.reuse_vectors,
+            "validation": validation,
+            "vector_store_class": new_config["vector_store_class"],
+            "params": new_config["params"],
+            "previous_params": live_config["params"],
+            "rebuild_seconds": round(time.monotonic() - started, 3)}
+
+
+# la ricostruzione tiene in memoria due copie dello store: una alla volta per processo
+register_job_handler("vector_store_rebuild", _process_rebuild_store_job, max_concurrency=1)
 
 ########################################################################################################################
 
@@ -128,6 +287,8 @@ class TaskInfo(BaseModel):
     payload: Optional[dict] = None
     result: Optional[Any] = None
     error: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    attempts: Optional[int] = None
 
 
 class ExecuteMethodRequest(BaseModel):
@@ -160,6 +321,10 @@ class VectorStoreConfigModel(BaseModel):
                                        example="This is a Chroma vector store configuration for project X.")
     custom_metadata: Optional[Dict[str, Any]] = Field(None, description="Custom metadata for the configuration.",
                                                       example={"project": "Project X", "owner": "John Doe"})
+    snapshot: Optional[Dict[str, Any]] = Field(None, description="The last on-disk snapshot of the store (FAISS), managed by the server.",
+                                               example={"version": "20240101T120000000000-1a2b3c4d", "vectors": 1000})
+    search_cache: Optional[Dict[str, Any]] = Field(None, description="Search result cache of the store (max_size 0 disables it); defaults to SEARCH_RESULT_CACHE_SIZE/SEARCH_RESULT_CACHE_TTL.",
+                                                   example={"max_size": 256, "ttl": 60})
 
 
 class MethodRequestModel(BaseModel):
@@ -195,10 +360,18 @@ class DocumentModel(BaseModel):
 class SearchRequestModel(BaseModel):
     """Pydantic model for a search request."""
     query: str = Field(..., description="The search query.", example="example query")
-    search_type: str = Field(..., description="The type of search to perform. Supported types: 'similarity', 'mmr', 'similarity_score_threshold'", example="similarity")
+    search_type: str = Field(..., description="The type of search to perform. Supported types: 'similarity', 'mmr', 'similarity_score_threshold', 'hybrid'", example="similarity")
     search_kwargs: Dict[str, Any] = Field(default_factory=dict, description="Additional keyword arguments for the search method.", example={"k": 4})
 
 
+class BatchSearchResultModel(BaseModel):
+    """Pydantic model for the result of one query of a batch search."""
+    query: str = Field(..., description="The search query.", example="example query")
+    search_type: str = Field(..., description="The type of search performed.", example="similarity")
+    results: List[DocumentModel | Tuple[DocumentModel, float]] = Field(default_factory=list, description="The documents that match the query.")
+    error: Optional[str] = Field(None, description="The error raised by this query, if any.", example=None)
+
+
 class FilterRequestModel(BaseModel):
     """Pydantic model for a filter request."""
     filter: Dict[str, Any] = Field(..., description="The filter criteria for retrieving documents.", example={"author": "John Doe"})
@@ -243,7 +416,9 @@ async def configure_vector_store(
     description: Optional[str] = Body(None, description="A description of the vector store configuration.",
                                       example="This is a Chroma vector store configuration for project X."),
     custom_metadata: Optional[Dict[str, Any]] = Body(None, description="Custom metadata for the configuration.",
-                                                     example={"project": "Project X", "owner": "John Doe"})
+                                                     example={"project": "Project X", "owner": "John Doe"}),
+    search_cache: Optional[Dict[str, Any]] = Body(None, description="Search result cache of the store (max_size 0 disables it).",
+                                                  example={"max_size": 256, "ttl": 60})
 ):
     """
     Configure a vector store.
@@ -258,7 +433,7 @@ async def configure_vector_store(
     if store_id is None:
         store_id = str(uuid.uuid4())
 
-    if vector_store_collection.find_one({"_id": config_id}):
+    if await async_vector_store_collection.find_one({"_id": config_id}):
         raise HTTPException(status_code=400, detail="Configuration ID already exists")
 
     config = {
@@ -269,10 +444,12 @@ async def configure_vector_store(
         "embeddings_model_class": embeddings_model_class,
         "embeddings_params": embeddings_params,
         "description": description,
-        "custom_metadata": custom_metadata
+        "custom_metadata": custom_metadata,
+        "search_cache": search_cache
     }
 
-    vector_store_collection.insert_one({"_id": config_id, "config": config})
+    await async_vector_store_collection.insert_one({"_id": config_id, "config": config})
+    object_registry.forget_missing("vector_store", store_id)
     return VectorStoreConfigModel(**config)
 
 
@@ -287,7 +464,7 @@ async def delete_vector_store_config(
 
     Returns a confirmation message upon successful deletion.
     """
-    result = vector_store_collection.delete_one({"_id": config_id})
+    result = await async_vector_store_collection.delete_one({"_id": config_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return {"detail": "Configuration deleted successfully"}
@@ -302,7 +479,8 @@ async def update_vector_store_config(
     embeddings_model_class: Optional[str] = Body(None, description="The class of the embeddings model.", example="OpenAIEmbeddings"),
     embeddings_params: Optional[Dict[str, Any]] = Body(None, description="Configuration parameters for the embeddings model.", example={"api_key": "new_api_key"}),
     description: Optional[str] = Body(None, description="A description of the vector store configuration.", example="Updated description for project X."),
-    custom_metadata: Optional[Dict[str, Any]] = Body(None, description="Custom metadata for the configuration.", example={"project": "Updated Project X", "owner": "Jane Doe"})
+    custom_metadata: Optional[Dict[str, Any]] = Body(None, description="Custom metadata for the configuration.", example={"project": "Updated Project X", "owner": "Jane Doe"}),
+    search_cache: Optional[Dict[str, Any]] = Body(None, description="Search result cache of the store (max_size 0 disables it).", example={"max_size": 256, "ttl": 60})
 ):
     """
     Update a vector store configuration.
@@ -311,7 +489,7 @@ async def update_vector_store_config(
 
     Returns the updated configuration.
     """
-    existing_config = vector_store_collection.find_one({"_id": config_id})
+    existing_config = await async_vector_store_collection.find_one({"_id": config_id})
     if not existing_config:
         raise HTTPException(status_code=404, detail="Configuration not found")
 
@@ -326,10 +504,18 @@ async def update_vector_store_config(
         "embeddings_model_class": embeddings_model_class,
         "embeddings_params": embeddings_params,
         "description": description,
-        "custom_metadata": custom_metadata
+        "custom_metadata": custom_metadata,
+        "search_cache": search_cache
     }
-
-    vector_store_collection.update_one({"_id": config_id}, {"$set": {"config": updated_config}})
+    # lo snapshot non fa parte della configurazione inviata dal client: senza, lo store ripartirebbe vuoto
+    if existing_config["config"].get("snapshot"):
+        updated_config["snapshot"] = existing_config["config"]["snapshot"]
+
+    await async_vector_store_collection.update_one({"_id": config_id}, {"$set": {"config": updated_config}})
+    object_registry.forget_missing("vector_store", store_id)
+    # le copie già caricate dagli altri worker diventano obsolete
+    await run_blocking("vector_stores", object_registry.mark_updated,
+                       "vector_store", store_id, config_version(updated_config))
     return VectorStoreConfigModel(**updated_config)
 
 
@@ -340,7 +526,7 @@ async def list_vector_store_configs():
 
     This endpoint retrieves and returns a list of all vector store configurations stored in MongoDB.
     """
-    configs = list(vector_store_collection.find({}, {"_id": 0, "config": 1}))
+    configs = await async_vector_store_collection.find({}, {"_id": 0, "config": 1}).to_list()
     return [VectorStoreConfigModel(**config["config"]) for config in configs]
 
 
@@ -365,31 +551,171 @@ def load_vector_store(
     if store_id in vector_stores:
         raise HTTPException(status_code=400, detail="Store ID already exists in memory")
 
+    _load_vector_store_config(config)
+    return {"detail": f"Vector store {store_id} loaded successfully"}
+
+
+def _load_vector_store_config(config: Dict[str, Any]):
+    """Valida la configurazione salvata e carica lo store (una sola costruzione per nodo); restituisce l'istanza."""
+    store_id = config["config"]["store_id"]
     vector_store_class = config["config"]["vector_store_class"]
     if vector_store_class not in VECTOR_STORE_CLASSES:
         raise HTTPException(status_code=400, detail=f"Vector store class {vector_store_class} not supported")
 
-    vector_store_params = config["config"]["params"]
+    if config["config"].get("embeddings_model_class") and \
+            config["config"]["embeddings_model_class"] not in EMBEDDINGS_MODELS:
+        raise HTTPException(status_code=400,
+                            detail=f"Embeddings model class {config['config']['embeddings_model_class']} not supported")
+
+    # la costruzione è serializzata sul nodo: più worker non istanziano in parallelo lo stesso store
+    return object_registry.load_once("vector_store", store_id, vector_stores,
+                                     build=lambda: _build_vector_store(config["config"]),
+                                     version=config_version(config["config"]))
+
 
-    # Load embeddings model if specified
-    # TODO:
-    #  - [ ] load embedding models from model_manager class
+def _build_vector_store(config: Dict[str, Any]):
+    """Istanzia vector store (ed eventuale modello di embedding) a partire dalla configurazione salvata."""
+    vector_store_class = config["vector_store_class"]
+    vector_store_params = config["params"]
+
+    # Load embeddings model if specified: con EMBEDDING_SERVICE_URL impostato il modello vive
+    # una sola volta nel servizio di embedding, condiviso da tutti gli store e da tutti i worker
     embeddings_model = None
-    if config["config"].get("embeddings_model_class"):
-        embeddings_model_class = config["config"]["embeddings_model_class"]
-        if embeddings_model_class not in EMBEDDINGS_MODELS:
-            raise HTTPException(status_code=400,
-                                detail=f"Embeddings model class {embeddings_model_class} not supported")
+    if config.get("embeddings_model_class"):
+        embeddings_model = build_embeddings(config["embeddings_model_class"],
+                                            config.get("embeddings_params"),
+                                            EMBEDDINGS_MODELS)
+        model_key = config_version({"class": config["embeddings_model_class"],
+                                    "params": config.get("embeddings_params")})
+        # i documenti già embeddati (da qualsiasi store con lo stesso modello) non passano dal modello
+        embeddings_model = with_document_cache(embeddings_model, model_key)
+        # gli embedding delle query ripetute vengono serviti dalla cache condivisa dagli store con lo stesso modello
+        embeddings_model = with_query_cache(embeddings_model, model_key)
+
+    # Initialize the vector store: dall'ultimo snapshot registrato nella configurazione, se presente
+    snapshot = config.get("snapshot")
+    if snapshot and hasattr(VECTOR_STORE_CLASSES[vector_store_class], "load_snapshot"):
+        instance = VECTOR_STORE_CLASSES[vector_store_class].load_snapshot(snapshot["path"], embeddings_model,
+                                                                          mmap=FAISS_SNAPSHOT_MMAP, **vector_store_params)
+    elif vector_store_class == "Chroma":
+        # gli store sotto la stessa directory condividono un client Chroma (vector_stores/utilities/chroma_pool.py)
+        instance = build_chroma_store(VECTOR_STORE_CLASSES[vector_store_class], vector_store_params, embeddings_model)
+    else:
+        instance = VECTOR_STORE_CLASSES[vector_store_class](**vector_store_params, embedding_function=embeddings_model)
+    configure_search_cache(instance, config.get("search_cache"))
+    return instance
+
+
+def _snapshot_vector_store(store_id: str, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Scrive uno snapshot dello store caricato in questo worker (se modificato dall'ultimo, o se `force`) e lo
+    registra nella configurazione; le copie degli altri worker diventano obsolete e vengono ricaricate dallo snapshot.
 
-        embeddings_params = config["config"].get("embeddings_params", {})
-        embeddings_model = EMBEDDINGS_MODELS[embeddings_model_class](**embeddings_params)
+    Returns:
+        Il descrittore dello snapshot, None se lo store non supporta gli snapshot o non è cambiato.
+    """
+    instance = vector_stores.get(store_id)
+    if instance is None or not supports_snapshots(instance) or not (force or instance.dirty):
+        return None
+    cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    if not cfg:
+        return None
+
+    snapshot = write_snapshot(instance, store_id)
+    vector_store_collection.update_one({"_id": cfg["_id"]}, {"$set": {"config.snapshot": snapshot}})
+    version = config_version({**cfg["config"], "snapshot": snapshot})
+    object_registry.mark_updated("vector_store", store_id, version)
+    # la copia di questo worker coincide con lo snapshot appena scritto: non va ricaricata
+    object_registry.register("vector_store", store_id, version=version)
+    return snapshot
+
+
+async def _periodic_snapshots() -> None:
+    while True:
+        await asyncio.sleep(FAISS_SNAPSHOT_INTERVAL_SECONDS)
+        for store_id in list(vector_stores):
+            try:
+                await run_blocking("vector_stores", _snapshot_vector_store, store_id)
+            except Exception as exc:
+                print(f"snapshot error for vector store {store_id}: {exc}")
+
+
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+@router.on_event("startup")
+async def start_periodic_snapshots():
+    global _snapshot_task
+    if FAISS_SNAPSHOT_INTERVAL_SECONDS > 0 and _snapshot_task is None:
+        _snapshot_task = asyncio.get_running_loop().create_task(_periodic_snapshots())
+
+
+@router.on_event("shutdown")
+async def snapshot_on_shutdown():
+    """Le modifiche in memoria non salvate sopravvivono al riavvio del worker."""
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+    for store_id in list(vector_stores):
+        try:
+            await run_blocking("vector_stores", _snapshot_vector_store, store_id)
+        except Exception as exc:
+            print(f"snapshot error for vector store {store_id}: {exc}")
+
+
+def get_vector_store(store_id: str):
+    """
+    Restituisce lo store in memoria, caricandolo in modo lazy dalla configurazione su Mongo.
 
-    # Initialize the vector store
+    Se un altro worker ha aggiornato la configurazione dello store (vedi `object_registry`),
+    la copia locale è considerata obsoleta e viene ricaricata. Le richieste concorrenti per
+    uno store non caricato attendono lo stesso caricamento (`object_registry.get_or_load`).
 
-    vector_store_instance = VECTOR_STORE_CLASSES[vector_store_class](**vector_store_params, embedding_function=embeddings_model)
-    vector_stores[store_id] = vector_store_instance
+    Raises:
+        HTTPException: 404 se lo store non è in memoria e non esiste una configurazione.
+    """
+    def load():
+        cfg = vector_store_collection.find_one({"config.store_id": store_id})
+        return _load_vector_store_config(cfg) if cfg else None
 
-    return {"detail": f"Vector store {store_id} loaded successfully"}
+    instance = object_registry.get_or_load("vector_store", store_id, vector_stores, load)
+    if instance is None:
+        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    return instance
+
+
+async def _aget_vector_store(store_id: str):
+    """Variante async di `get_vector_store`: lettura della config e lazy-load girano nel pool dei vector store."""
+    return await run_blocking("vector_stores", get_vector_store, store_id)
+
+
+def _is_process_local(config: Dict[str, Any]) -> bool:
+    """
+    True se le scritture sullo store sono visibili solo al processo che lo ha caricato: né snapshot (FAISS) né dati
+    condivisi su disco (Chroma persistito); NumpyVectorStore tiene in memoria documenti e mappatura dei file.
+    """
+    params = config.get("params") or {}
+    if config["vector_store_class"] == "Chroma":
+        return not params.get("persist_directory") and not params.get("client_settings")
+    if config["vector_store_class"] == "ShardedVectorStore":
+        return params.get("shard_class", "FAISS") != "FAISS"
+    return config["vector_store_class"] == "NumpyVectorStore"
+
+
+def _prepare_store_job(store_id: str) -> Tuple[Any, Dict[str, bool]]:
+    """
+    Prepara lo store per un job che può girare in un altro processo del nodo (utilities/jobs.py): le modifiche in
+    memoria vengono salvate in uno snapshot, da cui il worker dei job carica lo store.
+
+    Returns:
+        (istanza, affinità da passare ad `aenqueue_job`): il nodo, o il processo corrente per gli store che esistono
+        solo nella sua memoria (eseguiti da `process_job_worker` in questo processo).
+    """
+    instance = get_vector_store(store_id)
+    _snapshot_vector_store(store_id)
+    cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    if cfg and _is_process_local(cfg["config"]):
+        return instance, {"pin_to_process": True}
+    return instance, {"pin_to_node": True}
 
 
 @router.post("/vector_store/offload/{store_id}", response_model=dict)
@@ -405,30 +731,186 @@ async def offload_vector_store(
     """
 
     if store_id not in vector_stores:
-        # tentativo di lazy‑load
-         cfg = vector_store_collection.find_one({"config.store_id": store_id})
+        # non ha senso costruire lo store solo per scaricarlo: basta che esista la configurazione
+        if not await async_vector_store_collection.find_one({"config.store_id": store_id}):
+            raise HTTPException(status_code=404, detail="Vector store not found in memory")
+        return {"detail": f"Vector store {store_id} offloaded successfully"}
 
-         if cfg:
-             load_vector_store(config_id=cfg["_id"])
+    await run_blocking("vector_stores", _offload_vector_store, store_id)
+    return {"detail": f"Vector store {store_id} offloaded successfully"}
 
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
 
+def _offload_vector_store(store_id: str) -> None:
+    """Scarica lo store dal worker: gli store in memoria (FAISS) vengono salvati prima di essere scaricati."""
+    _snapshot_vector_store(store_id)
     # Offload the vector store
-    del vector_stores[store_id]
-    return {"detail": f"Vector store {store_id} offloaded successfully"}
+    instance = vector_stores.pop(store_id, None)
+    if instance is not None:
+        object_registry.unregister("vector_store", store_id)
+        # il client Chroma condiviso resta aperto: si rilascia solo il segmento della collezione dello store
+        write_locked(instance, release_chroma_store, instance)
+
+
+def _estimate_vector_store(vector_store_instance) -> Optional[int]:
+    """Byte occupati dallo store nel worker (e nei processi degli shard), per il budget di memoria."""
+    if hasattr(vector_store_instance, "memory_usage"):
+        usage = vector_store_instance.memory_usage()
+        # testo e metadati dei documenti restano in memoria anche con i vettori mappati da disco
+        return usage["resident_bytes"] + usage["vectors"] * VECTOR_STORE_TEXT_BYTES_PER_DOCUMENT
+    collection = getattr(vector_store_instance, "_collection", None)
+    if hasattr(collection, "count"):
+        return collection.count() * VECTOR_STORE_BYTES_PER_DOCUMENT
+    return None
+
+
+# gli store meno usati di recente vengono scaricati quando il budget di memoria del worker è superato
+lifecycle_manager.register_kind("vector_store", vector_stores, _offload_vector_store, _estimate_vector_store)
+
+
+@router.post("/vector_store/snapshot/{store_id}", response_model=dict)
+async def snapshot_vector_store(
+    store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
+    force: bool = Query(False, description="Write a snapshot even if the store has not changed since the last one.")
+):
+    """
+    Save an on-disk snapshot of an in-memory vector store (FAISS) and record its version in the store configuration.
+
+    Every worker loads the store from the recorded snapshot, and workers holding an older copy reload it on next access.
+    """
+    vector_store_instance = await _aget_vector_store(store_id)
+    if not supports_snapshots(vector_store_instance):
+        raise HTTPException(status_code=400, detail=f"Vector store {store_id} does not support snapshots")
+    snapshot = await run_blocking("vector_stores", _snapshot_vector_store, store_id, force)
+    if snapshot is None:
+        return {"detail": f"Vector store {store_id} has not changed since the last snapshot"}
+    return {"detail": f"Snapshot of vector store {store_id} saved successfully", "snapshot": snapshot}
 
 
 @router.get("/vector_store/loaded_store_ids", response_model=List[str])
-async def get_loaded_store_ids():
+async def get_loaded_store_ids(
+    scope: str = Query("worker", description="'worker' for the stores loaded by the answering worker, 'node' for the stores loaded by any worker on this node.", example="node")
+):
     """
     Get IDs of currently loaded vector stores.
 
     This endpoint returns a list of IDs for vector stores currently loaded in memory.
+    With `scope=node` the answer comes from the shared object registry and does not depend on which worker serves the request.
     """
+    if scope == "node":
+        return await run_blocking("vector_stores", object_registry.list_ids, "vector_store")
     return list(vector_stores.keys())
 
 
+@router.get("/vector_store/query_embedding_cache/stats", response_model=Dict[str, Dict[str, Any]])
+async def get_query_embedding_cache_statistics():
+    """
+    Get the query embedding cache statistics of the answering worker.
+
+    Returns hits, misses, evictions and size of the cache of each embeddings model configuration.
+    """
+    return get_query_embedding_cache_stats()
+
+
+@router.get("/vector_store/document_embedding_cache/stats", response_model=List[Dict[str, Any]])
+async def get_document_embedding_cache_statistics():
+    """
+    Get the number of document embeddings stored in the persistent embedding cache for each embeddings model configuration.
+    """
+    return await run_blocking("mongo", get_document_embedding_cache_stats)
+
+
+def _memory_usage(vector_store_instance) -> Dict[str, Any]:
+    if not hasattr(vector_store_instance, "memory_usage"):
+        return {"supported": False}
+    return {"supported": True, **vector_store_instance.memory_usage()}
+
+
+@router.get("/vector_store/memory", response_model=Dict[str, Dict[str, Any]])
+async def get_vector_stores_memory():
+    """
+    Get the vector memory footprint of every store loaded by the answering worker.
+
+    Stores that do not report their memory usage (Chroma, Elasticsearch) are returned with `supported: false`.
+    """
+    return {store_id: await run_blocking("vector_stores", _memory_usage, instance)
+            for store_id, instance in list(vector_stores.items())}
+
+
+@router.get("/vector_store/search_cache/stats", response_model=Dict[str, Dict[str, Any]])
+async def get_search_cache_statistics():
+    """
+    Get the search result cache statistics of every store loaded by the answering worker.
+
+    Returns hits, misses, invalidations and size of each store's cache; stores without a cache are omitted.
+    """
+    caches = {store_id: get_search_cache(instance) for store_id, instance in list(vector_stores.items())}
+    return {store_id: cache.get_stats() for store_id, cache in caches.items() if cache is not None}
+
+
+@router.get("/vector_store/locks/stats", response_model=Dict[str, Dict[str, Any]])
+async def get_lock_statistics():
+    """
+    Get the concurrency statistics of every store loaded by the answering worker.
+
+    Returns, for each store, the reads and writes that took its lock with their total, maximum and average
+    wait times, the readers and writers currently active or waiting and, when small additions went through
+    the write queue, how many requests were merged into how many writes.
+    """
+    stats = {}
+    for store_id, instance in list(vector_stores.items()):
+        stats[store_id] = {"lock": get_store_lock(instance).get_stats()}
+        queue = peek_write_queue(instance)
+        if queue is not None:
+            stats[store_id]["write_queue"] = queue.get_stats()
+    return stats
+
+
+@router.get("/vector_store/chroma/stats", response_model=Dict[str, Any])
+async def get_chroma_statistics():
+    """
+    Get the Chroma clients opened by the answering worker.
+
+    Chroma stores under the same persist directory (or under a shared root, `CHROMA_SHARED_ROOTS`) share one
+    client with one collection per store. Returns the number of open clients and, for each client, the loaded
+    stores, the collections, the loaded HNSW vector segments and their memory (on-disk size of the loaded indexes).
+    """
+    return await run_blocking("vector_stores", get_chroma_pool_stats)
+
+
+@router.get("/vector_store/memory/{store_id}", response_model=Dict[str, Any])
+async def get_vector_store_memory(
+    store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456")
+):
+    """
+    Get the vector memory footprint of a vector store: resident bytes, float32 equivalent and reduction factor.
+    """
+    vector_store_instance = await _aget_vector_store(store_id)
+    return await run_blocking("vector_stores", _memory_usage, vector_store_instance)
+
+
+@router.post("/vector_store/quantize/{store_id}", response_model=Dict[str, Any])
+async def quantize_vector_store(
+    store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
+    sample_size: int = Query(50000, ge=1, description="Number of vectors used to train the quantizer."),
+    recall_queries: int = Query(100, ge=1, description="Number of stored vectors used as queries to measure recall."),
+    k: int = Query(10, ge=1, description="Number of results compared for recall@k.")
+):
+    """
+    Train the quantizer configured in `params.quantization` and re-encode the store.
+
+    Returns the memory usage before and after quantization and the recall@k of the quantized search
+    against exact search.
+    """
+    vector_store_instance = await _aget_vector_store(store_id)
+    if not hasattr(vector_store_instance, "quantize"):
+        raise HTTPException(status_code=400, detail=f"Vector store {store_id} does not support quantization")
+    try:
+        return await run_blocking("vector_stores", vector_store_instance.quantize,
+                                  sample_size=sample_size, recall_queries=recall_queries, k=k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/vector_store/documents/{store_id}", response_model=dict)
 async def add_documents_to_vector_store(
     store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
@@ -439,24 +921,15 @@ async def add_documents_to_vector_store(
     Add documents to a vector store.
 
     This endpoint adds documents to a vector store specified by the store ID.
+    Small concurrent additions to the same store are merged into a single write.
 
     Returns a confirmation message upon successful addition.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
-
-    vector_store_instance = vector_stores[store_id]
+    vector_store_instance = await _aget_vector_store(store_id)
     langchain_docs = [doc.to_langchain_document() for doc in documents]
 
     # Add documents to vector store
-    vector_store_instance.add_documents(langchain_docs)
+    await _aadd_documents(store_id, vector_store_instance, langchain_docs)
 
     return {"detail": f"Documents added to vector store {store_id} successfully"}
 
@@ -471,25 +944,36 @@ async def add_texts_to_vector_store(
     Add texts to a vector store.
 
     This endpoint adds texts and optional metadata to a vector store specified by the store ID.
+    Small concurrent additions to the same store are merged into a single write.
 
     Returns a confirmation message upon successful addition.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    vector_store_instance = await _aget_vector_store(store_id)
 
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
+    # Add texts to vector store
+    await _aadd_documents(store_id, vector_store_instance,
+                          [Document(page_content=text, metadata=metadata or {})
+                           for text, metadata in zip(texts, metadatas or [None] * len(texts))])
 
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    return {"detail": f"Texts added to vector store {store_id} successfully"}
 
-    vector_store_instance = vector_stores[store_id]
 
-    # Add texts to vector store
-    vector_store_instance.add_texts(texts, metadatas)
+async def _aadd_documents(store_id: str, vector_store_instance, docs: List[Document]) -> List[str]:
+    """Aggiunta dal servizio: nativa async se disponibile, altrimenti dalla coda di scrittura dello store."""
+    if has_native_async(vector_store_instance, "aadd_documents"):
+        ids = await vector_store_instance.aadd_documents(docs)
+        record_added(vector_store_instance, ids, docs)
+    else:
+        # la coda registra le aggiunte negli indici (add_documents_batch)
+        ids = await run_blocking("vector_stores", get_write_queue(vector_store_instance).add_documents, docs)
+    await _astore_written(store_id)
+    return ids
 
-    return {"detail": f"Texts added to vector store {store_id} successfully"}
+
+async def _astore_written(store_id: str) -> None:
+    """Lo store può essere cresciuto: il budget di memoria del worker viene ricontrollato (utilities/lifecycle.py)."""
+    if lifecycle_manager.budget_bytes > 0:
+        await run_blocking("vector_stores", lifecycle_manager.written, "vector_store", store_id)
 
 
 @router.delete("/vector_store/documents/{store_id}", response_model=dict)
@@ -504,22 +988,33 @@ async def remove_documents_from_vector_store(
 
     Returns a confirmation message upon successful removal.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    vector_store_instance = await _aget_vector_store(store_id)
 
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
+    # Remove documents from vector store
+    if has_native_async(vector_store_instance, "adelete"):
+        await vector_store_instance.adelete(ids)
+    else:
+        await run_blocking("vector_stores", write_locked, vector_store_instance, vector_store_instance.delete, ids)
+    record_deleted(vector_store_instance, ids)
 
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    return {"detail": f"Documents removed from vector store {store_id} successfully"}
 
-    vector_store_instance = vector_stores[store_id]
 
-    # Remove documents from vector store
-    vector_store_instance.delete(ids)
+# metodi generici che possono modificare i documenti dello store (l'indice lessicale va ricostruito)
+_WRITE_METHOD_PREFIXES = ("add_", "aadd_", "delete", "adelete", "update_", "aupdate_", "upsert", "merge_from", "reset")
 
-    return {"detail": f"Documents removed from vector store {store_id} successfully"}
+
+async def _aafter_method(store_id: str, vector_store_instance, method_name: str) -> None:
+    """Dopo un metodo generico che può aver modificato lo store: indici invalidati e budget di memoria ricontrollato."""
+    if method_name.startswith(_WRITE_METHOD_PREFIXES):
+        invalidate(vector_store_instance)
+        await _astore_written(store_id)
+
+
+def _call_method(vector_store_instance, method_name: str, method, args, kwargs) -> Any:
+    """Metodo generico: con il lock in scrittura se può modificare lo store, in lettura altrimenti."""
+    locked = write_locked if method_name.startswith(_WRITE_METHOD_PREFIXES) else read_locked
+    return locked(vector_store_instance, method, *args, **kwargs)
 
 
 @router.post("/vector_store/method/{store_id}", response_model=dict)
@@ -535,23 +1030,14 @@ async def execute_vector_store_method(
 
     Returns the result of the method execution.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
-
-    vector_store_instance = vector_stores[store_id]
+    vector_store_instance = await _aget_vector_store(store_id)
 
     if not hasattr(vector_store_instance, method_name):
         raise HTTPException(status_code=400, detail=f"Method {method_name} not found in vector store class {type(vector_store_instance).__name__}")
 
     method = getattr(vector_store_instance, method_name)
-    result = method(**kwargs)
+    result = await run_blocking("vector_stores", _call_method, vector_store_instance, method_name, method, (), kwargs)
+    await _aafter_method(store_id, vector_store_instance, method_name)
 
     return {"detail": f"Method {method_name} executed successfully on vector store {store_id}", "result": result}
 
@@ -559,7 +1045,8 @@ async def execute_vector_store_method(
 @router.post("/vector_store/add_documents_from_store/{store_id}", response_model=dict)
 async def add_documents_from_document_store(
     store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
-    document_collection: str = Query(..., description="The name of the document collection in the document store.", example="my_document_collection")
+    document_collection: str = Query(..., description="The name of the document collection in the document store.", example="my_document_collection"),
+    batch_size: Optional[int] = Query(None, gt=0, description="The number of documents read, embedded and added per batch.", example=500)
 ):
     """
     Add documents to a vector store from a document store collection.
@@ -568,36 +1055,14 @@ async def add_documents_from_document_store(
 
     Returns a confirmation message upon successful addition.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    vector_store_instance = await _aget_vector_store(store_id)
+    batch_size = batch_size or ADD_DOCS_JOB_BATCH_SIZE
 
-    vector_store_instance = vector_stores[store_id]
+    # il cursore viene letto a blocchi: memoria limitata anche per collezioni molto grandi
     document_collection_instance = get_document_collection(document_collection)
-
-    # Recupera i documenti dal document store
-    documents_cursor = document_collection_instance.find()
-
-    # Converte i documenti nel formato richiesto
-    documents = [
-        DocumentModel(
-            page_content=doc["value"]["page_content"],
-            metadata=doc["value"]["metadata"]
-        ).to_langchain_document()
-        for doc in documents_cursor
-    ]
-
-    # Filtra i metadati complessi
-    filtered_documents = filter_complex_metadata(documents)
-
-    # Aggiunge i documenti filtrati al vector store
-    vector_store_instance.add_documents(filtered_documents)
+    await run_blocking("vector_stores", ingest_collection, vector_store_instance,
+                       document_collection_instance.find(batch_size=batch_size), batch_size)
+    await _astore_written(store_id)
 
     return {"detail": f"Documents from collection {document_collection} added to vector store {store_id} successfully"}
 
@@ -615,21 +1080,13 @@ async def update_document_in_vector_store(
 
     Returns a confirmation message upon successful update.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
-
-    vector_store_instance = vector_stores[store_id]
+    vector_store_instance = await _aget_vector_store(store_id)
 
     # Update document in vector store
     updated_document = document.to_langchain_document()
-    vector_store_instance.update_document(document_id, updated_document)
+    await run_blocking("vector_stores", write_locked, vector_store_instance, vector_store_instance.update_document,
+                       document_id, updated_document)
+    record_added(vector_store_instance, [document_id], [updated_document])
 
     return {"detail": f"Document {document_id} updated in vector store {store_id} successfully"}
 
@@ -638,7 +1095,7 @@ async def update_document_in_vector_store(
 async def search_vector_store(
     store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
     query: str = Body(..., description="The search query.", example="example query"),
-    search_type: str = Body(..., description="The type of search to perform. Supported types: 'similarity', 'mmr', 'similarity_score_threshold'", example="similarity"),
+    search_type: str = Body(..., description="The type of search to perform. Supported types: 'similarity', 'mmr', 'similarity_score_threshold', 'hybrid'", example="similarity"),
     search_kwargs: Dict[str, Any] = Body(default_factory=dict, description="Additional keyword arguments for the search method.", example={"k": 4})
 ):
     """
@@ -646,34 +1103,111 @@ async def search_vector_store(
 
     This endpoint allows searching a vector store using the specified search type and query.
 
+    The `hybrid` search type fuses a BM25 lexical search (part numbers, article codes, filenames) with the
+    dense search using reciprocal rank fusion and returns (document, fused score) pairs. Its search kwargs are
+    `k`, `fetch_k`, `filter`, `lexical_weight`, `vector_weight` and `rrf_k`.
+
+    When the store has a search result cache, repeated searches are answered from it until the next write.
+
     Returns a list of documents that match the search criteria.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    vector_store_instance = await _aget_vector_store(store_id)
 
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
+    if search_type not in SEARCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported search type. Supported types are: {', '.join(SEARCH_TYPES)}")
 
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    results = await acached_search(vector_store_instance, query, search_type, search_kwargs,
+                                   lambda: _asearch_text(vector_store_instance, query, search_type, search_kwargs))
+    return _search_results_to_models(search_type, results)
 
-    vector_store_instance = vector_stores[store_id]
 
-    if search_type not in ["similarity", "mmr", "similarity_score_threshold"]:
-        raise HTTPException(status_code=400, detail="Unsupported search type. Supported types are: 'similarity', 'mmr', 'similarity_score_threshold'")
-
-    if search_type == "similarity":
-        results = vector_store_instance.similarity_search(query, **search_kwargs)
-    elif search_type == "mmr":
-        results = vector_store_instance.max_marginal_relevance_search(query, **search_kwargs)
-    elif search_type == "similarity_score_threshold":
-        results = vector_store_instance.similarity_search_with_relevance_scores(query, **search_kwargs)
+def _search_results_to_models(search_type: str, results: List[Any]) -> List[DocumentModel | Tuple[DocumentModel, float]]:
+    if search_type in ("similarity_score_threshold", "hybrid"):
         return [(DocumentModel.from_langchain_document(result[0]), result[1]) for result in results]
-
     return [DocumentModel.from_langchain_document(result) for result in results]
 
 
+async def _asearch_text(vector_store_instance, query: str, search_type: str, search_kwargs: Dict[str, Any]):
+    """Ricerca testuale: l'embedding della query viene calcolato dallo store."""
+    if search_type == "hybrid":
+        return await run_blocking("vector_stores", read_locked, vector_store_instance, hybrid_search,
+                                  vector_store_instance, query, search_kwargs)
+    async_method, sync_method = TEXT_SEARCH_METHODS[search_type]
+    if has_native_async(vector_store_instance, async_method):
+        return await getattr(vector_store_instance, async_method)(query, **search_kwargs)
+    return await run_blocking("vector_stores", read_locked, vector_store_instance,
+                              getattr(vector_store_instance, sync_method), query, **search_kwargs)
+
+
+@router.post("/vector_store/batch_search/{store_id}", response_model=List[BatchSearchResultModel])
+async def batch_search_vector_store(
+    store_id: str = Path(..., description="The unique ID of the vector store instance.", example="abcd1234-efgh-5678-ijkl-9012mnop3456"),
+    queries: List[SearchRequestModel] = Body(..., embed=True, description="The searches to perform, each with its own search type and search kwargs (k, filter, ...).", example=[
+        {"query": "first query", "search_type": "similarity", "search_kwargs": {"k": 4}},
+        {"query": "second query", "search_type": "mmr", "search_kwargs": {"k": 2, "filter": {"author": "John Doe"}}}])
+):
+    """
+    Run many searches against a vector store in one request.
+
+    The embeddings of all the queries are computed with a single call to the store's embeddings model,
+    then the searches run in parallel. Stores that cannot search by vector for a given search type
+    fall back to the regular text search for that query.
+
+    Returns one result per query, in the same order. A query that fails reports its `error` without failing the others.
+    """
+    if len(queries) > BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Too many queries: at most {BATCH_SEARCH_MAX_QUERIES} are allowed")
+
+    unsupported = sorted({q.search_type for q in queries if q.search_type not in SEARCH_TYPES})
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported search types {unsupported}. Supported types are: {', '.join(SEARCH_TYPES)}")
+
+    vector_store_instance = await _aget_vector_store(store_id)
+
+    # le query già in cache non vengono né embeddate né eseguite
+    cache = get_search_cache(vector_store_instance)
+    keys = [search_cache_key(q.query, q.search_type, q.search_kwargs) for q in queries]
+    cached = [cache.get(key) if cache is not None else None for key in keys]
+    generation = cache.generation if cache is not None else 0
+
+    # un solo embedding batch per tutte le query ricercabili per vettore
+    embeddings_model = get_store_embeddings(vector_store_instance)
+    by_vector = [hit is None and embeddings_model is not None
+                 and supports_search_by_vector(vector_store_instance, q.search_type)
+                 for q, hit in zip(queries, cached)]
+    vector_texts = list(dict.fromkeys(q.query for q, use_vector in zip(queries, by_vector) if use_vector))
+    vectors: Dict[str, List[float]] = {}
+    if vector_texts:
+        embedded = await run_blocking("embeddings", embed_queries, embeddings_model, vector_texts)
+        vectors = dict(zip(vector_texts, embedded))
+
+    async def run_query(request: SearchRequestModel, use_vector: bool, key: str,
+                        hit: Optional[List[Any]]) -> BatchSearchResultModel:
+        try:
+            if hit is not None:
+                results = hit
+            elif use_vector and request.search_type == "hybrid":
+                results = await run_blocking("vector_stores", read_locked, vector_store_instance, hybrid_search,
+                                             vector_store_instance, request.query, request.search_kwargs,
+                                             vectors[request.query])
+            elif use_vector:
+                results = await run_blocking("vector_stores", read_locked, vector_store_instance, search_by_vector,
+                                             vector_store_instance, request.search_type, vectors[request.query],
+                                             request.search_kwargs)
+            else:
+                results = await _asearch_text(vector_store_instance, request.query,
+                                              request.search_type, request.search_kwargs)
+        except Exception as e:
+            return BatchSearchResultModel(query=request.query, search_type=request.search_type, error=str(e))
+        if hit is None and cache is not None:
+            cache.put(key, results, generation)
+        return BatchSearchResultModel(query=request.query, search_type=request.search_type,
+                                      results=_search_results_to_models(request.search_type, results))
+
+    return await asyncio.gather(*(run_query(q, use_vector, key, hit)
+                                  for q, use_vector, key, hit in zip(queries, by_vector, keys, cached)))
+
+
 @router.post("/vector_store/retrieve/{store_id}", response_model=List[DocumentModel | Tuple[DocumentModel, float]])
 async def vector_store_as_retriever(
         store_id: str = Path(..., description="The unique ID of the vector store instance.",
@@ -693,17 +1227,7 @@ async def vector_store_as_retriever(
 
     Returns a list of documents that match the search criteria.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
-
-    vector_store_instance = vector_stores[store_id]
+    vector_store_instance = await _aget_vector_store(store_id)
 
     # Ensure the vector store has the as_retriever method
     if not hasattr(vector_store_instance, "as_retriever"):
@@ -715,7 +1239,7 @@ async def vector_store_as_retriever(
 
     # Perform the retrieval
     #results = retriever.retrieve(query)
-    results = retriever.invoke(input=query)
+    results = await run_blocking("vector_stores", read_locked, vector_store_instance, retriever.invoke, input=query)
 
     #if search_type == "similarity_score_threshold":
     #    return [(DocumentModel.from_langchain_document(result[0]), result[1]) for result in results]
@@ -734,31 +1258,27 @@ async def filter_vector_store(
     Filter documents in a vector store.
 
     This endpoint retrieves documents from a vector store that match the specified filter criteria.
+    Filters use the Chroma where-clause syntax (equality, `$eq`, `$ne`, `$in`, `$nin`, `$gt`, `$gte`, `$lt`,
+    `$lte`, `$and`, `$or`) and are served by an in-memory metadata index built on first use (FAISS, Chroma,
+    NumpyVectorStore); other stores must provide their own `filter_documents` method.
 
-    Returns a list of documents that match the filter criteria.
+    Returns a list of documents that match the filter criteria, in insertion order.
     """
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
-
-    vector_store_instance = vector_stores[store_id]
-
-    # Assuming vector_store_instance has a method to filter documents based on metadata
-    if not hasattr(vector_store_instance, "filter_documents"):
-        raise HTTPException(status_code=400, detail=f"Vector store class {type(vector_store_instance).__name__} does not support filtering")
+    vector_store_instance = await _aget_vector_store(store_id)
 
-    results = vector_store_instance.filter_documents(filter, skip=skip, limit=limit)
+    try:
+        results = await run_blocking("vector_stores", read_locked, vector_store_instance, filter_store_documents,
+                                     vector_store_instance, filter, skip=skip, limit=limit)
+    except ValueError as e:
+        if not hasattr(vector_store_instance, "filter_documents"):
+            raise HTTPException(status_code=400, detail=str(e))
+        results = await run_blocking("vector_stores", read_locked, vector_store_instance,
+                                     vector_store_instance.filter_documents, filter, skip=skip, limit=limit)
     return [DocumentModel.from_langchain_document(doc) for doc in results]
 
 
 @router.post("/vector_store/method/", response_description="Execute a method of a vector store instance")
-async def execute_vector_store_method(request: ExecuteMethodRequest):
+async def execute_vector_store_method_from_request(request: ExecuteMethodRequest):
     """
     Execute a method of a vector store instance.
 
@@ -772,15 +1292,7 @@ async def execute_vector_store_method(request: ExecuteMethodRequest):
     args = request.args
     kwargs = request.kwargs
 
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    await _aget_vector_store(store_id)
 
     try:
         vector_store_instance = vector_stores.get(store_id)
@@ -793,7 +1305,9 @@ async def execute_vector_store_method(request: ExecuteMethodRequest):
         method = getattr(vector_store_instance, method_name)
 
         if callable(method):
-            result = method(*args, **kwargs)
+            result = await run_blocking("vector_stores", _call_method, vector_store_instance, method_name,
+                                        method, args, kwargs)
+            await _aafter_method(store_id, vector_store_instance, method_name)
             return {"result": result}
         else:
             raise ValueError(f"'{method_name}' is not a callable method")
@@ -812,15 +1326,7 @@ async def get_vector_store_attribute(request: GetAttributeRequest):
     store_id = request.store_id
     attribute_name = request.attribute_name
 
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
-
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
-
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
+    await _aget_vector_store(store_id)
 
     try:
         vector_store_instance = vector_stores.get(store_id)
@@ -843,12 +1349,12 @@ async def get_vector_store_attribute(request: GetAttributeRequest):
     summary="Avvia in background l’import da document store"
 )
 async def add_documents_from_document_store_async(
-    background_tasks: BackgroundTasks,
     store_id: str = Path(...,
                          description="ID del vector store già caricato"),
     document_collection: str = Query(...,
                                      description="Nome della collezione nel document store"),
-    task_id: Optional[str] = Query(None, description="Task ID")
+    task_id: Optional[str] = Query(None, description="Task ID"),
+    batch_size: Optional[int] = Query(None, gt=0, description="Documenti letti, embeddati e aggiunti per blocco")
 ):
     """
     Variante non-bloccante di **/add_documents_from_store/{store_id}**.\n
@@ -856,31 +1362,161 @@ async def add_documents_from_document_store_async(
     **/vector_store/task_status/{task_id}**.
     """
 
-    if store_id not in vector_stores:
-        # tentativo di lazy‑load
-        cfg = vector_store_collection.find_one({"config.store_id": store_id})
+    _, affinity = await run_blocking("vector_stores", _prepare_store_job, store_id)
 
-        if cfg:
-            load_vector_store(config_id=cfg["_id"])
+    try:
+        job = await aenqueue_job(
+            "vector_store_add_documents",
+            {"store_id": store_id, "document_collection": document_collection, "batch_size": batch_size},
+            job_id=task_id,
+            endpoint=f"/vector_store/add_documents_from_store_async/{store_id}",
+            **affinity,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
+    return {"task_id": job["id"], "status": job["status"]}
 
-    if store_id not in vector_stores:
-        raise HTTPException(status_code=404, detail="Vector store not found in memory")
 
-    task_id = str(uuid.uuid4()) if not task_id else task_id
+@router.post(
+    "/vector_store/sync_from_store/{store_id}",
+    response_model=dict,
+    summary="Avvia in background la sincronizzazione incrementale da document store"
+)
+async def sync_from_document_store(
+    store_id: str = Path(...,
+                         description="ID del vector store"),
+    document_collection: str = Query(...,
+                                     description="Nome della collezione nel document store"),
+    task_id: Optional[str] = Query(None, description="Task ID"),
+    batch_size: Optional[int] = Query(None, gt=0, description="Documenti confrontati e indicizzati per blocco")
+):
+    """
+    Sincronizza il vector store con una collezione del document store.\n
+    Aggiunge solo i documenti nuovi, sostituisce quelli modificati e rimuove
+    quelli cancellati dalla collezione; se nulla è cambiato non calcola embedding.
+    Restituisce subito `task_id`, interrogabile con **/vector_store/task_status/{task_id}**.
+    """
+
+    _, affinity = await run_blocking("vector_stores", _prepare_store_job, store_id)
 
-    _create_task_record(
-        task_id,
-        endpoint=f"/vector_store/add_documents_from_store_async/{store_id}",
-        payload={"store_id": store_id,
-                 "document_collection": document_collection},
-    )
-    background_tasks.add_task(
-        _process_add_docs_from_store_job,
-        store_id=store_id,
-        task_id=task_id,
-        document_collection=document_collection,
-    )
-    return {"task_id": task_id, "status": "PENDING"}
+    try:
+        job = await aenqueue_job(
+            "vector_store_sync",
+            {"store_id": store_id, "document_collection": document_collection, "batch_size": batch_size},
+            job_id=task_id,
+            endpoint=f"/vector_store/sync_from_store/{store_id}",
+            **affinity,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
+    return {"task_id": job["id"], "status": job["status"]}
+
+
+@router.get(
+    "/vector_store/sync_status/{store_id}",
+    response_model=dict,
+    summary="Esito dell'ultima sincronizzazione di una collezione in un vector store"
+)
+async def get_sync_from_store_status(
+    store_id: str = Path(..., description="ID del vector store"),
+    document_collection: str = Query(..., description="Nome della collezione nel document store")
+):
+    status = await run_blocking("mongo", get_sync_status, store_id, document_collection)
+    if not status:
+        raise HTTPException(status_code=404, detail="Sync status not found")
+    return status
+
+
+@router.post(
+    "/vector_store/rebuild_index/{store_id}",
+    response_model=dict,
+    summary="Costruisce in background l'indice ANN (IVF/HNSW) di un vector store FAISS"
+)
+async def rebuild_vector_store_index(
+    store_id: str = Path(..., description="ID del vector store"),
+    ann: Optional[Dict[str, Any]] = Body(None, description="Struttura dell'indice; default `params.ann` dello store.",
+                                         example={"type": "hnsw", "M": 32, "efConstruction": 80, "efSearch": 64}),
+    quantization: Optional[Dict[str, Any]] = Body(None, description="Codifica dei vettori; default `params.quantization` dello store.",
+                                                  example={"type": "sq8"}),
+    sample_size: int = Query(50000, ge=1, description="Vettori usati per l'addestramento (IVF, quantizzazione)"),
+    recall_queries: int = Query(100, ge=1, description="Vettori dello store usati come query per misurare il recall"),
+    k: int = Query(10, ge=1, description="Risultati confrontati per il recall@k"),
+    task_id: Optional[str] = Query(None, description="Task ID")
+):
+    """
+    Addestra e popola un nuovo indice mentre le ricerche continuano sul vecchio, poi lo sostituisce in modo atomico.\n
+    `nprobe` (IVF) ed `efSearch` (HNSW) si possono poi regolare per singola query nei `search_kwargs`.
+    Restituisce subito `task_id`; il risultato (recall@k, memoria, tempi) è in **/vector_store/task_status/{task_id}**.
+    """
+    vector_store_instance, affinity = await run_blocking("vector_stores", _prepare_store_job, store_id)
+    if not hasattr(vector_store_instance, "rebuild"):
+        raise HTTPException(status_code=400, detail=f"Vector store {store_id} does not support index rebuilds")
+
+    try:
+        job = await aenqueue_job(
+            "vector_store_rebuild_index",
+            {"store_id": store_id, "ann": ann, "quantization": quantization,
+             "sample_size": sample_size, "recall_queries": recall_queries, "k": k},
+            job_id=task_id,
+            endpoint=f"/vector_store/rebuild_index/{store_id}",
+            **affinity,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
+    return {"task_id": job["id"], "status": job["status"]}
+
+
+@router.post(
+    "/vector_store/rebuild/{store_id}",
+    response_model=dict,
+    summary="Ricostruisce in background un vector store con una nuova configurazione, senza interrompere le ricerche"
+)
+async def rebuild_vector_store(
+    store_id: str = Path(..., description="ID del vector store"),
+    vector_store_class: Optional[str] = Body(None, description="Nuova classe dello store; default quella attuale.",
+                                             example="FAISS"),
+    params: Optional[Dict[str, Any]] = Body(None, description="Nuovi parametri dello store; default quelli attuali. "
+                                                              "Directory, collezione e indice uguali a quelli in uso vengono spostati in `<nome>.rebuild-<id>`.",
+                                            example={"persist_directory": "vector_stores/project_x"}),
+    embeddings_model_class: Optional[str] = Body(None, description="Nuovo modello di embedding; default quello attuale.",
+                                                 example="HuggingFaceEmbeddings"),
+    embeddings_params: Optional[Dict[str, Any]] = Body(None, description="Parametri del nuovo modello di embedding.",
+                                                       example={"model_name": "sentence-transformers/all-MiniLM-L6-v2"}),
+    document_collection: Optional[str] = Query(None, description="Collezione del document store da cui ricostruire; default i documenti dello store"),
+    batch_size: Optional[int] = Query(None, gt=0, description="Documenti embeddati e inseriti per blocco"),
+    validation_queries: int = Query(REBUILD_VALIDATION_QUERIES, ge=0, description="Documenti cercati per misurare il self-recall"),
+    min_self_recall: float = Query(REBUILD_MIN_SELF_RECALL, ge=0, le=1, description="Self-recall@k minimo per sostituire lo store"),
+    k: int = Query(10, ge=1, description="Risultati considerati per il self-recall@k"),
+    task_id: Optional[str] = Query(None, description="Task ID")
+):
+    """
+    Costruisce in background una nuova istanza dello store dalla configurazione indicata (modello di embedding,
+    classe, parametri), popolata dalla collezione del document store o dai documenti dello store stesso.\n
+    Le ricerche continuano sullo store attuale; le scritture arrivate nel frattempo vengono riportate sulla nuova
+    istanza che, se supera la validazione (numero di documenti, self-recall@k), sostituisce lo store in modo atomico
+    e ne aggiorna la configurazione. Restituisce subito `task_id`, interrogabile con **/vector_store/task_status/{task_id}**.
+    """
+    _, affinity = await run_blocking("vector_stores", _prepare_store_job, store_id)
+    if vector_store_class is not None and vector_store_class not in VECTOR_STORE_CLASSES:
+        raise HTTPException(status_code=400, detail=f"Vector store class {vector_store_class} not supported")
+    if embeddings_model_class is not None and embeddings_model_class not in EMBEDDINGS_MODELS:
+        raise HTTPException(status_code=400, detail=f"Embeddings model class {embeddings_model_class} not supported")
+
+    try:
+        job = await aenqueue_job(
+            "vector_store_rebuild",
+            {"store_id": store_id, "document_collection": document_collection,
+             "vector_store_class": vector_store_class, "params": params,
+             "embeddings_model_class": embeddings_model_class, "embeddings_params": embeddings_params,
+             "batch_size": batch_size, "validation_queries": validation_queries,
+             "min_self_recall": min_self_recall, "k": k},
+            job_id=task_id,
+            endpoint=f"/vector_store/rebuild/{store_id}",
+            **affinity,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already exists")
+    return {"task_id": job["id"], "status": job["status"]}
 
 
 @router.get(
@@ -891,7 +1527,22 @@ async def add_documents_from_document_store_async(
 async def get_task_status(
     task_id: str = Path(..., description="ID restituito dall’endpoint async")
 ):
-    task = client[db_name]["tasks"].find_one({"id": task_id})
+    task = await aget_job(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return TaskInfo(**task)
+
+
+@router.post(
+    "/vector_store/task_cancel/{task_id}",
+    response_model=TaskInfo,
+    summary="Cancella un job lanciato in background"
+)
+async def cancel_task(
+    task_id: str = Path(..., description="ID restituito dall’endpoint async")
+):
+    task = await acancel_job(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -0,0 +1,223 @@
+"""
+chroma_pool.py
+
+Client Chroma condivisi tra gli store dello stesso worker.
+
+`Chroma(persist_directory=...)` apre un client per store: il flusso RAG crea
+uno store per contesto (`vector_stores/{context}`), quindi ogni worker finisce
+con decine di connessioni SQLite, cache di segmenti HNSW e thread di
+background. Con il pool:
+
+- gli store con la stessa `persist_directory` usano lo stesso client;
+- gli store la cui `persist_directory` è sotto una radice condivisa
+  (`CHROMA_SHARED_ROOTS`) usano il client della radice, ciascuno con la
+  propria collezione, chiamata come il percorso relativo alla radice (più
+  l'eventuale `collection_name` esplicito). Una directory che contiene già
+  un database Chroma (`chroma.sqlite3`, creato prima del pool) continua a
+  usare il proprio client, così i dati esistenti restano leggibili.
+
+Le configurazioni con `client` o `client_settings` propri non passano dal pool.
+
+I segmenti HNSW caricati appartengono al client, non allo store: scaricare
+uno store (offload o budget di memoria, utilities/lifecycle.py) rilascia il
+segmento della sua collezione se nessun altro store caricato la usa. Con
+`CHROMA_MEMORY_LIMIT_MB` i client tengono in memoria al più quella quantità
+di segmenti (cache LRU di Chroma), qualunque sia il numero di store.
+
+Le scritture su una collezione persistita possono arrivare da qualsiasi
+worker del nodo: gli store del pool sono registrati con `track_node_writes`
+(store_index.py), così cache dei risultati e indici BM25/metadati di un
+worker vengono scartati quando un altro worker scrive sulla stessa collezione.
+
+Client aperti, store e collezioni per client e memoria dei segmenti caricati
+(dimensione su disco dell'indice HNSW, caricato per intero) sono esposti da
+`/vector_store/chroma/stats`.
+
+Configurazione via env:
+
+    CHROMA_SHARED_ROOTS     (es. "vector_stores"; default nessuna radice condivisa)
+    CHROMA_MEMORY_LIMIT_MB  (default 0 = nessun limite ai segmenti caricati per client)
+"""
+
+import hashlib
+import os
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from vector_stores.utilities.store_index import track_node_writes
+
+CHROMA_SHARED_ROOTS = [os.path.abspath(root.strip())
+                       for root in os.getenv("CHROMA_SHARED_ROOTS", "").split(",") if root.strip()]
+CHROMA_MEMORY_LIMIT_MB = float(os.getenv("CHROMA_MEMORY_LIMIT_MB", "0"))
+
+# nome della collezione usato da langchain quando non ne viene indicato uno
+DEFAULT_COLLECTION_NAME = "langchain"
+# file creato da Chroma (>= 0.4) nella directory di persistenza
+_CHROMA_DB_FILE = "chroma.sqlite3"
+
+_MB = 1024 * 1024
+
+# percorso assoluto -> client
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+# store caricato -> (percorso del client, collezione); scompare con l'istanza dello store
+_stores: "weakref.WeakKeyDictionary[Any, Tuple[str, str]]" = weakref.WeakKeyDictionary()
+
+
+def _shared_root(path: str) -> Optional[str]:
+    """Radice condivisa più specifica che contiene `path`."""
+    roots = [root for root in CHROMA_SHARED_ROOTS if path == root or path.startswith(root + os.sep)]
+    return max(roots, key=len) if roots else None
+
+
+def collection_name_for(relative_path: str, collection_name: Optional[str] = None) -> str:
+    """
+    Nome di collezione valido per Chroma (3-63 caratteri alfanumerici, `_`, `-` o `.`, estremi alfanumerici)
+    derivato dal percorso relativo alla radice condivisa; i nomi troppo lunghi vengono accorciati con un hash.
+    """
+    parts = [part for part in relative_path.split(os.sep) if part and part != "."]
+    if collection_name:
+        parts.append(collection_name)
+    raw = "__".join(parts) or DEFAULT_COLLECTION_NAME
+    name = re.sub(r"[^a-zA-Z0-9_.-]", "_", raw).replace("..", "_")
+    name = name.strip("_.-")
+    if len(name) < 3 or len(name) > 63 or name != raw:
+        digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=4).hexdigest()
+        name = f"{name[:54].rstrip('_.-')}-{digest}" if name else digest
+    return name
+
+
+def get_chroma_client(path: str) -> Any:
+    """Client persistente per la directory `path`, creato alla prima richiesta e condiviso dagli store."""
+    path = os.path.abspath(path)
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            import chromadb
+            from chromadb.config import Settings
+
+            # impostazioni di default come `Chroma(persist_directory=...)`: Chroma rifiuta due client sulla stessa
+            # directory con impostazioni diverse nello stesso processo
+            settings = Settings()
+            if CHROMA_MEMORY_LIMIT_MB > 0:
+                settings.chroma_segment_cache_policy = "LRU"
+                settings.chroma_memory_limit_bytes = int(CHROMA_MEMORY_LIMIT_MB * _MB)
+            os.makedirs(path, exist_ok=True)
+            client = _clients[path] = chromadb.PersistentClient(path=path, settings=settings)
+        return client
+
+
+def resolve_chroma_params(params: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Parametri di `Chroma(...)` con il client del pool al posto della `persist_directory`.
+
+    Returns:
+        (percorso del client, parametri); percorso None se la configurazione non passa dal pool
+        (store in memoria, `client` o `client_settings` propri).
+    """
+    persist_directory = params.get("persist_directory")
+    if not persist_directory or params.get("client") is not None or params.get("client_settings") is not None:
+        return None, params
+
+    path = os.path.abspath(persist_directory)
+    root = _shared_root(path)
+    if root is None or root == path or os.path.exists(os.path.join(path, _CHROMA_DB_FILE)):
+        # client della directory dello store (già usata da sola prima del pool, o fuori dalle radici)
+        return path, {**params, "client": get_chroma_client(path)}
+
+    collection_name = collection_name_for(os.path.relpath(path, root), params.get("collection_name"))
+    return root, {**params, "client": get_chroma_client(root), "collection_name": collection_name}
+
+
+def build_chroma_store(chroma_class: Any, params: Dict[str, Any], embedding_function: Any) -> Any:
+    """Istanzia uno store Chroma sul client del pool (vedi `resolve_chroma_params`)."""
+    path, params = resolve_chroma_params(params)
+    instance = chroma_class(**params, embedding_function=embedding_function)
+    if path is not None:
+        _stores[instance] = (path, instance._collection.name)
+        track_node_writes(instance, f"chroma:{path}:{instance._collection.name}")
+    return instance
+
+
+def _segment_manager(client: Any) -> Any:
+    from chromadb.segment import SegmentManager
+
+    return client._system.instance(SegmentManager)
+
+
+def _loaded_vector_segments(client: Any) -> Dict[Any, Any]:
+    """Segmenti vettoriali (HNSW) caricati dal client: id della collezione -> segmento."""
+    from chromadb.types import SegmentScope
+
+    cache = _segment_manager(client).segment_cache[SegmentScope.VECTOR]
+    return dict(getattr(cache, "cache", {}))
+
+
+def _segment_bytes(path: str, segment: Any) -> int:
+    """L'indice HNSW di un segmento caricato è tutto in memoria: la sua dimensione su disco ne è la stima."""
+    total = 0
+    for dirpath, _, filenames in os.walk(os.path.join(path, str(segment["id"]))):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def release_chroma_store(instance: Any) -> None:
+    """
+    Rilascia il segmento HNSW della collezione dello store scaricato, se nessun altro store caricato la usa
+    (il client resta aperto per gli altri store).
+    """
+    entry = _stores.pop(instance, None)
+    if entry is None or entry in _stores.values():
+        return
+    path, _ = entry
+    client = _clients.get(path)
+    if client is None:
+        return
+    try:
+        manager = _segment_manager(client)
+        collection_id = instance._collection.id
+        from chromadb.types import SegmentScope
+
+        segment = manager.segment_cache[SegmentScope.VECTOR].pop(collection_id)
+        if segment is not None:
+            manager.callback_cache_evict(segment)
+    except Exception as exc:
+        print(f"chroma segment release error for {path}: {exc}")
+
+
+def get_chroma_pool_stats() -> Dict[str, Any]:
+    with _clients_lock:
+        clients = dict(_clients)
+    stores = list(_stores.values())
+    by_client: List[Dict[str, Any]] = []
+    for path, client in clients.items():
+        entry: Dict[str, Any] = {
+            "path": path,
+            "shared_root": path in CHROMA_SHARED_ROOTS,
+            "loaded_stores": sum(1 for store_path, _ in stores if store_path == path),
+            "collections": None,
+            "loaded_vector_segments": None,
+            "segment_bytes": None,
+        }
+        try:
+            entry["collections"] = client.count_collections()
+            segments = _loaded_vector_segments(client)
+            entry["loaded_vector_segments"] = len(segments)
+            entry["segment_bytes"] = sum(_segment_bytes(path, segment) for segment in segments.values())
+        except Exception as exc:
+            entry["error"] = str(exc)
+        by_client.append(entry)
+    return {
+        "open_clients": len(clients),
+        "shared_roots": CHROMA_SHARED_ROOTS,
+        "memory_limit_bytes": int(CHROMA_MEMORY_LIMIT_MB * _MB),
+        "loaded_stores": len(stores),
+        "segment_bytes": sum(entry["segment_bytes"] or 0 for entry in by_client),
+        "clients": by_client,
+    }
@@ -0,0 +1,635 @@
+"""
+faiss_store.py
+
+`FaissVectorStore`: FAISS LangChain configurabile da `params`.
+
+`FAISS(**params, embedding_function=...)` richiede indice, docstore e mappa
+degli id già costruiti, quindi non può essere istanziato dalla sola
+configurazione salvata. Questa sottoclasse crea un indice flat vuoto e resta
+compatibile con `FAISS.load_local`. La dimensione è quella dell'indice
+caricato (snapshot), altrimenti `dimension`, altrimenti quella del modello di
+embedding (`embedding_dimension`): il testo di prova passa da `embed_documents`,
+quindi dalla cache persistente dei documenti (una sola chiamata al modello per
+configurazione del modello) e non dalla cache delle query.
+
+L'indice di destinazione è descritto da due parametri opzionali:
+
+- `ann`, struttura di ricerca approssimata:
+
+      {"type": "ivf", "nlist": 1024, "nprobe": 16}
+      {"type": "hnsw", "M": 32, "efConstruction": 80, "efSearch": 64}
+
+  (`nlist` di default = 4 * sqrt(N) al momento della costruzione);
+- `quantization`, codifica dei vettori:
+
+      {"type": "sq8"}                          -> 1 byte per dimensione (4x)
+      {"type": "pq", "m": 16, "nbits": 8}      -> m byte per vettore
+      {"type": "pq", "m": 16, "rerank": "sq8"} -> PQ + riordino dei k*rerank_factor
+                                                   candidati con codici SQ8 ("flat" = vettori float, None = nessun riordino)
+
+L'indice viene costruito (addestramento su un campione, poi inserimento di
+tutti i vettori) automaticamente quando lo store raggiunge `train_size`
+vettori (0 = solo su richiesta) oppure con `rebuild()`, che misura anche il
+recall@k rispetto alla ricerca esatta e sostituisce l'indice in modo atomico:
+le ricerche in corso terminano sul vecchio indice, le aggiunte arrivate
+durante la costruzione vengono riportate sul nuovo. I vettori di partenza
+sono quelli dell'indice corrente se li conserva esatti (flat, IVF/HNSW flat,
+riordino "flat"); da un indice quantizzato (SQ8, PQ) sarebbero solo
+approssimati e ogni ricostruzione perderebbe altro recall, quindi i testi
+vengono embeddati di nuovo con il modello dello store (per i documenti già
+indicizzati la cache degli embedding, embedding_cache.py, evita le chiamate
+al modello). Senza modello (es. shard di ShardedVectorStore) si usano i
+vettori approssimati.
+
+`nprobe` (IVF) ed `efSearch` (HNSW) possono essere passati per singola query
+nei `search_kwargs`.
+
+Un filtro sui metadati in forma di dizionario viene risolto sull'indice dei
+metadati (metadata_index.py) e passato a FAISS come `IDSelector`: la ricerca
+considera solo i candidati che lo soddisfano, invece di prendere `fetch_k`
+risultati e filtrarli a posteriori (che con filtri selettivi restituisce
+meno di `k` documenti). Gli indici che non accettano un `IDSelector` (PQ
+senza IVF né HNSW, vedi `supports_selector`) cercano invece più candidati,
+finché non trovano `k` documenti che soddisfano il filtro o li hanno
+considerati tutti. I filtri callable restano filtri a posteriori.
+
+Concorrenza: lo store ha un lock lettori/scrittore (`rw_lock`, vedi
+store_locks.py), lo stesso usato dal servizio per lo store. Le ricerche lo
+prendono in lettura e procedono in parallelo; aggiunte, cancellazioni e
+sostituzione dell'indice lo prendono in scrittura. Gli embedding dei testi
+vengono calcolati prima di prendere il lock.
+
+Snapshot: `save_snapshot()` scrive indice e docstore nel formato di
+`save_local`; `load_snapshot()` li rilegge mappando l'indice in memoria
+(`IO_FLAG_MMAP`) quando il tipo di indice lo consente, così più worker
+condividono le stesse pagine. Alla prima scrittura l'indice mappato viene
+riletto in memoria privata.
+"""
+
+import copy
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+
+from vector_stores.utilities.metadata_index import get_metadata_index
+from vector_stores.utilities.quantization import QUANTIZATION_TYPES, CHUNK_ROWS, measure_recall
+from vector_stores.utilities.store_index import notify_added, notify_deleted
+from vector_stores.utilities.store_locks import ReadWriteLock, check_not_retired
+
+ANN_TYPES = ("flat", "ivf", "hnsw")
+
+
+def index_memory_bytes(index: Any) -> int:
+    """Byte occupati dai codici/vettori dell'indice."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return index_memory_bytes(index.base_index) + index_memory_bytes(index.refine_index)
+    try:
+        return index.sa_code_size() * index.ntotal
+    except RuntimeError:
+        # indici senza codici standalone (es. grafi): dimensione serializzata
+        return int(faiss.serialize_index(index).nbytes)
+
+
+def without_ids(index: Any, ids: np.ndarray) -> Any:
+    """
+    Indice senza le posizioni `ids`, con le posizioni successive compattate (come `IndexFlat.remove_ids`,
+    che è la semantica attesa da `FAISS.delete`). IVF e HNSW non compattano le posizioni (o non
+    supportano la rimozione): l'indice viene svuotato e ripopolato con i vettori rimanenti, senza riaddestrarlo.
+    """
+    # il proxy di downcast_index non possiede l'indice C++: si restituisce sempre `index`
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, faiss.IndexFlatCodes):
+        concrete.remove_ids(ids)
+        return index
+    if isinstance(concrete, faiss.IndexRefine) and isinstance(faiss.downcast_index(concrete.base_index), faiss.IndexFlatCodes):
+        faiss.downcast_index(concrete.base_index).remove_ids(ids)
+        faiss.downcast_index(concrete.refine_index).remove_ids(ids)
+        concrete.ntotal = concrete.base_index.ntotal
+        return index
+    keep = np.setdiff1d(np.arange(index.ntotal), ids)
+    vectors = index.reconstruct_n(0, index.ntotal)[keep]
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    rebuilt.add(vectors)
+    enable_reconstruct(rebuilt)
+    return rebuilt
+
+
+def has_exact_vectors(index: Any) -> bool:
+    """True se `reconstruct` sull'indice restituisce i vettori inseriti (nessuna codifica con perdita)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return has_exact_vectors(index.refine_index)
+    if isinstance(index, faiss.IndexHNSW):
+        return has_exact_vectors(index.storage)
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+
+def enable_reconstruct(index: Any) -> None:
+    """Mappa diretta sugli indici IVF: serve a `reconstruct`, usato da MMR e dalle ricostruzioni."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        enable_reconstruct(index.base_index)
+    elif isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+
+
+def supports_selector(index: Any) -> bool:
+    """True se la ricerca sull'indice accetta un `IDSelector` nei parametri (IndexPQ lo rifiuta)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return supports_selector(index.base_index)
+    if isinstance(index, faiss.IndexPQ):
+        return False
+    return isinstance(index, (faiss.IndexFlatCodes, faiss.IndexIVF, faiss.IndexHNSW))
+
+
+def _search_parameters(index: Any, nprobe: Optional[int], ef_search: Optional[int], selector: Any = None) -> Any:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        base = _search_parameters(index.base_index, nprobe, ef_search, selector)
+        if base is None:
+            return None
+        params = faiss.IndexRefineSearchParameters(k_factor=index.k_factor, base_index_params=base)
+        # i parametri SWIG non tengono vivi gli oggetti a cui puntano
+        params.referenced_objects = [base]
+        return params
+    if isinstance(index, faiss.IndexIVF) and (nprobe or selector is not None):
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe or index.nprobe))
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search or selector is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or index.hnsw.efSearch))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+        params.referenced_objects = [selector]
+    return params
+
+
+class _TunedIndex:
+    """Indice con parametri di ricerca per-query passati a ogni `search`; il resto è delegato."""
+
+    def __init__(self, index: Any, params: Any):
+        self._index = index
+        self._params = params
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._index.search(x, k, params=self._params)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._index, name)
+
+
+class _PostFilteredIndex(_TunedIndex):
+    """
+    Indice che non accetta un `IDSelector`: cerca più candidati (in proporzione alla selettività del filtro,
+    raddoppiandoli finché serve) e tiene i primi `k` tra le posizioni ammesse.
+    """
+
+    def __init__(self, index: Any, params: Any, positions: np.ndarray):
+        super().__init__(index, params)
+        self._positions = positions
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        labels = np.full((len(x), k), -1, dtype=np.int64)
+        ntotal = self._index.ntotal
+        if len(self._positions) == 0 or ntotal == 0:
+            return distances, labels
+        wanted = min(k, len(self._positions))
+        fetch = min(ntotal, max(k, int(np.ceil(2 * k * ntotal / len(self._positions)))))
+        while True:
+            found_distances, found_labels = self._index.search(x, fetch, params=self._params)
+            allowed = np.isin(found_labels, self._positions)
+            if fetch >= ntotal or (allowed.sum(axis=1) >= wanted).all():
+                break
+            fetch = min(ntotal, fetch * 2)
+        for row in range(len(x)):
+            columns = np.flatnonzero(allowed[row])[:k]
+            distances[row, :len(columns)] = found_distances[row, columns]
+            labels[row, :len(columns)] = found_labels[row, columns]
+        return distances, labels
+
+
+# testo embeddato per ricavare la dimensione del modello
+DIMENSION_PROBE_TEXT = "dimension probe"
+
+
+def embedding_dimension(embedding_function: Embeddings | Callable[[str], List[float]]) -> int:
+    """Dimensione dei vettori del modello, dalla cache dei documenti se il modello è avvolto da `with_document_cache`."""
+    if isinstance(embedding_function, Embeddings):
+        return len(embedding_function.embed_documents([DIMENSION_PROBE_TEXT])[0])
+    return len(embedding_function(DIMENSION_PROBE_TEXT))
+
+
+def _encoding(dimension: int, quantization: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    """Codifica dei vettori e suffisso di riordino per `faiss.index_factory`."""
+    kind = (quantization or {}).get("type")
+    if kind is None:
+        return "Flat", ""
+    if kind == "sq8":
+        return "SQ8", ""
+    if kind != "pq":
+        raise ValueError(f"Unsupported quantization type {kind}. Supported types are: {QUANTIZATION_TYPES}")
+    m = int(quantization.get("m", 8))
+    if dimension % m:
+        raise ValueError(f"Product quantization requires the dimension ({dimension}) to be a multiple of m ({m})")
+    rerank = quantization.get("rerank", "sq8")
+    if rerank not in ("sq8", "flat", None):
+        raise ValueError(f"Unsupported rerank {rerank}. Supported values are: 'sq8', 'flat', None")
+    return f"PQ{m}x{int(quantization.get('nbits', 8))}", {"sq8": ",Refine(SQ8)", "flat": ",RFlat", None: ""}[rerank]
+
+
+def build_index(dimension: int,
+                metric: int,
+                ntotal: int,
+                ann: Optional[Dict[str, Any]] = None,
+                quantization: Optional[Dict[str, Any]] = None) -> Any:
+    """Indice FAISS (non addestrato) descritto da `params.ann` e `params.quantization` per `ntotal` vettori."""
+    ann = ann or {}
+    kind = ann.get("type", "flat")
+    encoding, refine = _encoding(dimension, quantization)
+    if kind == "flat":
+        description = encoding
+    elif kind == "ivf":
+        nlist = int(ann.get("nlist") or max(1, min(4 * int(np.sqrt(ntotal)), ntotal)))
+        description = f"IVF{nlist},{encoding}"
+    elif kind == "hnsw":
+        description = f"HNSW{int(ann.get('M', 32))}" + ("" if encoding == "Flat" else f",{encoding}")
+    else:
+        raise ValueError(f"Unsupported ann type {kind}. Supported types are: {ANN_TYPES}")
+
+    index = faiss.index_factory(dimension, description + refine, metric)
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = float(quantization.get("rerank_factor", 4))
+    base = faiss.downcast_index(index.base_index) if isinstance(index, faiss.IndexRefine) else index
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = int(ann.get("nprobe", 8))
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efConstruction = int(ann.get("efConstruction", 40))
+        base.hnsw.efSearch = int(ann.get("efSearch", 16))
+    return index
+
+
+def read_index(path: str, mmap: bool = True) -> Tuple[Any, bool]:
+    """Legge un indice, memory-mapped (sola lettura) se richiesto e supportato. Restituisce (indice, mappato)."""
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass
+    return faiss.read_index(path), False
+
+
+class FaissVectorStore(FAISS):
+    # le scritture aggiornano da sé gli indici in memoria (vedi store_index.py)
+    notifies_store_indexes = True
+
+    def __init__(self,
+                 embedding_function: Embeddings | Callable[[str], List[float]],
+                 index: Any = None,
+                 docstore: Optional[Docstore] = None,
+                 index_to_docstore_id: Optional[Dict[int, str]] = None,
+                 relevance_score_fn: Optional[Callable[[float], float]] = None,
+                 normalize_L2: bool = False,
+                 distance_strategy: DistanceStrategy | str = DistanceStrategy.EUCLIDEAN_DISTANCE,
+                 *,
+                 dimension: Optional[int] = None,
+                 ann: Optional[Dict[str, Any]] = None,
+                 quantization: Optional[Dict[str, Any]] = None):
+        distance_strategy = DistanceStrategy(distance_strategy)
+        if index is None:
+            if dimension is None:
+                if embedding_function is None:
+                    raise ValueError("FAISS requires either dimension or an embeddings model")
+                dimension = embedding_dimension(embedding_function)
+            index = (faiss.IndexFlatIP(dimension) if distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+                     else faiss.IndexFlatL2(dimension))
+        super().__init__(embedding_function,
+                         index,
+                         docstore if docstore is not None else InMemoryDocstore(),
+                         index_to_docstore_id if index_to_docstore_id is not None else {},
+                         relevance_score_fn=relevance_score_fn,
+                         normalize_L2=normalize_L2,
+                         distance_strategy=distance_strategy)
+        self.ann = ann
+        self.quantization = quantization
+        self.train_size = int((ann or {}).get("train_size", (quantization or {}).get("train_size", 10000)))
+        # ricerche in lettura; scritture e sostituzione dell'indice in scrittura
+        self.rw_lock = ReadWriteLock()
+        self._deletions = 0
+        # modifiche dall'ultimo snapshot e file da cui è mappato l'indice (None = indice in memoria privata)
+        self._mutations = 0
+        self._saved_mutations = 0
+        self._mapped_from: Optional[str] = None
+        # id documento -> posizione nell'indice, per i filtri risolti sull'indice dei metadati (None = da ricalcolare)
+        self._positions: Optional[Dict[str, int]] = None
+
+    # ------------------------------------------------------------------ #
+    # Scrittura                                                          #
+    # ------------------------------------------------------------------ #
+
+    def _maybe_build(self) -> None:
+        targets_flat = (self.ann or {}).get("type", "flat") == "flat" and not self.quantization
+        if (not targets_flat and self.train_size and self.index.ntotal >= self.train_size
+                and isinstance(self.index, faiss.IndexFlat)):
+            self.rebuild()
+
+    def _ensure_writable(self) -> None:
+        """Da chiamare con `rw_lock` in scrittura prima di modificare l'indice: un indice mappato è in sola lettura."""
+        # uno store sostituito da una ricostruzione non accetta più scritture (rebuild.py)
+        check_not_retired(self)
+        if self._mapped_from is not None:
+            self.index = faiss.read_index(self._mapped_from)
+            self._mapped_from = None
+        self._mutations += 1
+        self._positions = None
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        # embedding prima del lock: le ricerche non attendono il modello
+        texts = list(texts)
+        embeddings = self._embed_documents(texts)
+        return self.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids, **kwargs)
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        with self.rw_lock.write():
+            self._ensure_writable()
+            ids = super().add_embeddings(text_embeddings, metadatas=metadatas, ids=ids, **kwargs)
+        # fuori dal lock: la costruzione di un indice in memoria legge lo store tenendo il lock dell'indice
+        self._notify_added(ids, [text for text, _ in text_embeddings], metadatas)
+        self._maybe_build()
+        return ids
+
+    def _notify_added(self, ids: List[str], texts: List[str], metadatas: Optional[List[dict]]) -> None:
+        notify_added(self, ids, [Document(id=doc_id, page_content=text, metadata=metadata or {})
+                                 for doc_id, text, metadata in zip(ids, texts, metadatas or [{}] * len(texts))])
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Come `FAISS.delete`, ma funziona anche sugli indici con riordino, IVF e HNSW (vedi `without_ids`)."""
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        with self.rw_lock.write():
+            missing_ids = set(ids).difference(self.index_to_docstore_id.values())
+            if missing_ids:
+                raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing_ids}")
+
+            reversed_index = {id_: idx for idx, id_ in self.index_to_docstore_id.items()}
+            index_to_delete = {reversed_index[id_] for id_ in ids}
+
+            self._ensure_writable()
+            self.index = without_ids(self.index, np.fromiter(index_to_delete, dtype=np.int64))
+            self.docstore.delete(ids)
+
+            remaining_ids = [id_ for i, id_ in sorted(self.index_to_docstore_id.items()) if i not in index_to_delete]
+            self.index_to_docstore_id = {i: id_ for i, id_ in enumerate(remaining_ids)}
+            self._deletions += 1
+        notify_deleted(self, ids)
+        return True
+
+    # ------------------------------------------------------------------ #
+    # Ricerca                                                            #
+    # ------------------------------------------------------------------ #
+
+    def _selected_positions(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Posizioni nell'indice dei documenti che soddisfano il filtro sui metadati."""
+        doc_ids = get_metadata_index(self).filter_ids(filter)
+        positions = self._position_map()
+        return np.fromiter((positions[doc_id] for doc_id in doc_ids if doc_id in positions), dtype=np.int64)
+
+    def _position_map(self) -> Dict[str, int]:
+        positions = self._positions
+        if positions is None:
+            positions = self._positions = {id_: i for i, id_ in self.index_to_docstore_id.items()}
+        return positions
+
+    def get_vectors_by_ids(self, ids: List[str]) -> np.ndarray:
+        """Vettori dei documenti con gli id dati (ricostruiti dall'indice), nello stesso ordine."""
+        with self.rw_lock.read():
+            positions = self._position_map()
+            vectors = np.empty((len(ids), self.index.d), dtype=np.float32)
+            for row, doc_id in enumerate(ids):
+                vectors[row] = self.index.reconstruct(positions[doc_id])
+            return vectors
+
+    def _tuned(self, nprobe: Optional[int], ef_search: Optional[int],
+               filter: Optional[Callable | Dict[str, Any]] = None) -> Tuple["FaissVectorStore", Any]:
+        """
+        Copia superficiale dello store che cerca con `nprobe`/`efSearch` dati e, per i filtri a dizionario, solo
+        tra i documenti che soddisfano il filtro (thread-safe: `self` non cambia). Restituisce anche il filtro
+        ancora da applicare a posteriori.
+        """
+        index = self.index
+        selector = positions = None
+        if isinstance(filter, dict) and filter:
+            positions = self._selected_positions(filter)
+            filter = None
+            if supports_selector(index):
+                selector = faiss.IDSelectorBatch(positions)
+                positions = None
+        params = _search_parameters(index, nprobe, ef_search, selector)
+        if positions is not None:
+            tuned = copy.copy(self)
+            tuned.index = _PostFilteredIndex(index, params, positions)
+            return tuned, filter
+        if params is None:
+            return self, filter
+        tuned = copy.copy(self)
+        tuned.index = _TunedIndex(index, params)
+        return tuned, filter
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Callable | Dict[str, Any]] = None, fetch_k: int = 20,
+                                               nprobe: Optional[int] = None, efSearch: Optional[int] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self.rw_lock.read():
+            tuned, filter = self._tuned(nprobe, efSearch, filter)
+            return FAISS.similarity_search_with_score_by_vector(tuned, embedding, k=k, filter=filter,
+                                                                fetch_k=fetch_k, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Callable | Dict[str, Any]] = None,
+                                                nprobe: Optional[int] = None, efSearch: Optional[int] = None,
+                                                **kwargs: Any) -> List[Document]:
+        with self.rw_lock.read():
+            tuned, filter = self._tuned(nprobe, efSearch, filter)
+            docs_and_scores = tuned.max_marginal_relevance_search_with_score_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter)
+        return [doc for doc, _ in docs_and_scores]
+
+    async def amax_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                       lambda_mult: float = 0.5,
+                                                       filter: Optional[Callable | Dict[str, Any]] = None,
+                                                       **kwargs: Any) -> List[Document]:
+        # la versione LangChain non inoltra i kwargs (nprobe/efSearch)
+        return await run_in_executor(None, self.max_marginal_relevance_search_by_vector, embedding, k=k,
+                                     fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter, **kwargs)
+
+    # ------------------------------------------------------------------ #
+    # Costruzione dell'indice                                            #
+    # ------------------------------------------------------------------ #
+
+    def rebuild(self,
+                ann: Optional[Dict[str, Any]] = None,
+                quantization: Optional[Dict[str, Any]] = None,
+                sample_size: int = 50000,
+                recall_queries: int = 100,
+                k: int = 10,
+                on_progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """
+        Costruisce l'indice descritto da `ann`/`quantization` (default: `params.ann`/`params.quantization`,
+        sostituiti in caso di successo) addestrato su `sample_size` vettori, misura il recall@k rispetto alla ricerca esatta su `recall_queries` vettori dello store e lo
+        sostituisce a quello corrente.
+
+        La copia dei vettori avviene con il lock in lettura e la costruzione senza lock: le ricerche continuano
+        sul vecchio indice. Da un indice quantizzato i vettori vengono ricalcolati dai testi (`_source_vectors`).
+        Le aggiunte arrivate nel
+        frattempo vengono riportate sul nuovo indice prima della sostituzione; se nel frattempo sono stati
+        cancellati documenti la costruzione viene ripetuta.
+
+        `on_progress(current=..., total=..., message=...)` viene chiamata tra una fase e l'altra (può sollevare
+        eccezioni, es. la cancellazione di un job, per interrompere la costruzione).
+        """
+        def progress(current: int, total: int, message: str) -> None:
+            if on_progress is not None:
+                on_progress(current=current, total=total, message=message)
+
+        ann = ann if ann is not None else self.ann
+        quantization = quantization if quantization is not None else self.quantization
+        started = time.monotonic()
+        memory_before = self.memory_usage()
+        for _ in range(3):
+            with self.rw_lock.read():
+                index, deletions = self.index, self._deletions
+                ntotal = index.ntotal
+                if ntotal == 0:
+                    raise ValueError("Cannot build an index for an empty store")
+                source = self._source_vectors(index, 0, ntotal)
+            vectors = source()
+
+            rng = np.random.default_rng(0)
+            built = build_index(index.d, index.metric_type, ntotal, ann, quantization)
+            progress(0, ntotal, "training")
+            built.train(vectors[np.sort(rng.choice(ntotal, size=min(sample_size, ntotal), replace=False))])
+            for start in range(0, ntotal, CHUNK_ROWS):
+                built.add(vectors[start:start + CHUNK_ROWS])
+                progress(min(start + CHUNK_ROWS, ntotal), ntotal, "adding")
+            enable_reconstruct(built)
+
+            progress(ntotal, ntotal, "measuring recall")
+            exact = index if isinstance(index, faiss.IndexFlat) else faiss.IndexFlat(index.d, index.metric_type)
+            if exact is not index:
+                exact.add(vectors)
+            queries = vectors[rng.choice(ntotal, size=min(recall_queries, ntotal), replace=False)]
+            recall = measure_recall(lambda q, n: exact.search(q[None, :], n)[1][0].tolist(),
+                                    lambda q, n: built.search(q[None, :], n)[1][0].tolist(),
+                                    queries, min(k, ntotal))
+
+            with self.rw_lock.write():
+                if self._deletions != deletions:
+                    # le posizioni sono cambiate: i vettori copiati non corrispondono più alla mappa degli id
+                    continue
+                if self.index.ntotal > ntotal:
+                    # documenti aggiunti durante la costruzione: già nella cache degli embedding
+                    built.add(self._source_vectors(self.index, ntotal, self.index.ntotal - ntotal)())
+                self.index = built
+                self._mapped_from = None
+                self._mutations += 1
+                self.ann, self.quantization = ann, quantization
+            return {"index": type(faiss.downcast_index(built)).__name__, "ann": ann,
+                    "vectors_from": "index" if has_exact_vectors(index) or self.embedding_function is None
+                    else "embeddings",
+                    "quantization": quantization, "memory_before": memory_before,
+                    "memory_after": self.memory_usage(), "recall_at_k": recall, "k": k,
+                    "recall_queries": len(queries), "build_seconds": round(time.monotonic() - started, 3)}
+        raise RuntimeError("The store kept changing while the index was being rebuilt, retry later")
+
+    def _source_vectors(self, index: Any, start: int, count: int) -> Callable[[], np.ndarray]:
+        """
+        Da chiamare con `rw_lock` almeno in lettura: legge ciò che serve dall'indice e dal docstore e restituisce
+        la funzione (da chiamare anche senza lock) che produce i vettori originali delle posizioni
+        `start..start+count`: quelli dell'indice se esatti, altrimenti gli embedding dei testi.
+        """
+        if has_exact_vectors(index) or self.embedding_function is None:
+            vectors = index.reconstruct_n(start, count)
+            return lambda: vectors
+        texts = [self.docstore.search(self.index_to_docstore_id[position]).page_content
+                 for position in range(start, start + count)]
+
+        def embed() -> np.ndarray:
+            vectors = np.empty((count, index.d), dtype=np.float32)
+            for offset in range(0, count, CHUNK_ROWS):
+                vectors[offset:offset + CHUNK_ROWS] = self._embed_documents(texts[offset:offset + CHUNK_ROWS])
+            if self._normalize_L2:
+                faiss.normalize_L2(vectors)
+            return vectors
+        return embed
+
+    def quantize(self, sample_size: int = 50000, recall_queries: int = 100, k: int = 10) -> Dict[str, Any]:
+        """`rebuild` con la quantizzazione configurata in `params.quantization`."""
+        if not self.quantization:
+            raise ValueError("Quantization is not configured for this store (params.quantization)")
+        report = self.rebuild(sample_size=sample_size, recall_queries=recall_queries, k=k)
+        return {"type": self.quantization.get("type"), **report}
+
+    # ------------------------------------------------------------------ #
+    # Snapshot                                                           #
+    # ------------------------------------------------------------------ #
+
+    @property
+    def dirty(self) -> bool:
+        """True se lo store è cambiato dall'ultimo snapshot (o dal caricamento)."""
+        return self._mutations != self._saved_mutations
+
+    def save_snapshot(self, folder_path: str) -> int:
+        """`save_local` coerente con le scritture concorrenti; restituisce il numero di vettori salvati."""
+        with self.rw_lock.read():
+            self.save_local(folder_path)
+            self._saved_mutations = self._mutations
+            return self.index.ntotal
+
+    @classmethod
+    def load_snapshot(cls,
+                      folder_path: str,
+                      embedding_function: Embeddings,
+                      mmap: bool = True,
+                      **kwargs: Any) -> "FaissVectorStore":
+        """Inverso di `save_snapshot` (stessi file di `FAISS.load_local`), con l'indice memory-mapped se possibile."""
+        index_path = os.path.join(folder_path, "index.faiss")
+        index, mapped = read_index(index_path, mmap)
+        # file scritti da questo servizio con save_snapshot
+        with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        store = cls(embedding_function, index, docstore, index_to_docstore_id, **kwargs)
+        store._mapped_from = index_path if mapped else None
+        return store
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Byte occupati dall'indice rispetto ai vettori float32."""
+        float32_bytes = self.index.ntotal * self.index.d * 4
+        resident = index_memory_bytes(self.index)
+        return {
+            "vectors": self.index.ntotal,
+            "float32_bytes": float32_bytes,
+            "resident_bytes": resident,
+            "reduction": float32_bytes / resident if resident else None,
+            "index": type(faiss.downcast_index(self.index)).__name__,
+            "memory_mapped": self._mapped_from is not None,
+        }
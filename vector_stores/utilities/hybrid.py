@@ -0,0 +1,82 @@
+"""
+hybrid.py
+
+Ricerca ibrida lessicale (BM25, vedi lexical.py) + densa, fusa con
+Reciprocal Rank Fusion:
+
+    score(d) = sum_i  weight_i / (rrf_k + rank_i(d))
+
+dove `rank_i` è la posizione (da 1) del documento nella lista i. RRF usa
+solo le posizioni, quindi non serve rendere confrontabili score BM25 e
+distanze vettoriali.
+
+`search_kwargs` della ricerca ibrida:
+
+    k              risultati restituiti (default 4)
+    fetch_k        candidati per ciascuna ricerca (default max(20, 4 * k))
+    filter         filtro sui metadati, applicato a entrambe le ricerche
+    lexical_weight peso della lista BM25 (default 1.0)
+    vector_weight  peso della lista densa (default 1.0)
+    rrf_k          costante di RRF (default 60)
+
+Gli altri argomenti (es. `nprobe`) vengono passati alla ricerca densa.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from vector_stores.utilities.lexical import get_lexical_index
+from vector_stores.utilities.search import search_by_vector
+
+RRF_K = 60
+
+
+def _document_key(document: Document) -> str:
+    # non tutti gli store restituiscono l'id (Chroma no): si identifica il documento dal contenuto
+    return document.page_content + "\x00" + json.dumps(document.metadata, sort_keys=True, default=str)
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Document]],
+                           weights: List[float],
+                           rrf_k: float = RRF_K) -> List[Tuple[Document, float]]:
+    """Fonde liste ordinate di documenti; a parità di documento vale la prima occorrenza."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, document in enumerate(ranked, start=1):
+            key = _document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    return [(documents[key], score) for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+
+def hybrid_search(vector_store: Any,
+                  query: str,
+                  search_kwargs: Dict[str, Any],
+                  embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    Ricerca ibrida: candidati BM25 e densi fusi con RRF, restituiti come (documento, score RRF).
+
+    Con `embedding` (già calcolato, es. nelle ricerche batch) la ricerca densa non richiama il modello.
+    """
+    kwargs = dict(search_kwargs)
+    k = int(kwargs.pop("k", 4))
+    fetch_k = int(kwargs.pop("fetch_k", max(20, 4 * k)))
+    lexical_weight = float(kwargs.pop("lexical_weight", 1.0))
+    vector_weight = float(kwargs.pop("vector_weight", 1.0))
+    rrf_k = float(kwargs.pop("rrf_k", RRF_K))
+    metadata_filter = kwargs.get("filter")
+
+    lexical = []
+    if lexical_weight > 0:
+        lexical = [doc for doc, _ in get_lexical_index(vector_store).search(query, fetch_k, filter=metadata_filter)]
+    dense = []
+    if vector_weight > 0:
+        if embedding is not None:
+            dense = search_by_vector(vector_store, "similarity", embedding, {**kwargs, "k": fetch_k})
+        else:
+            dense = vector_store.similarity_search(query, k=fetch_k, **kwargs)
+
+    return reciprocal_rank_fusion([lexical, dense], [lexical_weight, vector_weight], rrf_k)[:k]
@@ -0,0 +1,170 @@
+"""
+ingestion.py
+
+Import a blocchi da una collezione del document store in un vector store.
+
+Il cursore Mongo viene letto a blocchi di `batch_size` documenti e il lavoro
+è organizzato in pipeline: mentre il blocco N viene inserito nello store, il
+blocco N+1 viene convertito ed embeddato nel pool "embeddings". In memoria ci
+sono al più due blocchi, indipendentemente dalla dimensione della collezione,
+e nessuna chiamata a `add_documents` supera `batch_size` (Chroma rifiuta i
+batch oltre il suo limite).
+
+L'inserimento con vettori già calcolati usa `add_embeddings` (FAISS) o
+l'upsert della collezione Chroma; per le altre classi (o se lo store non
+espone il modello di embedding) il blocco viene inserito con `add_documents`,
+che calcola gli embedding durante l'inserimento.
+
+Ogni blocco viene inserito con il lock dello store in scrittura
+(store_locks.py), preso solo per l'inserimento: le ricerche concorrenti
+attendono al più un blocco, non l'intero import.
+"""
+
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.vectorstores.utils import filter_complex_metadata
+
+from utilities.executors import get_executor
+from vector_stores.utilities.store_index import get_store_documents, record_added
+from vector_stores.utilities.store_locks import reading, writing
+from vector_stores.utilities.search import get_store_embeddings, is_implemented
+
+# (documenti letti dal cursore, documenti da inserire, eventuali embedding)
+PreparedBatch = Tuple[int, List[Document], Optional[List[List[float]]]]
+
+
+def iter_cursor_batches(cursor: Any, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Legge il cursore a blocchi di `batch_size` documenti."""
+    batch: List[Dict[str, Any]] = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_langchain_documents(raw_docs: List[Dict[str, Any]]) -> List[Document]:
+    """Converte i documenti del document store (`{"value": {"page_content", "metadata"}}`) in Document filtrati."""
+    docs = [Document(page_content=d["value"]["page_content"], metadata=d["value"].get("metadata") or {})
+            for d in raw_docs]
+    return filter_complex_metadata(docs)
+
+
+def supports_add_embeddings(vector_store: Any) -> bool:
+    """True se lo store accetta documenti con embedding già calcolati."""
+    if get_store_embeddings(vector_store) is None:
+        return False
+    if is_implemented(vector_store, "add_embeddings"):
+        return True
+    return hasattr(getattr(vector_store, "_collection", None), "upsert")
+
+
+def add_embedded_documents(vector_store: Any,
+                           docs: List[Document],
+                           vectors: List[List[float]],
+                           ids: Optional[List[str]] = None) -> List[str]:
+    """Inserisce documenti con i loro embedding senza richiamare il modello (e li aggiunge all'indice lessicale)."""
+    texts = [doc.page_content for doc in docs]
+    metadatas = [doc.metadata for doc in docs]
+
+    if is_implemented(vector_store, "add_embeddings"):
+        with writing(vector_store):
+            ids = vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        record_added(vector_store, ids, docs)
+        return ids
+
+    # Chroma: stesso upsert di Chroma.add_texts (metadati vuoti non ammessi, quindi upsert separati)
+    ids = ids or [str(uuid.uuid4()) for _ in docs]
+    with_metadata = [i for i, metadata in enumerate(metadatas) if metadata]
+    without_metadata = [i for i, metadata in enumerate(metadatas) if not metadata]
+    with writing(vector_store):
+        if with_metadata:
+            vector_store._collection.upsert(ids=[ids[i] for i in with_metadata],
+                                            embeddings=[vectors[i] for i in with_metadata],
+                                            documents=[texts[i] for i in with_metadata],
+                                            metadatas=[metadatas[i] for i in with_metadata])
+        if without_metadata:
+            vector_store._collection.upsert(ids=[ids[i] for i in without_metadata],
+                                            embeddings=[vectors[i] for i in without_metadata],
+                                            documents=[texts[i] for i in without_metadata])
+    record_added(vector_store, ids, docs)
+    return ids
+
+
+def add_documents_batch(vector_store: Any, docs: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+    """Inserisce un blocco di documenti, con embedding calcolati a parte quando lo store lo consente."""
+    if supports_add_embeddings(vector_store):
+        vectors = get_store_embeddings(vector_store).embed_documents([doc.page_content for doc in docs])
+        return add_embedded_documents(vector_store, docs, vectors, ids=ids)
+    with writing(vector_store):
+        ids = vector_store.add_documents(docs, ids=ids) if ids is not None else vector_store.add_documents(docs)
+    record_added(vector_store, ids, docs)
+    return ids
+
+
+def ingest_collection(vector_store: Any,
+                      cursor: Any,
+                      batch_size: int,
+                      total: Optional[int] = None,
+                      on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      use_document_ids: bool = False) -> int:
+    """
+    Importa i documenti del cursore nello store a blocchi, sovrapponendo l'embedding
+    del blocco successivo all'inserimento del blocco corrente.
+
+    `on_progress(added, total)` viene chiamata dopo ogni blocco (può sollevare
+    eccezioni, es. la cancellazione di un job, per interrompere l'import).
+
+    Con `use_document_ids` i documenti hanno come id l'`_id` del document store e
+    quelli già presenti nello store vengono saltati: ripetere l'import (es. nuovo
+    tentativo di un job fallito a metà) non crea duplicati.
+
+    Returns:
+        Numero di documenti letti dal cursore (aggiunti o già presenti).
+    """
+    embeddings = get_store_embeddings(vector_store)
+    pre_embed = supports_add_embeddings(vector_store)
+    executor = get_executor("embeddings")
+
+    def prepare(raw_docs: List[Dict[str, Any]]) -> PreparedBatch:
+        docs = to_langchain_documents(raw_docs)
+        if use_document_ids:
+            ids = [str(raw["_id"]) for raw in raw_docs]
+            with reading(vector_store):
+                present = {doc.id for doc in get_store_documents(vector_store, ids)}
+            docs = [Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+                    for doc_id, doc in zip(ids, docs) if doc_id not in present]
+        if not pre_embed or not docs:
+            return len(raw_docs), docs, None
+        return len(raw_docs), docs, embeddings.embed_documents([doc.page_content for doc in docs])
+
+    batches = iter_cursor_batches(cursor, batch_size)
+    first = next(batches, None)
+    pending: Optional[Future] = executor.submit(prepare, first) if first is not None else None
+    added = 0
+    try:
+        while pending is not None:
+            read, docs, vectors = pending.result()
+            following = next(batches, None)
+            pending = executor.submit(prepare, following) if following is not None else None
+
+            if docs:
+                ids = [doc.id for doc in docs] if use_document_ids else None
+                if vectors is not None:
+                    add_embedded_documents(vector_store, docs, vectors, ids=ids)
+                else:
+                    add_documents_batch(vector_store, docs, ids=ids)
+            added += read
+            if on_progress is not None:
+                on_progress(added, total)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        if hasattr(cursor, "close"):
+            cursor.close()
+    return added
@@ -0,0 +1,134 @@
+"""
+lexical.py
+
+Indice lessicale BM25 in memoria, uno per vector store caricato.
+
+La ricerca densa trova male codici e identificativi (codici articolo
+"ESRS E1-6", part number, nomi di file): l'indice BM25 li tratta come token.
+La tokenizzazione conserva i token composti (`e1-6`, `report_2024.pdf`) e ne
+aggiunge le parti (`e1`, `6`, `report_2024`, `pdf`), così la query trova sia
+il codice completo sia i suoi componenti.
+
+L'indice di uno store viene costruito alla prima ricerca ibrida e poi
+aggiornato dalle scritture (vedi store_index.py).
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from vector_stores.utilities.metadata_index import metadata_matches
+from vector_stores.utilities.store_index import StoreIndexRegistry
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+(?:[-./:_]\w+)*")
+_PART_RE = re.compile(r"[-./:_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Token minuscoli; i token composti sono seguiti dalle loro parti."""
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = _PART_RE.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+    """Indice invertito BM25 (Okapi) con aggiunte e rimozioni incrementali per id documento."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # posting list: termine -> {numero documento: frequenza}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._documents: Dict[int, Document] = {}
+        self._lengths: Dict[int, int] = {}
+        self._terms: Dict[int, Tuple[str, ...]] = {}
+        self._numbers: Dict[str, int] = {}
+        self._next_number = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, ids: List[str], documents: List[Document]) -> None:
+        """Aggiunge (o sostituisce) i documenti con gli id dati."""
+        with self.lock:
+            self.remove(ids)
+            for doc_id, document in zip(ids, documents):
+                number = self._next_number
+                self._next_number += 1
+                counts = Counter(tokenize(document.page_content))
+                for term, frequency in counts.items():
+                    self._postings.setdefault(term, {})[number] = frequency
+                length = sum(counts.values())
+                self._numbers[doc_id] = number
+                self._documents[number] = Document(id=doc_id, page_content=document.page_content,
+                                                   metadata=document.metadata)
+                self._lengths[number] = length
+                self._terms[number] = tuple(counts)
+                self._total_length += length
+
+    def remove(self, ids: List[str]) -> None:
+        with self.lock:
+            for doc_id in ids:
+                number = self._numbers.pop(doc_id, None)
+                if number is None:
+                    continue
+                for term in self._terms.pop(number):
+                    postings = self._postings[term]
+                    del postings[number]
+                    if not postings:
+                        del self._postings[term]
+                self._total_length -= self._lengths.pop(number)
+                del self._documents[number]
+
+    def search(self,
+               query: str,
+               k: int,
+               filter: Optional[Dict[str, Any] | Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[Document, float]]:
+        """I `k` documenti con score BM25 più alto (solo quelli che contengono almeno un termine della query)."""
+        with self.lock:
+            n_docs = len(self._documents)
+            if n_docs == 0 or k <= 0:
+                return []
+            average_length = self._total_length / n_docs or 1.0
+            scores: Dict[int, float] = {}
+            for term, query_frequency in Counter(tokenize(query)).items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for number, frequency in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[number] / average_length)
+                    scores[number] = scores.get(number, 0.0) + \
+                        query_frequency * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            if filter:
+                match = filter if callable(filter) else (lambda metadata: metadata_matches(metadata, filter))
+                ranked = (item for item in ranked if match(self._documents[item[0]].metadata))
+            results = []
+            for number, score in ranked:
+                if len(results) >= k:
+                    break
+                results.append((self._documents[number], score))
+            return results
+
+
+# indice di ciascuno store caricato, vedi store_index.py
+_indexes = StoreIndexRegistry(BM25Index)
+
+
+def get_lexical_index(vector_store: Any) -> BM25Index:
+    """Indice BM25 dello store, costruito alla prima richiesta."""
+    return _indexes.get(vector_store)
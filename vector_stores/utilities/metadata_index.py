@@ -0,0 +1,246 @@
+"""
+metadata_index.py
+
+Indice dei metadati in memoria, uno per vector store caricato (ciclo di vita
+e aggiornamenti in store_index.py).
+
+I filtri usano la sintassi where-clause di Chroma:
+
+    {"source": "report.pdf"}                         uguaglianza (più chiavi = AND)
+    {"page_number": {"$gte": 10, "$lt": 20}}         $eq $ne $in $nin $gt $gte $lt $lte
+    {"$or": [{"lang": "it"}, {"lang": "en"}]}        $and / $or
+    {"lang": ["it", "en"]}                           lista = $in (come il filtro di FAISS)
+
+L'indice tiene, per ogni campo, le posting list valore -> documenti (per
+uguaglianza, $in, $ne, $nin) e, costruito alla prima query di intervallo e
+scartato alla scrittura successiva sul campo, un array ordinato dei valori
+numerici (bisezione per $gt/$gte/$lt/$lte). Serve l'endpoint
+`/vector_store/filter` per qualunque store e permette alla ricerca per
+similarità di restringere i candidati prima del calcolo delle distanze
+(FaissVectorStore, NumpyVectorStore) invece di filtrare a posteriori i top-k.
+"""
+
+import json
+import numbers
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_stores.utilities.store_index import StoreIndexRegistry, get_store_documents
+
+_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator {operator}")
+
+
+def _is_operator_dict(condition: Any) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(op.startswith("$") for op in condition)
+
+
+def metadata_matches(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """True se `metadata` soddisfa il filtro (sintassi where-clause di Chroma; più chiavi = AND)."""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, sub) for sub in condition):
+                return False
+        elif _is_operator_dict(condition):
+            value = metadata.get(key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif isinstance(condition, list):
+            if metadata.get(key) not in condition:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_))
+
+
+def _value_key(value: Any) -> Any:
+    # True == 1 in Python: i booleani hanno una chiave propria; i valori non hashable vanno in JSON
+    if isinstance(value, bool):
+        return ("$bool", value)
+    try:
+        hash(value)
+    except TypeError:
+        return ("$json", json.dumps(value, sort_keys=True, default=str))
+    return value
+
+
+class MetadataIndex:
+    """Posting list per campo e valore dei metadati, con aggiunte e rimozioni incrementali per id documento."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # campo -> chiave del valore -> (valore, numeri documento)
+        self._postings: Dict[str, Dict[Any, Tuple[Any, Set[int]]]] = {}
+        # campo -> (valori numerici ordinati, numeri documento corrispondenti)
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._metadatas: Dict[int, Dict[str, Any]] = {}
+        self._numbers: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._next_number = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids: List[str], documents: List[Document]) -> None:
+        """Aggiunge (o sostituisce) i documenti con gli id dati."""
+        with self.lock:
+            self.remove(ids)
+            for doc_id, document in zip(ids, documents):
+                number = self._next_number
+                self._next_number += 1
+                metadata = dict(document.metadata or {})
+                for field, value in metadata.items():
+                    postings = self._postings.setdefault(field, {})
+                    postings.setdefault(_value_key(value), (value, set()))[1].add(number)
+                    self._sorted.pop(field, None)
+                self._metadatas[number] = metadata
+                self._numbers[doc_id] = number
+                self._ids[number] = doc_id
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self.lock:
+            for doc_id in ids:
+                number = self._numbers.pop(doc_id, None)
+                if number is None:
+                    continue
+                for field, value in self._metadatas.pop(number).items():
+                    postings = self._postings[field]
+                    key = _value_key(value)
+                    postings[key][1].discard(number)
+                    if not postings[key][1]:
+                        del postings[key]
+                    if not postings:
+                        del self._postings[field]
+                    self._sorted.pop(field, None)
+                del self._ids[number]
+
+    def filter_ids(self, filter: Optional[Dict[str, Any]]) -> List[str]:
+        """Id dei documenti che soddisfano il filtro, in ordine di inserimento."""
+        with self.lock:
+            numbers = self._match(filter) if filter else set(self._ids)
+            return [self._ids[number] for number in sorted(numbers)]
+
+    def _match(self, filter: Dict[str, Any]) -> Set[int]:
+        result: Optional[Set[int]] = None
+        for key, condition in filter.items():
+            if key == "$and":
+                matches = self._all()
+                for sub in condition:
+                    matches &= self._match(sub)
+            elif key == "$or":
+                matches = set()
+                for sub in condition:
+                    matches |= self._match(sub)
+            elif _is_operator_dict(condition):
+                matches = self._all()
+                for operator, operand in condition.items():
+                    matches &= self._field_matches(key, operator, operand)
+            elif isinstance(condition, list):
+                matches = self._field_matches(key, "$in", condition)
+            else:
+                matches = self._field_matches(key, "$eq", condition)
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return self._all() if result is None else result
+
+    def _all(self) -> Set[int]:
+        return set(self._ids)
+
+    def _field_matches(self, field: str, operator: str, operand: Any) -> Set[int]:
+        postings = self._postings.get(field, {})
+        if operator == "$eq":
+            entry = postings.get(_value_key(operand))
+            return set(entry[1]) if entry else set()
+        if operator == "$in":
+            matches: Set[int] = set()
+            for value in operand:
+                entry = postings.get(_value_key(value))
+                if entry:
+                    matches |= entry[1]
+            return matches
+        # come _compare: un campo assente soddisfa $ne e $nin
+        if operator == "$ne":
+            return self._all() - self._field_matches(field, "$eq", operand)
+        if operator == "$nin":
+            return self._all() - self._field_matches(field, "$in", operand)
+        if operator not in _RANGE_OPERATORS:
+            raise ValueError(f"Unsupported filter operator {operator}")
+        if not _is_number(operand):
+            # intervalli su valori non numerici (es. date ISO): confronto sui valori distinti del campo
+            matches = set()
+            for value, numbers in postings.values():
+                if _compare(value, operator, operand):
+                    matches |= numbers
+            return matches
+        values, numbers = self._sorted_values(field)
+        if operator in ("$gt", "$gte"):
+            start = np.searchsorted(values, operand, side="right" if operator == "$gt" else "left")
+            return set(numbers[start:].tolist())
+        end = np.searchsorted(values, operand, side="left" if operator == "$lt" else "right")
+        return set(numbers[:end].tolist())
+
+    def _sorted_values(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._sorted.get(field)
+        if cached is None:
+            values: List[float] = []
+            numbers: List[int] = []
+            for value, value_numbers in self._postings.get(field, {}).values():
+                if _is_number(value):
+                    values.extend([value] * len(value_numbers))
+                    numbers.extend(value_numbers)
+            values_array = np.asarray(values, dtype=np.float64)
+            order = np.argsort(values_array, kind="stable")
+            cached = values_array[order], np.asarray(numbers, dtype=np.int64)[order]
+            self._sorted[field] = cached
+        return cached
+
+
+# indice di ciascuno store caricato, vedi store_index.py
+_indexes = StoreIndexRegistry(MetadataIndex)
+
+
+def get_metadata_index(vector_store: Any) -> MetadataIndex:
+    """Indice dei metadati dello store, costruito alla prima richiesta."""
+    return _indexes.get(vector_store)
+
+
+def filter_store_documents(vector_store: Any, filter: Optional[Dict[str, Any]], skip: int = 0,
+                           limit: int = 100) -> List[Document]:
+    """Documenti dello store che soddisfano il filtro, in ordine di inserimento, paginati con skip/limit."""
+    ids = get_metadata_index(vector_store).filter_ids(filter)[skip:skip + limit]
+    return get_store_documents(vector_store, ids)
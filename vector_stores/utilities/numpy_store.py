@@ -0,0 +1,616 @@
+"""
+numpy_store.py
+
+Vector store in-process senza dipendenze esterne (solo NumPy).
+
+I vettori stanno in un'unica matrice contigua float32 o float16 e la ricerca
+è un prodotto matrice-vettore (a blocchi, per limitare la memoria temporanea
+con float16). Supporta similarity, similarity_score_threshold e MMR come gli
+altri store LangChain, filtri sui metadati in stile Chroma (`$eq`, `$ne`,
+`$in`, `$nin`, `$gt`, `$gte`, `$lt`, `$lte`, `$and`, `$or`) e cancellazioni
+con compattazione.
+
+Con `persist_directory` lo store è persistente:
+
+    manifest.json     dimensione, dtype, distanza, numero di righe valide
+    vectors.bin       matrice (righe x dimensione) in formato raw, memory-mapped in lettura
+    docstore.jsonl    una riga {"id", "text", "metadata"} per vettore
+    deleted.json      righe cancellate in attesa di compattazione
+
+Le aggiunte vengono accodate ai file (nessuna riscrittura) e la matrice viene
+rimappata, quindi il caricamento è immediato e i vettori restano nella page
+cache del sistema operativo invece che nella memoria del processo. Le righe
+oltre il conteggio del manifest (scrittura interrotta) vengono scartate al
+caricamento.
+
+Con `quantization` (es. `{"type": "pq", "m": 16}`, vedi quantization.py) in
+memoria restano solo i codici quantizzati (`codes.bin`, `quantizer.npz`): la
+ricerca sceglie `k * rerank_factor` candidati sui codici e li riordina con i
+vettori float letti dal file memory-mapped. Il quantizzatore viene addestrato
+automaticamente quando lo store raggiunge `train_size` vettori, oppure con
+`quantize()`. Richiede `persist_directory`.
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from vector_stores.utilities.metadata_index import get_metadata_index, metadata_matches
+from vector_stores.utilities.store_index import notify_added, notify_deleted
+from vector_stores.utilities.quantization import build_quantizer, load_quantizer, measure_recall, CHUNK_ROWS
+
+DISTANCES = ("cosine", "dot", "euclidean")
+DTYPES = ("float32", "float16")
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.bin"
+DOCSTORE_FILE = "docstore.jsonl"
+DELETED_FILE = "deleted.json"
+CODES_FILE = "codes.bin"
+QUANTIZER_FILE = "quantizer.npz"
+
+
+def _append_rows(buffer: Optional[np.ndarray], start: int, rows: np.ndarray) -> np.ndarray:
+    """Scrive `rows` da `start` in un buffer a capacità crescente (raddoppio), riallocandolo se serve."""
+    count = start + len(rows)
+    if buffer is None or count > len(buffer):
+        capacity = max(count, 2 * (0 if buffer is None else len(buffer)), 1024)
+        grown = np.empty((capacity,) + rows.shape[1:], dtype=rows.dtype)
+        if start:
+            grown[:start] = buffer[:start]
+        buffer = grown
+    buffer[start:count] = rows
+    return buffer
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows])]
+
+
+class NumpyVectorStore(VectorStore):
+    """Vector store a matrice piatta NumPy, opzionalmente persistito su file memory-mapped."""
+
+    # le scritture aggiornano da sé gli indici in memoria (vedi store_index.py)
+    notifies_store_indexes = True
+
+    def __init__(self,
+                 embedding_function: Optional[Embeddings] = None,
+                 persist_directory: Optional[str] = None,
+                 dtype: str = "float32",
+                 distance: str = "cosine",
+                 compact_threshold: float = 0.2,
+                 quantization: Optional[Dict[str, Any]] = None,
+                 relevance_score_fn: Optional[Callable[[float], float]] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype}. Supported dtypes are: {DTYPES}")
+        if distance not in DISTANCES:
+            raise ValueError(f"Unsupported distance {distance}. Supported distances are: {DISTANCES}")
+        if quantization and not persist_directory:
+            raise ValueError("Quantization requires persist_directory: float vectors for the re-rank are read from disk")
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = np.dtype(dtype)
+        self.distance = distance
+        self.compact_threshold = compact_threshold
+        self.override_relevance_score_fn = relevance_score_fn
+        self.quantization = quantization
+        self.rerank_factor = int((quantization or {}).get("rerank_factor", 4))
+        self.train_size = int((quantization or {}).get("train_size", 10000))
+
+        self._lock = threading.RLock()
+        self._dim: Optional[int] = None
+        self._count = 0
+        # in memoria: buffer con capacità crescente; persistito: memmap di vectors.bin
+        self._buffer: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._alive = np.ones(0, dtype=bool)
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._deleted = 0
+        # quantizzatore addestrato e codici (righe x code_size, buffer a capacità crescente)
+        self._quantizer = None
+        self._codes: Optional[np.ndarray] = None
+
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._load()
+
+    # ------------------------------------------------------------------ #
+    # Persistenza                                                        #
+    # ------------------------------------------------------------------ #
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _write_json(self, name: str, data: Any) -> None:
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path(name))
+
+    def _write_manifest(self) -> None:
+        self._write_json(MANIFEST_FILE, {
+            "dim": self._dim,
+            "dtype": self.dtype.name,
+            "distance": self.distance,
+            "count": self._count,
+            "docstore_bytes": os.path.getsize(self._path(DOCSTORE_FILE)) if os.path.exists(self._path(DOCSTORE_FILE)) else 0,
+        })
+
+    def _map_vectors(self) -> None:
+        if self._count == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._path(VECTORS_FILE), dtype=self.dtype, mode="r", shape=(self._count, self._dim))
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path(MANIFEST_FILE)):
+            return
+        with open(self._path(MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["dtype"] != self.dtype.name or manifest["distance"] != self.distance:
+            raise ValueError(f"Store in {self.persist_directory} was created with dtype={manifest['dtype']} "
+                             f"and distance={manifest['distance']}")
+        self._dim = manifest["dim"]
+        self._count = manifest["count"]
+
+        # scarta le righe scritte oltre l'ultimo manifest (scrittura interrotta)
+        vectors_bytes = self._count * (self._dim or 0) * self.dtype.itemsize
+        quantizer = None
+        if self.quantization and os.path.exists(self._path(QUANTIZER_FILE)):
+            with np.load(self._path(QUANTIZER_FILE)) as state:
+                quantizer = load_quantizer(str(state["kind"]), {key: state[key] for key in state.files})
+        codes_bytes = self._count * quantizer.code_size if quantizer is not None else 0
+        for name, size in ((VECTORS_FILE, vectors_bytes), (DOCSTORE_FILE, manifest["docstore_bytes"]),
+                           (CODES_FILE, codes_bytes)):
+            if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) > size:
+                os.truncate(self._path(name), size)
+        if self._count == 0:
+            return
+
+        with open(self._path(DOCSTORE_FILE), encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                entry = json.loads(line)
+                self._ids.append(entry["id"])
+                self._texts.append(entry["text"])
+                self._metadatas.append(entry["metadata"])
+                self._id_to_row[entry["id"]] = row
+
+        self._alive = np.ones(self._count, dtype=bool)
+        if os.path.exists(self._path(DELETED_FILE)):
+            with open(self._path(DELETED_FILE), encoding="utf-8") as f:
+                deleted_rows = json.load(f)
+            self._alive[deleted_rows] = False
+            for row in deleted_rows:
+                self._id_to_row.pop(self._ids[row], None)
+            self._deleted = len(deleted_rows)
+        self._map_vectors()
+        if quantizer is not None:
+            self._quantizer = quantizer
+            self._codes = np.fromfile(self._path(CODES_FILE), dtype=np.uint8).reshape(self._count, quantizer.code_size)
+
+    def persist(self) -> None:
+        """Compatta lo store (rimuove le righe cancellate) e, se persistito, riscrive i file."""
+        with self._lock:
+            self._compact()
+
+    # ------------------------------------------------------------------ #
+    # Scrittura                                                          #
+    # ------------------------------------------------------------------ #
+
+    def _prepare_vectors(self, embeddings: List[List[float]]) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Embeddings must be a list of vectors")
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self._dim}")
+        if self.distance == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return vectors.astype(self.dtype, copy=False)
+
+    def _append(self, vectors: np.ndarray, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        start, count = self._count, self._count + len(ids)
+        codes = self._quantizer.encode(vectors.astype(np.float32)) if self._quantizer is not None else None
+
+        if self.persist_directory:
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path(DOCSTORE_FILE), "a", encoding="utf-8") as f:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, default=str) + "\n")
+            if codes is not None:
+                with open(self._path(CODES_FILE), "ab") as f:
+                    f.write(codes.tobytes())
+        else:
+            self._buffer = _append_rows(self._buffer, start, vectors)
+        if codes is not None:
+            self._codes = _append_rows(self._codes, start, codes)
+
+        alive = np.ones(count, dtype=bool)
+        alive[:start] = self._alive[:start]
+        self._alive = alive
+        for offset, doc_id in enumerate(ids):
+            self._id_to_row[doc_id] = start + offset
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self._count = count
+
+        if self.persist_directory:
+            self._write_manifest()
+            self._map_vectors()
+        else:
+            self._matrix = self._buffer[:count]
+
+    def add_embeddings(self,
+                       text_embeddings: Iterable[Tuple[str, List[float]]],
+                       metadatas: Optional[List[Dict[str, Any]]] = None,
+                       ids: Optional[List[str]] = None,
+                       **kwargs: Any) -> List[str]:
+        """Aggiunge testi con embedding già calcolati (stessa firma di FAISS.add_embeddings)."""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        metadatas = [dict(metadata or {}) for metadata in (metadatas or [{}] * len(texts))]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in the same add")
+
+        with self._lock:
+            existing = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+            if existing:
+                raise ValueError(f"Tried to add ids that already exist: {existing[:10]}")
+            self._append(self._prepare_vectors([vector for _, vector in text_embeddings]), ids, texts, metadatas)
+            if self.quantization and self._quantizer is None and self.train_size and len(self) >= self.train_size:
+                self.quantize()
+        # fuori dal lock dello store: la costruzione di un indice legge lo store tenendo il lock dell'indice
+        notify_added(self, ids, [Document(id=doc_id, page_content=text, metadata=metadata)
+                                 for doc_id, text, metadata in zip(ids, texts, metadatas)])
+        return ids
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[Dict[str, Any]]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        if self.embedding_function is None:
+            raise ValueError("NumpyVectorStore requires an embedding function to add texts")
+        texts = list(texts)
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            raise ValueError("No ids provided to delete")
+        with self._lock:
+            rows = [self._id_to_row.pop(doc_id) for doc_id in ids if doc_id in self._id_to_row]
+            if not rows:
+                return False
+            self._alive[rows] = False
+            self._deleted += len(rows)
+            if self._deleted > self.compact_threshold * self._count:
+                self._compact()
+            elif self.persist_directory:
+                self._write_json(DELETED_FILE, np.flatnonzero(~self._alive).tolist())
+        notify_deleted(self, ids)
+        return True
+
+    def _compact(self) -> None:
+        if self._deleted == 0:
+            return
+        keep = np.flatnonzero(self._alive)
+        vectors = np.asarray(self._matrix[keep]) if self._matrix is not None else None
+        if self._codes is not None:
+            self._codes = self._codes[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._count = len(keep)
+        self._alive = np.ones(self._count, dtype=bool)
+        self._deleted = 0
+
+        if self.persist_directory:
+            tmp_vectors = self._path(VECTORS_FILE + ".tmp")
+            with open(tmp_vectors, "wb") as f:
+                if vectors is not None:
+                    f.write(vectors.tobytes())
+            tmp_docstore = self._path(DOCSTORE_FILE + ".tmp")
+            with open(tmp_docstore, "w", encoding="utf-8") as f:
+                for doc_id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                    f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, default=str) + "\n")
+            os.replace(tmp_vectors, self._path(VECTORS_FILE))
+            os.replace(tmp_docstore, self._path(DOCSTORE_FILE))
+            if self._codes is not None:
+                self._write_codes()
+            if os.path.exists(self._path(DELETED_FILE)):
+                os.remove(self._path(DELETED_FILE))
+            self._write_manifest()
+            self._map_vectors()
+        else:
+            self._buffer = vectors
+            self._matrix = vectors
+
+    # ------------------------------------------------------------------ #
+    # Quantizzazione                                                     #
+    # ------------------------------------------------------------------ #
+
+    def _write_codes(self) -> None:
+        tmp_codes = self._path(CODES_FILE + ".tmp")
+        with open(tmp_codes, "wb") as f:
+            f.write(self._codes[:self._count].tobytes())
+        os.replace(tmp_codes, self._path(CODES_FILE))
+
+    def quantize(self, sample_size: int = 50000, recall_queries: int = 100, k: int = 10) -> Dict[str, Any]:
+        """
+        Addestra il quantizzatore configurato su un campione dei vettori, codifica tutto lo store e
+        misura il recall@k rispetto alla ricerca esatta su `recall_queries` vettori dello store.
+        """
+        if not self.quantization:
+            raise ValueError("Quantization is not configured for this store (params.quantization)")
+        with self._lock:
+            alive_rows = np.flatnonzero(self._alive[:self._count])
+            if len(alive_rows) == 0:
+                raise ValueError("Cannot train the quantizer on an empty store")
+            rng = np.random.default_rng(0)
+            memory_before = self.memory_usage()
+
+            sample_rows = np.sort(rng.choice(alive_rows, size=min(sample_size, len(alive_rows)), replace=False))
+            quantizer = build_quantizer(self.quantization)
+            quantizer.train(np.asarray(self._matrix[sample_rows], dtype=np.float32))
+            codes = np.concatenate([quantizer.encode(np.asarray(self._matrix[start:start + CHUNK_ROWS], dtype=np.float32))
+                                    for start in range(0, self._count, CHUNK_ROWS)])
+
+            self._quantizer, self._codes = quantizer, codes
+            self._write_codes()
+            np.savez(self._path(QUANTIZER_FILE), kind=quantizer.kind, **quantizer.state())
+
+            query_rows = rng.choice(alive_rows, size=min(recall_queries, len(alive_rows)), replace=False)
+            queries = np.asarray(self._matrix[np.sort(query_rows)], dtype=np.float32)
+            recall = measure_recall(lambda q, n: self._top_rows(q, n, exact=True)[0].tolist(),
+                                    lambda q, n: self._top_rows(q, n)[0].tolist(),
+                                    queries, k)
+            return {"type": quantizer.kind, "memory_before": memory_before, "memory_after": self.memory_usage(),
+                    "recall_at_k": recall, "k": k, "recall_queries": len(queries)}
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Byte occupati dai vettori nella memoria del processo e su disco."""
+        rows = self._count
+        float32_bytes = rows * (self._dim or 0) * 4
+        in_memory = self._buffer.nbytes if self._buffer is not None and not self.persist_directory else 0
+        codes = self._codes[:rows].nbytes if self._codes is not None else 0
+        resident = in_memory + codes
+        return {
+            "vectors": rows,
+            "float32_bytes": float32_bytes,
+            "resident_bytes": resident,
+            "codes_bytes": codes,
+            "on_disk_bytes": rows * (self._dim or 0) * self.dtype.itemsize if self.persist_directory else 0,
+            "reduction": float32_bytes / resident if resident else None,
+            "quantization": self._quantizer.kind if self._quantizer is not None else None,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Lettura                                                            #
+    # ------------------------------------------------------------------ #
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def __len__(self) -> int:
+        return self._count - self._deleted
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        with self._lock:
+            return [self._document(self._id_to_row[doc_id]) for doc_id in ids if doc_id in self._id_to_row]
+
+    def document_ids(self) -> List[str]:
+        """Id dei documenti non cancellati, in ordine di inserimento."""
+        with self._lock:
+            return [self._ids[row] for row in range(self._count) if self._alive[row]]
+
+    def get_vectors_by_ids(self, ids: List[str]) -> np.ndarray:
+        """Vettori float32 dei documenti con gli id dati, nello stesso ordine."""
+        with self._lock:
+            if not ids:
+                return np.zeros((0, self._dim or 0), dtype=np.float32)
+            return np.asarray(self._matrix[[self._id_to_row[doc_id] for doc_id in ids]], dtype=np.float32)
+
+    def _filter_mask(self, count: int, filter: Optional[Dict[str, Any] | Callable[[Dict[str, Any]], bool]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        if callable(filter):
+            return np.fromiter((filter(metadata) for metadata in self._metadatas[:count]), dtype=bool, count=count)
+        # filtro sui metadati: candidati dall'indice dei metadati invece che scandendo tutte le righe
+        doc_ids = get_metadata_index(self).filter_ids(filter)
+        with self._lock:
+            rows = np.fromiter((self._id_to_row.get(doc_id, count) for doc_id in doc_ids), dtype=np.int64,
+                               count=len(doc_ids))
+        mask = np.zeros(count, dtype=bool)
+        mask[rows[rows < count]] = True
+        return mask
+
+    def _snapshot(self) -> Tuple[Optional[np.ndarray], np.ndarray, int, Optional[np.ndarray], Any]:
+        with self._lock:
+            return self._matrix, self._alive, self._count, self._codes, self._quantizer
+
+    def _raw_scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Score per riga, più alto = più simile (per euclidean: -distanza²)."""
+        scores = np.empty(len(matrix), dtype=np.float32)
+        query_norm = float(query @ query)
+        for start in range(0, len(matrix), CHUNK_ROWS):
+            block = np.asarray(matrix[start:start + CHUNK_ROWS], dtype=np.float32)
+            block_scores = block @ query
+            if self.distance == "euclidean":
+                block_scores = 2 * block_scores - np.einsum("ij,ij->i", block, block) - query_norm
+            scores[start:start + len(block)] = block_scores
+        return scores
+
+    def _query_vector(self, embedding: List[float]) -> np.ndarray:
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.distance == "cosine":
+            norm = np.linalg.norm(query)
+            if norm:
+                query = query / norm
+        return query
+
+    def _quantized_scores(self, codes: np.ndarray, quantizer: Any, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_ROWS):
+            scores[start:start + CHUNK_ROWS] = quantizer.scores(codes[start:start + CHUNK_ROWS], query, self.distance)
+        return scores
+
+    def _top_rows(self,
+                  embedding: List[float],
+                  k: int,
+                  filter: Optional[Dict[str, Any]] = None,
+                  exact: bool = False) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Righe (ordinate) e score grezzi dei `k` vettori più simili che soddisfano il filtro."""
+        matrix, alive, count, codes, quantizer = self._snapshot()
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), matrix
+        if matrix is None or count == 0 or k <= 0:
+            return empty
+        query = self._query_vector(embedding)
+        mask = alive[:count]
+        filter_mask = self._filter_mask(count, filter)
+        if filter_mask is not None:
+            mask = mask & filter_mask
+        valid = int(mask.sum())
+        k = min(k, valid)
+        if k == 0:
+            return empty
+
+        if quantizer is None or exact:
+            scores = self._raw_scores(matrix, query)
+            scores[~mask] = -np.inf
+            rows = _top_k(scores, k)
+            return rows, scores[rows], matrix
+
+        # candidati scelti sui codici quantizzati, poi riordinati con i vettori float (letti dal memmap)
+        approx_scores = self._quantized_scores(codes[:count], quantizer, query)
+        approx_scores[~mask] = -np.inf
+        candidates = np.sort(_top_k(approx_scores, min(valid, k * self.rerank_factor)))
+        exact_scores = self._raw_scores(matrix[candidates], query)
+        order = _top_k(exact_scores, k)
+        return candidates[order], exact_scores[order], matrix
+
+    def _output_score(self, raw_score: float) -> float:
+        # come FAISS: per euclidean si restituisce la distanza (più bassa = più simile)
+        if self.distance == "euclidean":
+            return float(np.sqrt(max(-raw_score, 0.0)))
+        return float(raw_score)
+
+    def similarity_search_with_score_by_vector(self,
+                                               embedding: List[float],
+                                               k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        rows, scores, _ = self._top_rows(embedding, k, filter)
+        results = [(self._document(row), self._output_score(score)) for row, score in zip(rows, scores)]
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            compare = (lambda s: s <= score_threshold) if self.distance == "euclidean" else (lambda s: s >= score_threshold)
+            results = [(doc, score) for doc, score in results if compare(score)]
+        return results
+
+    def similarity_search_by_vector(self,
+                                    embedding: List[float],
+                                    k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def _embed_query(self, query: str) -> List[float]:
+        if self.embedding_function is None:
+            raise ValueError("NumpyVectorStore requires an embedding function to search by text")
+        return self.embedding_function.embed_query(query)
+
+    def similarity_search_with_score(self,
+                                     query: str,
+                                     k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self,
+                          query: str,
+                          k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embed_query(query), k, filter, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(self,
+                                                embedding: List[float],
+                                                k: int = 4,
+                                                fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        rows, _, matrix = self._top_rows(embedding, max(fetch_k, k), filter)
+        if len(rows) == 0:
+            return []
+        candidates = np.asarray(matrix[rows], dtype=np.float32)
+        selected = maximal_marginal_relevance(self._query_vector(embedding), candidates, k=k, lambda_mult=lambda_mult)
+        return [self._document(rows[i]) for i in selected]
+
+    def max_marginal_relevance_search(self,
+                                      query: str,
+                                      k: int = 4,
+                                      fetch_k: int = 20,
+                                      lambda_mult: float = 0.5,
+                                      filter: Optional[Dict[str, Any]] = None,
+                                      **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self._embed_query(query), k, fetch_k, lambda_mult,
+                                                            filter, **kwargs)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        if self.override_relevance_score_fn is not None:
+            return self.override_relevance_score_fn
+        if self.distance == "euclidean":
+            return self._euclidean_relevance_score_fn
+        # cosine (vettori normalizzati) e dot: lo score è già una similarità
+        return lambda score: score
+
+    def filter_documents(self, filter: Dict[str, Any], skip: int = 0, limit: int = 10) -> List[Document]:
+        """Documenti (non cancellati) i cui metadati soddisfano il filtro, in ordine di inserimento."""
+        with self._lock:
+            matches = (row for row in range(self._count)
+                       if self._alive[row] and metadata_matches(self._metadatas[row], filter))
+            results = []
+            for index, row in enumerate(matches):
+                if index < skip:
+                    continue
+                if len(results) >= limit:
+                    break
+                results.append(self._document(row))
+            return results
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[Dict[str, Any]]] = None,
+                   ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,160 @@
+"""
+quantization.py
+
+Quantizzatori NumPy per `NumpyVectorStore` e misura del recall.
+
+- `ScalarQuantizer8` ("sq8"): ogni dimensione è mappata su 256 livelli tra
+  minimo e massimo osservati in training; 1 byte per dimensione (4x rispetto
+  a float32).
+- `ProductQuantizer` ("pq"): il vettore è diviso in `m` sottovettori, ognuno
+  sostituito dall'indice (1 byte) del centroide più vicino di un k-means a
+  256 centroidi; `m` byte per vettore. Gli score sono calcolati con tabelle
+  di lookup (asymmetric distance computation) senza decodificare i vettori.
+
+Gli score approssimati servono solo a scegliere i candidati: lo store li
+riordina poi con i vettori float (memory-mapped su disco).
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+QUANTIZATION_TYPES = ("sq8", "pq")
+
+# righe per blocco nel calcolo degli score e nella codifica
+CHUNK_ROWS = 65536
+
+
+def _kmeans(x: np.ndarray, n_centroids: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    """K-means (Lloyd) minimale: inizializzazione su punti casuali, cluster vuoti reinizializzati."""
+    centroids = x[rng.choice(len(x), size=n_centroids, replace=len(x) < n_centroids)].copy()
+    for _ in range(n_iter):
+        assignment = _nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        counts = np.bincount(assignment, minlength=n_centroids)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+    return centroids
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    return np.argmin(centroid_norms[None, :] - 2 * x @ centroids.T, axis=1)
+
+
+class ScalarQuantizer8:
+    kind = "sq8"
+
+    def __init__(self, mins: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None):
+        self.mins = mins
+        self.scales = scales
+
+    @property
+    def code_size(self) -> int:
+        return len(self.mins)
+
+    def train(self, x: np.ndarray) -> None:
+        self.mins = x.min(axis=0).astype(np.float32)
+        scales = (x.max(axis=0) - self.mins) / 255.0
+        self.scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((x - self.mins) / self.scales), 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.mins + codes.astype(np.float32) * self.scales
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, distance: str) -> np.ndarray:
+        """Score approssimati (più alto = più simile) dei vettori codificati rispetto a `query`."""
+        if distance == "euclidean":
+            decoded = self.decode(codes)
+            return 2 * decoded @ query - np.einsum("ij,ij->i", decoded, decoded)
+        return codes.astype(np.float32) @ (query * self.scales) + float(query @ self.mins)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"mins": self.mins, "scales": self.scales}
+
+
+class ProductQuantizer:
+    kind = "pq"
+
+    def __init__(self, m: int = 8, n_iter: int = 20, centroids: Optional[np.ndarray] = None, seed: int = 0):
+        self.m = m
+        self.n_iter = n_iter
+        self.seed = seed
+        # (m, 256, dsub)
+        self.centroids = centroids
+
+    @property
+    def code_size(self) -> int:
+        return self.m
+
+    def train(self, x: np.ndarray) -> None:
+        dim = x.shape[1]
+        if dim % self.m:
+            raise ValueError(f"Product quantization requires the dimension ({dim}) to be a multiple of m ({self.m})")
+        dsub = dim // self.m
+        rng = np.random.default_rng(self.seed)
+        self.centroids = np.stack([
+            _kmeans(np.ascontiguousarray(x[:, j * dsub:(j + 1) * dsub]), 256, self.n_iter, rng)
+            for j in range(self.m)
+        ]).astype(np.float32)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        dsub = self.centroids.shape[2]
+        codes = np.empty((len(x), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(x[:, j * dsub:(j + 1) * dsub], self.centroids[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.centroids[np.arange(self.m), codes].reshape(len(codes), -1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, distance: str) -> np.ndarray:
+        sub_queries = query.reshape(self.m, 1, -1)
+        if distance == "euclidean":
+            tables = -((self.centroids - sub_queries) ** 2).sum(axis=2)
+        else:
+            tables = (self.centroids * sub_queries).sum(axis=2)
+        return tables[np.arange(self.m), codes].sum(axis=1)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+def build_quantizer(settings: Dict[str, Any]):
+    """Crea il quantizzatore (non addestrato) descritto da `params.quantization`."""
+    kind = settings.get("type")
+    if kind == "sq8":
+        return ScalarQuantizer8()
+    if kind == "pq":
+        return ProductQuantizer(m=int(settings.get("m", 8)), n_iter=int(settings.get("n_iter", 20)))
+    raise ValueError(f"Unsupported quantization type {kind}. Supported types are: {QUANTIZATION_TYPES}")
+
+
+def load_quantizer(kind: str, state: Dict[str, np.ndarray]):
+    if kind == "sq8":
+        return ScalarQuantizer8(mins=state["mins"], scales=state["scales"])
+    if kind == "pq":
+        centroids = state["centroids"]
+        return ProductQuantizer(m=centroids.shape[0], centroids=centroids)
+    raise ValueError(f"Unsupported quantization type {kind}")
+
+
+def measure_recall(exact_search: Callable[[np.ndarray, int], List[Any]],
+                   approx_search: Callable[[np.ndarray, int], List[Any]],
+                   queries: np.ndarray,
+                   k: int) -> float:
+    """Recall@k medio: frazione dei k risultati esatti restituiti anche dalla ricerca approssimata."""
+    if len(queries) == 0 or k <= 0:
+        return 1.0
+    hits = 0
+    expected = 0
+    for query in queries:
+        exact = set(exact_search(query, k))
+        hits += len(exact & set(approx_search(query, k)))
+        expected += len(exact)
+    return hits / expected if expected else 1.0
@@ -0,0 +1,228 @@
+"""
+rebuild.py
+
+Ricostruzione di uno store senza interruzione delle ricerche (indice ombra).
+
+Cambiare il modello di embedding, la classe o i parametri di uno store (o il
+chunking dei documenti nel document store) richiederebbe di scaricarlo,
+cancellarlo e reinserire tutto, con le ricerche ferme per tutto il tempo. Con
+`ShadowRebuild` lo store caricato continua a servire mentre in background
+viene costruita una nuova istanza (l'ombra) dalla nuova configurazione:
+
+1. l'ombra viene popolata da una collezione del document store (con
+   `sync_collection`, così gli id restano quelli del document store e lo
+   stato di sincronizzazione è pronto per lo store ricostruito) oppure dai
+   documenti dello store stesso; in quest'ultimo caso, se il modello di
+   embedding non cambia e lo store restituisce i vettori originali (FAISS non
+   quantizzato, NumpyVectorStore), i vettori vengono copiati senza richiamare
+   il modello, altrimenti i testi già embeddati con lo stesso modello
+   passano dalla cache degli embedding (embedding_cache.py);
+2. le scritture arrivate sullo store durante la costruzione (raccolte dal
+   giornale delle scritture, store_index.py) vengono riportate sull'ombra;
+   se lo store riceve scritture non tracciabili (es. `/vector_store/method`)
+   la ricostruzione fallisce e va ripetuta;
+3. l'ombra viene validata: deve contenere tutti i documenti inseriti, e una
+   parte dei suoi documenti, cercati per testo, deve trovare sé stessa tra i
+   primi `k` risultati (self-recall);
+4. con il lock in scrittura dello store vengono riportate le ultime
+   scritture, registrata la nuova configurazione e sostituita l'istanza in
+   `vector_stores`; la vecchia istanza viene ritirata (store_locks.py): le
+   ricerche in corso terminano su di essa, le scritture che la avevano già in
+   mano falliscono invece di andare perse.
+
+Se un passo fallisce (o il job viene cancellato) l'ombra viene eliminata e lo
+store resta quello di prima. I dati della configurazione precedente
+(directory, collezione, indice) non vengono cancellati: gli altri worker
+possono usarli finché non ricaricano lo store.
+
+Configurazione via env:
+
+    REBUILD_VALIDATION_QUERIES  (default 20 documenti cercati per il self-recall)
+    REBUILD_MIN_SELF_RECALL     (default 0.9)
+"""
+
+import os
+import random
+import re
+import shutil
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from vector_stores.utilities.ingestion import add_documents_batch, add_embedded_documents, supports_add_embeddings
+from vector_stores.utilities.store_index import (open_journal, close_journal, list_store_ids, get_store_documents,
+                                                 record_deleted)
+from vector_stores.utilities.store_locks import get_store_lock, read_locked, write_locked, retire
+from vector_stores.utilities.sync import clear_sync_state, sync_collection
+
+REBUILD_VALIDATION_QUERIES = int(os.getenv("REBUILD_VALIDATION_QUERIES", "20"))
+REBUILD_MIN_SELF_RECALL = float(os.getenv("REBUILD_MIN_SELF_RECALL", "0.9"))
+
+# parametri che individuano i dati di uno store: l'ombra non può condividerli con lo store che sostituisce
+SHADOW_PARAMS = ("persist_directory", "collection_name", "index_name")
+_SHADOW_SUFFIX = re.compile(r"\.rebuild-[0-9a-f]+$")
+
+
+def shadow_params(vector_store_class: str,
+                  params: Dict[str, Any],
+                  live_params: Dict[str, Any],
+                  tag: str) -> Dict[str, Any]:
+    """
+    Parametri dell'ombra: directory, collezione e indice uguali a quelli dello store in uso ricevono il suffisso
+    `.rebuild-<tag>` (al posto di quello di una ricostruzione precedente).
+    """
+    params = dict(params)
+    live_params = dict(live_params)
+    if vector_store_class == "Chroma" and not params.get("persist_directory"):
+        # Chroma in memoria: tutti gli store del processo condividono il client, va separata la collezione
+        params.setdefault("collection_name", "langchain")
+        live_params.setdefault("collection_name", "langchain")
+    for key in SHADOW_PARAMS:
+        if key in params and params[key] == live_params.get(key):
+            params[key] = f"{_SHADOW_SUFFIX.sub('', str(params[key]))}.rebuild-{tag}"
+    return params
+
+
+def has_exact_vectors(vector_store: Any) -> bool:
+    """True se lo store restituisce i vettori originali (FAISS quantizzato li ricostruisce in modo approssimato)."""
+    if not hasattr(vector_store, "get_vectors_by_ids"):
+        return False
+    return not (hasattr(vector_store, "index_to_docstore_id") and getattr(vector_store, "quantization", None))
+
+
+class ShadowRebuild:
+    """Costruzione, validazione e sostituzione dell'ombra di uno store caricato."""
+
+    def __init__(self, live: Any, shadow: Any, reuse_vectors: bool = False):
+        self.live = live
+        self.shadow = shadow
+        self.reuse_vectors = reuse_vectors and has_exact_vectors(live) and supports_add_embeddings(shadow)
+        self.documents = 0
+        self.caught_up = 0
+        # scritture sullo store da adesso in poi, da riportare sull'ombra
+        self.journal = open_journal(live)
+
+    # ------------------------------------------------------------------ #
+    # Costruzione                                                        #
+    # ------------------------------------------------------------------ #
+
+    def _add(self, docs: List[Document]) -> None:
+        ids = [doc.id for doc in docs]
+        if self.reuse_vectors:
+            vectors = read_locked(self.live, self.live.get_vectors_by_ids, ids)
+            add_embedded_documents(self.shadow, docs, [vector.tolist() for vector in vectors], ids=ids)
+        else:
+            add_documents_batch(self.shadow, docs, ids=ids)
+
+    def build_from_store(self, batch_size: int, on_progress: Optional[Callable[..., None]] = None) -> int:
+        """Copia nell'ombra i documenti dello store (con gli stessi id)."""
+        ids = read_locked(self.live, list_store_ids, self.live)
+        for start in range(0, len(ids), batch_size):
+            # i documenti cancellati nel frattempo vengono saltati, quelli modificati sono nel giornale
+            docs = read_locked(self.live, get_store_documents, self.live, ids[start:start + batch_size])
+            if docs:
+                self._add(docs)
+            self.documents += len(docs)
+            if on_progress is not None:
+                on_progress(current=min(start + batch_size, len(ids)), total=len(ids), message="copying")
+        self._check_count()
+        return self.documents
+
+    def build_from_collection(self,
+                              document_collection: Any,
+                              sync_store_id: str,
+                              batch_size: int,
+                              on_progress: Optional[Callable[..., None]] = None) -> int:
+        """
+        Popola l'ombra dalla collezione del document store; lo stato di sincronizzazione viene scritto per
+        `sync_store_id` (da spostare sullo store con `move_sync_state` alla sostituzione).
+        """
+        # resti di una ricostruzione interrotta
+        clear_sync_state(sync_store_id)
+        counts = sync_collection(self.shadow, sync_store_id, document_collection, batch_size, on_progress=on_progress)
+        self.documents = counts["added"]
+        self._check_count()
+        return self.documents
+
+    def _check_count(self) -> None:
+        count = len(list_store_ids(self.shadow))
+        if count != self.documents:
+            raise ValueError(f"The rebuilt store holds {count} documents, {self.documents} were inserted")
+
+    # ------------------------------------------------------------------ #
+    # Scritture concorrenti                                              #
+    # ------------------------------------------------------------------ #
+
+    def catch_up(self) -> int:
+        """Riporta sull'ombra le scritture fatte sullo store dall'ultima chiamata; restituisce gli id riportati."""
+        if self.journal.untracked:
+            raise RuntimeError("The store received untracked writes (e.g. /vector_store/method) during the rebuild, "
+                               "retry later")
+        ids = self.journal.take()
+        if not ids:
+            return 0
+        current = read_locked(self.live, get_store_documents, self.live, ids)
+        stale = [doc.id for doc in get_store_documents(self.shadow, ids)]
+        if stale:
+            write_locked(self.shadow, self.shadow.delete, ids=stale)
+            record_deleted(self.shadow, stale)
+        if current:
+            self._add(current)
+        self.caught_up += len(ids)
+        return len(ids)
+
+    # ------------------------------------------------------------------ #
+    # Validazione e sostituzione                                         #
+    # ------------------------------------------------------------------ #
+
+    def validate(self,
+                 queries: int = REBUILD_VALIDATION_QUERIES,
+                 k: int = 10,
+                 min_self_recall: float = REBUILD_MIN_SELF_RECALL) -> Dict[str, Any]:
+        """Self-recall@k dell'ombra su `queries` suoi documenti; solleva ValueError se sotto `min_self_recall`."""
+        ids = list_store_ids(self.shadow)
+        sample = random.Random(0).sample(ids, min(queries, len(ids)))
+        docs = get_store_documents(self.shadow, sample)
+        hits = 0
+        for doc in docs:
+            results = self.shadow.similarity_search(doc.page_content, k=k)
+            hits += any(result.page_content == doc.page_content for result in results)
+        recall = hits / len(docs) if docs else None
+        report = {"documents": len(ids), "queries": len(docs), "k": k, "self_recall": recall,
+                  "min_self_recall": min_self_recall}
+        if recall is not None and recall < min_self_recall:
+            raise ValueError(f"Rebuilt store failed validation: self-recall@{k} {recall:.3f} < {min_self_recall}")
+        return report
+
+    def swap(self, commit: Callable[[], None]) -> None:
+        """
+        Con il lock in scrittura dello store riporta le ultime scritture e chiama `commit()` (che registra la
+        nuova configurazione e mette l'ombra al posto dello store), poi ritira lo store sostituito.
+        """
+        with get_store_lock(self.live).write():
+            self.catch_up()
+            commit()
+            retire(self.live)
+        # scritture terminate prima dello scambio ma notificate dopo (l'ombra è già in uso: non si torna indietro)
+        try:
+            self.catch_up()
+        except Exception as exc:
+            print(f"rebuild catch-up error after swap: {exc}")
+        finally:
+            close_journal(self.live, self.journal)
+
+    def discard(self, params: Dict[str, Any]) -> None:
+        """Elimina l'ombra (ricostruzione fallita o cancellata); `params` sono i parametri con cui è stata creata."""
+        close_journal(self.live, self.journal)
+        try:
+            if hasattr(self.shadow, "delete_collection"):
+                # Chroma: la directory può appartenere a un client condiviso (chroma_pool.py)
+                self.shadow.delete_collection()
+                return
+            if hasattr(self.shadow, "close"):
+                self.shadow.close()
+            persist_directory = params.get("persist_directory")
+            if persist_directory and os.path.isdir(persist_directory):
+                shutil.rmtree(persist_directory, ignore_errors=True)
+        except Exception as exc:
+            print(f"rebuild cleanup error: {exc}")
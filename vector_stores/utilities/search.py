@@ -0,0 +1,116 @@
+"""
+search.py
+
+Esecuzione delle ricerche sui vector store a partire da un embedding già calcolato.
+
+Le ricerche testuali di LangChain (`similarity_search(query)`, ...) calcolano
+l'embedding della query dentro lo store, una chiamata al modello per query.
+Per le ricerche batch gli embedding di tutte le query vengono calcolati con
+una sola chiamata (`embed_queries`) e poi passati ai metodi `*_by_vector`
+dello store; se la classe concreta non li implementa (es. ElasticVectorSearch)
+la singola query ricade sulla ricerca testuale.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# "hybrid" (BM25 + densa, vedi hybrid.py) non corrisponde a un metodo dello store
+SEARCH_TYPES = ("similarity", "mmr", "similarity_score_threshold", "hybrid")
+
+# metodo testuale (sincrono / async) per ciascun tipo di ricerca dello store
+TEXT_SEARCH_METHODS: Dict[str, Tuple[str, str]] = {
+    "similarity": ("asimilarity_search", "similarity_search"),
+    "mmr": ("amax_marginal_relevance_search", "max_marginal_relevance_search"),
+    "similarity_score_threshold": ("asimilarity_search_with_relevance_scores",
+                                   "similarity_search_with_relevance_scores"),
+}
+
+# metodi per-vettore che restituiscono (documento, score grezzo): il nome varia a seconda della classe
+_SCORED_BY_VECTOR_METHODS = (
+    "similarity_search_with_score_by_vector",             # FAISS
+    "similarity_search_by_vector_with_relevance_scores",  # Chroma, ElasticsearchStore
+)
+
+
+def is_implemented(obj: Any, method_name: str) -> bool:
+    """True se `method_name` esiste ed è ridefinito rispetto a `VectorStore` (dove spesso solleva NotImplementedError)."""
+    method = getattr(type(obj), method_name, None)
+    if method is None:
+        return False
+    return getattr(VectorStore, method_name, None) is not method
+
+
+def get_store_embeddings(vector_store: Any) -> Optional[Embeddings]:
+    """Modello di embedding usato dallo store, se esposto (`VectorStore.embeddings`)."""
+    try:
+        embeddings = vector_store.embeddings
+    except (AttributeError, NotImplementedError):
+        return None
+    return embeddings if isinstance(embeddings, Embeddings) else None
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embedding di più query in una sola chiamata al modello.
+
+    Usa `embed_queries` se il modello lo fornisce (es. RemoteEmbeddings, che
+    distingue query e documenti); altrimenti `embed_documents`, che per i
+    modelli supportati produce gli stessi vettori di `embed_query`.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+def supports_search_by_vector(vector_store: Any, search_type: str) -> bool:
+    """True se lo store può eseguire `search_type` a partire da un embedding già calcolato."""
+    if search_type in ("similarity", "hybrid"):
+        return is_implemented(vector_store, "similarity_search_by_vector")
+    if search_type == "mmr":
+        return is_implemented(vector_store, "max_marginal_relevance_search_by_vector")
+    if search_type == "similarity_score_threshold":
+        if _scored_by_vector_method(vector_store) is None:
+            return False
+        try:
+            vector_store._select_relevance_score_fn()
+        except NotImplementedError:
+            return False
+        return True
+    return False
+
+
+def _scored_by_vector_method(vector_store: Any) -> Optional[str]:
+    for method_name in _SCORED_BY_VECTOR_METHODS:
+        if is_implemented(vector_store, method_name):
+            return method_name
+    return None
+
+
+def search_by_vector(vector_store: Any,
+                     search_type: str,
+                     embedding: List[float],
+                     search_kwargs: Dict[str, Any]) -> List[Document] | List[Tuple[Document, float]]:
+    """
+    Esegue `search_type` con un embedding già calcolato.
+
+    Per `similarity_score_threshold` gli score grezzi vengono convertiti con la
+    funzione di rilevanza dello store e filtrati con `score_threshold`, come in
+    `VectorStore.similarity_search_with_relevance_scores`.
+    """
+    kwargs = dict(search_kwargs)
+    if search_type == "similarity":
+        return vector_store.similarity_search_by_vector(embedding, **kwargs)
+    if search_type == "mmr":
+        return vector_store.max_marginal_relevance_search_by_vector(embedding, **kwargs)
+    if search_type == "similarity_score_threshold":
+        score_threshold = kwargs.pop("score_threshold", None)
+        relevance_fn = vector_store._select_relevance_score_fn()
+        docs_and_scores = getattr(vector_store, _scored_by_vector_method(vector_store))(embedding, **kwargs)
+        results = [(doc, relevance_fn(score)) for doc, score in docs_and_scores]
+        if score_threshold is not None:
+            results = [(doc, score) for doc, score in results if score >= score_threshold]
+        return results
+    raise ValueError(f"Unsupported search type {search_type}")
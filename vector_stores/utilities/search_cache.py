@@ -0,0 +1,165 @@
+"""
+search_cache.py
+
+Cache in memoria dei risultati di ricerca, una per vector store caricato.
+
+Il front end ripete le stesse ricerche (domande suggerite) e gli agenti
+ripetono gli stessi tool call nella stessa conversazione. La cache tiene i
+risultati per (query normalizzata, search_type, search_kwargs) in un LRU con
+TTL ed è svuotata da ogni scrittura sullo store che passa dagli hook di
+store_index.py (endpoint di aggiunta/rimozione/aggiornamento, ingestione,
+sync, `/vector_store/method`, scritture di FaissVectorStore e
+NumpyVectorStore). Una ricerca iniziata prima di una scrittura e terminata
+dopo non viene messa in cache (contatore di generazione).
+
+Ogni worker ha la propria cache: per gli store con dati condivisi tra i
+worker (Chroma persistito) le scritture fatte da un altro processo vengono
+rilevate alla lettura successiva dalla generazione di scrittura di nodo
+(`check_node_writes`, store_index.py) e svuotano la cache.
+
+Configurazione via env (default per tutti gli store):
+
+    SEARCH_RESULT_CACHE_SIZE   (default 0 = disabilitata; risultati per store)
+    SEARCH_RESULT_CACHE_TTL    (default 300 secondi, 0 = nessuna scadenza)
+
+e per singolo store con il campo `search_cache` della configurazione
+(`{"max_size": 256, "ttl": 60}`, `max_size` 0 disabilita).
+"""
+
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from embedding_models.utilities.query_cache import normalize_query
+from vector_stores.utilities.store_index import check_node_writes, on_store_write
+
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "0"))
+SEARCH_RESULT_CACHE_TTL = float(os.getenv("SEARCH_RESULT_CACHE_TTL", "300"))
+
+
+def search_cache_key(query: str, search_type: str, search_kwargs: Dict[str, Any]) -> str:
+    return json.dumps([normalize_query(query), search_type, search_kwargs], sort_keys=True, default=str)
+
+
+class SearchResultCache:
+    """Cache LRU thread-safe chiave di ricerca -> risultati, con scadenza per TTL."""
+
+    def __init__(self, max_size: int = SEARCH_RESULT_CACHE_SIZE, ttl: float = SEARCH_RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, List[Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # incrementata a ogni svuotamento: i risultati calcolati prima non vengono memorizzati
+        self.generation = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, results = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return list(results)
+
+    def put(self, key: str, results: List[Any], generation: int) -> None:
+        """Memorizza `results` se nessuna scrittura è avvenuta dalla `generation` letta prima della ricerca."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+# cache di ciascuno store caricato (None = disabilitata); scompare con l'istanza dello store
+_caches: "weakref.WeakKeyDictionary[Any, Optional[SearchResultCache]]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def configure_search_cache(vector_store: Any, settings: Optional[Dict[str, Any]] = None) -> None:
+    """Imposta la cache dello store da `settings` (`max_size`, `ttl`), o dai default di env se None."""
+    settings = settings or {}
+    max_size = int(settings.get("max_size", SEARCH_RESULT_CACHE_SIZE))
+    ttl = float(settings.get("ttl", SEARCH_RESULT_CACHE_TTL))
+    with _caches_lock:
+        _caches[vector_store] = SearchResultCache(max_size, ttl) if max_size > 0 else None
+
+
+def get_search_cache(vector_store: Any) -> Optional[SearchResultCache]:
+    """Cache dello store (creata con i default di env alla prima richiesta), None se disabilitata."""
+    # svuota la cache se un altro processo ha scritto sui dati condivisi dello store
+    check_node_writes(vector_store)
+    with _caches_lock:
+        if vector_store not in _caches:
+            _caches[vector_store] = SearchResultCache() if SEARCH_RESULT_CACHE_SIZE > 0 else None
+        return _caches[vector_store]
+
+
+def invalidate_search_cache(vector_store: Any) -> None:
+    cache = _caches.get(vector_store)
+    if cache is not None:
+        cache.clear()
+
+
+on_store_write(invalidate_search_cache)
+
+
+def cached_search(vector_store: Any, query: str, search_type: str, search_kwargs: Dict[str, Any],
+                  search: Callable[[], List[Any]]) -> List[Any]:
+    """Risultati di `search()` serviti dalla cache dello store, se abilitata."""
+    cache = get_search_cache(vector_store)
+    if cache is None:
+        return search()
+    key = search_cache_key(query, search_type, search_kwargs)
+    results = cache.get(key)
+    if results is None:
+        generation = cache.generation
+        results = search()
+        cache.put(key, results, generation)
+    return results
+
+
+async def acached_search(vector_store: Any, query: str, search_type: str, search_kwargs: Dict[str, Any],
+                         search: Callable[[], Awaitable[List[Any]]]) -> List[Any]:
+    """Versione async di `cached_search`."""
+    cache = get_search_cache(vector_store)
+    if cache is None:
+        return await search()
+    key = search_cache_key(query, search_type, search_kwargs)
+    results = cache.get(key)
+    if results is None:
+        generation = cache.generation
+        results = await search()
+        cache.put(key, results, generation)
+    return results
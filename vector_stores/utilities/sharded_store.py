@@ -0,0 +1,431 @@
+"""
+sharded_store.py
+
+`ShardedVectorStore`: store partizionato su più processi, per gli store che
+non stanno nella memoria di un solo processo o la cui ricerca su un solo
+core è troppo lenta.
+
+I documenti sono ripartiti per hash dell'id su `shards` processi worker, uno
+per shard, ciascuno con il proprio store (`shard_class`: "FAISS" o
+"NumpyVectorStore", con parametri `shard_params`):
+
+    {"vector_store_class": "ShardedVectorStore",
+     "params": {"shards": 4, "shard_class": "FAISS", "shard_params": {"ann": {"type": "hnsw"}}}}
+
+- gli embedding vengono calcolati nel processo del servizio (cache degli
+  embedding comprese) e gli shard ricevono solo vettori;
+- aggiunte e cancellazioni vanno allo shard proprietario di ciascun id;
+- le ricerche vengono inviate in parallelo a tutti gli shard e i top-k
+  vengono fusi per score di rilevanza (gli score restituiti sono quindi
+  rilevanze, più alto = più simile); per MMR ogni shard restituisce i propri
+  `fetch_k` candidati con i vettori e la selezione avviene sui candidati fusi;
+- i filtri sui metadati vengono applicati dentro ciascuno shard (ricerca
+  prefiltrata di FaissVectorStore e NumpyVectorStore).
+
+Con `persist_directory` negli `shard_params` (NumpyVectorStore) ogni shard usa
+la sottocartella `shard_<i>`; gli snapshot (shard FAISS) sono cartelle con
+una sottocartella per shard. Il numero di shard di dati già salvati non può
+cambiare (non c'è ripartizionamento).
+
+I processi partono alla costruzione dello store e si fermano quando l'istanza
+viene scaricata (o con `close()`). Ogni worker uvicorn che carica lo store
+avvia i propri `shards` processi (con `--workers N` sono N x `shards` per
+store): i processi degli shard sono contati sul nodo nel registro degli
+oggetti (utilities/object_registry.py) e lo store non viene caricato se il
+totale supererebbe `SHARDED_MAX_NODE_PROCESSES`.
+
+Configurazione via env:
+
+    SHARDED_MAX_NODE_PROCESSES  (default 4 x numero di CPU; 0 = nessun limite)
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import uuid
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from vector_stores.utilities.faiss_store import FaissVectorStore, embedding_dimension
+from vector_stores.utilities.numpy_store import NumpyVectorStore
+from utilities.object_registry import object_registry
+from vector_stores.utilities.store_index import notify_added, notify_deleted
+
+SHARDED_MAX_NODE_PROCESSES = int(os.getenv("SHARDED_MAX_NODE_PROCESSES", str(4 * (os.cpu_count() or 1))))
+
+SHARD_CLASSES = {
+    "FAISS": FaissVectorStore,
+    "NumpyVectorStore": NumpyVectorStore,
+}
+
+SHARDING_FILE = "sharding.json"
+
+# voce del registro degli oggetti con i processi degli shard avviati sul nodo
+_PROCESSES_KIND = "shard_processes"
+
+# documenti letti per blocco da uno shard per la costruzione degli indici in memoria
+_DOCUMENTS_BATCH_SIZE = 1000
+
+
+# ---------------------------------------------------------------------- #
+# Processo worker: uno store per processo                                #
+# ---------------------------------------------------------------------- #
+
+_shard: Any = None
+
+
+def _open_shard(shard_class: str, shard_params: Dict[str, Any], snapshot_path: Optional[str], mmap: bool) -> None:
+    global _shard
+    cls = SHARD_CLASSES[shard_class]
+    # lo shard non ha un modello di embedding (riceve solo vettori): FAISS lo segnala a ogni istanza
+    logging.getLogger("langchain_community.vectorstores.faiss").setLevel(logging.ERROR)
+    if snapshot_path:
+        _shard = cls.load_snapshot(snapshot_path, None, mmap=mmap, **shard_params)
+    else:
+        _shard = cls(embedding_function=None, **shard_params)
+
+
+def _shard_call(method: str, *args: Any, **kwargs: Any) -> Any:
+    return getattr(_shard, method)(*args, **kwargs)
+
+
+def _shard_attribute(name: str) -> Any:
+    return getattr(_shard, name)
+
+
+def _shard_search(embedding: List[float], k: int, kwargs: Dict[str, Any]) -> List[Tuple[Document, float]]:
+    """Top-k dello shard con score di rilevanza, confrontabili tra shard."""
+    relevance_fn = _shard._select_relevance_score_fn()
+    return [(doc, float(relevance_fn(score)))
+            for doc, score in _shard.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+
+def _shard_candidates(embedding: List[float], fetch_k: int,
+                      kwargs: Dict[str, Any]) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+    """Candidati MMR dello shard con i rispettivi vettori."""
+    results = _shard_search(embedding, fetch_k, kwargs)
+    return results, _shard.get_vectors_by_ids([doc.id for doc, _ in results])
+
+
+def _shard_ids() -> List[str]:
+    if hasattr(_shard, "index_to_docstore_id"):
+        return list(_shard.index_to_docstore_id.values())
+    return _shard.document_ids()
+
+
+# ---------------------------------------------------------------------- #
+# Store nel processo del servizio                                        #
+# ---------------------------------------------------------------------- #
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """Shard proprietario dell'id (hash stabile tra processi e riavvii, a differenza di `hash`)."""
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "big") % shards
+
+
+def _shutdown(executors: List[ProcessPoolExecutor], reservation: str) -> None:
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        object_registry.unregister(_PROCESSES_KIND, reservation)
+    except Exception as exc:
+        print(f"shard processes release error: {exc}")
+
+
+class ShardedVectorStore(VectorStore):
+    """Store partizionato per hash dell'id su processi worker, con ricerca scatter-gather."""
+
+    # le scritture aggiornano da sé gli indici in memoria (vedi store_index.py)
+    notifies_store_indexes = True
+
+    def __init__(self,
+                 embedding_function: Optional[Embeddings] = None,
+                 shards: int = 2,
+                 shard_class: str = "FAISS",
+                 shard_params: Optional[Dict[str, Any]] = None,
+                 *,
+                 snapshot_path: Optional[str] = None,
+                 mmap: bool = True):
+        if shard_class not in SHARD_CLASSES:
+            raise ValueError(f"Unsupported shard class {shard_class}. Supported classes are: {', '.join(SHARD_CLASSES)}")
+        if shards < 1:
+            raise ValueError("A sharded store needs at least one shard")
+        shard_params = dict(shard_params or {})
+        if snapshot_path:
+            self._check_sharding(snapshot_path, shards, shard_class)
+        persist_directory = shard_params.pop("persist_directory", None)
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._check_sharding(persist_directory, shards, shard_class)
+            self._write_sharding(persist_directory, shards, shard_class)
+        if shard_class == "FAISS" and "dimension" not in shard_params and not snapshot_path:
+            # gli shard non hanno il modello di embedding
+            if embedding_function is None:
+                raise ValueError("FAISS shards require either dimension or an embeddings model")
+            shard_params["dimension"] = embedding_dimension(embedding_function)
+
+        self.embedding_function = embedding_function
+        self.shards = shards
+        self.shard_class = shard_class
+        # processi avviati con spawn: il fork di un processo con thread (pool, lock) non è sicuro
+        context = multiprocessing.get_context("spawn")
+        self._executors: List[ProcessPoolExecutor] = []
+        reservation = uuid.uuid4().hex
+        object_registry.reserve(_PROCESSES_KIND, reservation, shards, SHARDED_MAX_NODE_PROCESSES)
+        self._finalizer = weakref.finalize(self, _shutdown, self._executors, reservation)
+        for shard in range(shards):
+            params = dict(shard_params)
+            if persist_directory:
+                params["persist_directory"] = os.path.join(persist_directory, f"shard_{shard}")
+            path = os.path.join(snapshot_path, f"shard_{shard}") if snapshot_path else None
+            self._executors.append(ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_open_shard,
+                                                       initargs=(shard_class, params, path, mmap)))
+        try:
+            # avvia i processi e fa emergere subito gli errori di configurazione
+            self._gather([executor.submit(_shard_attribute, "__class__") for executor in self._executors])
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def _check_sharding(path: str, shards: int, shard_class: str) -> None:
+        sharding_path = os.path.join(path, SHARDING_FILE)
+        if not os.path.exists(sharding_path):
+            return
+        with open(sharding_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved != {"shards": shards, "shard_class": shard_class}:
+            raise ValueError(f"Data in {path} was saved with {saved['shards']} {saved['shard_class']} shards: "
+                             f"re-sharding is not supported")
+
+    @staticmethod
+    def _write_sharding(path: str, shards: int, shard_class: str) -> None:
+        with open(os.path.join(path, SHARDING_FILE), "w", encoding="utf-8") as f:
+            json.dump({"shards": shards, "shard_class": shard_class}, f)
+
+    def close(self) -> None:
+        """Ferma i processi degli shard."""
+        self._finalizer()
+
+    @staticmethod
+    def _gather(futures: List[Future]) -> List[Any]:
+        """Risultati di tutti gli shard: attende che terminino tutti prima di sollevare il primo errore."""
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def _all(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> List[Any]:
+        return self._gather([executor.submit(fn, *args, **kwargs) for executor in self._executors])
+
+    def _by_shard(self, ids: List[str]) -> Dict[int, List[int]]:
+        """Posizioni in `ids` raggruppate per shard proprietario."""
+        groups: Dict[int, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            groups.setdefault(shard_of(doc_id, self.shards), []).append(position)
+        return groups
+
+    # ------------------------------------------------------------------ #
+    # Scrittura                                                          #
+    # ------------------------------------------------------------------ #
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def add_embeddings(self,
+                       text_embeddings: Iterable[Tuple[str, List[float]]],
+                       metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None,
+                       **kwargs: Any) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in text_embeddings]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in text_embeddings]
+        groups = self._by_shard(ids)
+        self._gather([self._executors[shard].submit(_shard_call, "add_embeddings",
+                                                    [text_embeddings[i] for i in positions],
+                                                    metadatas=[metadatas[i] for i in positions],
+                                                    ids=[ids[i] for i in positions])
+                      for shard, positions in groups.items()])
+        notify_added(self, ids, [Document(id=doc_id, page_content=text, metadata=metadata or {})
+                                 for doc_id, (text, _), metadata in zip(ids, text_embeddings, metadatas)])
+        return ids
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        if self.embedding_function is None:
+            raise ValueError("ShardedVectorStore requires an embedding function to add texts")
+        texts = list(texts)
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            raise ValueError("No ids provided to delete")
+        self._gather([self._executors[shard].submit(_shard_call, "delete", [ids[i] for i in positions])
+                      for shard, positions in self._by_shard(ids).items()])
+        notify_deleted(self, ids)
+        return True
+
+    # ------------------------------------------------------------------ #
+    # Lettura                                                            #
+    # ------------------------------------------------------------------ #
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._all(_shard_ids))
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        groups = self._by_shard(ids)
+        results = self._gather([self._executors[shard].submit(_shard_call, "get_by_ids",
+                                                              [ids[i] for i in positions])
+                                for shard, positions in groups.items()])
+        documents = {document.id: document for shard_documents in results for document in shard_documents}
+        return [documents[doc_id] for doc_id in ids if doc_id in documents]
+
+    def iter_documents(self, batch_size: int = _DOCUMENTS_BATCH_SIZE) -> Iterator[Tuple[List[str], List[Document]]]:
+        """(id, documenti) a blocchi, shard per shard (per la costruzione degli indici in memoria, store_index.py)."""
+        for executor, shard_ids in zip(self._executors, self._all(_shard_ids)):
+            for start in range(0, len(shard_ids), batch_size):
+                batch = shard_ids[start:start + batch_size]
+                documents = executor.submit(_shard_call, "get_by_ids", batch).result()
+                yield [document.id for document in documents], documents
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # gli shard restituiscono già score di rilevanza
+        return lambda score: score
+
+    def _embed_query(self, query: str) -> List[float]:
+        if self.embedding_function is None:
+            raise ValueError("ShardedVectorStore requires an embedding function to search by text")
+        return self.embedding_function.embed_query(query)
+
+    def similarity_search_with_score_by_vector(self,
+                                               embedding: List[float],
+                                               k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        score_threshold = kwargs.pop("score_threshold", None)
+        if filter is not None:
+            kwargs["filter"] = filter
+        results = [result for shard_results in self._all(_shard_search, list(embedding), k, kwargs)
+                   for result in shard_results]
+        results = heapq.nlargest(k, results, key=lambda result: result[1])
+        if score_threshold is not None:
+            results = [(doc, score) for doc, score in results if score >= score_threshold]
+        return results
+
+    def similarity_search_by_vector(self,
+                                    embedding: List[float],
+                                    k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self,
+                                     query: str,
+                                     k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self,
+                          query: str,
+                          k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embed_query(query), k, filter, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(self,
+                                                embedding: List[float],
+                                                k: int = 4,
+                                                fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        if filter is not None:
+            kwargs["filter"] = filter
+        fetch_k = max(fetch_k, k)
+        candidates = []
+        for results, vectors in self._all(_shard_candidates, list(embedding), fetch_k, kwargs):
+            candidates.extend((doc, score, vector) for (doc, score), vector in zip(results, vectors))
+        candidates = heapq.nlargest(fetch_k, candidates, key=lambda candidate: candidate[1])
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(np.asarray(embedding, dtype=np.float32),
+                                              np.vstack([vector for _, _, vector in candidates]),
+                                              k=k, lambda_mult=lambda_mult)
+        return [candidates[i][0] for i in selected]
+
+    def max_marginal_relevance_search(self,
+                                      query: str,
+                                      k: int = 4,
+                                      fetch_k: int = 20,
+                                      lambda_mult: float = 0.5,
+                                      filter: Optional[Dict[str, Any]] = None,
+                                      **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self._embed_query(query), k, fetch_k, lambda_mult,
+                                                            filter, **kwargs)
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Somma dell'occupazione di memoria degli shard, con il dettaglio per shard."""
+        shards = self._all(_shard_call, "memory_usage")
+        float32_bytes = sum(shard["float32_bytes"] for shard in shards)
+        resident = sum(shard["resident_bytes"] for shard in shards)
+        return {
+            "vectors": sum(shard["vectors"] for shard in shards),
+            "float32_bytes": float32_bytes,
+            "resident_bytes": resident,
+            "reduction": float32_bytes / resident if resident else None,
+            "shards": shards,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Snapshot (shard FAISS)                                             #
+    # ------------------------------------------------------------------ #
+
+    @property
+    def dirty(self) -> bool:
+        """True se almeno uno shard FAISS è cambiato dall'ultimo snapshot (gli shard NumPy persistono da sé)."""
+        return self.shard_class == "FAISS" and any(self._all(_shard_attribute, "dirty"))
+
+    def save_snapshot(self, folder_path: str) -> int:
+        """Snapshot di tutti gli shard in `folder_path/shard_<i>`; restituisce il numero di vettori salvati."""
+        if self.shard_class != "FAISS":
+            raise ValueError("Snapshots are only supported for FAISS shards")
+        os.makedirs(folder_path, exist_ok=True)
+        self._write_sharding(folder_path, self.shards, self.shard_class)
+        return sum(self._gather([executor.submit(_shard_call, "save_snapshot", os.path.join(folder_path, f"shard_{shard}"))
+                                 for shard, executor in enumerate(self._executors)]))
+
+    @classmethod
+    def load_snapshot(cls,
+                      folder_path: str,
+                      embedding_function: Optional[Embeddings],
+                      mmap: bool = True,
+                      **kwargs: Any) -> "ShardedVectorStore":
+        """Inverso di `save_snapshot`: ogni shard viene caricato dalla propria sottocartella."""
+        return cls(embedding_function, snapshot_path=folder_path, mmap=mmap, **kwargs)
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[Dict[str, Any]]] = None,
+                   ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "ShardedVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,63 @@
+"""
+snapshots.py
+
+Snapshot su disco degli store in memoria (FAISS, vedi faiss_store.py).
+
+Ogni snapshot è una cartella `<FAISS_SNAPSHOT_DIR>/<store_id>/<version>`
+scritta in una cartella temporanea e poi rinominata, quindi non è mai
+visibile a metà. La versione è ordinabile per data; l'ultima viene
+registrata nella configurazione dello store (`config.snapshot`), così ogni
+worker che carica (o ricarica) lo store legge lo stesso stato.
+
+Le versioni più vecchie delle ultime `FAISS_SNAPSHOT_KEEP` vengono rimosse:
+un worker che ha ancora mappata una versione cancellata continua a leggerla
+(il file resta valido finché è mappato).
+
+Configurazione via env:
+
+    FAISS_SNAPSHOT_DIR               (default "faiss_snapshots"; condivisa tra i worker del nodo)
+    FAISS_SNAPSHOT_INTERVAL_SECONDS  (default 0 = nessuno snapshot periodico)
+    FAISS_SNAPSHOT_KEEP              (default 2)
+    FAISS_SNAPSHOT_MMAP              (default "true")
+"""
+
+import datetime
+import os
+import shutil
+import uuid
+from typing import Any, Dict
+
+FAISS_SNAPSHOT_DIR = os.getenv("FAISS_SNAPSHOT_DIR", "faiss_snapshots")
+FAISS_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("FAISS_SNAPSHOT_INTERVAL_SECONDS", "0"))
+FAISS_SNAPSHOT_KEEP = max(1, int(os.getenv("FAISS_SNAPSHOT_KEEP", "2")))
+FAISS_SNAPSHOT_MMAP = os.getenv("FAISS_SNAPSHOT_MMAP", "true").lower() in ("1", "true", "yes")
+
+
+def supports_snapshots(vector_store: Any) -> bool:
+    return hasattr(vector_store, "save_snapshot") and hasattr(vector_store, "dirty")
+
+
+def write_snapshot(vector_store: Any, store_id: str) -> Dict[str, Any]:
+    """Scrive un nuovo snapshot dello store e restituisce il descrittore da salvare nella configurazione."""
+    now = datetime.datetime.utcnow()
+    version = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+    store_dir = os.path.join(FAISS_SNAPSHOT_DIR, store_id)
+    path = os.path.join(store_dir, version)
+    tmp_path = path + ".tmp"
+    os.makedirs(store_dir, exist_ok=True)
+    try:
+        vectors = vector_store.save_snapshot(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    prune_snapshots(store_id)
+    return {"version": version, "path": os.path.abspath(path), "vectors": vectors, "created_at": now}
+
+
+def prune_snapshots(store_id: str, keep: int = FAISS_SNAPSHOT_KEEP) -> None:
+    """Rimuove le versioni più vecchie delle ultime `keep`."""
+    store_dir = os.path.join(FAISS_SNAPSHOT_DIR, store_id)
+    versions = sorted(name for name in os.listdir(store_dir) if not name.endswith(".tmp"))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
@@ -0,0 +1,310 @@
+"""
+store_index.py
+
+Indici secondari in memoria costruiti sopra i vector store caricati
+(BM25 in lexical.py, metadati in metadata_index.py).
+
+Ogni tipo di indice ha un registro (`StoreIndexRegistry`) con un indice per
+istanza di store: viene costruito alla prima richiesta leggendo i documenti
+dallo store (FAISS, Chroma, NumpyVectorStore, ShardedVectorStore) e scompare
+con l'istanza (offload/ricaricamento). Da quel momento gli indici sono
+aggiornati in modo incrementale:
+
+- dalle scritture del servizio (`record_added`, `record_deleted`); le
+  scritture non tracciabili (es. `/vector_store/method`) li invalidano
+  (`invalidate`) e vengono ricostruiti alla richiesta successiva;
+- dagli store che notificano da sé le proprie scritture
+  (`notifies_store_indexes = True`, es. FaissVectorStore e NumpyVectorStore)
+  tramite `notify_added` / `notify_deleted`: per questi gli indici restano
+  allineati qualunque sia il percorso di scrittura (catene, job, ...), e le
+  chiamate `record_*` vengono ignorate.
+
+Un indice espone `lock` (RLock), `add(ids, documents)` e `remove(ids)`.
+
+Chi tiene stato derivato dallo store senza essere un indice (es. la cache
+dei risultati di ricerca, search_cache.py) si registra con `on_store_write`
+ed è richiamato a ogni scrittura notificata o invalidazione.
+
+Gli store i cui dati sono condivisi su disco dai worker del nodo (Chroma
+persistito, vedi chroma_pool.py) vengono registrati con `track_node_writes`:
+ogni scrittura notificata incrementa la generazione di scrittura di nodo dei
+loro dati (object_registry.py) e `check_node_writes` (chiamata prima di usare
+un indice o la cache dei risultati) scarta indici e stato derivato se un
+altro processo ha scritto da quando questo processo li ha aggiornati.
+
+Chi deve sapere quali documenti sono stati scritti da un certo momento in poi
+(la ricostruzione di uno store, rebuild.py) apre un giornale delle scritture
+(`open_journal`): raccoglie gli id aggiunti o rimossi, e segna come non
+tracciabili le scritture senza id e le invalidazioni.
+"""
+
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from utilities.object_registry import object_registry
+
+# documenti letti per blocco dallo store alla costruzione di un indice
+_BUILD_BATCH_SIZE = 1000
+
+
+def iter_store_documents(vector_store: Any) -> Iterator[Tuple[List[str], List[Document]]]:
+    """Legge a blocchi (id, documenti) da uno store in memoria o da una collezione Chroma."""
+    if hasattr(vector_store, "iter_documents"):
+        # ShardedVectorStore
+        yield from vector_store.iter_documents(_BUILD_BATCH_SIZE)
+    elif hasattr(vector_store, "index_to_docstore_id") and hasattr(vector_store, "docstore"):
+        # FAISS
+        ids = list(vector_store.index_to_docstore_id.values())
+        for start in range(0, len(ids), _BUILD_BATCH_SIZE):
+            batch = ids[start:start + _BUILD_BATCH_SIZE]
+            yield batch, [vector_store.docstore.search(doc_id) for doc_id in batch]
+    elif hasattr(vector_store, "filter_documents"):
+        # NumpyVectorStore
+        skip = 0
+        while True:
+            docs = vector_store.filter_documents({}, skip=skip, limit=_BUILD_BATCH_SIZE)
+            if not docs:
+                break
+            yield [doc.id for doc in docs], docs
+            skip += len(docs)
+    elif hasattr(getattr(vector_store, "_collection", None), "get"):
+        # Chroma
+        offset = 0
+        while True:
+            batch = vector_store.get(include=["documents", "metadatas"], limit=_BUILD_BATCH_SIZE, offset=offset)
+            if not batch["ids"]:
+                break
+            yield batch["ids"], [Document(page_content=text or "", metadata=metadata or {})
+                                 for text, metadata in zip(batch["documents"], batch["metadatas"])]
+            offset += len(batch["ids"])
+    else:
+        raise ValueError(f"In-memory indexes are not supported for {type(vector_store).__name__} stores")
+
+
+def list_store_ids(vector_store: Any) -> List[str]:
+    """Id di tutti i documenti dello store."""
+    if hasattr(vector_store, "document_ids"):
+        # NumpyVectorStore
+        return vector_store.document_ids()
+    if hasattr(vector_store, "index_to_docstore_id"):
+        # FAISS
+        return list(vector_store.index_to_docstore_id.values())
+    if hasattr(getattr(vector_store, "_collection", None), "get"):
+        # Chroma
+        return vector_store._collection.get(include=[])["ids"]
+    return [doc_id for ids, _ in iter_store_documents(vector_store) for doc_id in ids]
+
+
+def get_store_documents(vector_store: Any, ids: List[str]) -> List[Document]:
+    """Documenti dello store con gli id dati, nello stesso ordine (gli id non trovati vengono saltati)."""
+    if hasattr(vector_store, "index_to_docstore_id") and hasattr(vector_store, "docstore"):
+        documents = {}
+        for doc_id in ids:
+            document = vector_store.docstore.search(doc_id)
+            if isinstance(document, Document):
+                documents[doc_id] = Document(id=doc_id, page_content=document.page_content,
+                                             metadata=document.metadata)
+    elif hasattr(getattr(vector_store, "_collection", None), "get"):
+        batch = vector_store.get(ids=ids, include=["documents", "metadatas"])
+        documents = {doc_id: Document(id=doc_id, page_content=text or "", metadata=metadata or {})
+                     for doc_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])}
+    else:
+        documents = {document.id: document for document in vector_store.get_by_ids(ids)}
+    return [documents[doc_id] for doc_id in ids if doc_id in documents]
+
+
+_registries: List["StoreIndexRegistry"] = []
+_write_listeners: List[Callable[[Any], None]] = []
+
+
+class WriteJournal:
+    """Id dei documenti scritti (aggiunti o rimossi) su uno store da quando il giornale è aperto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, None] = {}
+        self.untracked = False
+
+    def record(self, ids: Optional[List[str]]) -> None:
+        with self._lock:
+            if ids is None:
+                self.untracked = True
+            else:
+                self._ids.update(dict.fromkeys(ids))
+
+    def take(self) -> List[str]:
+        """Id scritti dall'ultima chiamata, in ordine di scrittura (il giornale viene svuotato)."""
+        with self._lock:
+            ids, self._ids = list(self._ids), {}
+            return ids
+
+    def pending(self) -> List[str]:
+        """Id scritti dall'ultima `take`, senza svuotare il giornale."""
+        with self._lock:
+            return list(self._ids)
+
+
+_journals: "weakref.WeakKeyDictionary[Any, List[WriteJournal]]" = weakref.WeakKeyDictionary()
+_journals_lock = threading.Lock()
+
+
+def open_journal(vector_store: Any) -> WriteJournal:
+    """Inizia a raccogliere gli id scritti sullo store (da chiudere con `close_journal`)."""
+    journal = WriteJournal()
+    with _journals_lock:
+        _journals.setdefault(vector_store, []).append(journal)
+    return journal
+
+
+def close_journal(vector_store: Any, journal: WriteJournal) -> None:
+    with _journals_lock:
+        journals = _journals.get(vector_store, [])
+        if journal in journals:
+            journals.remove(journal)
+
+
+def _record_journals(vector_store: Any, ids: Optional[List[str]]) -> None:
+    for journal in list(_journals.get(vector_store, ())):
+        journal.record(ids)
+
+
+# tipo degli oggetti del registro di nodo per le generazioni di scrittura dei dati condivisi
+_NODE_DATA_KIND = "store_data"
+# store con dati condivisi tra i processi del nodo -> [chiave dei dati, ultima generazione di nodo applicata]
+_node_tracked: "weakref.WeakKeyDictionary[Any, List[Any]]" = weakref.WeakKeyDictionary()
+_node_lock = threading.Lock()
+
+
+def track_node_writes(vector_store: Any, data_key: str) -> None:
+    """
+    Registra uno store i cui dati (identificati da `data_key`, es. directory e collezione Chroma) possono
+    essere scritti anche da altri processi del nodo.
+    """
+    generation = object_registry.get_generation(_NODE_DATA_KIND, data_key)
+    with _node_lock:
+        _node_tracked[vector_store] = [data_key, generation]
+
+
+def check_node_writes(vector_store: Any) -> None:
+    """Scarta indici e stato derivato dello store se un altro processo ne ha scritto i dati dall'ultimo controllo."""
+    entry = _node_tracked.get(vector_store)
+    if entry is None:
+        return
+    current = object_registry.get_generation(_NODE_DATA_KIND, entry[0])
+    with _node_lock:
+        if current == entry[1]:
+            return
+        entry[1] = current
+    for registry in _registries:
+        registry.discard(vector_store)
+    # scritture di cui non si conoscono gli id (es. una ricostruzione in corso non può riportarle)
+    _record_journals(vector_store, None)
+    for listener in _write_listeners:
+        listener(vector_store)
+
+
+def _publish_node_write(vector_store: Any) -> None:
+    entry = _node_tracked.get(vector_store)
+    if entry is None:
+        return
+    previous, current = object_registry.bump_generation(_NODE_DATA_KIND, entry[0])
+    with _node_lock:
+        # se nel frattempo ha scritto un altro processo, il prossimo controllo scarterà lo stato derivato
+        if entry[1] == previous:
+            entry[1] = current
+
+
+def on_store_write(listener: Callable[[Any], None]) -> None:
+    """Registra `listener(vector_store)`, richiamato dopo ogni scrittura notificata o invalidazione dello store."""
+    _write_listeners.append(listener)
+
+
+def _notify_listeners(vector_store: Any) -> None:
+    _publish_node_write(vector_store)
+    for listener in _write_listeners:
+        listener(vector_store)
+
+
+class StoreIndexRegistry:
+    """Un indice (creato da `factory`) per ciascuno store caricato."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self._indexes: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        _registries.append(self)
+
+    def get(self, vector_store: Any) -> Any:
+        """Indice dello store, costruito alla prima richiesta (e di nuovo dopo le scritture di altri processi)."""
+        check_node_writes(vector_store)
+        with self._lock:
+            index = self._indexes.get(vector_store)
+            if index is not None:
+                return index
+            index = self.factory()
+            # le scritture concorrenti alla costruzione attendono il lock dell'indice e vengono applicate dopo
+            index.lock.acquire()
+            self._indexes[vector_store] = index
+        try:
+            for ids, documents in iter_store_documents(vector_store):
+                index.add(ids, documents)
+        except BaseException:
+            self.discard(vector_store)
+            raise
+        finally:
+            index.lock.release()
+        return index
+
+    def peek(self, vector_store: Any) -> Optional[Any]:
+        """Indice dello store se già costruito."""
+        return self._indexes.get(vector_store)
+
+    def discard(self, vector_store: Any) -> None:
+        with self._lock:
+            self._indexes.pop(vector_store, None)
+
+
+def notify_added(vector_store: Any, ids: Optional[List[str]], documents: List[Document]) -> None:
+    """Aggiorna gli indici già costruiti dello store dopo un inserimento."""
+    for registry in _registries:
+        index = registry.peek(vector_store)
+        if index is None:
+            continue
+        if not ids or len(ids) != len(documents):
+            # id non noti: non si possono collegare ai documenti
+            registry.discard(vector_store)
+        else:
+            index.add(ids, documents)
+    _record_journals(vector_store, ids if ids and len(ids) == len(documents) else None)
+    _notify_listeners(vector_store)
+
+
+def notify_deleted(vector_store: Any, ids: List[str]) -> None:
+    for registry in _registries:
+        index = registry.peek(vector_store)
+        if index is not None:
+            index.remove(ids)
+    _record_journals(vector_store, ids)
+    _notify_listeners(vector_store)
+
+
+def record_added(vector_store: Any, ids: Optional[List[str]], documents: List[Document]) -> None:
+    """Scrittura del servizio: aggiorna gli indici dello store se lo store non lo fa da sé."""
+    if not getattr(vector_store, "notifies_store_indexes", False):
+        notify_added(vector_store, ids, documents)
+
+
+def record_deleted(vector_store: Any, ids: List[str]) -> None:
+    if not getattr(vector_store, "notifies_store_indexes", False):
+        notify_deleted(vector_store, ids)
+
+
+def invalidate(vector_store: Any) -> None:
+    """Scarta gli indici dello store: verranno ricostruiti alla prossima richiesta."""
+    for registry in _registries:
+        registry.discard(vector_store)
+    _record_journals(vector_store, None)
+    _notify_listeners(vector_store)
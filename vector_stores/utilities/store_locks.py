@@ -0,0 +1,201 @@
+"""
+store_locks.py
+
+Controllo di concorrenza per vector store caricato: lock lettori/scrittore.
+
+Gli store in `vector_stores` sono condivisi dai thread delle richieste e dai
+job (es. `_process_add_docs_from_store_job`). Con un lock per store:
+
+- le ricerche (lettori) procedono in parallelo tra loro;
+- le scritture (aggiunte, rimozioni, aggiornamenti, metodi generici) sono
+  esclusive; le aggiunte grandi vengono fatte a blocchi (ingestion.py), le
+  piccole vengono unite dalla coda di scrittura (write_queue.py), e il
+  calcolo degli embedding avviene fuori dal lock;
+- uno scrittore in attesa ha la precedenza sui nuovi lettori, così un flusso
+  continuo di ricerche non lo blocca indefinitamente.
+
+Il lock è rientrante per lo stesso thread (lettura dentro lettura o dentro
+scrittura, scrittura dentro scrittura); il passaggio da lettura a scrittura
+nello stesso thread non è ammesso.
+
+Gli store che gestiscono da sé la propria concorrenza espongono il proprio
+lock come `rw_lock` (FaissVectorStore): i loro metodi lo prendono solo per
+il tempo necessario (es. non durante il calcolo degli embedding o la
+costruzione di un nuovo indice), quindi `reading`/`writing` non lo prendono
+dall'esterno; le sue statistiche sono comunque esposte.
+
+Uno store sostituito da una ricostruzione (rebuild.py) viene ritirato
+(`retire`): le scritture del servizio che lo avevano già in mano falliscono
+con `StoreReplacedError` invece di andare perse sulla vecchia istanza.
+
+I tempi di attesa per il lock sono esposti da `/vector_store/locks/stats`.
+"""
+
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class ReadWriteLock:
+    """Lock lettori/scrittore rientrante, con precedenza agli scrittori e statistiche sui tempi di attesa."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self.stats: Dict[str, float] = {"reads": 0, "writes": 0,
+                                        "read_wait_seconds": 0.0, "write_wait_seconds": 0.0,
+                                        "max_read_wait_seconds": 0.0, "max_write_wait_seconds": 0.0}
+
+    def _record(self, mode: str, waited: float) -> None:
+        self.stats[f"{mode}s"] += 1
+        self.stats[f"{mode}_wait_seconds"] += waited
+        self.stats[f"max_{mode}_wait_seconds"] = max(self.stats[f"max_{mode}_wait_seconds"], waited)
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        start = time.monotonic()
+        with self._cond:
+            # rientro: il thread ha già il lock in lettura o in scrittura
+            if self._writer != me and not self._readers.get(me):
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+            self._record("read", time.monotonic() - start)
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        start = time.monotonic()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if self._readers.get(me):
+                raise RuntimeError("Cannot acquire a write lock while holding a read lock on the same store")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+            self._record("write", time.monotonic() - start)
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self.stats,
+                "active_readers": sum(self._readers.values()),
+                "writer_active": self._writer is not None,
+                "waiting_writers": self._waiting_writers,
+                "avg_read_wait_seconds": self.stats["read_wait_seconds"] / self.stats["reads"] if self.stats["reads"] else 0.0,
+                "avg_write_wait_seconds": self.stats["write_wait_seconds"] / self.stats["writes"] if self.stats["writes"] else 0.0,
+            }
+
+
+class StoreReplacedError(RuntimeError):
+    """Scrittura su uno store già sostituito da una ricostruzione."""
+
+
+# store sostituiti da una ricostruzione; scompaiono con l'istanza dello store
+_retired: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def retire(vector_store: Any) -> None:
+    """Segna lo store come sostituito: da questo momento le scritture falliscono."""
+    _retired.add(vector_store)
+
+
+def check_not_retired(vector_store: Any) -> None:
+    if vector_store in _retired:
+        raise StoreReplacedError("The vector store was replaced by a rebuild while writing to it, retry the write")
+
+
+# lock di ciascuno store caricato che non ne ha uno proprio; scompare con l'istanza dello store
+_locks: "weakref.WeakKeyDictionary[Any, ReadWriteLock]" = weakref.WeakKeyDictionary()
+_locks_lock = threading.Lock()
+
+
+def get_store_lock(vector_store: Any) -> ReadWriteLock:
+    own = getattr(vector_store, "rw_lock", None)
+    if own is not None:
+        return own
+    with _locks_lock:
+        lock = _locks.get(vector_store)
+        if lock is None:
+            lock = _locks[vector_store] = ReadWriteLock()
+        return lock
+
+
+@contextmanager
+def reading(vector_store: Any) -> Iterator[None]:
+    """Lettura dello store da parte del servizio (nessun lock esterno per gli store con `rw_lock` proprio)."""
+    if getattr(vector_store, "rw_lock", None) is not None:
+        yield
+        return
+    with get_store_lock(vector_store).read():
+        yield
+
+
+@contextmanager
+def writing(vector_store: Any) -> Iterator[None]:
+    """Scrittura sullo store da parte del servizio (nessun lock esterno per gli store con `rw_lock` proprio)."""
+    if getattr(vector_store, "rw_lock", None) is not None:
+        # lo store controlla da sé, sotto il proprio lock, di non essere stato ritirato
+        check_not_retired(vector_store)
+        yield
+        return
+    with get_store_lock(vector_store).write():
+        check_not_retired(vector_store)
+        yield
+
+
+def read_locked(vector_store: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Esegue `fn` in `reading(vector_store)` (da chiamare nei pool, es. con `run_blocking`)."""
+    with reading(vector_store):
+        return fn(*args, **kwargs)
+
+
+def write_locked(vector_store: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Esegue `fn` in `writing(vector_store)` (da chiamare nei pool, es. con `run_blocking`)."""
+    with writing(vector_store):
+        return fn(*args, **kwargs)
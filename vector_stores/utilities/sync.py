@@ -0,0 +1,184 @@
+"""
+sync.py
+
+Sincronizzazione incrementale document store -> vector store.
+
+Per ogni coppia (store_id, collezione) viene salvato in Mongo, documento per
+documento, l'hash del contenuto indicizzato (`vector_store.sync_state`). Una
+sincronizzazione:
+
+1. legge la collezione a blocchi e confronta l'hash di ogni documento con
+   quello salvato: i documenti nuovi vengono aggiunti, quelli modificati
+   vengono sostituiti (delete + add), quelli invariati non costano né
+   embedding né scritture;
+2. scorre lo stato salvato e rimuove dallo store i documenti che non
+   esistono più nella collezione;
+3. registra l'esito in `vector_store.sync_status`.
+
+Nel vector store ogni documento ha come id l'`_id` del document store, così
+modifiche e cancellazioni fatte con `document_stores/api.py` (o dai loader)
+si propagano con la sincronizzazione successiva.
+"""
+
+import datetime
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+
+from utilities.mongo import get_mongo_client
+from vector_stores.utilities.ingestion import add_documents_batch, iter_cursor_batches, to_langchain_documents
+from vector_stores.utilities.store_index import record_deleted
+from vector_stores.utilities.store_locks import write_locked
+
+SYNC_DB_NAME = "vector_store"
+SYNC_STATE_COLLECTION_NAME = "sync_state"
+SYNC_STATUS_COLLECTION_NAME = "sync_status"
+
+_indexes_ready = False
+
+
+def _state_collection():
+    return get_mongo_client()[SYNC_DB_NAME][SYNC_STATE_COLLECTION_NAME]
+
+
+def _status_collection():
+    return get_mongo_client()[SYNC_DB_NAME][SYNC_STATUS_COLLECTION_NAME]
+
+
+def ensure_sync_indexes() -> None:
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    _state_collection().create_index([("store_id", ASCENDING), ("collection", ASCENDING), ("doc_id", ASCENDING)],
+                                     unique=True)
+    _indexes_ready = True
+
+
+def document_hash(value: Dict[str, Any]) -> str:
+    """Hash del contenuto indicizzato (testo e metadati) di un documento del document store."""
+    payload = json.dumps({"page_content": value.get("page_content"), "metadata": value.get("metadata") or {}},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def sync_status_id(store_id: str, collection: str) -> str:
+    return f"{store_id}:{collection}"
+
+
+def get_sync_status(store_id: str, collection: str) -> Optional[Dict[str, Any]]:
+    return _status_collection().find_one({"_id": sync_status_id(store_id, collection)}, {"_id": 0})
+
+
+def clear_sync_state(store_id: str, collection: Optional[str] = None) -> None:
+    """Dimentica lo stato di sincronizzazione dello store (per una collezione o per tutte)."""
+    scope = {"store_id": store_id}
+    if collection is not None:
+        scope["collection"] = collection
+    _state_collection().delete_many(scope)
+    _status_collection().delete_many(scope)
+
+
+def move_sync_state(from_store_id: str, to_store_id: str, collection: str) -> None:
+    """
+    Lo stato scritto sincronizzando `from_store_id` (la copia ricostruita, rebuild.py) diventa lo stato di
+    `to_store_id`; lo stato delle altre collezioni di `to_store_id` viene dimenticato (i loro documenti non
+    sono nella copia e verranno aggiunti alla prossima sincronizzazione).
+    """
+    clear_sync_state(to_store_id)
+    _state_collection().update_many({"store_id": from_store_id, "collection": collection},
+                                    {"$set": {"store_id": to_store_id}})
+    status = _status_collection().find_one({"_id": sync_status_id(from_store_id, collection)})
+    if status:
+        _status_collection().delete_one({"_id": status["_id"]})
+        _status_collection().insert_one({**status, "_id": sync_status_id(to_store_id, collection),
+                                         "store_id": to_store_id})
+
+
+def sync_collection(vector_store: Any,
+                    store_id: str,
+                    document_collection: Any,
+                    batch_size: int,
+                    on_progress: Optional[Callable[..., None]] = None) -> Dict[str, int]:
+    """
+    Allinea `vector_store` alla collezione `document_collection` (collection pymongo).
+
+    `on_progress(current=..., total=..., message=...)` viene chiamata dopo ogni blocco.
+
+    Returns:
+        Conteggi `added`, `updated`, `deleted`, `unchanged`.
+    """
+    ensure_sync_indexes()
+    collection_name = document_collection.name
+    state = _state_collection()
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    total = document_collection.estimated_document_count()
+    started_at = datetime.datetime.utcnow()
+    scope = {"store_id": store_id, "collection": collection_name}
+
+    # 1. documenti nuovi o modificati
+    scanned = 0
+    cursor = document_collection.find({}, {"value": 1}, batch_size=batch_size)
+    try:
+        for raw_docs in iter_cursor_batches(cursor, batch_size):
+            doc_ids = [str(raw["_id"]) for raw in raw_docs]
+            known = {row["doc_id"]: row["hash"]
+                     for row in state.find({**scope, "doc_id": {"$in": doc_ids}}, {"doc_id": 1, "hash": 1})}
+
+            changed_raw, changed_ids, changed_hashes, replaced_ids = [], [], [], []
+            for doc_id, raw in zip(doc_ids, raw_docs):
+                digest = document_hash(raw["value"])
+                if known.get(doc_id) == digest:
+                    counts["unchanged"] += 1
+                    continue
+                if doc_id in known:
+                    replaced_ids.append(doc_id)
+                changed_raw.append(raw)
+                changed_ids.append(doc_id)
+                changed_hashes.append(digest)
+
+            if replaced_ids:
+                write_locked(vector_store, vector_store.delete, ids=replaced_ids)
+                record_deleted(vector_store, replaced_ids)
+            if changed_raw:
+                add_documents_batch(vector_store, to_langchain_documents(changed_raw), ids=changed_ids)
+                now = datetime.datetime.utcnow()
+                state.bulk_write([
+                    UpdateOne({**scope, "doc_id": doc_id}, {"$set": {"hash": digest, "synced_at": now}}, upsert=True)
+                    for doc_id, digest in zip(changed_ids, changed_hashes)
+                ], ordered=False)
+            counts["updated"] += len(replaced_ids)
+            counts["added"] += len(changed_ids) - len(replaced_ids)
+
+            scanned += len(raw_docs)
+            if on_progress is not None:
+                on_progress(current=scanned, total=total, message="syncing", **counts)
+    finally:
+        cursor.close()
+
+    # 2. documenti rimossi dalla collezione
+    state_cursor = state.find(scope, {"doc_id": 1}, batch_size=batch_size)
+    try:
+        for rows in iter_cursor_batches(state_cursor, batch_size):
+            doc_ids = [row["doc_id"] for row in rows]
+            existing = {str(doc["_id"]) for doc in document_collection.find({"_id": {"$in": doc_ids}}, {"_id": 1})}
+            removed = [row for row in rows if row["doc_id"] not in existing]
+            if removed:
+                write_locked(vector_store, vector_store.delete, ids=[row["doc_id"] for row in removed])
+                record_deleted(vector_store, [row["doc_id"] for row in removed])
+                state.bulk_write([DeleteOne({"_id": row["_id"]}) for row in removed], ordered=False)
+                counts["deleted"] += len(removed)
+    finally:
+        state_cursor.close()
+
+    _status_collection().update_one(
+        {"_id": sync_status_id(store_id, collection_name)},
+        {"$set": {**scope,
+                  "started_at": started_at,
+                  "finished_at": datetime.datetime.utcnow(),
+                  "last_result": counts,
+                  "indexed_documents": state.count_documents(scope)}},
+        upsert=True,
+    )
+    return counts
@@ -0,0 +1,143 @@
+"""
+write_queue.py
+
+Coda di scrittura per vector store caricato: unisce le aggiunte piccole e
+concorrenti (`/vector_store/documents`, `/vector_store/texts`) in un'unica
+scrittura.
+
+Ogni richiesta accoda i propri documenti (con id già assegnati, così ognuna
+riceve i propri) e chi trova la coda libera la svuota per tutte (group
+commit), mentre le altre attendono sulla condizione della coda finché la loro
+scrittura non è completata: i documenti arrivati nel frattempo vengono inseriti insieme, fino a
+`WRITE_QUEUE_MAX_BATCH` documenti per scrittura, con un solo calcolo degli
+embedding (fuori dal lock) e una sola acquisizione del lock in scrittura
+dello store (store_locks.py). Le aggiunte già più grandi di
+`WRITE_QUEUE_MAX_BATCH` non passano dalla coda. Se la scrittura unita fallisce
+le richieste vengono ritentate una per una, così l'errore arriva solo a chi
+lo ha causato.
+
+Configurazione via env:
+
+    WRITE_QUEUE_MAX_BATCH   (default 256 documenti per scrittura unita)
+"""
+
+import os
+import threading
+import uuid
+import weakref
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from vector_stores.utilities.ingestion import add_documents_batch
+
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256"))
+
+
+class _PendingAdd:
+    def __init__(self, docs: List[Document], ids: List[str]):
+        self.docs = docs
+        self.ids = ids
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class WriteQueue:
+    """Aggiunte accodate per uno store, inserite a gruppi dal primo thread che trova la coda libera."""
+
+    def __init__(self, vector_store: Any, max_batch: int = WRITE_QUEUE_MAX_BATCH):
+        self._store = weakref.ref(vector_store)
+        self.max_batch = max_batch
+        self._pending: List[_PendingAdd] = []
+        self._lock = threading.Lock()
+        # notificata quando una scrittura termina o la coda torna libera
+        self._changed = threading.Condition(self._lock)
+        self._flushing = False
+        self.stats: Dict[str, int] = {"requests": 0, "writes": 0, "documents": 0, "merged_requests": 0}
+
+    def add_documents(self, docs: List[Document]) -> List[str]:
+        """Aggiunge i documenti allo store e ne restituisce gli id."""
+        ids = [doc.id or str(uuid.uuid4()) for doc in docs]
+        if len(docs) >= self.max_batch:
+            self._write([_PendingAdd(docs, ids)])
+            return ids
+
+        request = _PendingAdd(docs, ids)
+        with self._changed:
+            self._pending.append(request)
+            while self._flushing and not request.done:
+                self._changed.wait()
+            leader = not request.done
+            self._flushing = self._flushing or leader
+        if leader:
+            try:
+                self._flush()
+            finally:
+                with self._changed:
+                    self._flushing = False
+                    self._changed.notify_all()
+        if request.error is not None:
+            raise request.error
+        return request.ids
+
+    def _flush(self) -> None:
+        while True:
+            with self._lock:
+                batch: List[_PendingAdd] = []
+                size = 0
+                while self._pending and (not batch or size + len(self._pending[0].docs) <= self.max_batch):
+                    request = self._pending.pop(0)
+                    batch.append(request)
+                    size += len(request.docs)
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                # la scrittura unita è fallita: ognuno ritenta da solo e riceve il proprio errore
+                for request in batch:
+                    try:
+                        self._write([request])
+                    except Exception as e:
+                        request.error = e
+            finally:
+                with self._changed:
+                    for request in batch:
+                        request.done = True
+                    self._changed.notify_all()
+
+    def _write(self, batch: List[_PendingAdd]) -> None:
+        vector_store = self._store()
+        if vector_store is None:
+            raise RuntimeError("Vector store has been unloaded")
+        docs = [doc for request in batch for doc in request.docs]
+        ids = [doc_id for request in batch for doc_id in request.ids]
+        # embedding fuori dal lock, inserimento sotto il lock in scrittura dello store
+        add_documents_batch(vector_store, docs, ids=ids)
+        with self._lock:
+            self.stats["requests"] += len(batch)
+            self.stats["writes"] += 1
+            self.stats["documents"] += len(docs)
+            self.stats["merged_requests"] += len(batch) if len(batch) > 1 else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "pending": sum(len(request.docs) for request in self._pending),
+                    "max_batch": self.max_batch}
+
+
+# coda di ciascuno store caricato; scompare con l'istanza dello store
+_queues: "weakref.WeakKeyDictionary[Any, WriteQueue]" = weakref.WeakKeyDictionary()
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(vector_store: Any) -> WriteQueue:
+    with _queues_lock:
+        queue = _queues.get(vector_store)
+        if queue is None:
+            queue = _queues[vector_store] = WriteQueue(vector_store)
+        return queue
+
+
+def peek_write_queue(vector_store: Any) -> Optional[WriteQueue]:
+    return _queues.get(vector_store)